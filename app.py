@@ -4,34 +4,64 @@
 """
 SaveGuard - 存档守护者
 游戏存档备份管理工具的主程序入口
+
+使用 --startup-probe 参数启动时，会在热键就绪后输出启动耗时并退出。
 """
 
+from utils import startup_probe
+
 import os
+import sys
 import tkinter as tk
 from ui.main_window import BackupManagerUI
 from ui.welcome_window import WelcomeWindow
 from i18n import t
-import ctypes
+
+startup_probe.mark("imports")
+
+
+def report_startup(root, exit_after):
+    """热键就绪后输出启动耗时报告
+
+    Args:
+        root: tkinter主窗口
+        exit_after: 输出报告后是否退出程序
+    """
+    if startup_probe.get_mark("hotkeys") is None:
+        root.after(10, lambda: report_startup(root, exit_after))
+        return
+    print(startup_probe.format_report())
+    if exit_after:
+        root.destroy()
 
 
 def main():
     """程序入口函数"""
-    root = tk.Tk() 
-    ctypes.windll.shcore.SetProcessDpiAwareness(1)
-    ScaleFactor=ctypes.windll.shcore.GetScaleFactorForDevice(0)
-    root.tk.call('tk', 'scaling', ScaleFactor/75)
-    
+    probe_startup = "--startup-probe" in sys.argv
+
+    root = tk.Tk()
+    if sys.platform == "win32":
+        import ctypes
+        ctypes.windll.shcore.SetProcessDpiAwareness(1)
+        ScaleFactor=ctypes.windll.shcore.GetScaleFactorForDevice(0)
+        root.tk.call('tk', 'scaling', ScaleFactor/75)
+
     # 设置主窗口的基本属性
     root.title(t("app_title"))
     root.geometry("900x600")
     root.deiconify()  # 显示主窗口
-    
+
     # 检查配置文件是否存在
     if not os.path.exists("config.json"):
         welcome = WelcomeWindow(root)
         root.wait_window(welcome.window)
-    
+
     app = BackupManagerUI(root)
+    root.update_idletasks()
+    startup_probe.mark("window")
+
+    if probe_startup:
+        root.after(0, lambda: report_startup(root, True))
     root.mainloop()
 
 
@@ -15,6 +15,7 @@ a = Analysis(
         'psutil',
         'keyboard',
         'win32api',
+        'win32gui',
         'win32con',
         'pydirectinput',
         'config',
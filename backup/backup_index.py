@@ -0,0 +1,245 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+备份索引模块 - 按名称、类型、日期范围和大小快速筛选备份
+
+名称使用1~3字符的n-gram倒排索引，日期和大小使用有序数组二分查找，
+每次查询无需遍历全部备份记录，备份增删改时也只需增量更新索引。
+"""
+
+import bisect
+
+# 名称索引的最大n-gram长度
+MAX_GRAM = 3
+
+
+def _grams(text, size):
+    """生成文本中指定长度的所有子串"""
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+def _all_grams(text):
+    """生成文本中长度为1到MAX_GRAM的所有子串"""
+    return {text[i:i + size] for size in range(1, MAX_GRAM + 1) for i in range(len(text) - size + 1)}
+
+
+class BackupIndex:
+    """备份记录的内存索引"""
+
+    def __init__(self, backups=()):
+        """初始化索引
+
+        Args:
+            backups: 备份记录列表
+        """
+        self._records = {}      # 路径 -> 备份记录
+        self._names = {}        # 路径 -> 建立索引时的小写名称
+        self._sizes = {}        # 路径 -> 建立索引时的大小
+        self._gram_index = {}   # n-gram -> 路径集合
+        self._by_type = {}      # 类型 -> 路径集合
+        self._by_date = []      # 有序的 (日期, 路径)
+        self._by_size = []      # 有序的 (大小, 路径)，仅包含已知大小的备份
+        for backup in backups:
+            self.add(backup)
+
+    def __len__(self):
+        return len(self._records)
+
+    def add(self, backup):
+        """将备份加入索引
+
+        Args:
+            backup: 备份记录
+        """
+        path = backup["path"]
+        if path in self._records:
+            self.remove(self._records[path])
+
+        self._records[path] = backup
+        self._index_name(path, backup["name"].lower())
+        self._index_size(path, backup.get("size"))
+        self._by_type.setdefault(backup.get("type", "legacy"), set()).add(path)
+        bisect.insort(self._by_date, (backup["date"], path))
+
+    def remove(self, backup):
+        """从索引中移除备份
+
+        Args:
+            backup: 备份记录
+        """
+        path = backup["path"]
+        indexed = self._records.pop(path, None)
+        if indexed is None:
+            return
+
+        self._unindex_name(path)
+        self._unindex_size(path)
+        self._by_type.get(indexed.get("type", "legacy"), set()).discard(path)
+        self._remove_sorted(self._by_date, (indexed["date"], path))
+
+    def update(self, backup):
+        """备份记录被原地修改（如重命名、补充大小）后刷新索引
+
+        Args:
+            backup: 备份记录
+        """
+        path = backup["path"]
+        if path not in self._records:
+            self.add(backup)
+            return
+        name = backup["name"].lower()
+        if self._names.get(path) != name:
+            self._unindex_name(path)
+            self._index_name(path, name)
+        if self._sizes.get(path) != backup.get("size"):
+            self._unindex_size(path)
+            self._index_size(path, backup.get("size"))
+
+    def _index_name(self, path, name):
+        """将名称的所有n-gram加入倒排索引"""
+        self._names[path] = name
+        gram_index = self._gram_index
+        for gram in _all_grams(name):
+            paths = gram_index.get(gram)
+            if paths is None:
+                gram_index[gram] = {path}
+            else:
+                paths.add(path)
+
+    def _unindex_name(self, path):
+        """从倒排索引中移除名称"""
+        name = self._names.pop(path, None)
+        if name is None:
+            return
+        for gram in _all_grams(name):
+            paths = self._gram_index.get(gram)
+            if paths is not None:
+                paths.discard(path)
+                if not paths:
+                    del self._gram_index[gram]
+
+    def _index_size(self, path, size):
+        """将大小加入有序数组，大小未知时跳过"""
+        if size is not None:
+            self._sizes[path] = size
+            bisect.insort(self._by_size, (size, path))
+
+    def _unindex_size(self, path):
+        """从有序数组中移除大小"""
+        size = self._sizes.pop(path, None)
+        if size is not None:
+            self._remove_sorted(self._by_size, (size, path))
+
+    @staticmethod
+    def _remove_sorted(items, key):
+        """从有序数组中删除指定元素"""
+        position = bisect.bisect_left(items, key)
+        if position < len(items) and items[position] == key:
+            del items[position]
+
+    def _match_name(self, text):
+        """查找名称包含指定文本的备份
+
+        Args:
+            text: 查询文本
+
+        Returns:
+            set: 路径集合
+        """
+        text = text.lower()
+        gram_size = min(len(text), MAX_GRAM)
+        candidates = None
+        # 从最小的倒排列表开始求交集
+        for paths in sorted((self._gram_index.get(gram, set()) for gram in _grams(text, gram_size)), key=len):
+            candidates = set(paths) if candidates is None else candidates & paths
+            if not candidates:
+                return set()
+        if len(text) <= MAX_GRAM:
+            return candidates
+        # n-gram命中后再确认完整子串
+        return {path for path in candidates if text in self._names[path]}
+
+    @staticmethod
+    def _range(items, low, high):
+        """在有序数组中查找 [low, high] 范围内的路径"""
+        start = 0 if low is None else bisect.bisect_left(items, (low,))
+        # 路径是非空字符串，(high, "\uffff") 不小于任何 (high, 路径)
+        end = len(items) if high is None else bisect.bisect_right(items, (high, "\uffff"))
+        return {path for _, path in items[start:end]}
+
+    def search(self, text="", backup_type=None, date_from=None, date_to=None, min_size=None, max_size=None):
+        """按条件筛选备份
+
+        Args:
+            text: 名称包含的文本，不区分大小写
+            backup_type: 备份类型，'md5' 或 'legacy'
+            date_from: 最早日期（ISO格式字符串，包含）
+            date_to: 最晚日期（ISO格式字符串，包含）
+            min_size: 最小大小（字节）
+            max_size: 最大大小（字节）
+
+        Returns:
+            set: 符合条件的备份路径集合（不可修改），未指定任何条件时返回None表示全部
+        """
+        results = []
+        if text:
+            results.append(self._match_name(text))
+        if backup_type:
+            results.append(self._by_type.get(backup_type, set()))
+        if date_from is not None or date_to is not None:
+            results.append(self._range(self._by_date, date_from, date_to))
+        if min_size is not None or max_size is not None:
+            results.append(self._range(self._by_size, min_size, max_size))
+        if not results:
+            return None
+
+        if len(results) == 1:
+            return results[0]
+        results.sort(key=len)
+        matched = results[0] & results[1]
+        for paths in results[2:]:
+            matched &= paths
+        return matched
+
+    def search_sorted(self, **criteria):
+        """按条件筛选备份，并按日期升序返回
+
+        Args:
+            criteria: 与 search 相同的筛选条件
+
+        Returns:
+            list: 有序的 (日期, 路径) 列表
+        """
+        matched = self.search(**criteria)
+        if matched is None:
+            return list(self._by_date)
+        # 结果较少时直接排序，较多时按已排好序的日期数组过滤
+        if len(matched) * 16 < len(self._by_date):
+            return sorted((self._records[path]["date"], path) for path in matched)
+        return [key for key in self._by_date if key[1] in matched]
+
+    @staticmethod
+    def matches(backup, text="", backup_type=None, date_from=None, date_to=None, min_size=None, max_size=None):
+        """检查单个备份是否符合条件，参数与 search 相同
+
+        Returns:
+            bool: 是否符合条件
+        """
+        if text and text.lower() not in backup["name"].lower():
+            return False
+        if backup_type and backup.get("type", "legacy") != backup_type:
+            return False
+        if date_from is not None and backup["date"] < date_from:
+            return False
+        if date_to is not None and backup["date"] > date_to:
+            return False
+        if min_size is not None or max_size is not None:
+            size = backup.get("size")
+            if size is None:
+                return False
+            if min_size is not None and size < min_size:
+                return False
+            if max_size is not None and size > max_size:
+                return False
+        return True
@@ -3,80 +3,146 @@
 
 """
 备份管理模块 - 负责处理备份和恢复操作
+
+本模块不在导入时依赖 tkinter 或 win32，以便命令行等无界面环境直接驱动备份引擎；
+需要弹窗提示的地方通过 warning_handler 回调交给调用方处理。
 """
 
 import os
 import json
+import hashlib
 import shutil
+import functools
+import threading
 from datetime import datetime
-from tkinter import messagebox
-
-from utils.file_utils import calculate_file_md5, ensure_dir, safe_filename
-from utils.system_utils import simulate_key_press
-
-import win32gui
-import win32con
-
-def focus_window(window_title):
-    """模糊匹配窗口标题并聚焦窗口，使用增强的窗口激活方法"""
-    def enum_windows_callback(hwnd, results):
-        if win32gui.IsWindowVisible(hwnd):
-            title = win32gui.GetWindowText(hwnd)
-            if window_title.lower() in title.lower():  # 模糊匹配
-                results.append(hwnd)
-
-    results = []
-    win32gui.EnumWindows(enum_windows_callback, results)
-    if results:
-        hwnd = results[0]
-        # 尝试多种方法激活窗口
-        try:
-            # 确保窗口不是最小化的
-            win32gui.ShowWindow(hwnd, win32con.SW_RESTORE)
-            # 将窗口置于前台
-            win32gui.SetForegroundWindow(hwnd)
-            # 额外尝试置顶窗口
-            win32gui.BringWindowToTop(hwnd)
-            # 使用ALT+TAB切换到窗口
-            import time
-            time.sleep(0.1)
-            # 尝试再次激活窗口
-            win32gui.SetForegroundWindow(hwnd)
-            # 给系统更多时间来响应
-            time.sleep(0.1)
-            return True
-        except Exception as e:
-            print(f"激活窗口失败: {str(e)}")
-            return False
-    return False
+
+from config.config_manager import DEFAULT_PROFILE
+from utils.file_utils import calculate_file_md5, ensure_dir, safe_filename, WriteBatch, atomic_write_json
+from utils.waits import WaitTimings, wait_until, wait_stable, directory_state
+from utils.io_governor import METADATA_OP_BYTES, get_io_governor
+from utils.macros import MACRO_ACTIONS, MacroError, MacroRunner, MacroCalibrator, load_macro, key_sequence, step_delays
+from backup.journal import OperationJournal
+from backup.repository_lock import REPOSITORY_LOCK_FILE, get_repository_lock, get_catalog_lock
+from backup.object_store import create_object_store
+from backup.object_cache import get_object_cache
+from backup.cold_storage import RepositoryTiering
+from backup.staged_restore import (read_marker, write_marker, new_staging, discard_staging, swap_in, swap_previous,
+                                   recover_swap)
+from backup.manifest import (MANIFEST_FILE, ManifestError, encode_manifest, load_manifest, manifest_path,
+                             convert_manifest, stream_manifest, manifest_totals)
+from backup.tree import (TREE_POINTER_FILE, build_trees, write_trees, load_tree_pointer, make_tree_pointer,
+                         load_tree_manifest, walk_unique_trees, diff_trees, stream_tree)
+
+# 备份记录文件名
+CATALOG_FILE = "backups.json"
+
+# 非默认配置的数据目录，位于备份根目录下
+PROFILES_DIR = "profiles"
+
+# 自动退出/载入游戏的等待参数（秒），可在配置文件的 automation 中覆盖
+AUTOMATION_DEFAULTS = {
+    # 按键宏中未校准的按键之后的间隔，即原来每次按键的间隔；校准后使用各步骤实测的间隔
+    "key_interval": 0.2,
+    # 等待游戏窗口成为前台窗口的最长时间
+    "focus_timeout": 1.5,
+    # 存档文件和模拟器写入量保持不变多久视为已写完
+    "quiet_period": 0.3,
+    # 退出到标题画面后等待存档写完的最长时间
+    "save_timeout": 5.0,
+    # 恢复后等待模拟器I/O稳定再载入的最长时间，原来固定等待3.5秒
+    "settle_timeout": 3.5,
+}
+
+
+def _serialized(method):
+    """同一配置的备份、恢复等操作依次执行，不同配置的操作可以并行"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
 
 
 class BackupManager:
     """备份管理类，负责处理备份和恢复操作"""
     
-    def __init__(self, config_manager):
+    def __init__(self, config_manager, warning_handler=None, enable_automation=True, profile=None):
         """初始化备份管理器
         
         Args:
             config_manager: 配置管理器实例
+            warning_handler: 可选，接收警告消息的回调函数，如GUI中的弹窗
+            enable_automation: 是否允许自动退出/载入游戏等按键模拟操作
+            profile: 可选，配置名称，默认为默认配置
         """
         self.config_manager = config_manager
         self.config = config_manager.config
-        self.source_path = config_manager.source_path
+        self.profile = profile or DEFAULT_PROFILE
+        profile_settings = config_manager.get_profile(self.profile)
+        if profile_settings is None:
+            raise ValueError(f"配置不存在：{self.profile}")
+        self.source_path = profile_settings["source_path"]
         self.backup_root = config_manager.backup_root
+        self.warning_handler = warning_handler
+        self.enable_automation = enable_automation
+        
+        # 默认配置的备份直接存放在备份根目录下，其他配置各自使用 profiles/<名称> 目录
+        if self.profile == DEFAULT_PROFILE:
+            self.profile_root = self.backup_root
+        else:
+            self.profile_root = os.path.join(self.backup_root, PROFILES_DIR, safe_filename(self.profile))
+        
+        # 同一配置的操作依次执行
+        self._lock = threading.RLock()
+        
+        # 最近一次操作产生的警告信息
+        self.warnings = []
+        
+        # 最近一次自动退出/载入游戏中各个等待的实际耗时
+        self.automation_timings = WaitTimings()
+        self._emulator = None
+        
+        # 按键宏使用的输入后端，为None时使用平台默认的输入后端，测试时可替换为记录按键的后端
+        self.input_backend = None
+        
+        # 备份记录变化的监听函数
+        self.listeners = []
         
         # 确保备份根目录存在
-        ensure_dir(self.backup_root)
+        ensure_dir(self.profile_root)
+        
+        # 初始化文件仓库，所有配置共用一个仓库，默认为备份根目录下的 repository 目录；
+        # 仓库锁同时通过备份根目录下的锁文件与其他进程互斥
+        self.object_store = create_object_store(self.config, self.backup_root)
+        self.repository_lock = get_repository_lock(self.object_store.location,
+                                                   os.path.join(self.backup_root, REPOSITORY_LOCK_FILE))
         
-        # 初始化文件仓库路径
-        self.file_repository = os.path.join(self.backup_root, "repository")
-        ensure_dir(self.file_repository)
+        # 最近创建或恢复的备份的仓库文件缓存在内存中，同一仓库的所有配置共用，未启用时为None
+        self.object_cache = get_object_cache(self.config, self.object_store.location)
         
-        # 备份元数据文件
-        self.metadata_file = os.path.join(self.backup_root, "backups.json")
+        # 备份、清理、分层等任务读写磁盘时共用的I/O限速器，模拟器未运行时放宽限速
+        self.io_governor = get_io_governor(self.config, self._emulator_running)
         
-        # 加载备份记录
+        # 备份元数据文件，提交修改时持有其独占锁
+        self.metadata_file = os.path.join(self.profile_root, CATALOG_FILE)
+        self.catalog_lock = get_catalog_lock(self.metadata_file)
+        
+        # 写入仓库和元数据时是否同步落盘
+        self.durable = self.config['features'].get('durable_writes', True)
+        
+        # 加载备份记录，并处理上次崩溃时未完成的操作
+        self._catalog_stamp = None
         self.backups = self.load_backups()
+        self.journal = OperationJournal(self.profile_root, self.durable)
+        self._replay_journal()
+    
+    def _read_catalog_stamp(self):
+        """获取备份记录文件的修改标记，用于判断其他进程是否写入过备份记录"""
+        try:
+            stat = os.stat(self.metadata_file)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
     
     def load_backups(self):
         """加载备份记录
@@ -84,16 +150,238 @@ class BackupManager:
         Returns:
             list: 备份记录列表
         """
+        self._catalog_stamp = self._read_catalog_stamp()
         if os.path.exists(self.metadata_file):
             with open(self.metadata_file, "r", encoding="utf-8") as f:
                 return json.load(f)
         return []
     
     def save_backups(self):
-        """保存备份记录"""
-        with open(self.metadata_file, "w", encoding="utf-8") as f:
-            json.dump(self.backups, f, ensure_ascii=False, indent=2)
+        """保存备份记录，先写临时文件再替换，崩溃时不会留下写了一半的文件
+        
+        其他进程可能同时修改备份记录，修改备份记录应通过 _commit_catalog 进行。
+        """
+        atomic_write_json(self.metadata_file, self.backups, self.durable, ensure_ascii=False, indent=2)
+        self._catalog_stamp = self._read_catalog_stamp()
+    
+    def _merge_catalog(self, force=False):
+        """读取其他进程写入的备份记录并合并到内存中，已有备份记录的字典对象保持不变
+        
+        Args:
+            force: 为True时即使备份记录文件没有变化也重新读取
+            
+        Returns:
+            list: 变化列表 [(事件, 备份记录)]，事件同 add_listener
+        """
+        if not force and self._read_catalog_stamp() == self._catalog_stamp:
+            return []
+        current = {backup["path"]: backup for backup in self.backups}
+        merged = []
+        changes = []
+        for record in self.load_backups():
+            backup = current.pop(record["path"], None)
+            if backup is None:
+                backup = record
+                changes.append(("added", backup))
+            elif backup != record:
+                backup.clear()
+                backup.update(record)
+                changes.append(("updated", backup))
+            merged.append(backup)
+        changes.extend(("removed", backup) for backup in current.values())
+        self.backups = merged
+        return changes
+    
+    def refresh_backups(self, blocking=True):
+        """重新读取备份记录文件，合并其他 SaveGuard 进程或命令行所做的修改并通知监听函数
+        
+        备份记录文件没有变化时只需一次 stat。
+        
+        Args:
+            blocking: 为False时若本配置正在进行备份、恢复等操作则跳过，不等待操作完成；
+                      操作提交备份记录时同样会合并其他进程的修改
+        
+        Returns:
+            bool: 备份记录是否有变化
+        """
+        if not self._lock.acquire(blocking=blocking):
+            return False
+        try:
+            changes = self._merge_catalog()
+        finally:
+            self._lock.release()
+        for event, backup in changes:
+            self._notify(event, backup)
+        return bool(changes)
+    
+    def _commit_catalog(self, change):
+        """提交对备份记录的修改
+        
+        持有备份记录的独占锁，锁内先合并其他进程的修改，再执行 change 并写回，锁只在这一瞬间持有。
+        写入失败时内存中的备份记录恢复为磁盘上的内容。
+        
+        Args:
+            change: 无参数函数，修改 self.backups 或其中的备份记录，应在函数内按路径查找备份记录
+            
+        Returns:
+            change 的返回值
+        """
+        with self._lock:
+            with self.catalog_lock.exclusive():
+                changes = self._merge_catalog()
+                try:
+                    result = change()
+                    self.save_backups()
+                except Exception:
+                    self._merge_catalog(force=True)
+                    raise
+                finally:
+                    for event, backup in changes:
+                        self._notify(event, backup)
+        return result
+    
+    def catalog_files(self):
+        """获取共用仓库的所有配置的备份记录文件
+        
+        包括已从配置文件中移除、但备份仍然存在的配置。
+        
+        Returns:
+            list: 备份记录文件路径列表，默认配置在最前
+        """
+        roots = [self.backup_root]
+        profiles_dir = os.path.join(self.backup_root, PROFILES_DIR)
+        if os.path.isdir(profiles_dir):
+            roots.extend(os.path.join(profiles_dir, name) for name in sorted(os.listdir(profiles_dir)))
+        return [os.path.join(root, CATALOG_FILE) for root in roots
+                if os.path.exists(os.path.join(root, CATALOG_FILE))]
+    
+    def repository_backups(self):
+        """获取共用仓库的所有配置的备份记录
+        
+        包括本配置在内，所有配置的备份记录都从磁盘读取，其他进程刚提交的备份同样计入，确保清理仓库时
+        不会误删它们引用的文件。清理仓库时应在持有仓库独占锁后调用。不获取本配置的操作锁：操作锁总是
+        在仓库锁之前获取，持有仓库锁时再获取操作锁可能与同一进程中进行的备份互相等待。
+        
+        Returns:
+            list: 备份记录列表
+        """
+        backups = []
+        for catalog_file in self.catalog_files():
+            with open(catalog_file, "r", encoding="utf-8") as f:
+                backups.extend(json.load(f))
+        return backups
+    
+    def _replay_journal(self):
+        """回滚或补完上次崩溃时中断的操作"""
+        for entry in self.journal.pending():
+            backup_path = entry.get("path")
+            if entry.get("op") == "create_backup":
+                # 备份还没有写入备份记录，删除写了一半的备份目录；导入备份包时一次创建多个目录
+                for path in entry.get("paths", [backup_path]):
+                    if path and not self.find_backup(path) and os.path.isdir(path):
+                        shutil.rmtree(path, ignore_errors=True)
+            elif entry.get("op") == "migrate_backup":
+                # 备份记录还未改为MD5备份，data 目录完好，删除写了一半的根树指针，下次迁移时重新转换
+                backup = self.find_backup(backup_path)
+                if backup and backup.get("type") != "md5":
+                    pointer_file = os.path.join(backup_path, "metadata", TREE_POINTER_FILE)
+                    if os.path.exists(pointer_file):
+                        os.remove(pointer_file)
+            elif entry.get("op") == "swap_restore":
+                # 替换存档目录的两次重命名之间中断，换回原存档目录
+                recover_swap(backup_path)
+            elif entry.get("op") == "delete_backup":
+                # 继续完成删除
+                if self.find_backup(backup_path):
+                    self._commit_catalog(lambda: self._remove_backup_record(backup_path))
+                if backup_path and os.path.isdir(backup_path):
+                    shutil.rmtree(backup_path, ignore_errors=True)
+            self.object_store.remove_temp_files(entry["id"])
+            self.journal.end(entry["id"])
+    
+    def _remove_backup_record(self, backup_path):
+        """从备份记录中移除指定备份
+        
+        Returns:
+            list: 被移除的备份记录
+        """
+        removed = [b for b in self.backups if b['path'] == backup_path]
+        self.backups = [b for b in self.backups if b['path'] != backup_path]
+        return removed
+    
+    def _warn(self, message):
+        """记录警告信息，并交给调用方提供的回调显示
+        
+        Args:
+            message: 警告消息
+        """
+        self.warnings.append(message)
+        if self.warning_handler:
+            self.warning_handler(message)
+    
+    def add_listener(self, callback):
+        """注册备份记录变化的监听函数
+        
+        Args:
+            callback: 回调函数 callback(event, backup)，event为 'added'、'removed' 或 'updated'
+        """
+        self.listeners.append(callback)
+    
+    def _notify(self, event, backup):
+        """通知所有监听函数备份记录发生了变化
+        
+        Args:
+            event: 变化类型
+            backup: 发生变化的备份记录
+        """
+        for listener in self.listeners:
+            listener(event, backup)
+    
+    @_serialized
+    def close(self):
+        """释放操作日志的所有者锁和锁文件，替换备份管理器时调用，正在进行的操作完成后才关闭
+        
+        关闭后不再通知监听函数，也不能再进行备份、恢复等需要记录操作日志的操作。
+        """
+        self.listeners = []
+        self.journal.close()
+    
+    def _feature_enabled(self, feature):
+        """检查自动化相关功能是否启用
+        
+        Args:
+            feature: 功能配置项名称
+            
+        Returns:
+            bool: 功能是否启用
+        """
+        return self.enable_automation and self.config['features'].get(feature, False)
+    
+    def find_backup(self, backup_path):
+        """根据备份路径查找备份记录
+        
+        Args:
+            backup_path: 备份路径
+            
+        Returns:
+            dict: 备份记录，找不到时返回None
+        """
+        for backup in self.backups:
+            if backup["path"] == backup_path:
+                return backup
+        return None
+    
+    def get_latest_backup(self):
+        """获取最新的备份记录
+        
+        Returns:
+            dict: 备份记录，没有备份时返回None
+        """
+        if not self.backups:
+            return None
+        return max(self.backups, key=lambda x: x["date"])
     
+    @_serialized
     def create_backup(self, backup_name="未命名备份",is_manual=False):
         """创建新备份
         
@@ -103,15 +391,17 @@ class BackupManager:
         Returns:
             tuple: (成功标志, 消息)
         """
+        self.warnings = []
+        self.automation_timings = WaitTimings()
         if not os.path.exists(self.source_path):
             return False, "源目录不存在！"
             
         # 检查是否需要自动保存
-        if self.config['features'].get('auto_save_before_backup', False) and not is_manual:
+        if self._feature_enabled('auto_save_before_backup') and not is_manual:
             # 先退出游戏到主界面触发自动保存
             exit_success, exit_message = self.auto_exit_game()
             if not exit_success:
-                messagebox.showwarning("警告", exit_message)
+                self._warn(exit_message)
 
         backup_name = backup_name.strip() or "未命名备份"
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -119,81 +409,15 @@ class BackupManager:
         
         try:
             # 创建备份目录
-            backup_dir = os.path.join(self.backup_root, f"{safe_name}_{timestamp}")
-            
-            # 检查是否启用MD5去重
-            use_md5 = self.config['features']['md5_deduplication']
-            
-            if use_md5:
-                # MD5去重模式
-                metadata_dir = os.path.join(backup_dir, "metadata")
-                ensure_dir(metadata_dir)
-                
-                # 存储文件元数据信息
-                file_metadata = []
-                
-                # 遍历源目录中的所有文件
-                for root, _, files in os.walk(self.source_path):
-                    for file in files:
-                        src_file_path = os.path.join(root, file)
-                        # 计算相对路径
-                        rel_path = os.path.relpath(src_file_path, self.source_path)
-                        
-                        # 计算文件MD5
-                        file_md5 = calculate_file_md5(src_file_path)
-                        
-                        # 仓库中的文件路径
-                        repo_file_path = os.path.join(self.file_repository, file_md5)
-                        
-                        # 如果文件不在仓库中，则复制到仓库
-                        if not os.path.exists(repo_file_path):
-                            # 使用with语句确保文件句柄正确关闭
-                            with open(src_file_path, 'rb') as src_file:
-                                with open(repo_file_path, 'wb') as dest_file:
-                                    dest_file.write(src_file.read())
-                        
-                        # 记录文件元数据
-                        file_metadata.append({
-                            "path": rel_path,
-                            "md5": file_md5,
-                            "size": os.path.getsize(src_file_path),
-                            "mtime": os.path.getmtime(src_file_path)
-                        })
-                
-                # 保存文件元数据
-                with open(os.path.join(metadata_dir, "files.json"), "w", encoding="utf-8") as f:
-                    json.dump(file_metadata, f, ensure_ascii=False, indent=2)
-                
-                # 记录备份元数据
-                self.backups.append({
-                    "name": backup_name,
-                    "date": datetime.now().isoformat(),
-                    "path": backup_dir,
-                    "type": "md5"
-                })
-            else:
-                # 传统模式 - 使用安全的文件复制方法
-                ensure_dir(backup_dir)
-                data_dir = os.path.join(backup_dir, "data")
-                ensure_dir(data_dir)
-                self._safe_copy_tree(self.source_path, data_dir)
-                
-                # 记录备份元数据
-                self.backups.append({
-                    "name": backup_name,
-                    "date": datetime.now().isoformat(),
-                    "path": backup_dir,
-                    "type": "legacy"
-                })
-                
-            self.save_backups()
+            backup_dir = self._unique_backup_dir(f"{safe_name}_{timestamp}")
+            self._snapshot_source(backup_dir, backup_name)
             
             # 检查是否需要自动载入
-            if self.config['features'].get('auto_save_before_backup', False) and not is_manual:
+            if self._feature_enabled('auto_save_before_backup') and not is_manual:
                 # 备份完成后自动载入
                 load_success, load_message = self.auto_load_game()
                 if not load_success:
-                    messagebox.showwarning("警告", load_message)
+                    self._warn(load_message)
             
             return True, f"备份成功：{backup_name}"
         except Exception as e:
@@ -201,99 +425,37 @@ class BackupManager:
             traceback.print_exc()
             return False, f"备份失败：{str(e)}"
     
+    @_serialized
     def quick_backup(self):
         """快速备份功能
         
         Returns:
             tuple: (成功标志, 消息)
         """
+        self.warnings = []
+        self.automation_timings = WaitTimings()
         if not os.path.exists(self.source_path):
             return False, "源目录不存在"
             
         # 检查是否需要自动保存
-        if self.config['features'].get('auto_save_before_backup', False):
+        if self._feature_enabled('auto_save_before_backup'):
             # 先退出游戏到主界面触发自动保存
             exit_success, exit_message = self.auto_exit_game()
             if not exit_success:
-                messagebox.showwarning("警告", exit_message)
+                self._warn(exit_message)
 
         try:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             backup_name = f"快速备份_{timestamp}"
-            backup_dir = os.path.join(self.backup_root, f"quick_{timestamp}")
-            
-            # 检查是否启用MD5去重
-            use_md5 = self.config['features']['md5_deduplication']
-            
-            if use_md5:
-                # MD5去重模式
-                metadata_dir = os.path.join(backup_dir, "metadata")
-                ensure_dir(metadata_dir)
-                
-                # 存储文件元数据信息
-                file_metadata = []
-                
-                # 遍历源目录中的所有文件
-                for root, _, files in os.walk(self.source_path):
-                    for file in files:
-                        src_file_path = os.path.join(root, file)
-                        # 计算相对路径
-                        rel_path = os.path.relpath(src_file_path, self.source_path)
-                        
-                        # 计算文件MD5
-                        file_md5 = calculate_file_md5(src_file_path)
-                        
-                        # 仓库中的文件路径
-                        repo_file_path = os.path.join(self.file_repository, file_md5)
-                        
-                        # 如果文件不在仓库中，则复制到仓库
-                        if not os.path.exists(repo_file_path):
-                            # 使用with语句确保文件句柄正确关闭
-                            with open(src_file_path, 'rb') as src_file:
-                                with open(repo_file_path, 'wb') as dest_file:
-                                    dest_file.write(src_file.read())
-                        
-                        # 记录文件元数据
-                        file_metadata.append({
-                            "path": rel_path,
-                            "md5": file_md5,
-                            "size": os.path.getsize(src_file_path),
-                            "mtime": os.path.getmtime(src_file_path)
-                        })
-                
-                # 保存文件元数据
-                with open(os.path.join(metadata_dir, "files.json"), "w", encoding="utf-8") as f:
-                    json.dump(file_metadata, f, ensure_ascii=False, indent=2)
-                
-                self.backups.append({
-                    "name": backup_name,
-                    "date": datetime.now().isoformat(),
-                    "path": backup_dir,
-                    "type": "md5"
-                })
-            else:
-                # 传统模式 - 使用安全的文件复制方法
-                ensure_dir(backup_dir)
-                data_dir = os.path.join(backup_dir, "data")
-                ensure_dir(data_dir)
-                self._safe_copy_tree(self.source_path, data_dir)
-                
-                # 记录备份元数据
-                self.backups.append({
-                    "name": backup_name,
-                    "date": datetime.now().isoformat(),
-                    "path": backup_dir,
-                    "type": "legacy"
-                })
-                
-            self.save_backups()
+            backup_dir = self._unique_backup_dir(f"quick_{timestamp}")
+            self._snapshot_source(backup_dir, backup_name)
             
             # 检查是否需要自动载入
-            if self.config['features'].get('auto_save_before_backup', False):
+            if self._feature_enabled('auto_save_before_backup'):
                 # 备份完成后自动载入
                 load_success, load_message = self.auto_load_game()
                 if not load_success:
-                    messagebox.showwarning("警告", load_message)
+                    self._warn(load_message)
             
             return True, f"快速备份成功：{backup_name}"
         except Exception as e:
@@ -301,6 +463,218 @@ class BackupManager:
             traceback.print_exc()
             return False, f"快速备份失败：{str(e)}"
     
+    def _unique_backup_dir(self, dir_name):
+        """创建不与已有备份冲突的备份目录，同一秒内多次备份时追加序号
+        
+        Args:
+            dir_name: 期望的备份目录名
+            
+        Returns:
+            str: 备份目录路径
+        """
+        backup_dir = os.path.join(self.profile_root, dir_name)
+        index = 1
+        while True:
+            if not self.find_backup(backup_dir):
+                # 创建目录即占用该名称，其他进程同时备份时不会选中同一个目录
+                try:
+                    os.mkdir(backup_dir)
+                    return backup_dir
+                except FileExistsError:
+                    pass
+            backup_dir = os.path.join(self.profile_root, f"{dir_name}_{index}")
+            index += 1
+    
+    def _snapshot_source(self, backup_dir, backup_name):
+        """将源目录保存为一个新备份并写入备份记录
+        
+        仓库文件和元数据先写入临时文件，统一落盘后再重命名；整个过程记录在操作日志中，
+        中途崩溃时下次启动会删除写了一半的备份目录。
+        
+        Args:
+            backup_dir: 备份目录
+            backup_name: 备份名称
+        """
+        try:
+            entry_id = self.journal.begin("create_backup", path=backup_dir)
+        except Exception:
+            # 备份目录已预留，无法记录操作日志时一并删除
+            shutil.rmtree(backup_dir, ignore_errors=True)
+            raise
+        batch = WriteBatch(self.durable, tag=entry_id)
+        writer = self.object_store.writer(batch)
+        cache_fill = {}
+        try:
+            # 写入期间直到备份记录提交持有仓库共享锁，防止清理操作删除已存在但尚未被记录引用的文件；
+            # 仓库文件都是先写临时文件再重命名，其他进程同时读取仓库不受影响
+            with self.repository_lock.shared(), self.io_governor.job("backup") as io_job:
+                batch.throttle = io_job.throttle
+                backup_type, backup_size = self._write_snapshot(backup_dir, batch, writer, cache_fill)
+                writer.commit()
+                batch.commit()
+                
+                # 记录备份元数据
+                backup = {
+                    "name": backup_name,
+                    "date": datetime.now().isoformat(),
+                    "path": backup_dir,
+                    "type": backup_type,
+                    "size": backup_size
+                }
+                self._commit_catalog(lambda: self.backups.append(backup))
+        except Exception:
+            writer.abort()
+            batch.abort()
+            shutil.rmtree(backup_dir, ignore_errors=True)
+            raise
+        finally:
+            self.journal.end(entry_id)
+        if self.object_cache is not None and cache_fill:
+            for file_md5, data in cache_fill.items():
+                self.object_cache.put(file_md5, data)
+            self.object_cache.retain(backup_dir, cache_fill)
+        self._notify("added", backup)
+        # 新备份成为最新备份，提前准备好快速恢复
+        self._schedule_prepare_restore(backup_dir)
+    
+    def _write_snapshot(self, backup_dir, batch, writer, cache_fill=None):
+        """将源目录的文件写入仓库和备份目录
+        
+        Args:
+            backup_dir: 备份目录
+            batch: 写入批次
+            writer: 仓库写入器
+            cache_fill: 可选，计算MD5时读入内存的文件内容 md5 -> bytes 写入此字典，备份完成后放入缓存
+            
+        Returns:
+            tuple: (备份类型, 备份大小)
+        """
+        # 检查是否启用MD5去重
+        use_md5 = self.config['features']['md5_deduplication']
+        
+        if use_md5:
+            # MD5去重模式
+            metadata_dir = os.path.join(backup_dir, "metadata")
+            ensure_dir(metadata_dir)
+            
+            # 存储文件元数据信息，以及每个MD5对应的一个源文件
+            file_metadata = []
+            sources = {}
+            cache = self.object_cache if cache_fill is not None else None
+            cache_bytes = 0
+            
+            # 遍历源目录中的所有文件
+            for root, _, files in os.walk(self.source_path):
+                for file in files:
+                    src_file_path = os.path.join(root, file)
+                    # 计算相对路径
+                    rel_path = os.path.relpath(src_file_path, self.source_path)
+                    
+                    # 计算文件MD5，可以缓存的文件只读一次，读入的内容备份完成后放入缓存
+                    file_size = os.path.getsize(src_file_path)
+                    if cache is not None and cache.accepts(file_size) and cache_bytes + file_size <= cache.max_bytes:
+                        with open(src_file_path, "rb") as f:
+                            data = f.read()
+                        if batch.throttle is not None:
+                            batch.throttle(len(data))
+                        file_md5 = hashlib.md5(data).hexdigest()
+                        file_size = len(data)
+                        if file_md5 not in cache_fill:
+                            cache_fill[file_md5] = data
+                            cache_bytes += file_size
+                    else:
+                        file_md5 = calculate_file_md5(src_file_path, batch.throttle)
+                    sources.setdefault(file_md5, src_file_path)
+                    
+                    # 记录文件元数据
+                    file_metadata.append({
+                        "path": rel_path,
+                        "md5": file_md5,
+                        "size": file_size,
+                        "mtime": os.path.getmtime(src_file_path)
+                    })
+            
+            total_size, _ = self._write_tree_manifest(backup_dir, file_metadata, sources, batch, writer)
+            return "md5", total_size
+        
+        # 传统模式 - 使用安全的文件复制方法
+        ensure_dir(backup_dir)
+        data_dir = os.path.join(backup_dir, "data")
+        ensure_dir(data_dir)
+        self._safe_copy_tree(self.source_path, data_dir, batch)
+        return "legacy", self._dir_size(data_dir)
+    
+    def _write_tree_manifest(self, backup_dir, file_metadata, sources, batch, writer):
+        """将文件和树对象写入仓库，并在备份目录中写入根树指针
+        
+        Args:
+            backup_dir: 备份目录，其中的 metadata 目录需已存在
+            file_metadata: 文件元数据列表
+            sources: md5 -> 内容为该MD5的一个本地文件
+            batch: 写入批次
+            writer: 仓库写入器
+            
+        Returns:
+            tuple: (文件总大小, 仓库中原本没有、本次写入的文件 md5 -> 本地文件)
+        """
+        # 每个目录编码为一个树对象，未变化的目录得到相同的树对象，不会重复写入
+        root_md5, trees, file_count, total_size = build_trees(file_metadata)
+        
+        # 一次批量检查哪些文件和树对象已在仓库中，只写入缺少的
+        existing = self.object_store.has_many(list(sources) + list(trees))
+        written = {}
+        for file_md5, src_file_path in sources.items():
+            if file_md5 not in existing:
+                writer.put_file(file_md5, src_file_path)
+                written[file_md5] = src_file_path
+        write_trees(writer, trees, existing)
+        
+        # 备份目录中只保存指向根树的指针
+        batch.write_json(os.path.join(backup_dir, "metadata", TREE_POINTER_FILE),
+                         make_tree_pointer(root_md5, file_count, total_size), ensure_ascii=False)
+        return total_size, written
+    
+    def _load_file_metadata(self, backup_path):
+        """加载MD5备份的文件元数据
+        
+        Args:
+            backup_path: 备份路径
+            
+        Returns:
+            tuple: (文件清单 Manifest, 错误消息)，成功时错误消息为None
+        """
+        try:
+            pointer = load_tree_pointer(backup_path)
+            if pointer is not None:
+                return load_tree_manifest(self.object_store, pointer["root"]), None
+            return load_manifest(backup_path), None
+        except FileNotFoundError:
+            return None, "备份元数据文件不存在"
+        except ManifestError as e:
+            return None, str(e)
+    
+    def _stream_file_metadata(self, backup_path):
+        """以流的方式读取MD5备份的文件元数据，内存占用与文件数无关
+        
+        返回前已完整校验过清单，迭代过程中不会再因清单损坏而中断。
+        
+        Args:
+            backup_path: 备份路径
+            
+        Returns:
+            tuple: (ManifestEntry 迭代器, 错误消息)，成功时错误消息为None
+        """
+        try:
+            pointer = load_tree_pointer(backup_path)
+            if pointer is not None:
+                return stream_tree(self.object_store, pointer["root"]), None
+            return stream_manifest(backup_path), None
+        except FileNotFoundError:
+            return None, "备份元数据文件不存在"
+        except ManifestError as e:
+            return None, str(e)
+    
+    @_serialized
     def restore_backup(self, backup_path, backup_name, is_manual=False):
         """恢复指定备份
         
@@ -311,254 +685,329 @@ class BackupManager:
         Returns:
             tuple: (成功标志, 消息)
         """
+        self.warnings = []
+        self.automation_timings = WaitTimings()
         try:
             # 检查备份路径是否存在
             if not os.path.exists(backup_path):
                 return False, "备份路径不存在或无法访问"
                 
             # 获取备份的详细信息
-            backup_info = None
-            for backup in self.backups:
-                if backup["path"] == backup_path:
-                    backup_info = backup
-                    break
-            
+            backup_info = self.find_backup(backup_path)
             if not backup_info:
                 return False, "找不到备份信息"
             
-            # 检查是否需要自动载入
-            if self.config['features'].get('auto_load_after_restore', False) and not is_manual:
-                # 先退出游戏
-                exit_success, exit_message = self.auto_exit_game()
-                if not exit_success:
-                    messagebox.showwarning("警告", exit_message)
-            
-            # 清空目标目录
-            if os.path.exists(self.source_path):
-                shutil.rmtree(self.source_path)
-            ensure_dir(self.source_path)
-            
-            # 检查备份类型，处理MD5去重备份
-            if backup_info.get("type") == "md5":
-                metadata_file = os.path.join(backup_path, "metadata", "files.json")
-                if not os.path.exists(metadata_file):
-                    return False, "备份元数据文件不存在"
-                
-                # 加载文件元数据
-                try:
-                    with open(metadata_file, "r", encoding="utf-8") as f:
-                        file_metadata = json.load(f)
-                except json.JSONDecodeError:
-                    return False, "备份元数据文件已损坏，无法解析JSON格式"
-                
-                # 验证元数据格式
-                if not isinstance(file_metadata, list):
-                    return False, "备份元数据格式错误，应为文件列表"
-                
-                # 根据元数据恢复文件
-                corrupted_files = []
-                missing_files = []
-                invalid_paths = []
-                
-                for file_info in file_metadata:
-                    # 验证文件信息完整性
-                    if not all(k in file_info for k in ["path", "md5", "size", "mtime"]):
-                        continue  # 跳过不完整的文件信息
-                    
-                    # 检查文件路径是否合法
-                    if not file_info["path"] or ".." in file_info["path"] or file_info["path"].startswith("/"):
-                        invalid_paths.append(file_info["path"])
-                        continue
-                    
-                    # 目标文件路径
-                    dest_file_path = os.path.join(self.source_path, file_info["path"])
-                    # 确保目标目录存在
-                    ensure_dir(os.path.dirname(dest_file_path))
-                    
-                    # 仓库中的文件路径
-                    repo_file_path = os.path.join(self.file_repository, file_info["md5"])
-                    
-                    if os.path.exists(repo_file_path):
-                        # 验证仓库中文件的完整性
-                        repo_file_size = os.path.getsize(repo_file_path)
-                        if repo_file_size != file_info["size"]:
-                            corrupted_files.append(file_info["path"])
-                            continue
-                            
-                        # 验证MD5哈希值
-                        actual_md5 = calculate_file_md5(repo_file_path)
-                        if actual_md5 != file_info["md5"]:
-                            corrupted_files.append(file_info["path"])
-                            continue
-                            
-                        # 从仓库复制文件 - 使用with语句确保文件句柄正确关闭
-                        with open(repo_file_path, 'rb') as src_file:
-                            with open(dest_file_path, 'wb') as dest_file:
-                                dest_file.write(src_file.read())
-                        # 恢复文件的修改时间
-                        os.utime(dest_file_path, (file_info["mtime"], file_info["mtime"]))
-                    else:
-                        missing_files.append(file_info["path"])
-                
-                # 显示警告信息
-                if corrupted_files:
-                    messagebox.showwarning("警告", f"检测到{len(corrupted_files)}个文件已损坏，这些文件可能无法正常恢复")
-                
-                if missing_files:
-                    messagebox.showwarning("警告", f"仓库中找不到{len(missing_files)}个文件")
-                    
-                if invalid_paths:
-                    messagebox.showwarning("警告", f"检测到{len(invalid_paths)}个无效的文件路径")
-                    
-                if corrupted_files and len(corrupted_files) > len(file_metadata) // 2:
-                    return False, "大部分备份文件已损坏，恢复操作已取消"
-            else:
-                # 处理旧版备份格式
-                data_path = os.path.join(backup_path, "data")
-                if not os.path.exists(data_path):
-                    return False, "备份数据目录不存在"
-                    
-                # 自定义复制函数，确保文件句柄正确关闭
-                self._safe_copy_tree(data_path, self.source_path)
-            
-            # 检查是否需要自动载入
-            if self.config['features'].get('auto_load_after_restore', False) and not is_manual:
-                # 恢复存档后自动载入
-                load_success, load_message = self.auto_load_game()
-                if not load_success:
-                    messagebox.showwarning("警告", load_message)
-                
+            # 读取仓库期间持有共享锁，只会等待清理仓库，不会等待其他配置或进程的备份
+            with self.repository_lock.shared():
+                success, error = self._restore_from(backup_info, not is_manual)
+            if not success:
+                return False, error
             return True, f"已从 {backup_name} 恢复存档"
         except Exception as e:
             import traceback
             traceback.print_exc()
             return False, f"恢复失败：{str(e)}"
     
+    def list_backup_files(self, backup_path):
+        """列出备份中的文件，供选择部分恢复的文件
+        
+        Args:
+            backup_path: 备份路径
+            
+        Returns:
+            tuple: (成功标志, 消息, 文件元数据列表)
+        """
+        from backup.partial_restore import list_files
+        
+        backup = self.find_backup(backup_path)
+        if not backup:
+            return False, "找不到备份信息", []
+        try:
+            files = list_files(self, backup)
+        except (OSError, ManifestError) as e:
+            return False, str(e), []
+        return True, f"共{len(files)}个文件", files
+    
+    @_serialized
+    def restore_paths(self, backup_path, patterns):
+        """只恢复备份中选中的文件或目录，存档目录中的其他文件保持不变
+        
+        Args:
+            backup_path: 备份路径
+            patterns: 文件路径、目录路径或通配符（如 slot1/*.sav）列表，使用 / 或系统分隔符
+            
+        Returns:
+            tuple: (成功标志, 消息, 统计信息字典)
+        """
+        from backup.partial_restore import select_files, restore_files
+        
+        self.warnings = []
+        backup = self.find_backup(backup_path)
+        if not backup:
+            return False, "找不到备份信息", None
+        try:
+            with self.repository_lock.shared():
+                files = select_files(self, backup, patterns)
+                if not files:
+                    return False, "备份中没有匹配的文件", None
+                stats = restore_files(self, files)
+        except (OSError, ManifestError) as e:
+            return False, f"恢复失败：{str(e)}", None
+        
+        if stats["corrupted"]:
+            self._warn(f"检测到{len(stats['corrupted'])}个文件已损坏，存档中的对应文件未被替换")
+        if stats["missing"]:
+            self._warn(f"仓库中找不到{len(stats['missing'])}个文件")
+        if stats["invalid"]:
+            self._warn(f"检测到{len(stats['invalid'])}个无效的文件路径")
+        if not stats["restored"]:
+            return False, "没有文件被恢复", stats
+        return True, f"已从 {backup['name']} 恢复{stats['restored']}个文件", stats
+    
+    @_serialized
     def quick_restore(self):
         """快速恢复最新备份
         
         Returns:
             tuple: (成功标志, 消息)
         """
+        self.warnings = []
+        self.automation_timings = WaitTimings()
+        # 最新备份可能由其他进程创建
+        self.refresh_backups()
         if not self.backups:
             return False, "没有可用的备份"
 
         try:
-            latest = max(self.backups, key=lambda x: x["date"])
-            backup_path = latest["path"]
+            latest = self.get_latest_backup()
             
             # 检查备份路径是否存在
-            if not os.path.exists(backup_path):
+            if not os.path.exists(latest["path"]):
                 return False, "最新备份路径不存在或无法访问"
             
-            # 检查是否需要自动载入
-            if self.config['features'].get('auto_load_after_restore', False):
-                # 先退出游戏
-                exit_success, exit_message = self.auto_exit_game()
-                if not exit_success:
-                    messagebox.showwarning("警告", exit_message)
-            
-            # 清空目标目录
-            if os.path.exists(self.source_path):
-                shutil.rmtree(self.source_path)
-            ensure_dir(self.source_path)
+            with self.repository_lock.shared():
+                success, error = self._restore_from(latest, True)
+            if not success:
+                return False, error
+            return True, f"已快速恢复：{latest['name']}"
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
+            return False, f"快速恢复失败：{str(e)}"
+    
+    def _restore_from(self, backup_info, allow_automation):
+        """将备份内容写回源目录
+        
+        先在暂存目录中构建完整的存档（已提前准备好时直接使用），再退出游戏并通过重命名替换存档目录，
+        原存档目录保留为上一份存档，可用 undo_restore 撤销。
+        
+        Args:
+            backup_info: 备份记录
+            allow_automation: 是否按配置执行自动退出/载入游戏
             
-            # 检查备份类型，处理MD5去重备份
-            if latest.get("type") == "md5":
-                metadata_file = os.path.join(backup_path, "metadata", "files.json")
-                if not os.path.exists(metadata_file):
-                    return False, "备份元数据文件不存在"
-                
-                # 加载文件元数据
-                try:
-                    with open(metadata_file, "r", encoding="utf-8") as f:
-                        file_metadata = json.load(f)
-                except json.JSONDecodeError:
-                    return False, "备份元数据文件已损坏，无法解析JSON格式"
-                
-                # 验证元数据格式
-                if not isinstance(file_metadata, list):
-                    return False, "备份元数据格式错误，应为文件列表"
-                
-                # 根据元数据恢复文件
-                corrupted_files = []
-                missing_files = []
-                invalid_paths = []
+        Returns:
+            tuple: (成功标志, 错误消息)
+        """
+        backup_path = backup_info["path"]
+        auto_load = allow_automation and self._feature_enabled('auto_load_after_restore')
+        
+        # 游戏仍在运行时构建暂存目录，构建失败时存档目录不受影响
+        marker = read_marker(self.source_path)
+        if marker is not None and marker.get("backup") == backup_path:
+            problems = marker.get("problems", {})
+        else:
+            success, error, problems = self._build_staging(backup_info)
+            if not success:
+                return False, error
+        
+        # 显示警告信息
+        if problems.get("corrupted"):
+            self._warn(f"检测到{problems['corrupted']}个文件已损坏，这些文件可能无法正常恢复")
+        if problems.get("missing"):
+            self._warn(f"仓库中找不到{problems['missing']}个文件")
+        if problems.get("invalid"):
+            self._warn(f"检测到{problems['invalid']}个无效的文件路径")
+        
+        # 检查是否需要自动载入
+        if auto_load:
+            # 先退出游戏
+            exit_success, exit_message = self.auto_exit_game()
+            if not exit_success:
+                self._warn(exit_message)
+        
+        # 用暂存目录替换存档目录，两次重命名之间崩溃时下次启动会换回原存档目录
+        entry_id = self.journal.begin("swap_restore", path=self.source_path)
+        try:
+            swap_in(self.source_path)
+        finally:
+            self.journal.end(entry_id)
+        
+        # 检查是否需要自动载入
+        if auto_load:
+            # 恢复存档后自动载入
+            load_success, load_message = self.auto_load_game()
+            if not load_success:
+                self._warn(load_message)
+        
+        # 反复恢复同一个备份时，下次只需重命名
+        self._schedule_prepare_restore(backup_path)
+        return True, None
+    
+    def _build_staging(self, backup_info, throttle=None):
+        """在暂存目录中构建备份的完整存档
+        
+        Args:
+            backup_info: 备份记录
+            throttle: 可选，I/O限速函数，后台准备恢复时使用，玩家等待的恢复不限速
+            
+        Returns:
+            tuple: (成功标志, 错误消息, 问题统计 {"corrupted", "missing", "invalid"})
+        """
+        backup_path = backup_info["path"]
+        problems = {"corrupted": 0, "missing": 0, "invalid": 0}
+        
+        # 先校验元数据，避免在元数据损坏时创建暂存目录；元数据以流的方式逐条读取，不会一次载入内存
+        file_metadata = None
+        if backup_info.get("type") == "md5":
+            file_metadata, error = self._stream_file_metadata(backup_path)
+            if error:
+                return False, error, problems
+        else:
+            data_path = os.path.join(backup_path, "data")
+            if not os.path.exists(data_path):
+                return False, "备份数据目录不存在", problems
+        
+        staging = new_staging(self.source_path)
+        try:
+            # 检查备份类型，处理MD5去重备份
+            if file_metadata is not None:
+                # 根据元数据恢复文件，只统计问题文件的数量，不保留路径列表
+                total_files = 0
+                cached_keys = set()
                 
-                for file_info in file_metadata:
-                    # 验证文件信息完整性
-                    if not all(k in file_info for k in ["path", "md5", "size", "mtime"]):
-                        continue  # 跳过不完整的文件信息
+                for entry in file_metadata:
+                    total_files += 1
+                    # 跳过不完整的文件信息
+                    if entry.mtime is None:
+                        continue
                     
                     # 检查文件路径是否合法
-                    if not file_info["path"] or ".." in file_info["path"] or file_info["path"].startswith("/"):
-                        invalid_paths.append(file_info["path"])
+                    if not entry.path or ".." in entry.path or entry.path.startswith("/"):
+                        problems["invalid"] += 1
                         continue
                     
                     # 目标文件路径
-                    dest_file_path = os.path.join(self.source_path, file_info["path"])
+                    dest_file_path = os.path.join(staging, entry.path)
                     # 确保目标目录存在
                     ensure_dir(os.path.dirname(dest_file_path))
                     
-                    # 仓库中的文件路径
-                    repo_file_path = os.path.join(self.file_repository, file_info["md5"])
-                    
-                    if os.path.exists(repo_file_path):
-                        # 验证仓库中文件的完整性
-                        repo_file_size = os.path.getsize(repo_file_path)
-                        if repo_file_size != file_info["size"]:
-                            corrupted_files.append(file_info["path"])
-                            continue
-                            
-                        # 验证MD5哈希值
-                        actual_md5 = calculate_file_md5(repo_file_path)
-                        if actual_md5 != file_info["md5"]:
-                            corrupted_files.append(file_info["path"])
-                            continue
-                            
-                        # 从仓库复制文件 - 使用with语句确保文件句柄正确关闭
-                        with open(repo_file_path, 'rb') as src_file:
-                            with open(dest_file_path, 'wb') as dest_file:
-                                dest_file.write(src_file.read())
+                    # 从缓存或仓库取出文件，同时验证大小和MD5，验证失败的文件不会留在存档目录中
+                    status = self._fetch_object(entry.md5, entry.size, dest_file_path, cached_keys, throttle)
+                    if status == "ok":
                         # 恢复文件的修改时间
-                        os.utime(dest_file_path, (file_info["mtime"], file_info["mtime"]))
+                        os.utime(dest_file_path, (entry.mtime, entry.mtime))
                     else:
-                        missing_files.append(file_info["path"])
+                        problems[status] += 1
                 
-                # 显示警告信息
-                if corrupted_files:
-                    messagebox.showwarning("警告", f"检测到{len(corrupted_files)}个文件已损坏，这些文件可能无法正常恢复")
+                if problems["corrupted"] and problems["corrupted"] > total_files // 2:
+                    discard_staging(self.source_path)
+                    return False, "大部分备份文件已损坏，恢复操作已取消", problems
                 
-                if missing_files:
-                    messagebox.showwarning("警告", f"仓库中找不到{len(missing_files)}个文件")
-                    
-                if invalid_paths:
-                    messagebox.showwarning("警告", f"检测到{len(invalid_paths)}个无效的文件路径")
-                    
-                if corrupted_files and len(corrupted_files) > len(file_metadata) // 2:
-                    return False, "大部分备份文件已损坏，恢复操作已取消"
+                # 再次恢复同一个备份时直接从内存写入
+                if self.object_cache is not None:
+                    self.object_cache.retain(backup_path, cached_keys)
             else:
-                # 处理旧版备份格式
-                data_path = os.path.join(backup_path, "data")
-                if not os.path.exists(data_path):
-                    return False, "备份数据目录不存在"
-                    
-                # 自定义复制函数，确保文件句柄正确关闭
-                self._safe_copy_tree(data_path, self.source_path)
+                # 处理旧版备份格式，自定义复制函数确保文件句柄正确关闭
+                self._safe_copy_tree(os.path.join(backup_path, "data"), staging, throttle=throttle)
             
-            # 检查是否需要自动载入
-            if self.config['features'].get('auto_load_after_restore', False):
-                # 恢复存档后自动载入
-                load_success, load_message = self.auto_load_game()
-                if not load_success:
-                    messagebox.showwarning("警告", load_message)
-                
-            return True, f"已快速恢复：{latest['name']}"
+            write_marker(self.source_path, backup_path, problems, self.durable)
+        except Exception:
+            discard_staging(self.source_path)
+            raise
+        return True, None, problems
+    
+    @_serialized
+    def prepare_restore(self, backup_path=None):
+        """提前在暂存目录中构建备份的存档，之后恢复该备份时只需重命名
+        
+        Args:
+            backup_path: 可选，备份路径，默认为最新备份
+            
+        Returns:
+            tuple: (成功标志, 消息)
+        """
+        backup = self.find_backup(backup_path) if backup_path else self.get_latest_backup()
+        if not backup or not os.path.exists(backup["path"]):
+            return False, "找不到备份信息"
+        marker = read_marker(self.source_path)
+        if marker is not None and marker.get("backup") == backup["path"]:
+            return True, f"已准备好恢复：{backup['name']}"
+        try:
+            # 通常在备份或恢复后于后台运行，此时模拟器多半正在运行，与备份一样限速
+            with self.repository_lock.shared(), self.io_governor.job("prepare_restore") as io_job:
+                success, error, _ = self._build_staging(backup, io_job.throttle)
         except Exception as e:
-            import traceback
-            traceback.print_exc()
-            return False, f"快速恢复失败：{str(e)}"
+            return False, f"准备恢复失败：{str(e)}"
+        if not success:
+            return False, error
+        return True, f"已准备好恢复：{backup['name']}"
+    
+    def _schedule_prepare_restore(self, backup_path):
+        """在后台线程中为下一次恢复准备暂存目录，只在界面中启用"""
+        if self.enable_automation and self.config['features'].get('prepare_restore', True):
+            threading.Thread(target=self.prepare_restore, args=(backup_path,), daemon=True).start()
+    
+    @_serialized
+    def undo_restore(self):
+        """撤销上一次恢复：换回恢复前的存档目录，再次调用即重做
+        
+        Returns:
+            tuple: (成功标志, 消息)
+        """
+        entry_id = self.journal.begin("swap_restore", path=self.source_path)
+        try:
+            if not swap_previous(self.source_path):
+                return False, "没有可以撤销的恢复"
+        except OSError as e:
+            return False, f"撤销恢复失败：{str(e)}"
+        finally:
+            self.journal.end(entry_id)
+        return True, "已换回恢复前的存档，再次撤销可重新换回"
+    
+    def _fetch_object(self, file_md5, size, dest_path, cached_keys, throttle=None):
+        """将仓库文件写入本地路径，优先从缓存写入
+        
+        缓存中的内容放入时已校验过，直接写入不再校验；不在缓存中的文件从仓库读取并校验，
+        可以缓存的文件同时放入缓存。
+        
+        Args:
+            file_md5: 文件MD5
+            size: 文件大小
+            dest_path: 目标文件路径
+            cached_keys: 已在缓存中的文件的键加入此集合
+            throttle: 可选，I/O限速函数
+            
+        Returns:
+            str: 'ok'、'missing' 或 'corrupted'
+        """
+        cache = self.object_cache
+        if cache is None or not cache.accepts(size):
+            return self.object_store.fetch_verified(file_md5, size, dest_path, throttle)
+        data = cache.get(file_md5)
+        if data is None:
+            status, data = self.object_store.read_verified(file_md5, size, throttle)
+            if status != "ok":
+                return status
+            cache.put(file_md5, data)
+        elif throttle is not None:
+            # 从内存写入，只计写入的字节数
+            throttle(len(data))
+        cached_keys.add(file_md5)
+        with open(dest_path, "wb") as dest_file:
+            dest_file.write(data)
+        return "ok"
     
+    @_serialized
     def delete_backup(self, backup_path, backup_name):
         """删除备份
         
@@ -570,15 +1019,24 @@ class BackupManager:
             tuple: (成功标志, 消息)
         """
         try:
+            # 先更新备份记录再删除文件，中途崩溃时下次启动会继续删除
+            entry_id = self.journal.begin("delete_backup", path=backup_path)
+            removed = self._commit_catalog(lambda: self._remove_backup_record(backup_path))
+            for backup in removed:
+                self._notify("removed", backup)
             # 删除备份文件
             shutil.rmtree(backup_path)
-            # 更新备份记录
-            self.backups = [b for b in self.backups if b['path'] != backup_path]
-            self.save_backups()
+            self.journal.end(entry_id)
+            if self.object_cache is not None:
+                self.object_cache.forget(backup_path)
+            marker = read_marker(self.source_path)
+            if marker is not None and marker.get("backup") == backup_path:
+                discard_staging(self.source_path)
             return True, f"已删除备份：{backup_name}"
         except Exception as e:
             return False, f"删除失败：{str(e)}"
     
+    @_serialized
     def rename_backup(self, backup_path, new_name):
         """重命名备份
         
@@ -592,16 +1050,22 @@ class BackupManager:
         old_name = ""
         try:
             # 更新备份记录
-            for backup in self.backups:
-                if backup['path'] == backup_path:
+            def change():
+                nonlocal old_name
+                backup = self.find_backup(backup_path)
+                if backup:
                     old_name = backup['name']
                     backup['name'] = new_name
-                    break
-            self.save_backups()
+                return backup
+            
+            renamed = self._commit_catalog(change)
+            if renamed:
+                self._notify("updated", renamed)
             return True, f"已重命名：{old_name} -> {new_name}", old_name
         except Exception as e:
             return False, f"重命名失败：{str(e)}", old_name
     
+    @_serialized
     def duplicate_backup(self, src_path, src_name):
         """复制备份
         
@@ -613,63 +1077,133 @@ class BackupManager:
             tuple: (成功标志, 消息)
         """
         try:
-            # 创建新的备份名称和路径
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            new_name = f"{src_name}_副本"
-            new_path = os.path.join(self.backup_root, f"{new_name}_{timestamp}")
-            
             # 获取源备份的详细信息
-            src_backup = None
-            for backup in self.backups:
-                if backup["path"] == src_path:
-                    src_backup = backup
-                    break
-                    
+            src_backup = self.find_backup(src_path)
             if not src_backup:
                 return False, "找不到源备份信息"
-                
-            # 检查备份类型
+            
+            src_pointer = None
             if src_backup.get("type") == "md5":
-                # 创建元数据目录
-                metadata_dir = os.path.join(new_path, "metadata")
-                ensure_dir(metadata_dir)
-                
-                # 复制元数据文件
-                src_metadata_file = os.path.join(src_path, "metadata", "files.json")
-                if os.path.exists(src_metadata_file):
-                    with open(src_metadata_file, "r", encoding="utf-8") as f:
-                        file_metadata = json.load(f)
+                try:
+                    src_pointer = load_tree_pointer(src_path)
+                except ManifestError as e:
+                    return False, f"源备份{e}"
+                if src_pointer is None:
+                    src_manifest, error = self._load_file_metadata(src_path)
+                    if error:
+                        return False, f"源备份{error}"
+            
+            # 创建新的备份名称和路径
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            new_name = f"{src_name}_副本"
+            new_path = self._unique_backup_dir(f"{new_name}_{timestamp}")
+            
+            entry_id = self.journal.begin("create_backup", path=new_path)
+            batch = WriteBatch(self.durable, tag=entry_id)
+            try:
+                # 检查备份类型
+                if src_backup.get("type") == "md5":
+                    # 创建元数据目录
+                    metadata_dir = os.path.join(new_path, "metadata")
+                    ensure_dir(metadata_dir)
                     
-                    # 保存到新备份
-                    with open(os.path.join(metadata_dir, "files.json"), "w", encoding="utf-8") as f:
-                        json.dump(file_metadata, f, ensure_ascii=False, indent=2)
+                    if src_pointer is not None:
+                        # 树清单只需复制根树指针，树对象和文件都与源备份共用
+                        batch.write_json(os.path.join(metadata_dir, TREE_POINTER_FILE), src_pointer,
+                                         ensure_ascii=False)
+                    else:
+                        # 复制文件清单，旧版元数据同时转换为新格式
+                        batch.write_bytes(manifest_path(new_path), src_manifest.to_bytes())
                 else:
-                    return False, "源备份的元数据文件不存在"
-            else:
-                # 旧版备份格式，直接复制
-                shutil.copytree(src_path, new_path)
-
-            # 更新备份记录
-            self.backups.append({
-                "name": new_name,
-                "date": datetime.now().isoformat(),
-                "path": new_path,
-                "type": src_backup.get("type", "legacy")
-            })
-            self.save_backups()
+                    # 旧版备份格式，直接复制
+                    self._safe_copy_tree(src_path, new_path, batch)
+                batch.commit()
+                
+                # 更新备份记录
+                new_backup = {
+                    "name": new_name,
+                    "date": datetime.now().isoformat(),
+                    "path": new_path,
+                    "type": src_backup.get("type", "legacy")
+                }
+                if "size" in src_backup:
+                    new_backup["size"] = src_backup["size"]
+                self._commit_catalog(lambda: self.backups.append(new_backup))
+            except Exception:
+                batch.abort()
+                shutil.rmtree(new_path, ignore_errors=True)
+                raise
+            finally:
+                self.journal.end(entry_id)
+            self._notify("added", new_backup)
             return True, f"已创建副本：{new_name}"
         except Exception as e:
             import traceback
             traceback.print_exc()
             return False, f"创建副本失败：{str(e)}"
     
-    def _safe_copy_tree(self, src, dst):
+    def _dir_size(self, path):
+        """计算目录中所有文件的总大小
+        
+        Args:
+            path: 目录路径
+            
+        Returns:
+            int: 总字节数
+        """
+        total = 0
+        for root, _, files in os.walk(path):
+            for file in files:
+                total += os.path.getsize(os.path.join(root, file))
+        return total
+    
+    @_serialized
+    def backfill_backup_sizes(self):
+        """为旧版本创建、缺少大小信息的备份记录补充大小并保存
+        
+        Returns:
+            int: 补充了大小的备份数量
+        """
+        sizes = {}
+        for backup in self.backups:
+            if "size" in backup:
+                continue
+            if backup.get("type") == "md5":
+                totals, error = self._manifest_totals(backup["path"])
+                if error:
+                    continue
+                sizes[backup["path"]] = totals[1]
+            else:
+                data_path = os.path.join(backup["path"], "data")
+                if not os.path.isdir(data_path):
+                    continue
+                sizes[backup["path"]] = self._dir_size(data_path)
+        
+        def change():
+            updated = []
+            for backup in self.backups:
+                if "size" not in backup and backup["path"] in sizes:
+                    backup["size"] = sizes[backup["path"]]
+                    updated.append(backup)
+            return updated
+        
+        updated = self._commit_catalog(change) if sizes else []
+        if updated:
+            for backup in updated:
+                self._notify("updated", backup)
+        return len(updated)
+    
+    def _safe_copy_tree(self, src, dst, batch=None, throttle=None):
         """安全地复制目录树，确保所有文件句柄都被正确关闭
         
         Args:
             src: 源目录路径
             dst: 目标目录路径
+            batch: 可选，写入批次，复制的文件会登记到批次中在提交时统一落盘
+            throttle: 可选，I/O限速函数，未提供时使用批次的限速函数
         """
+        if throttle is None and batch is not None:
+            throttle = batch.throttle
         # 确保目标目录存在
         ensure_dir(dst)
         
@@ -680,47 +1214,110 @@ class BackupManager:
             
             if os.path.isdir(s):
                 # 如果是目录，递归复制
-                self._safe_copy_tree(s, d)
+                self._safe_copy_tree(s, d, batch, throttle)
             else:
                 # 如果是文件，使用with语句确保文件句柄正确关闭
                 ensure_dir(os.path.dirname(d))
                 with open(s, 'rb') as src_file:
-                    with open(d, 'wb') as dst_file:
-                        dst_file.write(src_file.read())
+                    data = src_file.read()
+                if throttle is not None:
+                    throttle(len(data))
+                with open(d, 'wb') as dst_file:
+                    dst_file.write(data)
                 # 保留文件的修改时间和访问时间
                 os.utime(d, (os.path.getatime(s), os.path.getmtime(s)))
+                if batch is not None:
+                    batch.add_written(d)
+    
+    def _automation_setting(self, name):
+        """获取自动退出/载入游戏的等待参数
+        
+        Args:
+            name: 参数名称，见 AUTOMATION_DEFAULTS
+            
+        Returns:
+            float: 参数值（秒）
+        """
+        return self.config.get('automation', {}).get(name, AUTOMATION_DEFAULTS[name])
+    
+    def _emulator_tracker(self):
+        """获取模拟器进程跟踪器，首次使用时创建"""
+        if self._emulator is None:
+            from utils.system_utils import ProcessTracker
+            self._emulator = ProcessTracker(self.config_manager.process_names)
+        return self._emulator
+    
+    def _emulator_running(self):
+        """模拟器是否在运行，供I/O限速器判断是否放宽限速"""
+        return self._emulator_tracker().is_running()
+    
+    def _macro(self):
+        """获取当前配置的游戏的按键宏
+        
+        Returns:
+            tuple: (游戏名称, 宏定义)
+            
+        Raises:
+            MacroError: 没有宏定义或定义无效
+        """
+        game = self.config_manager.get_profile(self.profile)["game"]
+        return game, load_macro(self.config, game)
+    
+    def _macro_delays(self, game, macro, action):
+        """获取宏中每个按键之后的间隔，有适用的校准结果时使用校准结果"""
+        calibration = self.config.get('calibration', {}).get(game, {}).get(action)
+        return step_delays(macro[action], self._automation_setting("key_interval"), calibration)
+    
+    def _run_macro(self, macro, action, delays):
+        """执行宏
+        
+        Args:
+            macro: 宏定义
+            action: 'exit'、'load' 或 'reset'
+            delays: 每个按键之后的间隔
+            
+        Returns:
+            tuple: (是否完成, 中止时失败的等待条件名称)
+        """
+        from utils.system_utils import focus_game_window
+        from utils.platform_backends import get_backend
+        emulator = self._emulator_tracker()
+        conditions = {
+            "window_focus": lambda timeout: focus_game_window(macro["window_titles"], timeout,
+                                                               self.automation_timings),
+            "save_quiescent": self._wait_save_quiescent,
+            "emulator_io_settled": lambda timeout: wait_stable(emulator.io_write_bytes,
+                                                               self._automation_setting("quiet_period"), timeout,
+                                                               "emulator_io_settled", self.automation_timings),
+        }
+        timeouts = {
+            "window_focus": self._automation_setting("focus_timeout"),
+            "save_quiescent": self._automation_setting("save_timeout"),
+            "emulator_io_settled": self._automation_setting("settle_timeout"),
+        }
+        runner = MacroRunner(self.input_backend or get_backend("input"), conditions, self.automation_timings)
+        return runner.run(macro.get(action, []), delays, timeouts)
+    
+    def _wait_save_quiescent(self, timeout):
+        """等待游戏写完存档：存档文件的大小和修改时间、模拟器累计写入量都保持不变
+        
+        Args:
+            timeout: 最长等待秒数
+            
+        Returns:
+            bool: 是否在超时前稳定
+        """
+        emulator = self._emulator_tracker()
+        return wait_stable(lambda: (directory_state(self.source_path), emulator.io_write_bytes()),
+                           self._automation_setting("quiet_period"), timeout,
+                           "save_quiescent", self.automation_timings)
     
     def auto_exit_game(self):
-        """自动退出游戏"""
-        try:
-            # 等待一段时间确保文件已经完全写入
-            import time
-            # 尝试多个可能的窗口标题
-            window_titles = ["Bloodborne", "BLOODBORNE", "血源诅咒", "血源"]
-            window_found = False
-            
-            # 多次尝试查找窗口
-            max_attempts = 3
-            for attempt in range(max_attempts):
-                for title in window_titles:
-                    if focus_window(title):
-                        window_found = True
-                        # 给窗口更多时间来响应
-                        time.sleep(0.1)
-                        break
-                if window_found:
-                    break
-                time.sleep(0.5)  # 等待一段时间再次尝试
-            
-            if window_found:
-                simulate_key_press('enter')
-                simulate_key_press('left')
-                simulate_key_press('b')
-                simulate_key_press('up')
-                simulate_key_press('b')
-                simulate_key_press('left')
-                simulate_key_press('b')
-                
+        """按当前游戏的按键宏自动退出游戏到标题画面，并等待游戏写完存档"""
+        try:
+            game, macro = self._macro()
+            completed, _ = self._run_macro(macro, "exit", self._macro_delays(game, macro, "exit"))
+            if completed:
                 return True, "已自动退出游戏"
             else:
                 return False, "未找到游戏窗口"
@@ -728,86 +1325,638 @@ class BackupManager:
             return False, f"自动退出失败：{str(e)}"
         
     def auto_load_game(self):
-        """自动载入游戏存档"""
-        try:
-            # 等待一段时间确保文件已经完全写入
-            import time
-            time.sleep(3.5)
-            # 尝试多个可能的窗口标题
-            window_titles = ["Bloodborne", "BLOODBORNE", "血源诅咒", "血源"]
-            window_found = False
-            
-            # 多次尝试查找窗口
-            max_attempts = 3
-            for attempt in range(max_attempts):
-                for title in window_titles:
-                    if focus_window(title):
-                        window_found = True
-                        # 给窗口更多时间来响应
-                        time.sleep(0.1)
-                        break
-                if window_found:
-                    break
-                time.sleep(0.5)  # 等待一段时间再次尝试
-            
-            if window_found:
-                simulate_key_press('b')
-                simulate_key_press('b')
-                
-                
-                
+        """按当前游戏的按键宏自动载入游戏存档"""
+        try:
+            game, macro = self._macro()
+            completed, _ = self._run_macro(macro, "load", self._macro_delays(game, macro, "load"))
+            if completed:
                 return True, "已自动载入存档"
             else:
                 return False, "未找到游戏窗口，请手动载入存档"
         except Exception as e:
             return False, f"自动载入失败：{str(e)}"
+    
+    @_serialized
+    def calibrate_automation(self, trials=3, iterations=4, progress=None):
+        """校准当前游戏按键宏中每个按键之后的最短可靠间隔，并保存到配置文件
+        
+        校准会反复退出到标题画面再载入存档，开始前游戏需处于可以退出的状态（已载入存档）。
+        每个按键的间隔在未校准的间隔以内二分查找，连续 trials 次退出时存档被写入、
+        载入时模拟器读取了存档才视为可靠，结果增加25%的余量。
+        
+        Args:
+            trials: 每个候选间隔需要连续成功的次数
+            iterations: 每个按键二分查找的次数
+            progress: 可选，接收进度消息的回调函数
+            
+        Returns:
+            tuple: (是否成功, 消息, {"exit": [...], "load": [...]} 校准后的间隔)
+        """
+        self.automation_timings = WaitTimings()
+        try:
+            game, macro = self._macro()
+        except MacroError as e:
+            return False, str(e), None
+        emulator = self._emulator_tracker()
+        if not emulator.is_running():
+            return False, "模拟器未运行，无法校准", None
+        
+        key_interval = self._automation_setting("key_interval")
+        start = {action: step_delays(macro[action], key_interval) for action in MACRO_ACTIONS}
+        
+        def verify_action(action):
+            # 退出后存档目录应发生变化，载入后模拟器应读取了存档
+            if action == "exit":
+                before = directory_state(self.source_path)
+                return lambda: wait_until(lambda: directory_state(self.source_path) != before,
+                                          self._automation_setting("save_timeout"))
+            before = emulator.io_read_bytes()
+            return lambda: wait_until(lambda: emulator.io_read_bytes() not in (None, before),
+                                      self._automation_setting("settle_timeout"))
+        
+        def reset():
+            self._run_macro(macro, "reset", step_delays(macro.get("reset", []), key_interval))
+            wait_stable(emulator.io_write_bytes, self._automation_setting("quiet_period"),
+                        self._automation_setting("settle_timeout"))
+        
+        calibrator = MacroCalibrator(lambda action, delays: self._run_macro(macro, action, delays),
+                                     verify_action, reset, trials, iterations, progress=progress)
+        try:
+            result = calibrator.calibrate(start)
+        except MacroError as e:
+            return False, f"校准失败：{str(e)}", None
+        
+        calibration = self.config.setdefault('calibration', {})
+        calibration[game] = {action: {"keys": key_sequence(macro[action]), "delays": result[action]}
+                             for action in MACRO_ACTIONS}
+        calibration[game]["calibrated_at"] = datetime.now().isoformat()
+        self.config_manager.save_config()
+        summary = "，".join(f"{action} {sum(start[action]) * 1000:.0f} ms -> {sum(result[action]) * 1000:.0f} ms"
+                           for action in MACRO_ACTIONS)
+        return True, f"校准完成（{game}）：{summary}", result
         
     
     def calculate_storage_stats(self):
-        """计算存储统计信息
+        """计算存储统计信息，仓库由所有配置共用，统计范围为全部配置的备份
         
         Returns:
             dict: 统计信息字典
         """
-        if not self.backups:
+        try:
+            # 读取仓库期间持有共享锁，备份记录在锁内读取，与仓库中的文件一致
+            with self.repository_lock.shared():
+                backups = self.repository_backups()
+                if not backups:
+                    return None
+                
+                # 统计信息
+                backup_count = len(backups)
+                md5_backup_count = len([b for b in backups if b.get("type") == "md5"])
+            
+                # 计算仓库中的文件数量和总大小
+                repo_size = sum(size for _, size in self.object_store.list())
+                index = getattr(self.object_store, "index", None)
+            
+                # 启用冷存储时统计两层的大小和恢复每个备份需要从各层读取的数据量
+                tiers = restore_costs = None
+                cold = getattr(self.object_store, "cold", None)
+                if cold is not None:
+                    cold_stats = cold.stats()
+                    tiers = {"hot_bytes": repo_size - cold_stats["bytes"], "cold_bytes": cold_stats["bytes"],
+                             "cold_stored_bytes": cold_stats["stored_bytes"], "cold_objects": cold_stats["objects"],
+                             "packs": cold_stats["packs"]}
+                    restore_costs = RepositoryTiering(self).restore_costs(
+                        sorted(backups, key=lambda b: b["date"], reverse=True))
+            
+                # 计算所有备份中的文件总数和理论大小（如果不去重）
+                total_files = 0
+                theoretical_size = 0
+            
+                for backup in backups:
+                    if backup.get("type") == "md5":
+                        totals, error = self._manifest_totals(backup["path"])
+                        if not error:
+                            total_files += totals[0]
+                            theoretical_size += totals[1]
+            
+                # 计算节省的空间
+                saved_space = theoretical_size - repo_size if theoretical_size > repo_size else 0
+                saved_percentage = (saved_space / theoretical_size * 100) if theoretical_size > 0 else 0
+            
+                return {
+                    "backup_count": backup_count,
+                    "md5_backup_count": md5_backup_count,
+                    "repo_size": repo_size,
+                    "total_files": total_files,
+                    "theoretical_size": theoretical_size,
+                    "saved_space": saved_space,
+                    "saved_percentage": saved_percentage,
+                    "object_cache": self.object_cache.stats() if self.object_cache is not None else None,
+                    "object_index": index.stats() if index is not None else None,
+                    "tiers": tiers,
+                    "restore_costs": restore_costs,
+                    "io_governor": self.io_governor.stats()
+                }
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
             return None
+
+    @_serialized
+    def convert_manifests(self):
+        """将本配置中旧版 files.json 格式的备份元数据转换为紧凑的 manifest.bin
+
+        Returns:
+            tuple: (成功标志, 消息, 统计信息字典)
+        """
+        stats = {"converted": 0, "bytes_before": 0, "bytes_after": 0, "failed": []}
+        batch = WriteBatch(self.durable)
+        legacy_files = []
+        try:
+            for backup in self.backups:
+                if backup.get("type") != "md5":
+                    continue
+                try:
+                    legacy_file = convert_manifest(backup["path"], batch)
+                except (OSError, ManifestError) as e:
+                    stats["failed"].append({"name": backup["name"], "path": backup["path"], "error": str(e)})
+                    continue
+                if legacy_file is None:
+                    continue
+                legacy_files.append(legacy_file)
+                stats["bytes_before"] += os.path.getsize(legacy_file)
+            batch.commit()
+        except Exception as e:
+            batch.abort()
+            return False, f"转换失败：{str(e)}", stats
+
+        # 新清单已落盘后再删除旧文件，中断时两者并存，读取时优先使用新清单
+        for legacy_file in legacy_files:
+            stats["bytes_after"] += os.path.getsize(os.path.join(os.path.dirname(legacy_file), MANIFEST_FILE))
+            os.remove(legacy_file)
+        stats["converted"] = len(legacy_files)
+        message = f"已转换{stats['converted']}个备份的元数据"
+        if stats["failed"]:
+            return False, f"{message}，{len(stats['failed'])}个备份的元数据无法读取", stats
+        return True, message, stats
+
+    def backup_objects(self, backup, visited=None, include_trees=True):
+        """获取MD5备份引用的仓库文件
+        
+        Args:
+            backup: 备份记录
+            visited: 可选，已遍历过的树对象集合，其中的子树不再重复收集
+            include_trees: 是否包括树对象本身
+            
+        Returns:
+            dict: md5 -> 大小
             
+        Raises:
+            ManifestError: 元数据无法读取
+        """
+        pointer = load_tree_pointer(backup["path"])
+        if pointer is None:
+            file_metadata, error = self._load_file_metadata(backup["path"])
+            if error:
+                raise ManifestError(error)
+            return dict(zip(file_metadata.digests(), file_metadata.sizes))
+        
+        objects = {}
+        for tree_md5, entries, size in walk_unique_trees(self.object_store, [pointer["root"]], visited):
+            if include_trees:
+                objects[tree_md5] = size
+            objects.update((entry["md5"], entry["size"]) for entry in entries if entry["type"] == "file")
+        return objects
+
+    def _manifest_totals(self, backup_path):
+        """获取MD5备份的文件数和总大小，树清单直接读取根树指针，扁平清单逐块读取大小列
+
+        Returns:
+            tuple: ((文件数, 总大小), 错误消息)，成功时错误消息为None
+        """
+        try:
+            pointer = load_tree_pointer(backup_path)
+            if pointer is not None:
+                return (pointer["files"], pointer["size"]), None
+            return manifest_totals(backup_path), None
+        except FileNotFoundError:
+            return None, "备份元数据文件不存在"
+        except ManifestError as e:
+            return None, str(e)
+
+    def _load_backup_manifest(self, backup_path):
+        """加载用于比较的备份文件元数据
+
+        Returns:
+            tuple: (备份记录, 文件元数据列表, 错误消息)，成功时错误消息为None
+        """
+        backup = self.find_backup(backup_path)
+        if backup is None:
+            return None, None, "找不到备份"
+        if backup.get("type") != "md5":
+            return backup, None, f"{backup['name']} 是传统备份，没有可比较的文件元数据"
+        file_metadata, error = self._load_file_metadata(backup_path)
+        if error:
+            return backup, None, f"{backup['name']} {error}"
+        return backup, file_metadata, None
+
+    @staticmethod
+    def _diff_message(diff):
+        """生成比较结果摘要"""
+        return (f"新增{len(diff['added'])}个文件，删除{len(diff['removed'])}个，"
+                f"修改{len(diff['modified'])}个，{diff['unchanged']}个未变化")
+
+    def diff_backups(self, old_path, new_path):
+        """比较两个备份，只读取文件元数据，不访问仓库文件
+
+        Args:
+            old_path: 较早的备份路径
+            new_path: 较新的备份路径
+
+        Returns:
+            tuple: (成功标志, 消息, 比较结果字典)，结果格式见 manifest_diff.diff_manifests
+        """
+        from backup.manifest_diff import diff_manifests
+
+        # 两个备份都是树清单时逐层比较，相同的子树直接跳过
+        pointers = []
+        for path in (old_path, new_path):
+            backup = self.find_backup(path)
+            try:
+                pointer = load_tree_pointer(path) if backup and backup.get("type") == "md5" else None
+            except ManifestError:
+                pointer = None
+            pointers.append(pointer)
+        if None not in pointers:
+            try:
+                diff = diff_trees(self.object_store, pointers[0]["root"], pointers[1]["root"])
+            except ManifestError as e:
+                return False, str(e), None
+            return True, self._diff_message(diff), diff
+
+        _, old_metadata, error = self._load_backup_manifest(old_path)
+        if error:
+            return False, error, None
+        _, new_metadata, error = self._load_backup_manifest(new_path)
+        if error:
+            return False, error, None
+        diff = diff_manifests(old_metadata, new_metadata)
+        return True, self._diff_message(diff), diff
+
+    def diff_with_source(self, backup_path):
+        """比较备份与当前存档目录
+
+        大小和修改时间与该备份或最新备份记录一致的文件沿用记录中的MD5，只重新计算变化过的文件。
+
+        Args:
+            backup_path: 备份路径
+
+        Returns:
+            tuple: (成功标志, 消息, 比较结果字典)，结果额外包含 hashed（重新计算MD5的文件数）
+        """
+        from backup.manifest_diff import diff_manifests, build_hash_cache, scan_source
+
+        if not os.path.exists(self.source_path):
+            return False, "源目录不存在", None
+        backup, file_metadata, error = self._load_backup_manifest(backup_path)
+        if error:
+            return False, error, None
+
+        cache_sources = [file_metadata]
+        latest = self.get_latest_backup()
+        if latest is not None and latest is not backup and latest.get("type") == "md5":
+            latest_metadata, error = self._load_file_metadata(latest["path"])
+            if not error:
+                cache_sources.append(latest_metadata)
+
         try:
-            # 统计信息
-            backup_count = len(self.backups)
-            md5_backup_count = len([b for b in self.backups if b.get("type") == "md5"])
+            source_metadata, hashed = scan_source(self.source_path, build_hash_cache(cache_sources))
+        except OSError as e:
+            return False, f"读取存档失败：{str(e)}", None
+        diff = diff_manifests(file_metadata, source_metadata)
+        diff["hashed"] = hashed
+        return True, self._diff_message(diff), diff
+
+    def export_backups(self, fileobj, backups=None, since=None, compress=False):
+        """将备份导出为备份包，只包含所选备份的元数据和引用的文件
+        
+        Args:
+            fileobj: 可写入二进制数据的文件对象，可以是管道或标准输出
+            backups: 要导出的备份记录列表，默认为全部备份，指定基础备份时默认为其后的所有备份
+            since: 可选，基础备份记录，只导出该备份之后新产生的文件
+            compress: 是否使用gzip压缩
             
-            # 计算仓库中的文件数量和总大小
-            repo_files = os.listdir(self.file_repository)
-            repo_size = sum(os.path.getsize(os.path.join(self.file_repository, f)) for f in repo_files)
+        Returns:
+            tuple: (成功标志, 消息, 统计信息字典)
+        """
+        from backup.bundle import BundleError, export_bundle
+        
+        if backups is None:
+            backups = [b for b in self.backups if since is None or b["date"] > since["date"]]
+        backups = sorted(backups, key=lambda x: x["date"])
+        if not backups:
+            return False, "没有需要导出的备份", None
+        try:
+            with self.repository_lock.shared():
+                stats = export_bundle(self, fileobj, backups, since, compress)
+            return True, f"已导出{stats['backups']}个备份，{stats['objects']}个文件", stats
+        except BundleError as e:
+            return False, f"导出失败：{str(e)}", None
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
+            return False, f"导出失败：{str(e)}", None
+    
+    @_serialized
+    def import_backups(self, fileobj):
+        """从备份包导入备份，跳过仓库中已有的文件和已导入过的备份
+        
+        Args:
+            fileobj: 可读取二进制数据的文件对象，可以是管道或标准输入
             
-            # 计算所有备份中的文件总数和理论大小（如果不去重）
-            total_files = 0
-            theoretical_size = 0
+        Returns:
+            tuple: (成功标志, 消息, 统计信息字典)
+        """
+        from backup.bundle import BundleError, import_bundle
+        
+        entry_id = None
+        backup_dirs = []
+        
+        def begin_journal(paths):
+            # 读到包信息后、写入任何文件前记录操作日志，临时文件使用日志ID作标记
+            nonlocal entry_id
+            backup_dirs.extend(paths)
+            entry_id = self.journal.begin("create_backup", paths=paths)
+            batch.tag = entry_id
+        
+        batch = WriteBatch(self.durable)
+        writer = self.object_store.writer(batch)
+        try:
+            with self.repository_lock.shared():
+                new_backups, stats = import_bundle(self, fileobj, batch, writer, begin_journal)
+                writer.commit()
+                batch.commit()
+                self._commit_catalog(lambda: self.backups.extend(new_backups))
+        except Exception as e:
+            writer.abort()
+            batch.abort()
+            for path in backup_dirs:
+                shutil.rmtree(path, ignore_errors=True)
+            if isinstance(e, BundleError):
+                return False, f"导入失败：{str(e)}", None
+            import traceback
+            traceback.print_exc()
+            return False, f"导入失败：{str(e)}", None
+        finally:
+            if entry_id:
+                self.journal.end(entry_id)
+        
+        for backup in new_backups:
+            self._notify("added", backup)
+        message = f"已导入{stats['backups']}个备份，新增{stats['objects']}个文件，跳过{stats['skipped_objects']}个已有文件"
+        if stats["skipped_backups"]:
+            message += f"，{stats['skipped_backups']}个备份已存在"
+        return True, message, stats
+    
+    def mirror_repository(self, target_root, max_workers=None, prune=False, low_priority=True):
+        """将备份根目录（所有配置的备份记录和仓库）增量镜像到另一个目录
+        
+        Args:
+            target_root: 镜像目录
+            max_workers: 并行复制的线程数
+            prune: 是否删除镜像中源目录已不存在的备份和仓库文件
+            low_priority: 是否降低复制线程的优先级
             
-            for backup in self.backups:
-                if backup.get("type") == "md5":
-                    metadata_file = os.path.join(backup["path"], "metadata", "files.json")
-                    if os.path.exists(metadata_file):
-                        with open(metadata_file, "r", encoding="utf-8") as f:
-                            file_metadata = json.load(f)
-                            total_files += len(file_metadata)
-                            theoretical_size += sum(file_info["size"] for file_info in file_metadata)
-            
-            # 计算节省的空间
-            saved_space = theoretical_size - repo_size if theoretical_size > repo_size else 0
-            saved_percentage = (saved_space / theoretical_size * 100) if theoretical_size > 0 else 0
-            
-            return {
-                "backup_count": backup_count,
-                "md5_backup_count": md5_backup_count,
-                "repo_size": repo_size,
-                "total_files": total_files,
-                "theoretical_size": theoretical_size,
-                "saved_space": saved_space,
-                "saved_percentage": saved_percentage
-            }
+        Returns:
+            tuple: (成功标志, 消息, 镜像报告)
+        """
+        from backup.mirror import RepositoryMirror
+        
+        if os.path.normcase(os.path.abspath(target_root)) == os.path.normcase(os.path.abspath(self.backup_root)):
+            return False, "镜像目录不能与备份目录相同", None
+        try:
+            report = RepositoryMirror(self, target_root).run(max_workers, prune, low_priority)
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
+            return False, f"镜像失败：{str(e)}", None
+        message = f"已镜像{report['backups']}个备份，复制{report['objects_copied']}个仓库文件，{report['objects_skipped']}个已存在"
+        if prune:
+            message += f"，删除{report['pruned_backups']}个备份和{report['pruned_objects']}个文件"
+        return True, message, report
+    
+    def migrate_legacy_backups(self, max_workers=None, low_priority=True):
+        """将传统备份（完整复制的 data 目录）转换为MD5去重备份，逐个校验后删除 data 目录
+        
+        中断后再次调用会跳过已转换的备份，已转换但未删除 data 目录的备份会继续完成。
+        
+        Args:
+            max_workers: 并行计算MD5和校验的线程数
+            low_priority: 是否降低工作线程的优先级
+            
+        Returns:
+            tuple: (成功标志, 消息, 迁移报告)
+        """
+        from backup.migration import LegacyMigration
+        
+        try:
+            report = LegacyMigration(self).run(max_workers, low_priority)
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
+            return False, f"迁移失败：{str(e)}", None
+        message = f"已迁移{report['migrated']}个传统备份"
+        if report["failed"]:
+            return False, f"{message}，{len(report['failed'])}个备份迁移失败", report
+        return True, message, report
+    
+    def gc_repository(self, dry_run=False):
+        """清理仓库中不再被任何备份引用的文件
+        
+        Args:
+            dry_run: 为True时只统计，不实际删除
+            
+        Returns:
+            tuple: (成功标志, 消息, 统计信息字典)
+        """
+        stats = {"removed_files": 0, "freed_bytes": 0}
+        try:
+            # 清理期间不允许任何配置写入仓库，否则正在备份的文件可能被误删
+            with self.repository_lock.exclusive(), self.io_governor.job("gc") as io_job:
+                # 收集所有配置的MD5备份引用的文件，任何元数据无法读取时放弃清理，避免误删
+                referenced = set()
+                roots = set()
+                for backup in self.repository_backups():
+                    if backup.get("type") != "md5":
+                        continue
+                    try:
+                        pointer = load_tree_pointer(backup["path"])
+                    except ManifestError as e:
+                        return False, f"清理已取消：{backup['name']} {e}", stats
+                    if pointer is not None:
+                        roots.add(pointer["root"])
+                        continue
+                    file_metadata, error = self._load_file_metadata(backup["path"])
+                    if error:
+                        return False, f"清理已取消：{backup['name']} {error}", stats
+                    referenced.update(file_metadata.digests())
+                
+                # 树清单：备份之间共用的子树只遍历一次，树对象本身也是被引用的仓库文件
+                try:
+                    for tree_md5, entries, size in walk_unique_trees(self.object_store, roots):
+                        io_job.throttle(size)
+                        referenced.add(tree_md5)
+                        referenced.update(entry["md5"] for entry in entries if entry["type"] == "file")
+                except ManifestError as e:
+                    return False, f"清理已取消：{e}", stats
+                
+                unreferenced = []
+                for file_md5, size in self.object_store.list():
+                    if file_md5 in referenced:
+                        continue
+                    unreferenced.append(file_md5)
+                    stats["removed_files"] += 1
+                    stats["freed_bytes"] += size
+                if not dry_run:
+                    io_job.throttle(len(unreferenced) * METADATA_OP_BYTES)
+                    self.object_store.delete_many(unreferenced)
+            stats["io"] = io_job.report()
+            
+            return True, f"已清理{stats['removed_files']}个未引用的文件", stats
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
+            return False, f"清理失败：{str(e)}", stats
+    
+    def tier_repository(self, dry_run=False):
+        """将只被旧备份引用的仓库文件移入冷存储，新备份又引用的冷存储文件移回仓库目录
+        
+        Args:
+            dry_run: 为True时只统计，不移动文件
+            
+        Returns:
+            tuple: (成功标志, 消息, 分层报告)
+        """
+        if getattr(self.object_store, "cold", None) is None:
+            return False, "未启用冷存储（cold_storage.enabled），或当前仓库不是本地仓库", None
+        try:
+            # 移动文件期间不允许写入和读取仓库，与清理仓库相同
+            with self.repository_lock.exclusive(), self.io_governor.job("tier") as io_job:
+                report = RepositoryTiering(self).run(dry_run, throttle=io_job.throttle)
+            report["io"] = io_job.report()
+        except ManifestError as e:
+            return False, f"分层已取消：{e}", None
         except Exception as e:
             import traceback
             traceback.print_exc()
-            return None
\ No newline at end of file
+            return False, f"分层失败：{str(e)}", None
+        message = (f"已将{report['frozen']}个文件移入冷存储，{report['thawed']}个文件移回仓库目录"
+                   f"（{report['old_backups']}个旧备份）")
+        if report["corrupted"]:
+            message += f"，{len(report['corrupted'])}个文件校验失败未移动"
+        return True, message, report
+    
+    def rebuild_object_index(self):
+        """从仓库目录重建内存中的文件索引和仓库旁的布隆过滤器文件
+        
+        仓库文件被 SaveGuard 以外的程序删除或复制进来后使用。
+        
+        Returns:
+            tuple: (成功标志, 消息, 索引统计)
+        """
+        try:
+            with self.repository_lock.shared():
+                stats = self.object_store.rebuild_index() if hasattr(self.object_store, "rebuild_index") else None
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
+            return False, f"重建索引失败：{str(e)}", None
+        if stats is None:
+            return False, "当前仓库未使用文件索引", None
+        return True, f"已重建索引，共{stats['objects']}个文件", stats
+    
+    def verify_backups(self, backups=None):
+        """校验备份数据的完整性
+        
+        Args:
+            backups: 要校验的备份记录列表，默认为全部备份
+            
+        Returns:
+            tuple: (是否全部完好, 消息, 问题列表)
+        """
+        if backups is None:
+            backups = self.backups
+        
+        with self.repository_lock.shared():
+            problems = self._verify(backups)
+        if problems:
+            return False, f"{len(problems)}个备份存在问题", problems
+        return True, f"已校验{len(backups)}个备份，全部完好", problems
+    
+    def _verify(self, backups):
+        """逐个校验备份引用的仓库文件
+        
+        Args:
+            backups: 要校验的备份记录列表
+            
+        Returns:
+            list: 问题列表
+        """
+        problems = []
+        # 同一文件可能被多个备份引用，只计算一次MD5
+        object_status = {}
+        
+        for backup in backups:
+            if backup.get("type") != "md5":
+                if not os.path.isdir(os.path.join(backup["path"], "data")):
+                    problems.append({"name": backup["name"], "path": backup["path"],
+                                     "error": "备份数据目录不存在", "missing": [], "corrupted": []})
+                continue
+            
+            file_metadata, error = self._load_file_metadata(backup["path"])
+            if error:
+                problems.append({"name": backup["name"], "path": backup["path"],
+                                 "error": error, "missing": [], "corrupted": []})
+                continue
+            
+            missing_files = []
+            corrupted_files = []
+            for file_info in file_metadata:
+                if not all(k in file_info for k in ["path", "md5", "size"]):
+                    continue
+                
+                status = object_status.get(file_info["md5"])
+                if status is None:
+                    status = self.object_store.check(file_info["md5"], file_info["size"])
+                    object_status[file_info["md5"]] = status
+                
+                if status == "missing":
+                    missing_files.append(file_info["path"])
+                elif status == "corrupted":
+                    corrupted_files.append(file_info["path"])
+            
+            if missing_files or corrupted_files:
+                problems.append({"name": backup["name"], "path": backup["path"], "error": None,
+                                 "missing": missing_files, "corrupted": corrupted_files})
+        return problems
+    
+    def scrub_repository(self, time_budget=None, max_workers=None, low_priority=True):
+        """后台校验仓库文件，可中断并在下次运行时继续
+        
+        Args:
+            time_budget: 本次最多运行的秒数，None表示不限制
+            max_workers: 并行校验的线程数
+            low_priority: 是否降低校验线程的优先级
+            
+        Returns:
+            tuple: (是否未发现问题, 消息, 校验报告)
+        """
+        from backup.scrub import RepositoryScrubber
+        
+        # 持有共享锁，清理仓库删除的文件不会被误报为缺失
+        with self.repository_lock.shared():
+            report = RepositoryScrubber(self).run(time_budget, max_workers, low_priority=low_priority)
+        progress = "" if report["complete"] else f"，剩余{report['remaining']}个待下次继续"
+        if report["affected_backups"]:
+            return False, f"发现{len(report['bad_objects'])}个问题文件，影响{len(report['affected_backups'])}个备份{progress}", report
+        return True, f"已校验{report['checked']}个文件，未发现问题{progress}", report
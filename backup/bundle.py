@@ -0,0 +1,342 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+备份包模块 - 将选定的备份导出为单个tar归档，或从归档导入，用于在电脑之间迁移备份
+
+归档只包含所选备份的元数据和它们引用的仓库文件，按顺序流式读写，导出和导入
+数GB的备份历史都不需要额外的暂存空间。导入时跳过目标仓库已有的文件；增量导出
+只包含指定基础备份之后新产生的文件。文件元数据导出时逐条编码写入，不会把整个清单
+载入内存：先流式读一遍统计 files.json 的长度（tar 成员需先写大小），写入时再读一遍。
+
+归档结构:
+    saveguard-bundle.json          包信息和备份记录，位于归档开头
+    backups/<目录名>/files.json    MD5去重备份的文件元数据（JSON，导入时转换为 manifest.bin）
+    backups/<目录名>/data/...      传统备份的文件
+    objects/<md5>                  仓库文件
+
+树清单格式的备份以扁平的 files.json 导出，不包含树对象，导入后成为 manifest.bin 格式的备份：
+文件内容仍按MD5去重，只是不再与其他备份共用子树。
+"""
+
+import io
+import os
+import re
+import json
+import hashlib
+import tarfile
+from datetime import datetime
+
+from utils.file_utils import ensure_dir
+from backup.manifest import encode_manifest, manifest_path
+
+# 包信息文件名和格式版本
+BUNDLE_HEADER = "saveguard-bundle.json"
+BUNDLE_FORMAT = "saveguard-bundle"
+BUNDLE_VERSION = 1
+
+OBJECT_NAME_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+
+class BundleError(Exception):
+    """备份包格式错误或内容不完整"""
+
+
+def _add_bytes(tar, name, data):
+    """向归档中写入一段数据"""
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    info.mtime = int(datetime.now().timestamp())
+    tar.addfile(info, io.BytesIO(data))
+
+
+def _manifest_chunks(entries):
+    """将文件元数据逐条编码为 files.json 的内容（与旧版 files.json 结构相同的JSON数组）
+
+    Args:
+        entries: ManifestEntry 迭代器
+
+    Yields:
+        bytes: 数据块
+    """
+    separator = b"["
+    for entry in entries:
+        file_info = {"path": entry.path, "md5": entry.md5, "size": entry.size}
+        if entry.mtime is not None:
+            file_info["mtime"] = entry.mtime
+        yield separator + json.dumps(file_info, ensure_ascii=False).encode("utf-8")
+        separator = b", "
+    yield b"[]" if separator == b"[" else b"]"
+
+
+class _ChunkReader:
+    """把数据块迭代器包装为只读文件对象，供 tarfile 流式写入"""
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._buffer = b""
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) < size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            self._buffer += chunk
+        if size < 0:
+            size = len(self._buffer)
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+
+def _stream_entries(backup_manager, backup):
+    """以流的方式读取备份的文件元数据
+
+    Raises:
+        BundleError: 元数据无法读取
+    """
+    entries, error = backup_manager._stream_file_metadata(backup["path"])
+    if error:
+        raise BundleError(f"{backup['name']} {error}")
+    return entries
+
+
+def _referenced_objects(backup_manager, backups, measure=False):
+    """以流的方式收集备份引用的仓库文件
+
+    Args:
+        backup_manager: 备份管理器实例
+        backups: 备份记录列表
+        measure: 是否同时统计每个备份的 files.json 的字节数
+
+    Returns:
+        tuple: (备份路径 -> files.json 的字节数, md5集合)，measure 为False时字节数为None
+    """
+    manifest_sizes = {}
+    objects = set()
+    for backup in backups:
+        if backup.get("type") != "md5":
+            continue
+        entries = _stream_entries(backup_manager, backup)
+        if measure:
+            def collect(entries=entries):
+                for entry in entries:
+                    objects.add(entry.md5)
+                    yield entry
+            manifest_sizes[backup["path"]] = sum(len(chunk) for chunk in _manifest_chunks(collect()))
+        else:
+            manifest_sizes[backup["path"]] = None
+            objects.update(entry.md5 for entry in entries)
+    return manifest_sizes, objects
+
+
+def export_bundle(backup_manager, fileobj, backups, since=None, compress=False):
+    """将备份流式写入归档
+
+    Args:
+        backup_manager: 备份管理器实例
+        fileobj: 可写入二进制数据的文件对象，可以是管道或标准输出
+        backups: 要导出的备份记录列表
+        since: 可选，基础备份记录；该备份及更早的备份引用的文件不再导出，
+               导入方需已导入过基础备份
+        compress: 是否使用gzip压缩
+
+    Returns:
+        dict: {"backups": 备份数, "objects": 文件数, "bytes": 文件总字节数}
+    """
+    manifest_sizes, objects = _referenced_objects(backup_manager, backups, measure=True)
+    if since is not None:
+        # 基础备份及之前的备份已在目标仓库中，它们引用的文件无需再次导出
+        base_backups = [b for b in backup_manager.backups if b["date"] <= since["date"]]
+        _, base_objects = _referenced_objects(backup_manager, base_backups)
+        objects -= base_objects
+
+    header = {
+        "format": BUNDLE_FORMAT,
+        "version": BUNDLE_VERSION,
+        "created": datetime.now().isoformat(),
+        "base": {"name": since["name"], "date": since["date"]} if since else None,
+        "backups": [{
+            "id": os.path.basename(backup["path"]),
+            "name": backup["name"],
+            "date": backup["date"],
+            "type": backup.get("type", "legacy"),
+            "size": backup.get("size")
+        } for backup in backups],
+        "object_count": len(objects)
+    }
+
+    stats = {"backups": len(backups), "objects": 0, "bytes": 0}
+    with tarfile.open(fileobj=fileobj, mode="w|gz" if compress else "w|") as tar:
+        _add_bytes(tar, BUNDLE_HEADER, json.dumps(header, ensure_ascii=False, indent=2).encode("utf-8"))
+
+        # 元数据在文件之前，导入时读到文件前就能知道哪些文件是需要的
+        for backup in backups:
+            backup_id = os.path.basename(backup["path"])
+            if backup["path"] in manifest_sizes:
+                info = tarfile.TarInfo(f"backups/{backup_id}/files.json")
+                info.size = manifest_sizes[backup["path"]]
+                info.mtime = int(datetime.now().timestamp())
+                tar.addfile(info, _ChunkReader(_manifest_chunks(_stream_entries(backup_manager, backup))))
+
+        store = backup_manager.object_store
+        for file_md5 in sorted(objects):
+            info = tarfile.TarInfo(f"objects/{file_md5}")
+            info.size = store.size(file_md5)
+            if info.size is None:
+                raise BundleError(f"仓库中缺少文件：{file_md5}")
+            info.mtime = int(datetime.now().timestamp())
+            with store.open(file_md5) as src_file:
+                tar.addfile(info, src_file)
+            stats["objects"] += 1
+            stats["bytes"] += info.size
+
+        for backup in backups:
+            if backup["path"] in manifest_sizes:
+                continue
+            backup_id = os.path.basename(backup["path"])
+            data_dir = os.path.join(backup["path"], "data")
+            for root, _, files in os.walk(data_dir):
+                for file in files:
+                    file_path = os.path.join(root, file)
+                    rel_path = os.path.relpath(file_path, data_dir).replace(os.sep, "/")
+                    tar.add(file_path, arcname=f"backups/{backup_id}/data/{rel_path}", recursive=False)
+                    stats["bytes"] += os.path.getsize(file_path)
+    return stats
+
+
+def _safe_relative_path(path):
+    """检查归档中的相对路径，拒绝绝对路径和跳出目录的路径
+
+    Returns:
+        list: 路径的各级名称
+    """
+    parts = path.split("/")
+    if not path or path.startswith("/") or any(part in ("", ".", "..") or ":" in part for part in parts):
+        raise BundleError(f"归档中的路径不合法：{path}")
+    return parts
+
+
+def import_bundle(backup_manager, fileobj, batch, writer, journal_paths):
+    """从归档流式导入备份，写入的文件登记在写入批次和仓库写入器中，由调用方提交
+
+    Args:
+        backup_manager: 备份管理器实例
+        fileobj: 可读取二进制数据的文件对象，可以是管道或标准输入
+        batch: 备份目录的写入批次
+        writer: 仓库写入器
+        journal_paths: 回调函数，参数为将要创建的备份目录列表，返回前应将其记录到操作日志
+
+    Returns:
+        tuple: (新备份记录列表, 统计信息字典)
+    """
+    stats = {"backups": 0, "skipped_backups": 0, "objects": 0, "skipped_objects": 0, "bytes": 0}
+    store = backup_manager.object_store
+    header = None
+    targets = {}     # 归档中的备份目录名 -> 新备份目录
+    manifests = {}   # 归档中的备份目录名 -> 文件元数据
+    existing = set()
+    manifests_checked = False
+
+    with tarfile.open(fileobj=fileobj, mode="r|*") as tar:
+        for member in tar:
+            if header is None:
+                if member.name != BUNDLE_HEADER:
+                    raise BundleError("不是有效的备份包")
+                header = json.load(tar.extractfile(member))
+                if header.get("format") != BUNDLE_FORMAT or header.get("version", 0) > BUNDLE_VERSION:
+                    raise BundleError("不支持的备份包版本")
+                targets = _plan_backup_dirs(backup_manager, header["backups"], stats)
+                journal_paths(list(targets.values()))
+                continue
+
+            if not member.isfile():
+                continue
+            parts = _safe_relative_path(member.name)
+
+            if parts[0] == "objects" and len(parts) == 2 and OBJECT_NAME_PATTERN.match(parts[1]):
+                file_md5 = parts[1]
+                if not manifests_checked:
+                    # 读到第一个仓库文件时，所有元数据都已读完，一次批量检查仓库中已有的文件
+                    manifests_checked = True
+                    existing = store.has_many({file_info["md5"] for file_metadata in manifests.values()
+                                               for file_info in file_metadata if "md5" in file_info})
+                if file_md5 in existing or writer.is_pending(file_md5):
+                    # 目标仓库已有该文件，流式读取时直接跳过其内容
+                    stats["skipped_objects"] += 1
+                    continue
+                digest = hashlib.md5()
+                writer.put_stream(file_md5, tar.extractfile(member), member.size, digest)
+                if digest.hexdigest() != file_md5:
+                    raise BundleError(f"备份包中的文件已损坏：{file_md5}")
+                stats["objects"] += 1
+                stats["bytes"] += member.size
+            elif parts[0] == "backups" and len(parts) >= 3:
+                backup_id = parts[1]
+                if backup_id not in targets:
+                    continue
+                if parts[2:] == ["files.json"]:
+                    manifests[backup_id] = json.load(tar.extractfile(member))
+                elif parts[2] == "data" and len(parts) > 3:
+                    dest_file_path = os.path.join(targets[backup_id], "data", *parts[3:])
+                    ensure_dir(os.path.dirname(dest_file_path))
+                    batch.write_stream(dest_file_path, tar.extractfile(member))
+                    stats["bytes"] += member.size
+                else:
+                    raise BundleError(f"归档中的路径不合法：{member.name}")
+            else:
+                raise BundleError(f"归档中的路径不合法：{member.name}")
+
+    if header is None:
+        raise BundleError("备份包为空")
+
+    # 增量包依赖基础备份中的文件，缺失时说明目标仓库还没有导入基础备份
+    new_backups = []
+    for info in header["backups"]:
+        backup_id = info["id"]
+        if backup_id not in targets:
+            continue
+        backup_dir = targets[backup_id]
+        if info["type"] == "md5":
+            file_metadata = manifests.get(backup_id)
+            if file_metadata is None:
+                raise BundleError(f"备份包中缺少 {info['name']} 的文件元数据")
+            missing = {file_info["md5"] for file_info in file_metadata} - existing
+            missing = {file_md5 for file_md5 in missing if not writer.is_pending(file_md5)}
+            if missing:
+                missing -= store.has_many(missing)
+            if missing:
+                base = header.get("base")
+                hint = f"，请先导入基础备份 {base['name']}" if base else ""
+                raise BundleError(f"{info['name']} 引用的文件不在备份包中{hint}")
+            ensure_dir(os.path.join(backup_dir, "metadata"))
+            batch.write_bytes(manifest_path(backup_dir), encode_manifest(file_metadata))
+        else:
+            ensure_dir(os.path.join(backup_dir, "data"))
+
+        backup = {"name": info["name"], "date": info["date"], "path": backup_dir, "type": info["type"]}
+        if info.get("size") is not None:
+            backup["size"] = info["size"]
+        new_backups.append(backup)
+        stats["backups"] += 1
+    return new_backups, stats
+
+
+def _plan_backup_dirs(backup_manager, infos, stats):
+    """为归档中的备份分配新的备份目录，已导入过的备份（名称和日期相同）跳过
+
+    Returns:
+        dict: 归档中的备份目录名 -> 新备份目录
+    """
+    existing = {(b["name"], b["date"]) for b in backup_manager.backups}
+    for info in infos:
+        if len(_safe_relative_path(info["id"])) != 1:
+            raise BundleError(f"归档中的备份目录名不合法：{info['id']}")
+    targets = {}
+    for info in infos:
+        if (info["name"], info["date"]) in existing:
+            stats["skipped_backups"] += 1
+            continue
+        # 分配时即创建目录，本次已分配的目录和其他进程同时创建的目录都不会重复
+        targets[info["id"]] = backup_manager._unique_backup_dir(info["id"])
+    return targets
+
@@ -0,0 +1,621 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+冷存储模块 - 只被旧备份引用的仓库文件压缩后打包存放，最近的备份引用的文件保持为不压缩的散文件
+
+仓库分为两层：
+    热层   仓库目录中的散文件，恢复时直接复制
+    冷层   冷存储目录（默认为备份根目录下的 cold，可以放在另一块硬盘上）中的文件包，每个文件单独压缩，
+           <名称>.pack 为依次存放的压缩数据，<名称>.idx 记录每个文件在包中的位置
+
+分层规则：每个配置最近的 keep_recent 个备份，以及 age_days 天内的备份为新备份，其引用的文件属于热层；
+只被其他备份引用的文件移入冷层。之后的备份再次引用冷层中的文件时（例如恢复旧备份后继续游戏），
+下次分层时移回热层。树对象始终在热层，清理和统计仓库不需要解压。读取文件时先查找热层再查找冷层，
+恢复、校验、导出等操作不需要区分文件所在的层。
+
+文件包先完整写入并落盘后才删除对应的散文件，移回热层时先写入散文件再从文件包中移除，任何时刻中断
+都不会丢失文件，只会在两层中各留一份，下次分层时清理。
+
+配置示例（config.json）:
+    "cold_storage": {"enabled": true, "directory": "D:/SaveGuardCold", "age_days": 30, "keep_recent": 10,
+                     "compression": "zlib", "pack_mb": 256, "hot_mb_s": 200, "cold_mb_s": 40}
+
+hot_mb_s 和 cold_mb_s 是估算恢复耗时使用的热层读取速度和冷层读取解压速度（MB/秒）。
+"""
+
+import os
+import json
+import zlib
+import hashlib
+import threading
+from datetime import datetime, timedelta
+
+from utils.file_utils import WriteBatch, atomic_write_json, COPY_BUFFER_SIZE
+
+# 文件包和索引的后缀
+PACK_SUFFIX = ".pack"
+INDEX_SUFFIX = ".idx"
+
+# 默认的分层设置
+DEFAULT_DIRECTORY = "cold"
+DEFAULT_AGE_DAYS = 30
+DEFAULT_KEEP_RECENT = 10
+DEFAULT_COMPRESSION = "zlib"
+DEFAULT_PACK_MB = 256
+DEFAULT_HOT_MB_S = 200
+DEFAULT_COLD_MB_S = 40
+
+# 文件包中仍被使用的数据少于此比例时重写文件包
+REPACK_RATIO = 0.5
+
+# 读取压缩数据的块大小，限制单次解压出的数据量
+READ_CHUNK_SIZE = 64 * 1024
+
+_storages = {}
+_storages_guard = threading.Lock()
+
+
+def _compressor(codec):
+    """创建压缩器"""
+    if codec == "zlib":
+        return zlib.compressobj(6)
+    if codec == "lzma":
+        import lzma
+        return lzma.LZMACompressor()
+    raise ValueError(f"不支持的压缩格式：{codec}")
+
+
+def _decompressor(codec):
+    """创建解压器"""
+    if codec == "zlib":
+        return zlib.decompressobj()
+    if codec == "lzma":
+        import lzma
+        return lzma.LZMADecompressor()
+    raise ValueError(f"不支持的压缩格式：{codec}")
+
+
+def cold_settings(config):
+    """获取分层设置，未设置的项使用默认值
+
+    Returns:
+        dict: 分层设置
+    """
+    settings = config.get("cold_storage", {})
+    return {
+        "enabled": settings.get("enabled", False),
+        "directory": settings.get("directory") or None,
+        "age_days": settings.get("age_days", DEFAULT_AGE_DAYS),
+        "keep_recent": settings.get("keep_recent", DEFAULT_KEEP_RECENT),
+        "compression": settings.get("compression", DEFAULT_COMPRESSION),
+        "pack_mb": settings.get("pack_mb", DEFAULT_PACK_MB),
+        "hot_mb_s": settings.get("hot_mb_s", DEFAULT_HOT_MB_S),
+        "cold_mb_s": settings.get("cold_mb_s", DEFAULT_COLD_MB_S),
+    }
+
+
+def cold_directory(config, backup_root):
+    """获取冷存储目录
+
+    Returns:
+        str: 冷存储目录，未启用冷存储且目录中没有文件包时返回None
+    """
+    settings = cold_settings(config)
+    directory = settings["directory"] or os.path.join(backup_root, DEFAULT_DIRECTORY)
+    # 关闭冷存储后已移入冷层的文件仍然可以读取
+    if settings["enabled"] or os.path.isdir(directory):
+        return directory
+    return None
+
+
+class _PackedObjectReader:
+    """从文件包中读取并解压一个文件"""
+
+    def __init__(self, pack_path, offset, length, codec):
+        self._file = open(pack_path, "rb")
+        self._file.seek(offset)
+        self._remaining = length
+        self._decompressor = _decompressor(codec)
+        self._buffer = b""
+
+    def _fill(self, size):
+        """解压直到缓冲区中至少有 size 字节或数据已读完"""
+        while (size < 0 or len(self._buffer) < size) and self._remaining:
+            chunk = self._file.read(min(READ_CHUNK_SIZE, self._remaining))
+            if not chunk:
+                raise EOFError("文件包被截断")
+            self._remaining -= len(chunk)
+            self._buffer += self._decompressor.decompress(chunk)
+        if not self._remaining and hasattr(self._decompressor, "flush"):
+            self._buffer += self._decompressor.flush()
+
+    def read(self, size=-1):
+        if size is None:
+            size = -1
+        self._fill(size)
+        if size < 0:
+            data, self._buffer = self._buffer, b""
+        else:
+            data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ColdStorage:
+    """冷存储目录中的文件包"""
+
+    def __init__(self, directory):
+        """初始化冷存储，读取所有文件包的索引
+
+        Args:
+            directory: 冷存储目录
+        """
+        self.directory = directory
+        self._lock = threading.RLock()
+        self._packs = {}     # 包名 -> {"codec", "objects": {md5: [偏移, 压缩后大小, 大小]}}
+        self._objects = {}   # md5 -> 包名
+        self._state = None
+        self._load()
+
+    def _directory_state(self):
+        """获取目录的修改时间，文件包增删或索引重写都会改变它"""
+        try:
+            return os.stat(self.directory).st_mtime_ns
+        except OSError:
+            return None
+
+    def _load(self):
+        """读取所有文件包的索引"""
+        self._state = self._directory_state()
+        self._packs = {}
+        self._objects = {}
+        if self._state is None:
+            return
+        for name in sorted(os.listdir(self.directory)):
+            if not name.endswith(INDEX_SUFFIX):
+                continue
+            try:
+                with open(os.path.join(self.directory, name), "r", encoding="utf-8") as f:
+                    pack = json.load(f)
+            except (OSError, ValueError):
+                continue
+            pack_name = name[:-len(INDEX_SUFFIX)]
+            self._packs[pack_name] = pack
+            for key in pack["objects"]:
+                self._objects[key] = pack_name
+
+    def refresh(self):
+        """目录被其他进程修改时重新读取索引"""
+        with self._lock:
+            if self._directory_state() != self._state:
+                self._load()
+
+    def _path(self, pack_name, suffix):
+        return os.path.join(self.directory, pack_name + suffix)
+
+    def contains_many(self, keys):
+        """批量检查文件是否在冷层中
+
+        Returns:
+            set: 在冷层中的键
+        """
+        with self._lock:
+            self.refresh()
+            return {key for key in keys if key in self._objects}
+
+    def get(self, key):
+        """获取文件在冷层中的位置
+
+        Returns:
+            tuple: (包名, 偏移, 压缩后大小, 大小)，不在冷层中时返回None
+        """
+        with self._lock:
+            self.refresh()
+            pack_name = self._objects.get(key)
+            if pack_name is None:
+                return None
+            offset, length, size = self._packs[pack_name]["objects"][key]
+            return pack_name, offset, length, size
+
+    def size(self, key):
+        """获取文件解压后的大小，不在冷层中时返回None"""
+        location = self.get(key)
+        return location[3] if location is not None else None
+
+    def open(self, key):
+        """打开冷层中的文件读取解压后的内容
+
+        Raises:
+            FileNotFoundError: 文件不在冷层中
+        """
+        with self._lock:
+            location = self.get(key)
+            if location is None:
+                raise FileNotFoundError(key)
+            pack_name, offset, length, _ = location
+            return _PackedObjectReader(self._path(pack_name, PACK_SUFFIX), offset, length,
+                                       self._packs[pack_name]["codec"])
+
+    def list(self):
+        """列出冷层中的所有文件
+
+        Returns:
+            list: (键, 解压后的大小)
+        """
+        with self._lock:
+            self.refresh()
+            return [(key, self._packs[pack_name]["objects"][key][2]) for key, pack_name in self._objects.items()]
+
+    def _new_pack_name(self):
+        """生成新的包名"""
+        return "pack-" + datetime.now().strftime("%Y%m%d%H%M%S%f")
+
+    def _write_pack(self, items, codec, durable, throttle=None):
+        """写入一个文件包
+
+        Args:
+            items: (键, 大小, 打开文件的函数) 的列表
+            codec: 压缩格式
+            durable: 是否同步落盘
+            throttle: 可选，I/O限速函数，每读取一块数据后以其字节数调用
+
+        Returns:
+            tuple: (包名, 已写入的键, 损坏的键)
+        """
+        pack_name = self._new_pack_name()
+        pack_path = self._path(pack_name, PACK_SUFFIX)
+        objects = {}
+        corrupted = []
+        batch = WriteBatch(durable)
+        try:
+            with open(pack_path, "wb") as pack_file:
+                for key, size, open_source in items:
+                    offset = pack_file.tell()
+                    digest = hashlib.md5()
+                    compressor = _compressor(codec)
+                    length = 0
+                    with open_source() as src_file:
+                        for chunk in iter(lambda: src_file.read(COPY_BUFFER_SIZE), b""):
+                            if throttle is not None:
+                                throttle(len(chunk))
+                            digest.update(chunk)
+                            length += len(chunk)
+                            pack_file.write(compressor.compress(chunk))
+                    pack_file.write(compressor.flush())
+                    if length != size or digest.hexdigest() != key:
+                        # 不把损坏的文件移入冷层，截掉已写入的部分
+                        pack_file.seek(offset)
+                        pack_file.truncate()
+                        corrupted.append(key)
+                        continue
+                    objects[key] = [offset, pack_file.tell() - offset, size]
+            if not objects:
+                os.remove(pack_path)
+                return None, [], corrupted
+            # 文件包落盘后再写入索引，索引存在即表示文件包完整
+            batch.add_written(pack_path)
+            batch.write_json(self._path(pack_name, INDEX_SUFFIX), {"codec": codec, "objects": objects})
+            batch.commit()
+        except BaseException:
+            batch.abort()
+            if os.path.exists(pack_path):
+                os.remove(pack_path)
+            raise
+        self._packs[pack_name] = {"codec": codec, "objects": objects}
+        for key in objects:
+            self._objects[key] = pack_name
+        return pack_name, list(objects), corrupted
+
+    def add(self, items, codec=DEFAULT_COMPRESSION, max_pack_bytes=DEFAULT_PACK_MB * 1024 * 1024, durable=True,
+            throttle=None):
+        """将文件压缩后写入新的文件包，写入前后校验大小和MD5
+
+        Args:
+            items: (键, 大小, 打开文件的函数) 的列表
+            codec: 压缩格式，'zlib' 或 'lzma'
+            max_pack_bytes: 单个文件包中文件的最大总大小（压缩前）
+            durable: 是否同步落盘
+            throttle: 可选，I/O限速函数
+
+        Returns:
+            dict: {"packs": 新文件包数, "objects": 已移入的键, "corrupted": 损坏而未移入的键}
+        """
+        _compressor(codec)
+        report = {"packs": 0, "objects": [], "corrupted": []}
+        with self._lock:
+            self.refresh()
+            os.makedirs(self.directory, exist_ok=True)
+            group = []
+            group_bytes = 0
+            for item in list(items) + [None]:
+                if item is not None and item[0] in self._objects:
+                    continue
+                if group and (item is None or group_bytes + item[1] > max_pack_bytes):
+                    pack_name, written, corrupted = self._write_pack(group, codec, durable, throttle)
+                    report["packs"] += 1 if pack_name else 0
+                    report["objects"].extend(written)
+                    report["corrupted"].extend(corrupted)
+                    group, group_bytes = [], 0
+                if item is not None:
+                    group.append(item)
+                    group_bytes += item[1]
+            self._state = self._directory_state()
+        return report
+
+    def remove(self, keys, durable=True):
+        """从冷层中移除文件，文件包中剩余的数据过少时重写文件包
+
+        Args:
+            keys: 键的列表
+            durable: 是否同步落盘
+
+        Returns:
+            int: 重写的文件包数
+        """
+        repacked = 0
+        with self._lock:
+            self.refresh()
+            affected = {}
+            for key in keys:
+                pack_name = self._objects.pop(key, None)
+                if pack_name is not None:
+                    affected.setdefault(pack_name, []).append(key)
+            for pack_name, removed in affected.items():
+                pack = self._packs[pack_name]
+                for key in removed:
+                    del pack["objects"][key]
+                live_bytes = sum(length for _, length, _ in pack["objects"].values())
+                pack_path = self._path(pack_name, PACK_SUFFIX)
+                index_path = self._path(pack_name, INDEX_SUFFIX)
+                if not pack["objects"]:
+                    self._delete_pack(pack_name)
+                elif live_bytes < os.path.getsize(pack_path) * REPACK_RATIO:
+                    self._repack(pack_name, durable)
+                    repacked += 1
+                else:
+                    atomic_write_json(index_path, pack, durable)
+            self._state = self._directory_state()
+        return repacked
+
+    def _delete_pack(self, pack_name):
+        """删除文件包，先删除索引"""
+        self._packs.pop(pack_name, None)
+        for suffix in (INDEX_SUFFIX, PACK_SUFFIX):
+            try:
+                os.remove(self._path(pack_name, suffix))
+            except FileNotFoundError:
+                pass
+
+    def _repack(self, pack_name, durable):
+        """将文件包中仍被使用的压缩数据复制到新的文件包，不需要重新压缩"""
+        pack = self._packs[pack_name]
+        new_name = self._new_pack_name()
+        new_path = self._path(new_name, PACK_SUFFIX)
+        objects = {}
+        batch = WriteBatch(durable)
+        try:
+            with open(self._path(pack_name, PACK_SUFFIX), "rb") as src_file, open(new_path, "wb") as dest_file:
+                for key, (offset, length, size) in sorted(pack["objects"].items(), key=lambda item: item[1][0]):
+                    src_file.seek(offset)
+                    objects[key] = [dest_file.tell(), length, size]
+                    remaining = length
+                    while remaining:
+                        chunk = src_file.read(min(COPY_BUFFER_SIZE, remaining))
+                        if not chunk:
+                            raise EOFError("文件包被截断")
+                        dest_file.write(chunk)
+                        remaining -= len(chunk)
+            batch.add_written(new_path)
+            batch.write_json(self._path(new_name, INDEX_SUFFIX), {"codec": pack["codec"], "objects": objects})
+            batch.commit()
+        except BaseException:
+            batch.abort()
+            if os.path.exists(new_path):
+                os.remove(new_path)
+            raise
+        self._delete_pack(pack_name)
+        self._packs[new_name] = {"codec": pack["codec"], "objects": objects}
+        for key in objects:
+            self._objects[key] = new_name
+
+    def remove_incomplete(self):
+        """删除写入中断留下的没有索引的文件包和临时文件"""
+        with self._lock:
+            if not os.path.isdir(self.directory):
+                return
+            for name in os.listdir(self.directory):
+                stale = name.endswith(".tmp") or (
+                    name.endswith(PACK_SUFFIX) and name[:-len(PACK_SUFFIX)] not in self._packs)
+                if stale:
+                    try:
+                        os.remove(os.path.join(self.directory, name))
+                    except OSError:
+                        pass
+            self._state = self._directory_state()
+
+    def stats(self):
+        """获取冷层统计
+
+        Returns:
+            dict: {"packs", "objects", "bytes": 解压后的大小, "stored_bytes": 压缩后的大小}
+        """
+        with self._lock:
+            self.refresh()
+            total = stored = 0
+            for pack in self._packs.values():
+                for _, length, size in pack["objects"].values():
+                    total += size
+                    stored += length
+            return {"packs": len(self._packs), "objects": len(self._objects), "bytes": total, "stored_bytes": stored}
+
+
+def get_cold_storage(directory):
+    """获取冷存储目录对应的冷存储
+
+    Args:
+        directory: 冷存储目录
+
+    Returns:
+        ColdStorage: 同一目录始终返回同一个实例
+    """
+    location = os.path.normcase(os.path.abspath(directory))
+    with _storages_guard:
+        storage = _storages.get(location)
+        if storage is None:
+            storage = _storages[location] = ColdStorage(directory)
+        return storage
+
+
+class RepositoryTiering:
+    """按备份的新旧在热层和冷层之间移动仓库文件"""
+
+    def __init__(self, backup_manager):
+        """初始化分层
+
+        Args:
+            backup_manager: 备份管理器实例
+        """
+        self.backup_manager = backup_manager
+        self.object_store = backup_manager.object_store
+        self.settings = cold_settings(backup_manager.config)
+
+    def _load_catalog(self, catalog_file):
+        with open(catalog_file, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def classify_backups(self, now=None):
+        """将共用仓库的所有备份分为新备份和旧备份
+
+        Returns:
+            tuple: (新备份列表, 旧备份列表)
+        """
+        cutoff = ((now or datetime.now()) - timedelta(days=self.settings["age_days"])).isoformat()
+        recent, old = [], []
+        for catalog_file in self.backup_manager.catalog_files():
+            backups = sorted(self._load_catalog(catalog_file), key=lambda b: b["date"], reverse=True)
+            for position, backup in enumerate(backups):
+                if position < self.settings["keep_recent"] or backup["date"] >= cutoff:
+                    recent.append(backup)
+                else:
+                    old.append(backup)
+        return recent, old
+
+    def plan(self, now=None):
+        """计算需要移入冷层和移回热层的文件
+
+        Returns:
+            dict: {"freeze": md5 -> 大小, "thaw": md5 -> 大小, "duplicates": 两层都有的文件, "old_backups": 旧备份数}
+
+        Raises:
+            ManifestError: 备份元数据无法读取
+        """
+        recent, old = self.classify_backups(now)
+        hot = {}
+        visited = set()
+        for backup in recent:
+            if backup.get("type") == "md5":
+                hot.update(self.backup_manager.backup_objects(backup, visited, include_trees=False))
+        cold = {}
+        visited = set()
+        for backup in old:
+            if backup.get("type") == "md5":
+                cold.update(self.backup_manager.backup_objects(backup, visited, include_trees=False))
+        for key in hot:
+            cold.pop(key, None)
+
+        store = self.object_store
+        in_cold = store.cold.contains_many(set(hot) | set(cold))
+        loose = store.loose_many(set(hot) | set(cold))
+        return {
+            "freeze": {key: size for key, size in cold.items() if key in loose and key not in in_cold},
+            "thaw": {key: size for key, size in hot.items() if key in in_cold and key not in loose},
+            "duplicates": {key: key in hot for key in in_cold & loose},
+            "old_backups": len(old),
+        }
+
+    def run(self, dry_run=False, now=None, throttle=None):
+        """执行一次分层，调用方需持有仓库独占锁
+
+        Args:
+            dry_run: 为True时只统计，不移动文件
+            now: 可选，判断备份新旧使用的当前时间
+            throttle: 可选，I/O限速函数，读取要移动的文件时调用
+
+        Returns:
+            dict: 分层报告
+        """
+        plan = self.plan(now)
+        report = {"old_backups": plan["old_backups"], "frozen": len(plan["freeze"]),
+                  "frozen_bytes": sum(plan["freeze"].values()), "thawed": len(plan["thaw"]),
+                  "thawed_bytes": sum(plan["thaw"].values()), "packs": 0, "corrupted": []}
+        if dry_run:
+            return report
+
+        store = self.object_store
+        durable = self.backup_manager.durable
+        store.cold.remove_incomplete()
+        # 上次中断留下的重复文件：新备份引用的保留散文件，否则保留文件包中的
+        store.cold.remove([key for key, is_hot in plan["duplicates"].items() if is_hot], durable)
+        store.delete_loose([key for key, is_hot in plan["duplicates"].items() if not is_hot])
+
+        if plan["freeze"]:
+            packed = store.freeze(plan["freeze"], self.settings["compression"],
+                                  int(self.settings["pack_mb"] * 1024 * 1024), durable, throttle)
+            report["frozen"] = len(packed["objects"])
+            report["frozen_bytes"] = sum(plan["freeze"][key] for key in packed["objects"])
+            report["packs"] = packed["packs"]
+            report["corrupted"].extend(packed["corrupted"])
+        if plan["thaw"]:
+            thawed, corrupted = store.thaw(plan["thaw"], durable, throttle)
+            report["thawed"] = len(thawed)
+            report["thawed_bytes"] = sum(plan["thaw"][key] for key in thawed)
+            report["corrupted"].extend(corrupted)
+        return report
+
+    def restore_costs(self, backups):
+        """估算恢复每个备份需要从两层读取的数据量和耗时
+
+        Args:
+            backups: 备份记录列表
+
+        Returns:
+            list: 每个备份的 {"name", "path", "hot_bytes", "cold_bytes", "packs", "seconds"}，
+                  元数据无法读取的备份 error 为错误消息
+        """
+        cold = self.object_store.cold
+        hot_rate = self.settings["hot_mb_s"] * 1024 * 1024
+        cold_rate = self.settings["cold_mb_s"] * 1024 * 1024
+        costs = []
+        for backup in backups:
+            cost = {"name": backup["name"], "path": backup["path"], "hot_bytes": 0, "cold_bytes": 0,
+                    "packs": 0, "seconds": 0.0, "error": None}
+            if backup.get("type") == "md5":
+                try:
+                    objects = self.backup_manager.backup_objects(backup, include_trees=False)
+                except Exception as e:
+                    cost["error"] = str(e)
+                    costs.append(cost)
+                    continue
+                packs = set()
+                for key, size in objects.items():
+                    location = cold.get(key) if cold is not None else None
+                    if location is None:
+                        cost["hot_bytes"] += size
+                    else:
+                        cost["cold_bytes"] += size
+                        packs.add(location[0])
+                cost["packs"] = len(packs)
+            else:
+                cost["hot_bytes"] = backup.get("size", 0)
+            cost["seconds"] = cost["hot_bytes"] / hot_rate + cost["cold_bytes"] / cold_rate
+            costs.append(cost)
+        return costs
@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+操作日志模块 - 记录进行中的备份操作，程序崩溃后启动时据此回滚或补完
+
+每个操作在开始前写入 journal 目录下的一个日志文件，完成后删除；
+启动时仍存在的日志文件即为被中断的操作。
+
+多个进程可能共用同一个日志目录。每个日志对象在 journal/<所有者>.lock 上持有独占锁直到关闭或进程退出，
+日志记录所有者；检查未完成的操作时，锁仍被持有的所有者还在运行，其操作不会被当作中断而回滚。
+"""
+
+import os
+import json
+import uuid
+
+from utils.file_utils import ensure_dir, atomic_write_json
+from backup.repository_lock import FileLock
+
+# 日志目录名
+JOURNAL_DIR = "journal"
+
+# 所有者锁文件后缀
+OWNER_LOCK_SUFFIX = ".lock"
+
+
+class OperationJournal:
+    """备份操作日志"""
+
+    def __init__(self, backup_root, durable=True):
+        """初始化操作日志
+
+        Args:
+            backup_root: 备份根目录
+            durable: 写日志时是否同步落盘
+        """
+        self.journal_dir = os.path.join(backup_root, JOURNAL_DIR)
+        self.durable = durable
+        ensure_dir(self.journal_dir)
+        # 锁随日志对象一直持有，调用 close 或进程退出时释放
+        while True:
+            self.owner = uuid.uuid4().hex
+            lock_file = self._owner_lock_file(self.owner)
+            self._owner_fd = FileLock(lock_file).acquire(exclusive=True)
+            # 加锁前锁文件可能已被其他进程当作已退出的所有者删除，此时换一个所有者重试
+            try:
+                if os.path.samestat(os.fstat(self._owner_fd), os.stat(lock_file)):
+                    break
+            except FileNotFoundError:
+                pass
+            FileLock.release(self._owner_fd)
+
+    def close(self):
+        """释放所有者锁并删除锁文件，之后不能再记录操作，重复调用没有影响"""
+        if self._owner_fd is None:
+            return
+        lock_file = self._owner_lock_file(self.owner)
+        # 持有锁时删除，其他进程不会把仍在运行的所有者当作已退出；Windows 上无法删除打开的文件，释放后再删除
+        try:
+            os.remove(lock_file)
+            lock_file = None
+        except OSError:
+            pass
+        FileLock.release(self._owner_fd)
+        self._owner_fd = None
+        if lock_file is not None:
+            try:
+                os.remove(lock_file)
+            except OSError:
+                pass
+
+    def _owner_lock_file(self, owner):
+        """获取所有者锁文件路径"""
+        return os.path.join(self.journal_dir, f"{owner}{OWNER_LOCK_SUFFIX}")
+
+    def _owner_alive(self, owner):
+        """检查日志的所有者是否仍在运行，已退出时顺便删除其锁文件"""
+        if owner == self.owner:
+            return False
+        lock_file = self._owner_lock_file(owner)
+        fd = FileLock(lock_file).acquire(exclusive=True, blocking=False)
+        if fd is None:
+            return True
+        FileLock.release(fd)
+        try:
+            os.remove(lock_file)
+        except OSError:
+            pass
+        return False
+
+    def _entry_file(self, entry_id):
+        """获取日志文件路径"""
+        return os.path.join(self.journal_dir, f"{entry_id}.json")
+
+    def begin(self, op, **details):
+        """记录一个即将开始的操作
+
+        Args:
+            op: 操作类型，如 'create_backup'、'delete_backup'
+            details: 恢复时需要的信息，如备份路径
+
+        Returns:
+            str: 日志ID，同时用作该操作临时文件的标记
+
+        Raises:
+            RuntimeError: 日志已关闭
+        """
+        if self._owner_fd is None:
+            raise RuntimeError("操作日志已关闭")
+        entry_id = uuid.uuid4().hex
+        atomic_write_json(self._entry_file(entry_id), dict(details, id=entry_id, op=op, owner=self.owner),
+                          durable=self.durable, ensure_ascii=False)
+        return entry_id
+
+    def end(self, entry_id):
+        """标记操作已完成，删除日志
+
+        Args:
+            entry_id: 日志ID
+        """
+        try:
+            os.remove(self._entry_file(entry_id))
+        except FileNotFoundError:
+            pass
+
+    def pending(self):
+        """获取所有被中断的操作，其他仍在运行的进程正在进行的操作不包括在内
+
+        Returns:
+            list: 日志内容列表
+        """
+        names = os.listdir(self.journal_dir)
+        # 仍在运行的其他所有者，已退出的所有者的锁文件在检查时删除
+        alive = {name[:-len(OWNER_LOCK_SUFFIX)] for name in names if name.endswith(OWNER_LOCK_SUFFIX)
+                 and self._owner_alive(name[:-len(OWNER_LOCK_SUFFIX)])}
+
+        entries = []
+        for name in names:
+            path = os.path.join(self.journal_dir, name)
+            if name.endswith(OWNER_LOCK_SUFFIX):
+                continue
+            if not name.endswith(".json"):
+                # 写日志时中断留下的临时文件，有其他进程在运行时可能是它正在写入的日志
+                if not alive:
+                    os.remove(path)
+                continue
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                if not alive:
+                    os.remove(path)
+                continue
+            if entry.get("owner") in alive:
+                continue
+            entries.append(entry)
+        return entries
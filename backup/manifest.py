@@ -0,0 +1,548 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+文件清单模块 - MD5去重备份的文件元数据（路径、MD5、大小、修改时间）
+
+清单以紧凑的二进制列式格式保存在 metadata/manifest.bin，按路径排序：
+
+    文件头     magic "SGMF"、版本、文件数、路径表字节数、CRC32（均为小端）
+    MD5列      每个文件16字节
+    大小列     每个文件8字节无符号整数
+    修改时间列  每个文件8字节浮点数，NaN表示未记录
+    路径偏移    文件数+1个4字节无符号整数
+    路径表      UTF-8编码的路径依次拼接
+
+读取时只做一次文件读取和校验，各列在首次使用时才解码；统计和清理只需要大小列或MD5列，
+不必解析路径。路径按顺序排列，查找单个文件为二分查找。旧版备份的 metadata/files.json
+仍可读取，convert_manifest 可将其转换为新格式。
+
+恢复和统计使用 stream_manifest、manifest_totals 逐块读取清单，每次只解码固定数量的条目，
+内存占用与文件数无关；条目为紧凑的 ManifestEntry 元组而不是字典。
+"""
+
+import os
+import sys
+import json
+import math
+import zlib
+import bisect
+import struct
+from array import array
+from collections import namedtuple
+
+# 清单文件名
+MANIFEST_FILE = "manifest.bin"
+LEGACY_MANIFEST_FILE = "files.json"
+
+MANIFEST_MAGIC = b"SGMF"
+MANIFEST_VERSION = 1
+
+# magic、版本、保留字段、文件数、路径表字节数、CRC32
+_HEADER = struct.Struct("<4sHHIII")
+_DIGEST_SIZE = 16
+
+# 流式读取时每次解码的条目数和读取的字节数
+STREAM_CHUNK_ENTRIES = 4096
+STREAM_CHUNK_BYTES = 1024 * 1024
+
+# 流式读取得到的文件条目，未记录修改时间时 mtime 为None
+ManifestEntry = namedtuple("ManifestEntry", "path md5 size mtime")
+
+
+class ManifestError(Exception):
+    """清单文件损坏或格式不受支持"""
+
+
+def _column(typecode, data):
+    """将小端字节解码为数组"""
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+def _column_bytes(typecode, values):
+    """将数组编码为小端字节"""
+    values = array(typecode, values)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values.tobytes()
+
+
+class Manifest:
+    """只读的文件清单，可迭代得到与旧版 files.json 相同结构的字典"""
+
+    def __init__(self, data):
+        """从二进制数据加载清单
+
+        Args:
+            data: manifest.bin 的内容
+
+        Raises:
+            ManifestError: 数据损坏或版本不受支持
+        """
+        if len(data) < _HEADER.size:
+            raise ManifestError("清单文件不完整")
+        magic, version, _, count, paths_size, checksum = _HEADER.unpack_from(data)
+        if magic != MANIFEST_MAGIC:
+            raise ManifestError("不是有效的清单文件")
+        if version > MANIFEST_VERSION:
+            raise ManifestError(f"不支持的清单版本：{version}")
+        body = memoryview(data)[_HEADER.size:]
+        if len(body) != count * (_DIGEST_SIZE + 8 + 8 + 4) + 4 + paths_size or zlib.crc32(body) != checksum:
+            raise ManifestError("清单文件已损坏")
+
+        self._data = data
+        self._count = count
+        self._body = body
+        self._sizes_offset = count * _DIGEST_SIZE
+        self._mtimes_offset = self._sizes_offset + count * 8
+        self._offsets_offset = self._mtimes_offset + count * 8
+        self._paths_offset = self._offsets_offset + (count + 1) * 4
+        self._sizes = None
+        self._mtimes = None
+        self._path_offsets = None
+
+    @classmethod
+    def from_entries(cls, entries):
+        """由文件元数据字典列表创建清单"""
+        return cls(encode_manifest(entries))
+
+    def to_bytes(self):
+        """获取清单的二进制内容"""
+        return bytes(self._data)
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        for index in range(self._count):
+            yield self.entry(index)
+
+    @property
+    def sizes(self):
+        """大小列"""
+        if self._sizes is None:
+            self._sizes = _column("Q", self._body[self._sizes_offset:self._mtimes_offset])
+        return self._sizes
+
+    @property
+    def mtimes(self):
+        """修改时间列"""
+        if self._mtimes is None:
+            self._mtimes = _column("d", self._body[self._mtimes_offset:self._offsets_offset])
+        return self._mtimes
+
+    def _offsets(self):
+        if self._path_offsets is None:
+            self._path_offsets = _column("I", self._body[self._offsets_offset:self._paths_offset])
+        return self._path_offsets
+
+    def path(self, index):
+        """获取第index个文件的路径"""
+        offsets = self._offsets()
+        start = self._paths_offset + offsets[index]
+        return str(self._body[start:self._paths_offset + offsets[index + 1]], "utf-8")
+
+    def digest(self, index):
+        """获取第index个文件的MD5（十六进制）"""
+        start = index * _DIGEST_SIZE
+        return self._body[start:start + _DIGEST_SIZE].hex()
+
+    def digests(self):
+        """依次返回所有文件的MD5，不解析路径"""
+        for index in range(self._count):
+            yield self.digest(index)
+
+    def total_size(self):
+        """所有文件的总大小"""
+        return sum(self.sizes)
+
+    def entry(self, index):
+        """获取第index个文件的元数据字典"""
+        file_info = {"path": self.path(index), "md5": self.digest(index), "size": self.sizes[index]}
+        mtime = self.mtimes[index]
+        if not math.isnan(mtime):
+            file_info["mtime"] = mtime
+        return file_info
+
+    def lookup(self, path):
+        """按路径查找文件
+
+        Args:
+            path: 相对路径
+
+        Returns:
+            dict: 文件元数据，不存在时返回None
+        """
+        index = bisect.bisect_left(_PathView(self), path)
+        if index < self._count and self.path(index) == path:
+            return self.entry(index)
+        return None
+
+    def under(self, directory):
+        """返回目录下的所有文件（按路径排序，范围查找）
+
+        Args:
+            directory: 以 os.sep 分隔的相对目录路径
+
+        Yields:
+            dict: 文件元数据
+        """
+        prefix = directory.rstrip(os.sep) + os.sep
+        index = bisect.bisect_left(_PathView(self), prefix)
+        while index < self._count:
+            path = self.path(index)
+            if not path.startswith(prefix):
+                return
+            yield self.entry(index)
+            index += 1
+
+
+class _PathView:
+    """按下标访问路径的序列视图，供二分查找使用"""
+
+    def __init__(self, manifest):
+        self._manifest = manifest
+
+    def __len__(self):
+        return len(self._manifest)
+
+    def __getitem__(self, index):
+        return self._manifest.path(index)
+
+
+def encode_manifest(entries):
+    """将文件元数据编码为清单格式
+
+    Args:
+        entries: 文件元数据字典的可迭代对象，每项包含 path、md5、size，mtime可选
+
+    Returns:
+        bytes: 清单内容
+
+    Raises:
+        ManifestError: 元数据中的MD5格式不正确
+    """
+    entries = sorted((file_info for file_info in entries if "md5" in file_info and "size" in file_info
+                      and "path" in file_info), key=lambda file_info: file_info["path"])
+    try:
+        digests = b"".join(bytes.fromhex(file_info["md5"]) for file_info in entries)
+    except (TypeError, ValueError):
+        raise ManifestError("文件元数据中的MD5格式不正确")
+    if len(digests) != len(entries) * _DIGEST_SIZE:
+        raise ManifestError("文件元数据中的MD5格式不正确")
+
+    encoded_paths = [file_info["path"].encode("utf-8") for file_info in entries]
+    offsets = [0]
+    for encoded in encoded_paths:
+        offsets.append(offsets[-1] + len(encoded))
+    body = b"".join((
+        digests,
+        _column_bytes("Q", (file_info["size"] for file_info in entries)),
+        _column_bytes("d", (file_info.get("mtime", math.nan) for file_info in entries)),
+        _column_bytes("I", offsets),
+        b"".join(encoded_paths),
+    ))
+    header = _HEADER.pack(MANIFEST_MAGIC, MANIFEST_VERSION, 0, len(entries), offsets[-1], zlib.crc32(body))
+    return header + body
+
+
+def manifest_path(backup_path):
+    """获取备份的清单文件路径"""
+    return os.path.join(backup_path, "metadata", MANIFEST_FILE)
+
+
+def load_manifest(backup_path):
+    """读取备份的文件清单，优先读取新格式，其次读取旧版 files.json
+
+    Args:
+        backup_path: 备份路径
+
+    Returns:
+        Manifest: 文件清单
+
+    Raises:
+        FileNotFoundError: 两种格式的清单都不存在
+        ManifestError: 清单损坏
+    """
+    try:
+        with open(manifest_path(backup_path), "rb") as f:
+            return Manifest(f.read())
+    except FileNotFoundError:
+        pass
+
+    with open(os.path.join(backup_path, "metadata", LEGACY_MANIFEST_FILE), "r", encoding="utf-8") as f:
+        try:
+            entries = json.load(f)
+        except ValueError:
+            raise ManifestError("备份元数据文件已损坏，无法解析JSON格式")
+    if not isinstance(entries, list):
+        raise ManifestError("备份元数据格式错误，应为文件列表")
+    return Manifest.from_entries(entry for entry in entries if isinstance(entry, dict))
+
+
+def convert_manifest(backup_path, batch):
+    """将旧版 files.json 转换为新格式，新清单登记在写入批次中，由调用方提交后删除旧文件
+
+    上次转换在删除旧文件前中断时，新清单已存在，只返回旧文件路径。
+
+    Args:
+        backup_path: 备份路径
+        batch: 写入批次
+
+    Returns:
+        str: 需要在提交后删除的旧清单路径，无需转换时返回None
+
+    Raises:
+        ManifestError: 旧清单损坏
+    """
+    legacy_file = os.path.join(backup_path, "metadata", LEGACY_MANIFEST_FILE)
+    if not os.path.exists(legacy_file):
+        return None
+    if not os.path.exists(manifest_path(backup_path)):
+        batch.write_bytes(manifest_path(backup_path), load_manifest(backup_path).to_bytes())
+    return legacy_file
+
+
+def _body_layout(count):
+    """计算清单各列相对于正文开头的偏移
+
+    Returns:
+        tuple: (大小列, 修改时间列, 路径偏移列, 路径表)
+    """
+    sizes_offset = count * _DIGEST_SIZE
+    mtimes_offset = sizes_offset + count * 8
+    offsets_offset = mtimes_offset + count * 8
+    return sizes_offset, mtimes_offset, offsets_offset, offsets_offset + (count + 1) * 4
+
+
+def _read_exact(f, offset, size):
+    """从文件的指定位置读取指定字节数"""
+    f.seek(offset)
+    data = f.read(size)
+    if len(data) != size:
+        raise ManifestError("清单文件不完整")
+    return data
+
+
+def _scan_body(f, count, paths_size, checksum, on_chunk=None):
+    """逐块读取清单正文并校验长度和CRC32
+
+    Args:
+        f: 已读取文件头的清单文件
+        count: 文件数
+        paths_size: 路径表字节数
+        checksum: 文件头中的CRC32
+        on_chunk: 可选，回调函数 on_chunk(正文偏移, 数据块)
+
+    Raises:
+        ManifestError: 清单损坏
+    """
+    body_size = _body_layout(count)[3] + paths_size
+    if os.fstat(f.fileno()).st_size != _HEADER.size + body_size:
+        raise ManifestError("清单文件已损坏")
+    f.seek(_HEADER.size)
+    crc = 0
+    position = 0
+    while position < body_size:
+        chunk = f.read(min(STREAM_CHUNK_BYTES, body_size - position))
+        if not chunk:
+            raise ManifestError("清单文件不完整")
+        crc = zlib.crc32(chunk, crc)
+        if on_chunk is not None:
+            on_chunk(position, chunk)
+        position += len(chunk)
+    if crc != checksum:
+        raise ManifestError("清单文件已损坏")
+
+
+def _read_header(f):
+    """读取并检查清单文件头
+
+    Returns:
+        tuple: (文件数, 路径表字节数, CRC32)
+    """
+    header = f.read(_HEADER.size)
+    if len(header) < _HEADER.size:
+        raise ManifestError("清单文件不完整")
+    magic, version, _, count, paths_size, checksum = _HEADER.unpack(header)
+    if magic != MANIFEST_MAGIC:
+        raise ManifestError("不是有效的清单文件")
+    if version > MANIFEST_VERSION:
+        raise ManifestError(f"不支持的清单版本：{version}")
+    return count, paths_size, checksum
+
+
+def _iter_manifest_file(f, count):
+    """逐块解码清单条目，每次只读取各列中 STREAM_CHUNK_ENTRIES 个条目"""
+    with f:
+        sizes_offset, mtimes_offset, offsets_offset, paths_offset = (
+            _HEADER.size + offset for offset in _body_layout(count))
+        for start in range(0, count, STREAM_CHUNK_ENTRIES):
+            n = min(STREAM_CHUNK_ENTRIES, count - start)
+            digests = _read_exact(f, _HEADER.size + start * _DIGEST_SIZE, n * _DIGEST_SIZE)
+            sizes = _column("Q", _read_exact(f, sizes_offset + start * 8, n * 8))
+            mtimes = _column("d", _read_exact(f, mtimes_offset + start * 8, n * 8))
+            offsets = _column("I", _read_exact(f, offsets_offset + start * 4, (n + 1) * 4))
+            paths = _read_exact(f, paths_offset + offsets[0], offsets[n] - offsets[0])
+            base = offsets[0]
+            for index in range(n):
+                mtime = mtimes[index]
+                yield ManifestEntry(
+                    str(paths[offsets[index] - base:offsets[index + 1] - base], "utf-8"),
+                    digests[index * _DIGEST_SIZE:(index + 1) * _DIGEST_SIZE].hex(),
+                    sizes[index],
+                    None if math.isnan(mtime) else mtime)
+
+
+def _iter_json_array(f):
+    """逐个解析JSON数组中的元素，每次只读取一块文本
+
+    Raises:
+        ManifestError: 不是JSON数组或格式错误
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    position = 0
+    eof = False
+
+    def fill():
+        # 丢弃已解析的部分，再读入一块
+        nonlocal buffer, position, eof
+        chunk = f.read(STREAM_CHUNK_BYTES)
+        eof = not chunk
+        buffer = buffer[position:] + chunk
+        position = 0
+        return not eof
+
+    def skip_whitespace():
+        nonlocal position
+        while True:
+            while position < len(buffer) and buffer[position] in " \t\r\n":
+                position += 1
+            if position < len(buffer) or not fill():
+                return
+
+    def check_end():
+        # 数组之后只能有空白
+        nonlocal position
+        position += 1
+        skip_whitespace()
+        if position < len(buffer):
+            raise ManifestError("备份元数据文件已损坏，无法解析JSON格式")
+
+    skip_whitespace()
+    if buffer[position:position + 1] != "[":
+        raise ManifestError("备份元数据格式错误，应为文件列表")
+    position += 1
+    skip_whitespace()
+    if buffer[position:position + 1] == "]":
+        check_end()
+        return
+    while True:
+        while True:
+            try:
+                value, end = decoder.raw_decode(buffer, position)
+                # 数字可能被块边界截断，后面还有内容才能确定已解析完整
+                if end < len(buffer) or eof:
+                    break
+            except ValueError:
+                if eof:
+                    raise ManifestError("备份元数据文件已损坏，无法解析JSON格式")
+            if not fill():
+                continue
+        position = end
+        yield value
+        skip_whitespace()
+        separator = buffer[position:position + 1]
+        if separator == "]":
+            check_end()
+            return
+        if separator != ",":
+            raise ManifestError("备份元数据文件已损坏，无法解析JSON格式")
+        position += 1
+        skip_whitespace()
+
+
+def _iter_legacy_manifest(backup_path):
+    """流式读取旧版 files.json"""
+    with open(os.path.join(backup_path, "metadata", LEGACY_MANIFEST_FILE), "r", encoding="utf-8") as f:
+        for file_info in _iter_json_array(f):
+            if not isinstance(file_info, dict) or not all(k in file_info for k in ("path", "md5", "size")):
+                continue
+            yield ManifestEntry(file_info["path"], file_info["md5"], file_info["size"], file_info.get("mtime"))
+
+
+def stream_manifest(backup_path):
+    """以流的方式读取备份的扁平文件清单，内存占用与文件数无关
+
+    调用时先逐块校验整个清单（新格式校验CRC32，旧版 files.json 完整解析一遍），
+    校验通过才返回迭代器，调用方可以在修改存档前确认清单完好。
+
+    Args:
+        backup_path: 备份路径
+
+    Returns:
+        iterator: ManifestEntry 迭代器，新格式按路径排序
+
+    Raises:
+        FileNotFoundError: 两种格式的清单都不存在
+        ManifestError: 清单损坏
+    """
+    try:
+        f = open(manifest_path(backup_path), "rb")
+    except FileNotFoundError:
+        for _ in _iter_legacy_manifest(backup_path):
+            pass
+        return _iter_legacy_manifest(backup_path)
+    try:
+        count, paths_size, checksum = _read_header(f)
+        _scan_body(f, count, paths_size, checksum)
+    except BaseException:
+        f.close()
+        raise
+    return _iter_manifest_file(f, count)
+
+
+def manifest_totals(backup_path):
+    """逐块读取扁平清单，计算文件数和总大小，同时校验CRC32
+
+    Returns:
+        tuple: (文件数, 总大小)
+
+    Raises:
+        FileNotFoundError: 两种格式的清单都不存在
+        ManifestError: 清单损坏
+    """
+    try:
+        f = open(manifest_path(backup_path), "rb")
+    except FileNotFoundError:
+        files = total = 0
+        for entry in _iter_legacy_manifest(backup_path):
+            files += 1
+            total += entry.size
+        return files, total
+
+    with f:
+        count, paths_size, checksum = _read_header(f)
+        sizes_start, sizes_end = _body_layout(count)[:2]
+        total = 0
+        pending = b""
+
+        def add_sizes(position, chunk):
+            # 大小列可能跨越数据块，不足8字节的部分留到下一块
+            nonlocal total, pending
+            start = max(sizes_start, position)
+            end = min(sizes_end, position + len(chunk))
+            if start >= end:
+                return
+            data = pending + bytes(chunk[start - position:end - position])
+            usable = len(data) - len(data) % 8
+            total += sum(_column("Q", data[:usable]))
+            pending = data[usable:]
+
+        _scan_body(f, count, paths_size, checksum, add_sizes)
+    return count, total
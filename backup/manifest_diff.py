@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+备份比较模块 - 按文件元数据比较两个备份，或比较备份与当前存档
+
+比较只使用备份的文件元数据（路径、MD5、大小），不读取仓库文件，大型存档也能在毫秒级完成。
+与当前存档比较时，大小和修改时间与已有备份记录一致的文件直接沿用记录中的MD5，
+只有发生变化的文件才重新计算。
+"""
+
+import os
+
+from utils.file_utils import calculate_file_md5
+
+
+def diff_manifests(old_metadata, new_metadata):
+    """比较两份文件元数据
+
+    Args:
+        old_metadata: 较早的文件元数据列表，每项包含 path、md5、size
+        new_metadata: 较新的文件元数据列表
+
+    Returns:
+        dict: {
+            "added": [{"path", "size"}],
+            "removed": [{"path", "size"}],
+            "modified": [{"path", "old_size", "new_size", "size_delta"}],
+            "unchanged": 未变化的文件数,
+            "size_delta": 总大小变化
+        }
+        各列表按路径排序
+    """
+    old_files = {file_info["path"]: file_info for file_info in old_metadata}
+    new_files = {file_info["path"]: file_info for file_info in new_metadata}
+
+    added = [{"path": path, "size": new_files[path]["size"]}
+             for path in sorted(new_files.keys() - old_files.keys())]
+    removed = [{"path": path, "size": old_files[path]["size"]}
+               for path in sorted(old_files.keys() - new_files.keys())]
+    modified = []
+    unchanged = 0
+    for path in sorted(old_files.keys() & new_files.keys()):
+        old_info = old_files[path]
+        new_info = new_files[path]
+        if old_info["md5"] == new_info["md5"]:
+            unchanged += 1
+            continue
+        modified.append({"path": path, "old_size": old_info["size"], "new_size": new_info["size"],
+                         "size_delta": new_info["size"] - old_info["size"]})
+
+    size_delta = (sum(item["size"] for item in added) - sum(item["size"] for item in removed)
+                  + sum(item["size_delta"] for item in modified))
+    return {"added": added, "removed": removed, "modified": modified,
+            "unchanged": unchanged, "size_delta": size_delta}
+
+
+def build_hash_cache(metadata_lists):
+    """由已有备份的文件元数据建立哈希缓存
+
+    Args:
+        metadata_lists: 文件元数据列表的可迭代对象，靠前的优先
+
+    Returns:
+        dict: 相对路径 -> (大小, 修改时间, MD5)
+    """
+    cache = {}
+    for file_metadata in metadata_lists:
+        for file_info in file_metadata:
+            if "mtime" in file_info:
+                cache.setdefault(file_info["path"], (file_info["size"], file_info["mtime"], file_info["md5"]))
+    return cache
+
+
+def scan_source(source_path, hash_cache):
+    """生成当前存档目录的文件元数据
+
+    Args:
+        source_path: 存档目录
+        hash_cache: build_hash_cache 返回的哈希缓存
+
+    Returns:
+        tuple: (文件元数据列表, 重新计算MD5的文件数)
+    """
+    file_metadata = []
+    hashed = 0
+    for root, _, files in os.walk(source_path):
+        for file in files:
+            src_file_path = os.path.join(root, file)
+            rel_path = os.path.relpath(src_file_path, source_path)
+            stat = os.stat(src_file_path)
+            cached = hash_cache.get(rel_path)
+            if cached is not None and cached[0] == stat.st_size and cached[1] == stat.st_mtime:
+                file_md5 = cached[2]
+            else:
+                file_md5 = calculate_file_md5(src_file_path)
+                hashed += 1
+            file_metadata.append({"path": rel_path, "md5": file_md5,
+                                  "size": stat.st_size, "mtime": stat.st_mtime})
+    return file_metadata, hashed
@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+迁移模块 - 将关闭MD5去重时创建的传统备份（完整复制在 <备份>/data 下）转换为MD5去重备份
+
+每个备份的文件以多线程并行计算MD5，写入仓库和树清单后逐个校验仓库文件，校验通过才把
+备份记录改为MD5备份并删除 data 目录。每个备份单独提交，中断后再次运行会跳过已转换的备份；
+已改为MD5备份但 data 目录尚未删除的备份会在校验后继续删除。
+"""
+
+import os
+import time
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.file_utils import calculate_file_md5, ensure_dir, WriteBatch
+from utils.system_utils import lower_current_thread_priority
+from backup.tree import TREE_POINTER_FILE, load_tree_pointer
+
+
+class MigrationError(Exception):
+    """单个备份转换失败"""
+
+
+class LegacyMigration:
+    """传统备份迁移任务"""
+
+    def __init__(self, backup_manager):
+        """初始化迁移任务
+
+        Args:
+            backup_manager: 备份管理器实例
+        """
+        self.backup_manager = backup_manager
+        self.object_store = backup_manager.object_store
+
+    def pending_backups(self):
+        """需要迁移的备份：传统备份，以及已转换但 data 目录还在的备份"""
+        pending = []
+        for backup in self.backup_manager.backups:
+            data_dir = os.path.join(backup["path"], "data")
+            if backup.get("type") != "md5" or os.path.isdir(data_dir):
+                pending.append(backup)
+        return pending
+
+    @staticmethod
+    def _hash_file(args):
+        """计算单个文件的元数据
+
+        Args:
+            args: (文件路径, 相对路径)
+
+        Returns:
+            dict: 文件元数据
+        """
+        file_path, rel_path = args
+        stat = os.stat(file_path)
+        return {"path": rel_path, "md5": calculate_file_md5(file_path), "size": stat.st_size, "mtime": stat.st_mtime}
+
+    def _scan(self, data_dir, executor):
+        """并行计算 data 目录中所有文件的MD5
+
+        Returns:
+            tuple: (文件元数据列表, md5 -> 本地文件)
+        """
+        files = []
+        for root, _, names in os.walk(data_dir):
+            for name in names:
+                file_path = os.path.join(root, name)
+                files.append((file_path, os.path.relpath(file_path, data_dir)))
+        file_metadata = list(executor.map(self._hash_file, files))
+        sources = {}
+        for (file_path, _), file_info in zip(files, file_metadata):
+            sources.setdefault(file_info["md5"], file_path)
+        return file_metadata, sources
+
+    def _verify(self, backup_path, expected_files, executor):
+        """校验转换后的备份：清单能读取、文件数一致，且引用的仓库文件都完好
+
+        Raises:
+            MigrationError: 校验失败
+        """
+        file_metadata, error = self.backup_manager._load_file_metadata(backup_path)
+        if error:
+            raise MigrationError(error)
+        if expected_files is not None and len(file_metadata) != expected_files:
+            raise MigrationError("转换后的文件数与原备份不一致")
+        objects = dict(zip(file_metadata.digests(), file_metadata.sizes))
+        bad = [file_md5 for file_md5, status in zip(objects, executor.map(
+            lambda item: self.object_store.check(*item), objects.items())) if status != "ok"]
+        if bad:
+            raise MigrationError(f"{len(bad)}个仓库文件校验失败")
+
+    def _convert(self, backup, executor, report):
+        """转换一个传统备份，成功后备份记录已改为MD5备份
+
+        Raises:
+            MigrationError: 转换或校验失败，备份保持原样
+        """
+        backup_manager = self.backup_manager
+        backup_path = backup["path"]
+        data_dir = os.path.join(backup_path, "data")
+        if not os.path.isdir(data_dir):
+            raise MigrationError("备份数据目录不存在")
+
+        file_metadata, sources = self._scan(data_dir, executor)
+        report["files"] += len(file_metadata)
+
+        entry_id = backup_manager.journal.begin("migrate_backup", path=backup_path)
+        batch = WriteBatch(backup_manager.durable, tag=entry_id)
+        writer = self.object_store.writer(batch)
+        pointer_file = os.path.join(backup_path, "metadata", TREE_POINTER_FILE)
+        try:
+            # 从写入到更新备份记录期间持有共享锁，防止清理操作删除尚未被记录引用的文件；
+            # 与其他操作相同，先获取本配置的操作锁再获取仓库锁，每个备份转换完成后即释放
+            with backup_manager._lock, backup_manager.repository_lock.shared():
+                ensure_dir(os.path.join(backup_path, "metadata"))
+                total_size, written = backup_manager._write_tree_manifest(
+                    backup_path, file_metadata, sources, batch, writer)
+                writer.commit()
+                batch.commit()
+                self._verify(backup_path, len(file_metadata), executor)
+
+                def change():
+                    record = backup_manager.find_backup(backup_path)
+                    if record is None:
+                        raise MigrationError("备份已被删除")
+                    record["type"] = "md5"
+                    record["size"] = total_size
+                    return record
+
+                backup = backup_manager._commit_catalog(change)
+        except Exception as e:
+            writer.abort()
+            batch.abort()
+            if os.path.exists(pointer_file):
+                os.remove(pointer_file)
+            if isinstance(e, MigrationError):
+                raise
+            raise MigrationError(str(e))
+        finally:
+            backup_manager.journal.end(entry_id)
+
+        report["objects_written"] += len(written)
+        report["bytes_written"] += sum(os.path.getsize(path) for path in written.values())
+        backup_manager._notify("updated", backup)
+
+    def run(self, max_workers=None, low_priority=True):
+        """迁移所有传统备份
+
+        Args:
+            max_workers: 并行计算MD5和校验的线程数，默认按CPU数量决定
+            low_priority: 是否降低工作线程的优先级
+
+        Returns:
+            dict: 迁移报告
+        """
+        started = time.time()
+        if max_workers is None:
+            max_workers = min(8, (os.cpu_count() or 1) * 2)
+        report = {"migrated": 0, "files": 0, "objects_written": 0, "bytes_written": 0,
+                  "bytes_removed": 0, "reclaimed": 0, "failed": []}
+
+        initializer = lower_current_thread_priority if low_priority else None
+        with ThreadPoolExecutor(max_workers=max_workers, initializer=initializer) as executor:
+            for backup in self.pending_backups():
+                data_dir = os.path.join(backup["path"], "data")
+                try:
+                    if backup.get("type") == "md5":
+                        # 上次迁移已更新备份记录，但还没来得及删除 data 目录
+                        if load_tree_pointer(backup["path"]) is None:
+                            continue
+                        self._verify(backup["path"], None, executor)
+                    else:
+                        self._convert(backup, executor, report)
+                except Exception as e:
+                    report["failed"].append({"name": backup["name"], "path": backup["path"], "error": str(e)})
+                    continue
+
+                # 备份已校验通过并改为MD5备份，data 目录不再需要
+                report["bytes_removed"] += self.backup_manager._dir_size(data_dir)
+                shutil.rmtree(data_dir, ignore_errors=True)
+                report["migrated"] += 1
+
+        report["reclaimed"] = max(0, report["bytes_removed"] - report["bytes_written"])
+        report["elapsed"] = time.time() - started
+        return report
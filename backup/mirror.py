@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+仓库镜像模块 - 将备份根目录增量复制到另一个目录（另一块硬盘或NAS挂载点）
+
+仓库文件以MD5命名、内容不会改变，每次镜像只需比较两边的文件列表，再并行复制
+缺少的文件。复制按批提交，中断后再次运行会从已完成的部分继续。所有仓库文件和
+备份元数据复制完成后才替换镜像中的备份记录，镜像目录随时都可以直接作为备份目录使用。
+"""
+
+import os
+import json
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.file_utils import ensure_dir, WriteBatch, atomic_write_json
+
+# 镜像写入的临时文件标记，中断后再次运行时据此清理
+MIRROR_TEMP_TAG = "mirror"
+
+# 每批提交的仓库文件数
+OBJECT_BATCH_SIZE = 256
+
+
+class RepositoryMirror:
+    """备份根目录的镜像"""
+
+    def __init__(self, backup_manager, target_root):
+        """初始化镜像
+
+        Args:
+            backup_manager: 备份管理器实例
+            target_root: 镜像目录
+        """
+        self.backup_manager = backup_manager
+        self.source_root = backup_manager.backup_root
+        self.target_root = os.path.abspath(target_root)
+        self.object_store = backup_manager.object_store
+        # 无论源仓库是本地目录还是对象存储，镜像中的仓库都是本地的 repository 目录
+        self.target_repository = os.path.join(self.target_root, "repository")
+        self.durable = backup_manager.durable
+
+    def _target_path(self, source_path):
+        """将备份根目录下的路径换算为镜像中的路径，不在备份根目录下时返回None"""
+        rel_path = os.path.relpath(source_path, self.source_root)
+        if rel_path.startswith(os.pardir) or os.path.isabs(rel_path):
+            return None
+        return os.path.join(self.target_root, rel_path)
+
+    @staticmethod
+    def _list_files(directory):
+        """列出目录中的文件及其大小，忽略临时文件
+
+        Returns:
+            dict: 文件名 -> 大小
+        """
+        if not os.path.isdir(directory):
+            return {}
+        with os.scandir(directory) as entries:
+            return {entry.name: entry.stat().st_size for entry in entries
+                    if entry.is_file() and not entry.name.endswith(".tmp")}
+
+    def _remove_stale_temp_files(self):
+        """删除上次中断时留下的临时文件"""
+        suffix = f".{MIRROR_TEMP_TAG}.tmp"
+        for name in os.listdir(self.target_repository):
+            if name.endswith(suffix):
+                os.remove(os.path.join(self.target_repository, name))
+
+    def _copy_objects(self, names, max_workers, low_priority, io_job, stats):
+        """并行复制仓库文件，每批提交一次"""
+        initializer = io_job.worker_initializer(low_priority)
+        with ThreadPoolExecutor(max_workers=max_workers, initializer=initializer) as executor:
+            for start in range(0, len(names), OBJECT_BATCH_SIZE):
+                batch = WriteBatch(self.durable, tag=MIRROR_TEMP_TAG, throttle=io_job.throttle)
+                chunk = names[start:start + OBJECT_BATCH_SIZE]
+                try:
+                    list(executor.map(lambda name: self._copy_object(name, batch), chunk))
+                    batch.commit()
+                except Exception:
+                    batch.abort()
+                    raise
+                stats["objects_copied"] += len(chunk)
+                stats["bytes_copied"] += sum(os.path.getsize(os.path.join(self.target_repository, name))
+                                             for name in chunk)
+
+    def _copy_object(self, name, batch):
+        """将一个仓库文件写入镜像的临时文件"""
+        with self.object_store.open(name) as src_file:
+            batch.write_stream(os.path.join(self.target_repository, name), src_file)
+
+    def _copy_tree(self, source_dir, target_dir, batch, stats):
+        """复制备份目录中缺少或已变化的文件（按大小和修改时间判断）"""
+        for root, _, files in os.walk(source_dir):
+            for file in files:
+                src_file_path = os.path.join(root, file)
+                dest_file_path = os.path.join(target_dir, os.path.relpath(src_file_path, source_dir))
+                src_stat = os.stat(src_file_path)
+                try:
+                    dest_stat = os.stat(dest_file_path)
+                    if dest_stat.st_size == src_stat.st_size and int(dest_stat.st_mtime) == int(src_stat.st_mtime):
+                        continue
+                except FileNotFoundError:
+                    pass
+                ensure_dir(os.path.dirname(dest_file_path))
+                batch.copy_file(src_file_path, dest_file_path)
+                # 保留修改时间，下次镜像时据此判断文件是否变化
+                shutil.copystat(src_file_path, batch.temp_path(dest_file_path))
+                stats["files_copied"] += 1
+                stats["bytes_copied"] += src_stat.st_size
+
+    @staticmethod
+    def _load_catalog(catalog_file):
+        """读取备份记录文件，不存在或无法读取时返回空列表"""
+        try:
+            with open(catalog_file, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return []
+
+    def run(self, max_workers=None, prune=False, low_priority=True):
+        """执行一次镜像
+
+        Args:
+            max_workers: 并行复制的线程数，默认按CPU数量决定
+            prune: 是否删除镜像中源目录已不存在的备份和仓库文件
+            low_priority: 是否降低复制线程的优先级
+
+        Returns:
+            dict: 镜像报告
+        """
+        started = time.time()
+        if max_workers is None:
+            max_workers = min(8, (os.cpu_count() or 1) * 2)
+        stats = {"objects_copied": 0, "objects_skipped": 0, "files_copied": 0, "bytes_copied": 0,
+                 "backups": 0, "pruned_backups": 0, "pruned_objects": 0, "skipped_backups": []}
+
+        ensure_dir(self.target_repository)
+        self._remove_stale_temp_files()
+
+        # 持有仓库共享锁，防止镜像过程中源仓库被清理
+        with self.backup_manager.repository_lock.shared(), self.backup_manager.io_governor.job("mirror") as io_job:
+            catalogs = {catalog_file: self._load_catalog(catalog_file)
+                        for catalog_file in self.backup_manager.catalog_files()}
+
+            # 1. 仓库文件：只比较文件名和大小，复制缺少或未复制完整的文件
+            source_objects = dict(self.object_store.list())
+            target_objects = self._list_files(self.target_repository)
+            missing = sorted(name for name, size in source_objects.items() if target_objects.get(name) != size)
+            stats["objects_skipped"] = len(source_objects) - len(missing)
+            self._copy_objects(missing, max_workers, low_priority, io_job, stats)
+
+            # 2. 备份目录中的元数据（传统备份为数据文件）
+            batch = WriteBatch(self.durable, tag=MIRROR_TEMP_TAG, throttle=io_job.throttle)
+            try:
+                for backups in catalogs.values():
+                    for backup in backups:
+                        target_dir = self._target_path(backup["path"])
+                        if target_dir is None or not os.path.isdir(backup["path"]):
+                            stats["skipped_backups"].append(backup["path"])
+                            continue
+                        self._copy_tree(backup["path"], target_dir, batch, stats)
+                        stats["backups"] += 1
+                batch.commit()
+            except Exception:
+                batch.abort()
+                raise
+
+            # 3. 备份记录：路径换算为镜像中的路径，最后替换，镜像在任何时刻都是一致的
+            previous_paths = set()
+            current_paths = set()
+            for catalog_file, backups in catalogs.items():
+                target_catalog = self._target_path(catalog_file)
+                previous_paths.update(b["path"] for b in self._load_catalog(target_catalog))
+                mirrored = []
+                for backup in backups:
+                    target_dir = self._target_path(backup["path"])
+                    if target_dir is None:
+                        continue
+                    mirrored.append(dict(backup, path=target_dir))
+                    current_paths.add(target_dir)
+                ensure_dir(os.path.dirname(target_catalog))
+                atomic_write_json(target_catalog, mirrored, self.durable, ensure_ascii=False, indent=2)
+
+            if prune:
+                # 删除镜像中源目录已删除的备份，以及不再存在于源仓库中的文件
+                for path in previous_paths - current_paths:
+                    if os.path.isdir(path):
+                        shutil.rmtree(path)
+                        stats["pruned_backups"] += 1
+                for name in set(self._list_files(self.target_repository)) - set(source_objects):
+                    os.remove(os.path.join(self.target_repository, name))
+                    stats["pruned_objects"] += 1
+
+        stats["io"] = io_job.report()
+        stats["elapsed"] = time.time() - started
+        return stats
@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+仓库文件缓存模块 - 在内存中保留最近几个备份的仓库文件，反复快速恢复同一个备份时不再读盘和校验
+
+缓存按字节数限制，以最近最少使用的顺序淘汰。创建或恢复备份时登记该备份的文件，只保留最近
+max_backups 个备份引用的文件；仓库文件以内容的MD5为键，放入缓存前已校验过内容，取出时不再校验。
+同一仓库的所有配置共用一个缓存。
+
+配置示例（config.json，max_mb 为 0 时不使用缓存）:
+    "object_cache": {"max_mb": 128, "max_backups": 2, "max_object_mb": 32}
+"""
+
+import threading
+from collections import OrderedDict
+
+# 默认的缓存设置
+DEFAULT_MAX_MB = 128
+DEFAULT_MAX_BACKUPS = 2
+DEFAULT_MAX_OBJECT_MB = 32
+
+_caches = {}
+_caches_guard = threading.Lock()
+
+
+class ObjectCache:
+    """按字节数限制的仓库文件LRU缓存"""
+
+    def __init__(self, max_bytes, max_backups=DEFAULT_MAX_BACKUPS, max_object_bytes=None):
+        """初始化缓存
+
+        Args:
+            max_bytes: 缓存的最大字节数
+            max_backups: 保留文件的备份个数
+            max_object_bytes: 可选，单个文件的最大字节数，更大的文件不缓存
+        """
+        self.max_bytes = max_bytes
+        self.max_backups = max_backups
+        self.max_object_bytes = min(max_object_bytes or max_bytes, max_bytes)
+        self._objects = OrderedDict()
+        self._backups = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def accepts(self, size):
+        """判断该大小的文件是否可以缓存"""
+        return 0 < size <= self.max_object_bytes
+
+    def get(self, key):
+        """取出文件内容
+
+        Returns:
+            bytes: 文件内容，不在缓存中时返回None
+        """
+        with self._lock:
+            data = self._objects.get(key)
+            if data is None:
+                self.misses += 1
+                return None
+            self._objects.move_to_end(key)
+            self.hits += 1
+            return data
+
+    def put(self, key, data):
+        """放入已校验过的文件内容，超出容量时淘汰最久未使用的文件
+
+        Returns:
+            bool: 是否放入了缓存
+        """
+        if not self.accepts(len(data)):
+            return False
+        with self._lock:
+            if key in self._objects:
+                self._objects.move_to_end(key)
+                return True
+            self._objects[key] = data
+            self.bytes += len(data)
+            while self.bytes > self.max_bytes:
+                _, evicted = self._objects.popitem(last=False)
+                self.bytes -= len(evicted)
+                self.evictions += 1
+            return True
+
+    def retain(self, backup_path, keys):
+        """登记备份引用的文件，超出 max_backups 个备份时丢弃最早登记的备份独有的文件
+
+        Args:
+            backup_path: 备份路径
+            keys: 该备份中已放入缓存的文件的键
+        """
+        with self._lock:
+            self._backups.pop(backup_path, None)
+            self._backups[backup_path] = frozenset(keys)
+            while len(self._backups) > self.max_backups:
+                _, dropped = self._backups.popitem(last=False)
+                self._discard(dropped)
+
+    def forget(self, backup_path):
+        """备份被删除时丢弃其独有的文件"""
+        with self._lock:
+            dropped = self._backups.pop(backup_path, None)
+            if dropped:
+                self._discard(dropped)
+
+    def _discard(self, keys):
+        """丢弃不再被登记的备份引用的文件，调用时需持有锁"""
+        retained = set().union(*self._backups.values()) if self._backups else set()
+        for key in keys:
+            if key not in retained:
+                data = self._objects.pop(key, None)
+                if data is not None:
+                    self.bytes -= len(data)
+
+    def clear(self):
+        """清空缓存，保留命中计数"""
+        with self._lock:
+            self._objects.clear()
+            self._backups.clear()
+            self.bytes = 0
+
+    def stats(self):
+        """获取缓存统计
+
+        Returns:
+            dict: {"objects", "bytes", "max_bytes", "backups", "hits", "misses", "hit_rate", "evictions"}
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "objects": len(self._objects),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "backups": len(self._backups),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+
+
+def get_object_cache(config, location):
+    """获取仓库对应的缓存
+
+    Args:
+        config: 配置字典，缓存设置以第一次获取时的为准
+        location: 仓库位置，即 ObjectStore.location
+
+    Returns:
+        ObjectCache: 同一仓库位置始终返回同一个缓存，配置中 max_mb 为 0 时返回None
+    """
+    settings = config.get("object_cache", {})
+    max_mb = settings.get("max_mb", DEFAULT_MAX_MB)
+    if not max_mb:
+        return None
+    with _caches_guard:
+        cache = _caches.get(location)
+        if cache is None:
+            cache = _caches[location] = ObjectCache(
+                int(max_mb * 1024 * 1024), settings.get("max_backups", DEFAULT_MAX_BACKUPS),
+                int(settings.get("max_object_mb", DEFAULT_MAX_OBJECT_MB) * 1024 * 1024))
+        return cache
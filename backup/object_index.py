@@ -0,0 +1,330 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+仓库文件索引模块 - 在内存中记录本地仓库目录中有哪些文件，检查文件是否存在时不再逐个访问文件系统
+
+索引只覆盖仓库目录中的散文件（热层），冷存储中的文件由冷存储自己的文件包索引记录。索引由两部分组成：
+    布隆过滤器   保存在仓库目录旁的 repository.bloom 文件中，启动时直接读入；判断为不存在的文件
+                 一定不在仓库中，无需任何文件系统访问
+    文件表       MD5 -> 大小，第一次需要确认布隆过滤器的阳性结果时扫描一次仓库目录建立
+
+写入的文件随 WriteBatch 提交后加入索引，清理仓库删除的文件同时从索引中移除，两种情况都会重新保存
+布隆过滤器；完整列出仓库目录时（清理、统计、镜像）顺便更新文件表。布隆过滤器文件被其他进程改写时
+（例如另一个进程清理了仓库），下一次检查前重新读取并重新扫描仓库目录。索引只用于加速，丢失或过时的
+布隆过滤器文件只会导致文件被重复写入，可以用 rebuild 从仓库目录重建。
+
+配置示例（config.json，为 false 时不使用索引）:
+    "repository": {"backend": "local", "object_index": true}
+"""
+
+import os
+import struct
+import hashlib
+import threading
+
+from utils.file_utils import WriteBatch
+
+# 布隆过滤器文件的后缀，位于仓库目录旁
+BLOOM_SUFFIX = ".bloom"
+
+# 文件头：标记、位数、哈希函数个数、登记的文件数
+BLOOM_MAGIC = b"SGBLOOM1"
+BLOOM_HEADER = struct.Struct("<8sQIQ")
+
+# 每个文件占用的位数和哈希函数个数，误判率约为1%
+BITS_PER_OBJECT = 10
+HASH_COUNT = 7
+
+# 布隆过滤器至少可容纳的文件数，文件数超过容量时按两倍重建
+MIN_CAPACITY = 65536
+
+_indexes = {}
+_indexes_guard = threading.Lock()
+
+
+class BloomFilter:
+    """以MD5为键的布隆过滤器"""
+
+    def __init__(self, capacity, bits=None, num_hashes=HASH_COUNT, count=0):
+        """初始化布隆过滤器
+
+        Args:
+            capacity: 预计登记的文件数
+            bits: 可选，已有的位数组（bytearray），长度决定位数
+            num_hashes: 哈希函数个数
+            count: 已登记的文件数
+        """
+        if bits is None:
+            bits = bytearray((max(capacity, 1) * BITS_PER_OBJECT + 7) // 8)
+        self.bits = bits
+        self.num_bits = len(bits) * 8
+        self.num_hashes = num_hashes
+        self.count = count
+
+    @property
+    def capacity(self):
+        """在预期误判率下可登记的文件数"""
+        return self.num_bits // BITS_PER_OBJECT
+
+    def _positions(self, key):
+        """计算键对应的位，MD5本身就是均匀分布的哈希值，由其高低两半组合出各个哈希函数"""
+        try:
+            value = int(key, 16)
+        except ValueError:
+            value = int(hashlib.md5(key.encode("utf-8")).hexdigest(), 16)
+        low = value & 0xFFFFFFFFFFFFFFFF
+        high = (value >> 64) | 1
+        return [(low + i * high) % self.num_bits for i in range(self.num_hashes)]
+
+    def add(self, key):
+        """登记一个键"""
+        bits = self.bits
+        for position in self._positions(key):
+            bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+    def to_bytes(self):
+        """序列化为文件内容"""
+        return BLOOM_HEADER.pack(BLOOM_MAGIC, self.num_bits, self.num_hashes, self.count) + bytes(self.bits)
+
+    @classmethod
+    def from_bytes(cls, data):
+        """从文件内容恢复
+
+        Raises:
+            ValueError: 文件内容无效
+        """
+        if len(data) < BLOOM_HEADER.size:
+            raise ValueError("布隆过滤器文件不完整")
+        magic, num_bits, num_hashes, count = BLOOM_HEADER.unpack_from(data)
+        bits = bytearray(data[BLOOM_HEADER.size:])
+        if magic != BLOOM_MAGIC or not num_bits or num_bits != len(bits) * 8 or not num_hashes:
+            raise ValueError("布隆过滤器文件无效")
+        return cls(0, bits, num_hashes, count)
+
+
+class ObjectIndex:
+    """本地仓库的文件索引"""
+
+    def __init__(self, directory):
+        """初始化索引，只读取布隆过滤器文件，文件表在第一次需要时扫描仓库目录建立
+
+        Args:
+            directory: 仓库目录
+        """
+        self.directory = directory
+        self.bloom_file = directory.rstrip("/\\") + BLOOM_SUFFIX
+        self._lock = threading.RLock()
+        self._bloom = None
+        self._entries = None
+        # 最后一次读取或保存时布隆过滤器文件的状态，用于发现其他进程的修改
+        self._bloom_state = None
+        self.lookups = 0
+        self.bloom_negatives = 0
+        self.false_positives = 0
+        self.scans = 0
+        self._load_bloom()
+
+    def _file_state(self):
+        """获取布隆过滤器文件的状态，不存在时返回None"""
+        try:
+            stat = os.stat(self.bloom_file)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    def _load_bloom(self):
+        """读取布隆过滤器文件，不存在或无效时扫描仓库目录重建"""
+        self._bloom_state = self._file_state()
+        try:
+            with open(self.bloom_file, "rb") as f:
+                self._bloom = BloomFilter.from_bytes(f.read())
+        except (OSError, ValueError):
+            self._scan()
+            self._save()
+
+    def _scan(self):
+        """扫描仓库目录建立文件表，并按文件表重建布隆过滤器"""
+        entries = {}
+        with os.scandir(self.directory) as scanned:
+            for entry in scanned:
+                if entry.is_file() and not entry.name.endswith(".tmp"):
+                    entries[entry.name] = entry.stat().st_size
+        self._entries = entries
+        self._rebuild_bloom()
+        self.scans += 1
+
+    def _rebuild_bloom(self):
+        """按文件表重建布隆过滤器"""
+        bloom = BloomFilter(max(MIN_CAPACITY, len(self._entries) * 2))
+        for key in self._entries:
+            bloom.add(key)
+        self._bloom = bloom
+
+    def _save(self):
+        """保存布隆过滤器文件，丢失最近的修改只会导致文件被重复写入，不需要同步落盘"""
+        batch = WriteBatch(durable=False)
+        try:
+            batch.write_bytes(self.bloom_file, self._bloom.to_bytes())
+            batch.commit()
+        except OSError:
+            batch.abort()
+            return
+        self._bloom_state = self._file_state()
+
+    def _refresh(self):
+        """布隆过滤器文件被其他进程改写时重新读取，文件表在下次需要时重新扫描"""
+        if self._file_state() != self._bloom_state:
+            self._entries = None
+            self._load_bloom()
+
+    def _ensure_entries(self):
+        """需要时扫描仓库目录建立文件表"""
+        if self._entries is None:
+            bloom = self._bloom
+            self._scan()
+            # 保留读入的布隆过滤器中登记的键，其他进程写入、尚未扫描到的文件仍视为可能存在
+            if bloom is not None and bloom.num_bits == self._bloom.num_bits:
+                for i, byte in enumerate(bloom.bits):
+                    self._bloom.bits[i] |= byte
+
+    def contains_many(self, keys):
+        """批量检查文件是否存在
+
+        Args:
+            keys: 键的集合
+
+        Returns:
+            set: 存在的键
+        """
+        with self._lock:
+            self._refresh()
+            keys = list(keys)
+            self.lookups += len(keys)
+            candidates = [key for key in keys if key in self._bloom]
+            self.bloom_negatives += len(keys) - len(candidates)
+            if not candidates:
+                return set()
+            self._ensure_entries()
+            present = {key for key in candidates if key in self._entries}
+            self.false_positives += len(candidates) - len(present)
+            return present
+
+    def get(self, key):
+        """获取文件的大小
+
+        Returns:
+            int: 大小，不在索引中时返回None
+        """
+        with self._lock:
+            self._refresh()
+            if key not in self._bloom:
+                return None
+            self._ensure_entries()
+            return self._entries.get(key)
+
+    def add(self, items):
+        """登记已写入仓库目录的文件
+
+        Args:
+            items: (键, 大小) 的列表
+        """
+        with self._lock:
+            self._refresh()
+            added = False
+            for key, size in items:
+                if self._entries is not None:
+                    self._entries[key] = size
+                if key not in self._bloom:
+                    self._bloom.add(key)
+                    added = True
+            if self._entries is not None and len(self._entries) > self._bloom.capacity:
+                self._rebuild_bloom()
+                added = True
+            if added:
+                self._save()
+
+    def remove(self, keys):
+        """移除已从仓库中删除的文件，布隆过滤器无法删除键，按剩余的文件重建
+
+        Args:
+            keys: 键的列表
+        """
+        with self._lock:
+            self._refresh()
+            self._ensure_entries()
+            for key in keys:
+                self._entries.pop(key, None)
+            self._rebuild_bloom()
+            self._save()
+
+    def discard(self, key):
+        """移除发现已不在仓库中的文件，不重建布隆过滤器"""
+        with self._lock:
+            if self._entries is not None:
+                self._entries.pop(key, None)
+
+    def replace(self, sizes):
+        """用完整列出仓库目录的结果替换文件表，省去单独的扫描
+
+        Args:
+            sizes: 键 -> 大小
+        """
+        with self._lock:
+            self._refresh()
+            if self._entries is not None and self._entries.keys() == sizes.keys():
+                return
+            self._entries = dict(sizes)
+            self._rebuild_bloom()
+            self._save()
+
+    def rebuild(self):
+        """从仓库目录重建文件表和布隆过滤器
+
+        Returns:
+            dict: 重建后的统计信息
+        """
+        with self._lock:
+            self._scan()
+            self._save()
+            return self.stats()
+
+    def stats(self):
+        """获取索引统计
+
+        Returns:
+            dict: {"objects", "bloom_bytes", "bloom_capacity", "lookups", "bloom_negatives",
+                   "false_positives", "scans"}，文件表尚未建立时 objects 为布隆过滤器中登记的文件数
+        """
+        with self._lock:
+            return {
+                "objects": len(self._entries) if self._entries is not None else self._bloom.count,
+                "bloom_bytes": len(self._bloom.bits),
+                "bloom_capacity": self._bloom.capacity,
+                "lookups": self.lookups,
+                "bloom_negatives": self.bloom_negatives,
+                "false_positives": self.false_positives,
+                "scans": self.scans,
+            }
+
+
+def get_object_index(directory):
+    """获取本地仓库对应的索引
+
+    Args:
+        directory: 仓库目录
+
+    Returns:
+        ObjectIndex: 同一仓库目录始终返回同一个索引
+    """
+    location = os.path.normcase(os.path.abspath(directory))
+    with _indexes_guard:
+        index = _indexes.get(location)
+        if index is None:
+            index = _indexes[location] = ObjectIndex(directory)
+        return index
@@ -0,0 +1,840 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+对象存储模块 - 仓库文件的存储后端
+
+仓库文件以MD5为键存取，备份引擎只通过 ObjectStore 接口访问仓库：
+    LocalObjectStore  本地目录（默认），写入经由 WriteBatch 原子提交，存在性检查由内存中的文件索引回答，
+                      只被旧备份引用的文件可以移入冷存储的压缩文件包（见 cold_storage）
+    S3ObjectStore     S3兼容的HTTP对象存储，连接复用，存在性检查和删除按批进行
+
+配置示例（config.json）:
+    "repository": {"backend": "local", "object_index": true}
+    "repository": {"backend": "s3", "endpoint": "http://127.0.0.1:9000", "bucket": "saves",
+                   "prefix": "repository/", "access_key": "...", "secret_key": "...",
+                   "region": "us-east-1", "max_connections": 8}
+"""
+
+import io
+import os
+import hmac
+import queue
+import base64
+import shutil
+import hashlib
+import threading
+import http.client
+from datetime import datetime, timezone
+from urllib.parse import urlsplit, quote
+from xml.etree import ElementTree
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.file_utils import ensure_dir, WriteBatch, COPY_BUFFER_SIZE
+from backup.object_index import get_object_index
+from backup.cold_storage import cold_directory, get_cold_storage
+
+
+class ObjectStoreError(Exception):
+    """对象存储访问失败"""
+
+
+class ObjectStore:
+    """仓库文件存储接口，键为文件内容的MD5"""
+
+    # 用于区分不同仓库的位置描述，同一位置共用一个仓库锁
+    location = None
+
+    def has(self, key):
+        """检查文件是否存在"""
+        return key in self.has_many([key])
+
+    def has_many(self, keys):
+        """批量检查文件是否存在
+
+        Args:
+            keys: 键的集合
+
+        Returns:
+            set: 存在的键
+        """
+        raise NotImplementedError
+
+    def size(self, key):
+        """获取文件大小，不存在时返回None"""
+        raise NotImplementedError
+
+    def list(self):
+        """列出所有文件
+
+        Returns:
+            iterator: (键, 大小)
+        """
+        raise NotImplementedError
+
+    def open(self, key):
+        """打开文件读取，返回的文件对象需要关闭（支持with语句）"""
+        raise NotImplementedError
+
+    def get_file(self, key, dest_path):
+        """将文件下载或复制到本地路径
+
+        Args:
+            key: 键
+            dest_path: 目标文件路径
+        """
+        with self.open(key) as src_file:
+            with open(dest_path, "wb") as dest_file:
+                shutil.copyfileobj(src_file, dest_file, COPY_BUFFER_SIZE)
+
+    def _read_verified(self, key, size, dest_file=None, throttle=None):
+        """读取文件并校验大小和MD5，可同时写入目标文件
+
+        Args:
+            key: 键
+            size: 期望的大小
+            dest_file: 可选，同时写入的目标文件对象
+            throttle: 可选，I/O限速函数，每读取一块数据后以其字节数调用
+
+        Returns:
+            str: 'ok'、'missing' 或 'corrupted'
+        """
+        try:
+            src_file = self.open(key)
+        except FileNotFoundError:
+            return "missing"
+        digest = hashlib.md5()
+        length = 0
+        with src_file:
+            for chunk in iter(lambda: src_file.read(COPY_BUFFER_SIZE), b""):
+                if throttle is not None:
+                    throttle(len(chunk))
+                digest.update(chunk)
+                length += len(chunk)
+                if dest_file is not None:
+                    dest_file.write(chunk)
+        return "ok" if length == size and digest.hexdigest() == key else "corrupted"
+
+    def check(self, key, size, throttle=None):
+        """校验文件的大小和MD5
+
+        Args:
+            key: 键
+            size: 期望的大小
+            throttle: 可选，I/O限速函数，每读取一块数据后以其字节数调用
+
+        Returns:
+            str: 'ok'、'missing' 或 'corrupted'
+        """
+        return self._read_verified(key, size, throttle=throttle)
+
+    def read_verified(self, key, size, throttle=None):
+        """将整个文件读入内存，同时校验大小和MD5，用于放入缓存的小文件
+
+        Args:
+            key: 键
+            size: 期望的大小
+            throttle: 可选，I/O限速函数，每读取一块数据后以其字节数调用
+
+        Returns:
+            tuple: (状态, 文件内容)，状态为 'ok'、'missing' 或 'corrupted'，不是 'ok' 时内容为None
+        """
+        buffer = io.BytesIO()
+        status = self._read_verified(key, size, buffer, throttle)
+        return status, buffer.getvalue() if status == "ok" else None
+
+    def fetch_verified(self, key, size, dest_path, throttle=None):
+        """将文件写入本地路径，同时校验大小和MD5，校验失败时删除写入的文件
+
+        远程仓库只需一次请求，不需要先查询再下载。
+
+        Args:
+            key: 键
+            size: 期望的大小
+            dest_path: 目标文件路径
+            throttle: 可选，I/O限速函数，每读取一块数据后以其字节数调用
+
+        Returns:
+            str: 'ok'、'missing' 或 'corrupted'
+        """
+        with open(dest_path, "wb") as dest_file:
+            status = self._read_verified(key, size, dest_file, throttle)
+        if status != "ok":
+            os.remove(dest_path)
+        return status
+
+    def writer(self, batch):
+        """创建写入器
+
+        Args:
+            batch: 本次操作的 WriteBatch，本地仓库的文件写入其中一并提交
+
+        Returns:
+            ObjectWriter: 写入器
+        """
+        raise NotImplementedError
+
+    def delete_many(self, keys):
+        """批量删除文件
+
+        Args:
+            keys: 键的列表
+        """
+        raise NotImplementedError
+
+    def remove_temp_files(self, tag):
+        """删除某次操作中断后留下的临时文件
+
+        Args:
+            tag: 临时文件标记
+        """
+
+
+class ObjectWriter:
+    """写入器：先调用 put_* 写入，再调用 commit 等待写入完成，失败时调用 abort"""
+
+    def is_pending(self, key):
+        """检查文件是否已在本次写入中"""
+        raise NotImplementedError
+
+    def put_file(self, key, src_path):
+        """写入本地文件"""
+        raise NotImplementedError
+
+    def put_stream(self, key, src_file, size, digest=None):
+        """从文件对象流式写入
+
+        Args:
+            key: 键
+            src_file: 可读取二进制数据的文件对象
+            size: 数据长度
+            digest: 可选，hashlib哈希对象，写入的数据会同时更新到其中
+        """
+        raise NotImplementedError
+
+    def commit(self):
+        """等待所有写入完成，须在提交 WriteBatch 之前调用"""
+
+    def abort(self):
+        """放弃本次写入"""
+
+
+class LocalObjectStore(ObjectStore):
+    """本地目录仓库，可以带有存放旧文件的冷存储"""
+
+    def __init__(self, directory, use_index=True, cold_directory=None):
+        """初始化本地仓库
+
+        Args:
+            directory: 仓库目录
+            use_index: 是否通过内存中的文件索引检查文件是否存在，而不是逐个访问文件系统
+            cold_directory: 可选，冷存储目录，仓库目录中没有的文件再到其中的文件包中查找
+        """
+        self.directory = directory
+        self.location = os.path.normcase(os.path.abspath(directory))
+        ensure_dir(directory)
+        self.index = get_object_index(directory) if use_index else None
+        self.cold = get_cold_storage(cold_directory) if cold_directory else None
+
+    def path(self, key):
+        """获取文件的本地路径"""
+        return os.path.join(self.directory, key)
+
+    def has(self, key):
+        return key in self.has_many([key])
+
+    def loose_many(self, keys):
+        """批量检查文件是否在仓库目录中（热层）
+
+        Returns:
+            set: 存在的键
+        """
+        if self.index is not None:
+            return self.index.contains_many(keys)
+        return {key for key in keys if os.path.exists(self.path(key))}
+
+    def has_many(self, keys):
+        keys = set(keys)
+        present = self.loose_many(keys)
+        if self.cold is not None and len(present) < len(keys):
+            present |= self.cold.contains_many(keys - present)
+        return present
+
+    def size(self, key):
+        if self.index is not None:
+            size = self.index.get(key)
+            if size is not None:
+                return size
+        # 索引中没有时仍以文件系统为准，其他进程可能刚写入该文件
+        size = self._disk_size(key)
+        if size is None and self.cold is not None:
+            size = self.cold.size(key)
+        return size
+
+    def _disk_size(self, key):
+        """从文件系统获取文件大小，不存在时返回None"""
+        try:
+            return os.path.getsize(self.path(key))
+        except OSError:
+            return None
+
+    def list(self):
+        listed = {}
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.is_file() and not entry.name.endswith(".tmp"):
+                    listed[entry.name] = entry.stat().st_size
+                    yield entry.name, listed[entry.name]
+        # 完整列出后顺便更新索引
+        if self.index is not None:
+            self.index.replace(listed)
+        if self.cold is not None:
+            for key, size in self.cold.list():
+                if key not in listed:
+                    yield key, size
+
+    def open(self, key):
+        try:
+            return open(self.path(key), "rb")
+        except FileNotFoundError:
+            if self.cold is None:
+                raise
+        return self.cold.open(key)
+
+    def check(self, key, size, throttle=None):
+        # 校验以文件系统为准，大小不符时无需读取内容
+        actual_size = self._disk_size(key)
+        if actual_size is None and self.cold is not None:
+            actual_size = self.cold.size(key)
+        if actual_size is None:
+            if self.index is not None:
+                self.index.discard(key)
+            return "missing"
+        if actual_size != size:
+            return "corrupted"
+        return self._read_verified(key, size, throttle=throttle)
+
+    def get_file(self, key, dest_path):
+        try:
+            shutil.copyfile(self.path(key), dest_path)
+        except FileNotFoundError:
+            if self.cold is None:
+                raise
+            super().get_file(key, dest_path)
+
+    def writer(self, batch):
+        return _LocalObjectWriter(self, batch)
+
+    def delete_loose(self, keys):
+        """删除仓库目录中的文件，不影响冷存储
+
+        Args:
+            keys: 键的列表
+        """
+        keys = list(keys)
+        if not keys:
+            return
+        try:
+            for key in keys:
+                try:
+                    os.remove(self.path(key))
+                except FileNotFoundError:
+                    pass
+        finally:
+            if self.index is not None:
+                self.index.remove(keys)
+
+    def delete_many(self, keys):
+        keys = list(keys)
+        self.delete_loose(keys)
+        if self.cold is not None:
+            self.cold.remove(keys)
+
+    def freeze(self, sizes, codec, max_pack_bytes, durable=True, throttle=None):
+        """将仓库目录中的文件压缩打包移入冷存储，文件包落盘后才删除散文件
+
+        Args:
+            sizes: md5 -> 大小
+            codec: 压缩格式
+            max_pack_bytes: 单个文件包中文件的最大总大小
+            durable: 是否同步落盘
+            throttle: 可选，I/O限速函数
+
+        Returns:
+            dict: {"packs", "objects": 已移入的键, "corrupted": 校验失败而未移入的键}
+        """
+        items = [(key, size, lambda key=key: open(self.path(key), "rb")) for key, size in sorted(sizes.items())]
+        report = self.cold.add(items, codec, max_pack_bytes, durable, throttle)
+        self.delete_loose(report["objects"])
+        return report
+
+    def thaw(self, sizes, durable=True, throttle=None):
+        """将冷存储中的文件解压回仓库目录，散文件提交后才从文件包中移除
+
+        Args:
+            sizes: md5 -> 大小
+            durable: 是否同步落盘
+            throttle: 可选，I/O限速函数
+
+        Returns:
+            tuple: (已移回的键, 校验失败而未移回的键)
+        """
+        batch = WriteBatch(durable, throttle=throttle)
+        thawed, corrupted = [], []
+        try:
+            for key, size in sorted(sizes.items()):
+                digest = hashlib.md5()
+                with self.cold.open(key) as src_file:
+                    batch.write_stream(self.path(key), src_file, digest)
+                if digest.hexdigest() != key or os.path.getsize(batch.temp_path(self.path(key))) != size:
+                    batch.discard(self.path(key))
+                    corrupted.append(key)
+                    continue
+                thawed.append(key)
+            batch.commit()
+        except BaseException:
+            batch.abort()
+            raise
+        if self.index is not None:
+            self.index.add([(key, sizes[key]) for key in thawed])
+        self.cold.remove(thawed, durable)
+        return thawed, corrupted
+
+    def rebuild_index(self):
+        """从仓库目录重建文件索引
+
+        Returns:
+            dict: 索引统计，未使用索引时返回None
+        """
+        return self.index.rebuild() if self.index is not None else None
+
+    def remove_temp_files(self, tag):
+        suffix = f".{tag}.tmp"
+        for name in os.listdir(self.directory):
+            if name.endswith(suffix):
+                try:
+                    os.remove(self.path(name))
+                except OSError:
+                    pass
+
+
+class _LocalObjectWriter(ObjectWriter):
+    """本地仓库写入器，文件写入临时文件，随 WriteBatch 一起落盘并重命名"""
+
+    def __init__(self, store, batch):
+        self.store = store
+        self.batch = batch
+        # 本次写入的文件，WriteBatch 提交后登记到索引
+        self._written = []
+
+    def is_pending(self, key):
+        return self.batch.is_pending(self.store.path(key))
+
+    def _record(self, key, size):
+        """记录写入的文件，文件重命名为正式文件之后才加入索引"""
+        if self.store.index is None:
+            return
+        if not self._written:
+            self.batch.on_commit(self._index_written)
+        self._written.append((key, size))
+
+    def _index_written(self):
+        """WriteBatch 提交后将写入的文件加入索引"""
+        written, self._written = self._written, []
+        self.store.index.add(written)
+
+    def put_file(self, key, src_path):
+        self.batch.copy_file(src_path, self.store.path(key))
+        self._record(key, os.path.getsize(self.batch.temp_path(self.store.path(key))))
+
+    def put_stream(self, key, src_file, size, digest=None):
+        self.batch.write_stream(self.store.path(key), src_file, digest)
+        self._record(key, size)
+
+    def abort(self):
+        self._written = []
+
+
+def _xml_children(element, name):
+    """查找XML子元素，忽略命名空间"""
+    return [child for child in element if child.tag.rsplit("}", 1)[-1] == name]
+
+
+def _xml_text(element, name, default=None):
+    """获取XML子元素的文本，忽略命名空间"""
+    children = _xml_children(element, name)
+    return children[0].text if children else default
+
+
+class _ConnectionPool:
+    """HTTP连接池，同一主机的请求复用已建立的连接"""
+
+    def __init__(self, scheme, host, port, size, timeout):
+        self.scheme = scheme
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self._idle = queue.LifoQueue(maxsize=size)
+        # 新建的连接数，用于统计复用效果
+        self.connections_created = 0
+
+    def acquire(self):
+        """取出一个空闲连接，没有时新建"""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            self.connections_created += 1
+            connection_class = http.client.HTTPSConnection if self.scheme == "https" else http.client.HTTPConnection
+            return connection_class(self.host, self.port, timeout=self.timeout)
+
+    def release(self, connection):
+        """归还连接，连接池已满时关闭"""
+        try:
+            self._idle.put_nowait(connection)
+        except queue.Full:
+            connection.close()
+
+    def close(self):
+        """关闭所有空闲连接"""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class _PooledResponse:
+    """流式读取的HTTP响应，读完或关闭时将连接归还连接池"""
+
+    def __init__(self, pool, connection, response):
+        self._pool = pool
+        self._connection = connection
+        self._response = response
+
+    def read(self, size=-1):
+        return self._response.read(None if size is None or size < 0 else size)
+
+    def close(self):
+        if self._connection is None:
+            return
+        if self._response.isclosed():
+            self._pool.release(self._connection)
+        else:
+            # 未读完的响应无法复用连接
+            self._connection.close()
+        self._connection = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class S3ObjectStore(ObjectStore):
+    """S3兼容的HTTP对象存储（路径风格访问，AWS Signature V4签名）"""
+
+    # 检查的键达到此数量时改为列出前缀下的全部文件，而不是逐个HEAD请求
+    LIST_THRESHOLD = 32
+
+    # 单次批量删除的最大键数（S3限制）
+    DELETE_BATCH_SIZE = 1000
+
+    def __init__(self, endpoint, bucket, prefix="", access_key=None, secret_key=None,
+                 region="us-east-1", max_connections=8, timeout=60):
+        """初始化S3对象存储
+
+        Args:
+            endpoint: 服务地址，如 http://127.0.0.1:9000
+            bucket: 存储桶名称
+            prefix: 键前缀
+            access_key: 访问密钥ID，为空时发送不签名的请求
+            secret_key: 访问密钥
+            region: 签名使用的区域
+            max_connections: 连接池大小，也是并行上传和检查的线程数
+            timeout: 请求超时秒数
+        """
+        parts = urlsplit(endpoint)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise ValueError(f"无效的对象存储地址：{endpoint}")
+        self.host_header = parts.netloc
+        self.bucket = bucket
+        self.prefix = prefix
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.region = region
+        self.max_connections = max_connections
+        self.location = f"{parts.scheme}://{parts.netloc}/{bucket}/{prefix}"
+        self.pool = _ConnectionPool(parts.scheme, parts.hostname, parts.port, max_connections, timeout)
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        # 发出的请求数，用于统计网络往返次数
+        self.request_count = 0
+        self._count_lock = threading.Lock()
+
+    def executor(self):
+        """共用的线程池，用于并行上传和HEAD请求"""
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_connections)
+            return self._executor
+
+    def _object_path(self, key=None):
+        """获取请求路径"""
+        path = f"/{quote(self.bucket)}"
+        if key is not None:
+            path += "/" + quote(self.prefix + key)
+        return path
+
+    def _sign(self, method, path, query, headers, payload_hash):
+        """按AWS Signature V4为请求签名"""
+        now = datetime.now(timezone.utc)
+        amz_date = now.strftime("%Y%m%dT%H%M%SZ")
+        date_stamp = now.strftime("%Y%m%d")
+        headers["x-amz-date"] = amz_date
+        headers["x-amz-content-sha256"] = payload_hash
+
+        signed = sorted((name.lower(), str(value).strip()) for name, value in headers.items())
+        canonical_headers = "".join(f"{name}:{value}\n" for name, value in signed)
+        signed_headers = ";".join(name for name, _ in signed)
+        canonical_query = "&".join(f"{quote(k, safe='-_.~')}={quote(v, safe='-_.~')}"
+                                   for k, v in sorted(query.items()))
+        canonical_request = "\n".join([method, path, canonical_query, canonical_headers,
+                                       signed_headers, payload_hash])
+        scope = f"{date_stamp}/{self.region}/s3/aws4_request"
+        string_to_sign = "\n".join(["AWS4-HMAC-SHA256", amz_date, scope,
+                                    hashlib.sha256(canonical_request.encode("utf-8")).hexdigest()])
+
+        signing_key = ("AWS4" + self.secret_key).encode("utf-8")
+        for part in (date_stamp, self.region, "s3", "aws4_request"):
+            signing_key = hmac.new(signing_key, part.encode("utf-8"), hashlib.sha256).digest()
+        signature = hmac.new(signing_key, string_to_sign.encode("utf-8"), hashlib.sha256).hexdigest()
+        headers["Authorization"] = (f"AWS4-HMAC-SHA256 Credential={self.access_key}/{scope}, "
+                                    f"SignedHeaders={signed_headers}, Signature={signature}")
+
+    def _request(self, method, path, query=None, body=None, headers=None, stream=False, retry=True):
+        """发送请求
+
+        Args:
+            method: HTTP方法
+            path: 请求路径
+            query: 查询参数字典
+            body: 请求体，bytes或文件对象
+            headers: 额外的请求头
+            stream: 为True时返回 _PooledResponse 供流式读取
+            retry: 连接被服务器关闭时是否用新连接重试一次（请求体为文件对象时不可重试）
+
+        Returns:
+            tuple: (状态码, 响应头, 响应体bytes或_PooledResponse)
+        """
+        query = query or {}
+        # 每次发送都对调用方传入的请求头的副本重新签名，重试时不会把上次的签名头算进签名
+        request_headers = dict(headers or {})
+        request_headers["Host"] = self.host_header
+        if self.access_key and self.secret_key:
+            if isinstance(body, bytes):
+                payload_hash = hashlib.sha256(body).hexdigest()
+            elif body is None:
+                payload_hash = hashlib.sha256(b"").hexdigest()
+            else:
+                payload_hash = "UNSIGNED-PAYLOAD"
+            self._sign(method, path, query, request_headers, payload_hash)
+        url = path
+        if query:
+            url += "?" + "&".join(f"{quote(k, safe='-_.~')}={quote(v, safe='-_.~')}" if v else quote(k)
+                                  for k, v in query.items())
+
+        connection = self.pool.acquire()
+        try:
+            with self._count_lock:
+                self.request_count += 1
+            connection.request(method, url, body=body, headers=request_headers)
+            response = connection.getresponse()
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+            # 复用的连接可能已被服务器关闭
+            connection.close()
+            if not retry or not (body is None or isinstance(body, bytes)):
+                raise
+            return self._request(method, path, query, body, headers, stream, retry=False)
+        except Exception:
+            connection.close()
+            raise
+
+        if stream and response.status == 200:
+            return response.status, response.headers, _PooledResponse(self.pool, connection, response)
+        data = response.read()
+        self.pool.release(connection)
+        return response.status, response.headers, data
+
+    def _check(self, status, data, action):
+        """检查响应状态，失败时抛出异常"""
+        if status >= 300:
+            message = data.decode("utf-8", "replace")[:200] if isinstance(data, bytes) else ""
+            raise ObjectStoreError(f"{action}失败：HTTP {status} {message}")
+
+    def size(self, key):
+        status, headers, data = self._request("HEAD", self._object_path(key))
+        if status == 404:
+            return None
+        self._check(status, data, "查询文件")
+        return int(headers.get("Content-Length", 0))
+
+    def has(self, key):
+        return self.size(key) is not None
+
+    def has_many(self, keys):
+        keys = set(keys)
+        if not keys:
+            return set()
+        if len(keys) >= self.LIST_THRESHOLD:
+            # 列出前缀下的文件，每次请求最多返回1000个键
+            return {key for key, _ in self.list() if key in keys}
+        present = self.executor().map(lambda key: (key, self.has(key)), keys)
+        return {key for key, exists in present if exists}
+
+    def list(self):
+        token = None
+        while True:
+            query = {"list-type": "2", "prefix": self.prefix}
+            if token:
+                query["continuation-token"] = token
+            status, _, data = self._request("GET", self._object_path(), query)
+            self._check(status, data, "列出文件")
+            root = ElementTree.fromstring(data)
+            for item in _xml_children(root, "Contents"):
+                name = _xml_text(item, "Key", "")[len(self.prefix):]
+                if name and "/" not in name:
+                    yield name, int(_xml_text(item, "Size", "0"))
+            if _xml_text(root, "IsTruncated") != "true":
+                return
+            token = _xml_text(root, "NextContinuationToken")
+
+    def open(self, key):
+        status, _, response = self._request("GET", self._object_path(key), stream=True)
+        if status == 404:
+            raise FileNotFoundError(key)
+        self._check(status, response, "下载文件")
+        return response
+
+    def put_stream(self, key, src_file, size, digest=None):
+        """上传数据
+
+        Args:
+            key: 键
+            src_file: 可读取二进制数据的文件对象
+            size: 数据长度
+            digest: 可选，hashlib哈希对象，上传的数据会同时更新到其中
+        """
+        if digest is not None:
+            src_file = _DigestReader(src_file, digest)
+        status, _, data = self._request("PUT", self._object_path(key), body=src_file,
+                                        headers={"Content-Length": str(size)})
+        self._check(status, data, "上传文件")
+
+    def put_file(self, key, src_path):
+        """上传本地文件"""
+        with open(src_path, "rb") as f:
+            self.put_stream(key, f, os.fstat(f.fileno()).st_size)
+
+    def writer(self, batch):
+        return _S3ObjectWriter(self)
+
+    def delete_many(self, keys):
+        keys = list(keys)
+        for start in range(0, len(keys), self.DELETE_BATCH_SIZE):
+            chunk = keys[start:start + self.DELETE_BATCH_SIZE]
+            root = ElementTree.Element("Delete")
+            ElementTree.SubElement(root, "Quiet").text = "true"
+            for key in chunk:
+                ElementTree.SubElement(ElementTree.SubElement(root, "Object"), "Key").text = self.prefix + key
+            body = ElementTree.tostring(root, encoding="utf-8")
+            status, _, data = self._request("POST", self._object_path(), {"delete": ""}, body, {
+                "Content-Type": "application/xml",
+                "Content-MD5": _base64_md5(body)
+            })
+            self._check(status, data, "删除文件")
+            errors = _xml_children(ElementTree.fromstring(data), "Error") if data else []
+            if errors:
+                raise ObjectStoreError(f"删除文件失败：{_xml_text(errors[0], 'Key')} {_xml_text(errors[0], 'Message')}")
+
+    def close(self):
+        """关闭连接池和线程池"""
+        if self._executor is not None:
+            self._executor.shutdown()
+        self.pool.close()
+
+
+def _base64_md5(data):
+    """计算请求体的Content-MD5"""
+    return base64.b64encode(hashlib.md5(data).digest()).decode("ascii")
+
+
+class _DigestReader:
+    """读取数据时同时计算哈希"""
+
+    def __init__(self, src_file, digest):
+        self._src_file = src_file
+        self._digest = digest
+
+    def read(self, size=-1):
+        chunk = self._src_file.read(size)
+        self._digest.update(chunk)
+        return chunk
+
+
+class _S3ObjectWriter(ObjectWriter):
+    """S3写入器，本地文件由线程池并行上传，commit时等待全部完成"""
+
+    def __init__(self, store):
+        self.store = store
+        self._futures = {}
+        self._uploaded = set()
+
+    def is_pending(self, key):
+        return key in self._futures or key in self._uploaded
+
+    def put_file(self, key, src_path):
+        self._futures[key] = self.store.executor().submit(self.store.put_file, key, src_path)
+
+    def put_stream(self, key, src_file, size, digest=None):
+        # 流式数据源只能顺序读取，直接在当前线程上传
+        self._uploaded.add(key)
+        self.store.put_stream(key, src_file, size, digest)
+
+    def commit(self):
+        for key, future in list(self._futures.items()):
+            future.result()
+            self._uploaded.add(key)
+            del self._futures[key]
+
+    def abort(self):
+        # 等待进行中的上传结束，已上传的文件不删除：其他配置的备份可能同时上传了同一个文件并已提交引用，
+        # 与本地仓库相同，未被引用的文件留给持有仓库独占锁的清理操作删除
+        for future in self._futures.values():
+            future.exception()
+        self._futures = {}
+        self._uploaded = set()
+
+
+def create_object_store(config, backup_root):
+    """根据配置创建仓库存储
+
+    Args:
+        config: 完整的配置字典
+        backup_root: 备份根目录，本地仓库位于其下的 repository 目录
+
+    Returns:
+        ObjectStore: 仓库存储
+    """
+    settings = config.get('repository', {})
+    backend = settings.get('backend', 'local')
+    if backend == 'local':
+        return LocalObjectStore(os.path.join(backup_root, "repository"), settings.get('object_index', True),
+                                cold_directory(config, backup_root))
+    if backend == 's3':
+        return S3ObjectStore(
+            settings['endpoint'], settings['bucket'], settings.get('prefix', ''),
+            settings.get('access_key'), settings.get('secret_key'),
+            settings.get('region', 'us-east-1'), settings.get('max_connections', 8)
+        )
+    raise ValueError(f"不支持的仓库类型：{backend}")
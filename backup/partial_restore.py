@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+部分恢复模块 - 只把备份中选中的文件或目录写回存档目录，存档目录中的其他文件保持不变
+
+选择条件可以是文件路径、目录路径或通配符（如 slot1/*.sav）。精确路径直接在清单中查找：
+树清单只读取路径经过的树对象，扁平清单按路径二分查找；恢复一个文件只读取一个仓库文件。
+每个文件先取到临时文件并校验，校验通过后才替换存档中的文件，仓库文件损坏时原文件不受影响。
+"""
+
+import os
+import shutil
+from fnmatch import fnmatchcase
+
+from utils.file_utils import ensure_dir
+from backup.manifest import ManifestError, load_manifest
+from backup.tree import load_tree_pointer, find_tree_entry, walk_tree
+
+# 恢复时临时文件的后缀
+RESTORE_TEMP_SUFFIX = ".restore.tmp"
+
+
+def normalize_pattern(pattern):
+    """将用户输入的路径或通配符统一为以 os.sep 分隔的相对路径"""
+    return pattern.replace("/", os.sep).strip().strip(os.sep)
+
+
+def is_glob(pattern):
+    """判断是否为通配符"""
+    return any(char in pattern for char in "*?[")
+
+
+def match_path(path, pattern):
+    """判断文件是否被选中：与通配符或路径相同，或位于匹配的目录下"""
+    if is_glob(pattern):
+        parts = path.split(os.sep)
+        return any(fnmatchcase(os.sep.join(parts[:depth]), pattern) for depth in range(1, len(parts) + 1))
+    return path == pattern or path.startswith(pattern + os.sep)
+
+
+def _legacy_files(backup_path):
+    """列出传统备份中的文件"""
+    data_dir = os.path.join(backup_path, "data")
+    if not os.path.isdir(data_dir):
+        raise ManifestError("备份数据目录不存在")
+    for root, _, files in os.walk(data_dir):
+        for file in files:
+            src_file_path = os.path.join(root, file)
+            stat = os.stat(src_file_path)
+            yield {"path": os.path.relpath(src_file_path, data_dir), "size": stat.st_size,
+                   "mtime": stat.st_mtime, "source": src_file_path}
+
+
+def list_files(backup_manager, backup):
+    """列出备份中的所有文件
+
+    Returns:
+        list: 文件元数据，MD5备份包含 md5，传统备份包含 source（备份中的文件路径）
+
+    Raises:
+        ManifestError: 元数据无法读取
+    """
+    if backup.get("type") != "md5":
+        return list(_legacy_files(backup["path"]))
+    file_metadata, error = backup_manager._load_file_metadata(backup["path"])
+    if error:
+        raise ManifestError(error)
+    return list(file_metadata)
+
+
+def select_files(backup_manager, backup, patterns):
+    """按路径或通配符选择备份中的文件
+
+    Args:
+        backup_manager: 备份管理器实例
+        backup: 备份记录
+        patterns: 文件路径、目录路径或通配符列表
+
+    Returns:
+        list: 选中的文件元数据，按路径排序且不重复
+
+    Raises:
+        ManifestError: 元数据无法读取
+    """
+    patterns = [normalize_pattern(p) for p in patterns if normalize_pattern(p)]
+    exact = [p for p in patterns if not is_glob(p)]
+    globs = [p for p in patterns if is_glob(p)]
+    selected = {}
+
+    if backup.get("type") != "md5" or globs:
+        # 传统备份和通配符需要遍历全部文件
+        for file_info in list_files(backup_manager, backup):
+            if any(match_path(file_info["path"], p) for p in patterns):
+                selected[file_info["path"]] = file_info
+        return [selected[path] for path in sorted(selected)]
+
+    pointer = load_tree_pointer(backup["path"])
+    store = backup_manager.object_store
+    manifest = None
+    for pattern in exact:
+        if pointer is not None:
+            entry = find_tree_entry(store, pointer["root"], pattern)
+            if entry is None:
+                continue
+            if entry["type"] == "dir":
+                files = walk_tree(store, entry["md5"], pattern)
+            else:
+                files = [dict({k: entry[k] for k in ("md5", "size", "mtime") if k in entry}, path=pattern)]
+        else:
+            if manifest is None:
+                manifest = load_manifest(backup["path"])
+            file_info = manifest.lookup(pattern)
+            files = [file_info] if file_info is not None else manifest.under(pattern)
+        for file_info in files:
+            selected[file_info["path"]] = file_info
+    return [selected[path] for path in sorted(selected)]
+
+
+def restore_files(backup_manager, files):
+    """将选中的文件写回存档目录
+
+    Args:
+        backup_manager: 备份管理器实例
+        files: select_files 返回的文件元数据
+
+    Returns:
+        dict: {"restored": 恢复的文件数, "bytes": 字节数, "corrupted": [...], "missing": [...], "invalid": [...]}
+    """
+    stats = {"restored": 0, "bytes": 0, "corrupted": [], "missing": [], "invalid": []}
+    source_root = os.path.abspath(backup_manager.source_path)
+    for file_info in files:
+        path = file_info["path"]
+        dest_file_path = os.path.abspath(os.path.join(source_root, path))
+        if not path or os.path.isabs(path) or not dest_file_path.startswith(source_root + os.sep):
+            stats["invalid"].append(path)
+            continue
+
+        ensure_dir(os.path.dirname(dest_file_path))
+        temp_path = dest_file_path + RESTORE_TEMP_SUFFIX
+        if "source" in file_info:
+            shutil.copy2(file_info["source"], temp_path)
+        else:
+            status = backup_manager.object_store.fetch_verified(file_info["md5"], file_info["size"], temp_path)
+            if status != "ok":
+                stats["corrupted" if status == "corrupted" else "missing"].append(path)
+                continue
+            if "mtime" in file_info:
+                os.utime(temp_path, (file_info["mtime"], file_info["mtime"]))
+        os.replace(temp_path, dest_file_path)
+        stats["restored"] += 1
+        stats["bytes"] += file_info["size"]
+    return stats
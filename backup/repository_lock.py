@@ -0,0 +1,209 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+仓库锁模块 - 协调共享同一文件仓库的多个备份管理器，以及同时运行的多个进程
+
+多个配置（存档槽位或游戏）共用一个仓库，各自的备份可以同时进行：写入仓库的
+备份以及恢复、统计、校验等读取仓库的操作持有共享锁，清理未引用文件等需要看到
+仓库完整状态的操作持有独占锁。仓库文件都是先写临时文件再重命名，写入本身不需要独占锁，
+读取者不会被耗时的备份阻塞。
+
+备份记录（backups.json）的提交持有单独的独占锁，锁内先重新读取磁盘上的记录再修改，
+只在写入记录的瞬间持有。
+
+同一进程中指向同一仓库的备份管理器取得的是同一个锁对象；指定锁文件时还会在锁文件上
+加咨询锁（POSIX 为 flock，Windows 为 LockFileEx），与其他 SaveGuard 进程或命令行互斥。
+"""
+
+import os
+import sys
+import threading
+from contextlib import contextmanager
+
+# 仓库位置 -> 锁
+_locks = {}
+_locks_guard = threading.Lock()
+
+# 锁文件名
+REPOSITORY_LOCK_FILE = "repository.lock"
+CATALOG_LOCK_SUFFIX = ".lock"
+
+
+def _lock_fd(fd, exclusive, blocking):
+    """在文件描述符上加咨询锁
+
+    Returns:
+        bool: 是否取得锁，只有非阻塞时才可能返回False
+    """
+    if sys.platform == "win32":
+        import ctypes
+        import msvcrt
+        from ctypes import wintypes
+
+        class OVERLAPPED(ctypes.Structure):
+            _fields_ = [("Internal", ctypes.c_void_p), ("InternalHigh", ctypes.c_void_p),
+                        ("Offset", wintypes.DWORD), ("OffsetHigh", wintypes.DWORD), ("hEvent", wintypes.HANDLE)]
+
+        LOCKFILE_FAIL_IMMEDIATELY = 0x1
+        LOCKFILE_EXCLUSIVE_LOCK = 0x2
+        flags = (LOCKFILE_EXCLUSIVE_LOCK if exclusive else 0) | (0 if blocking else LOCKFILE_FAIL_IMMEDIATELY)
+        overlapped = OVERLAPPED()
+        handle = wintypes.HANDLE(msvcrt.get_osfhandle(fd))
+        if ctypes.windll.kernel32.LockFileEx(handle, flags, 0, 1, 0, ctypes.byref(overlapped)):
+            return True
+        if not blocking:
+            return False
+        raise ctypes.WinError()
+
+    import fcntl
+    flags = (fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH) | (0 if blocking else fcntl.LOCK_NB)
+    try:
+        fcntl.flock(fd, flags)
+    except BlockingIOError:
+        return False
+    return True
+
+
+class FileLock:
+    """锁文件上的跨进程咨询锁
+
+    每次加锁都单独打开锁文件，同一进程的多个线程各自持有的共享锁互不影响；
+    进程退出时操作系统自动释放锁，崩溃不会留下死锁。
+    """
+
+    def __init__(self, path):
+        """初始化锁
+
+        Args:
+            path: 锁文件路径，不存在时自动创建
+        """
+        self.path = path
+
+    def acquire(self, exclusive=True, blocking=True):
+        """加锁
+
+        Args:
+            exclusive: 是否为独占锁
+            blocking: 是否等待其他进程释放锁
+
+        Returns:
+            int: 持有锁的文件描述符，需要传给 release；非阻塞且锁被占用时返回None
+        """
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT | getattr(os, "O_BINARY", 0), 0o666)
+        try:
+            if _lock_fd(fd, exclusive, blocking):
+                return fd
+        except BaseException:
+            os.close(fd)
+            raise
+        os.close(fd)
+        return None
+
+    @staticmethod
+    def release(fd):
+        """释放锁，关闭文件即释放其上的锁"""
+        os.close(fd)
+
+    @contextmanager
+    def hold(self, exclusive=True):
+        """在 with 语句中持有锁"""
+        fd = self.acquire(exclusive)
+        try:
+            yield
+        finally:
+            self.release(fd)
+
+
+class RepositoryLock:
+    """读写锁，独占请求等待时不再授予新的共享锁，避免清理操作被持续的备份饿死"""
+
+    def __init__(self, lock_file=None):
+        """初始化锁
+
+        Args:
+            lock_file: 可选，锁文件路径，指定时同时与其他进程互斥
+        """
+        self._condition = threading.Condition()
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+        self._file_lock = FileLock(lock_file) if lock_file else None
+
+    @contextmanager
+    def _process_lock(self, exclusive):
+        """先取得进程内的锁，再在锁文件上加锁"""
+        if self._file_lock is None:
+            yield
+            return
+        with self._file_lock.hold(exclusive):
+            yield
+
+    @contextmanager
+    def shared(self):
+        """持有共享锁，用于备份、恢复等读写仓库文件但不删除文件的操作"""
+        with self._condition:
+            while self._writer or self._waiting_writers:
+                self._condition.wait()
+            self._readers += 1
+        try:
+            with self._process_lock(False):
+                yield
+        finally:
+            with self._condition:
+                self._readers -= 1
+                if not self._readers:
+                    self._condition.notify_all()
+
+    @contextmanager
+    def exclusive(self):
+        """持有独占锁，用于清理仓库等会删除文件的操作"""
+        with self._condition:
+            self._waiting_writers += 1
+            try:
+                while self._writer or self._readers:
+                    self._condition.wait()
+            finally:
+                self._waiting_writers -= 1
+            self._writer = True
+        try:
+            with self._process_lock(True):
+                yield
+        finally:
+            with self._condition:
+                self._writer = False
+                self._condition.notify_all()
+
+
+def get_repository_lock(location, lock_file=None):
+    """获取仓库对应的锁
+
+    Args:
+        location: 仓库位置，即 ObjectStore.location
+        lock_file: 可选，跨进程互斥使用的锁文件，以第一次获取时指定的为准
+
+    Returns:
+        RepositoryLock: 同一仓库位置始终返回同一个锁
+    """
+    with _locks_guard:
+        lock = _locks.get(location)
+        if lock is None:
+            lock = _locks[location] = RepositoryLock(lock_file)
+        return lock
+
+
+def get_catalog_lock(catalog_file):
+    """获取备份记录文件对应的锁，提交备份记录时持有其独占锁
+
+    Args:
+        catalog_file: 备份记录文件路径
+
+    Returns:
+        RepositoryLock: 同一备份记录文件始终返回同一个锁
+    """
+    key = ("catalog", os.path.normcase(os.path.abspath(catalog_file)))
+    with _locks_guard:
+        lock = _locks.get(key)
+        if lock is None:
+            lock = _locks[key] = RepositoryLock(catalog_file + CATALOG_LOCK_SUFFIX)
+        return lock
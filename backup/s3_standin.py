@@ -0,0 +1,263 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+S3替身服务模块 - 在进程内运行的最小S3兼容HTTP服务，用于在本机测试和测量对象存储后端
+
+只实现备份引擎用到的接口：对象的 PUT/GET/HEAD/DELETE、ListObjectsV2 和批量删除。
+提供 access_key 和 secret_key 时按 AWS Signature V4 独立计算并校验每个请求的签名，签名不符时返回
+403 SignatureDoesNotMatch；未提供时不校验。数据保存在内存中；request_counts 记录各类请求的次数，
+便于统计网络往返。
+
+用法:
+    server = StandInS3Server(access_key="test", secret_key="secret")
+    endpoint = server.start()        # 如 http://127.0.0.1:54321
+    ...
+    server.stop()
+"""
+
+import hmac
+import hashlib
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, unquote, quote, parse_qs
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
+
+# 单次列出的最大键数
+MAX_KEYS = 1000
+
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    """处理S3请求"""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _parse(self):
+        """解析请求路径
+
+        Returns:
+            tuple: (存储桶, 键或None, 查询参数)
+        """
+        parts = urlsplit(self.path)
+        bucket, _, key = unquote(parts.path).lstrip("/").partition("/")
+        query = {name: values[0] for name, values in parse_qs(parts.query, keep_blank_values=True).items()}
+        self.server.count(self.command, key, query)
+        return bucket, key or None, query
+
+    def _send(self, status, body=b"", headers=None):
+        """发送响应"""
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _read_body(self):
+        """读取请求体"""
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def _signature_error(self, body):
+        """按 AWS Signature V4 校验请求的签名
+
+        Args:
+            body: 请求体
+
+        Returns:
+            str: 签名无效的原因，有效或未配置密钥时返回None
+        """
+        server = self.server
+        if not (server.access_key and server.secret_key):
+            return None
+        fields = {}
+        scheme, _, params = self.headers.get("Authorization", "").partition(" ")
+        if scheme != "AWS4-HMAC-SHA256":
+            return "缺少签名"
+        for param in params.split(","):
+            name, _, value = param.strip().partition("=")
+            fields[name] = value
+        credential = fields.get("Credential", "").split("/")
+        if len(credential) != 5 or credential[0] != server.access_key:
+            return "访问密钥无效"
+        _, date_stamp, region, service, terminator = credential
+        signed_names = fields.get("SignedHeaders", "").split(";")
+        if "host" not in signed_names or "x-amz-date" not in signed_names or "authorization" in signed_names:
+            return "签名的请求头无效"
+        payload_hash = self.headers.get("x-amz-content-sha256", "")
+        if payload_hash != "UNSIGNED-PAYLOAD" and payload_hash != hashlib.sha256(body).hexdigest():
+            return "请求体的哈希值不符"
+        amz_date = self.headers.get("x-amz-date", "")
+
+        parts = urlsplit(self.path)
+        query = sorted((unquote(name), unquote(value)) for name, _, value in
+                       (item.partition("=") for item in parts.query.split("&") if item))
+        canonical_query = "&".join(f"{quote(name, safe='-_.~')}={quote(value, safe='-_.~')}"
+                                   for name, value in query)
+        canonical_headers = "".join(f"{name}:{(self.headers.get(name) or '').strip()}\n" for name in signed_names)
+        canonical_request = "\n".join([self.command, parts.path, canonical_query, canonical_headers,
+                                       ";".join(signed_names), payload_hash])
+        scope = f"{date_stamp}/{region}/{service}/{terminator}"
+        string_to_sign = "\n".join(["AWS4-HMAC-SHA256", amz_date, scope,
+                                    hashlib.sha256(canonical_request.encode("utf-8")).hexdigest()])
+        signing_key = ("AWS4" + server.secret_key).encode("utf-8")
+        for part in (date_stamp, region, service, terminator):
+            signing_key = hmac.new(signing_key, part.encode("utf-8"), hashlib.sha256).digest()
+        expected = hmac.new(signing_key, string_to_sign.encode("utf-8"), hashlib.sha256).hexdigest()
+        if not hmac.compare_digest(expected, fields.get("Signature", "")):
+            return "签名不符"
+        return None
+
+    def _authorize(self, body=b""):
+        """校验签名，无效时发送403响应
+
+        Returns:
+            bool: 签名是否有效
+        """
+        error = self._signature_error(body)
+        if error is None:
+            return True
+        with self.server.lock:
+            self.server.rejected += 1
+        self._send(403, f"<Error><Code>SignatureDoesNotMatch</Code><Message>{escape(error)}</Message></Error>"
+                   .encode("utf-8"), {"Content-Type": "application/xml"})
+        return False
+
+    def do_PUT(self):
+        bucket, key, _ = self._parse()
+        data = self._read_body()
+        if not self._authorize(data):
+            return
+        with self.server.lock:
+            self.server.buckets.setdefault(bucket, {})[key] = data
+        self._send(200)
+
+    def do_GET(self):
+        bucket, key, query = self._parse()
+        if not self._authorize():
+            return
+        with self.server.lock:
+            objects = dict(self.server.buckets.get(bucket, {}))
+        if key is None:
+            self._send(200, self._list(objects, query), {"Content-Type": "application/xml"})
+        elif key in objects:
+            self._send(200, objects[key], {"Content-Type": "application/octet-stream"})
+        else:
+            self._send(404)
+
+    def do_HEAD(self):
+        bucket, key, _ = self._parse()
+        if not self._authorize():
+            return
+        with self.server.lock:
+            data = self.server.buckets.get(bucket, {}).get(key)
+        if data is None:
+            self._send(404)
+            return
+        # HEAD响应不带响应体，但Content-Length为对象大小
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+
+    def do_DELETE(self):
+        bucket, key, _ = self._parse()
+        if not self._authorize():
+            return
+        with self.server.lock:
+            self.server.buckets.get(bucket, {}).pop(key, None)
+        self._send(204)
+
+    def do_POST(self):
+        bucket, _, query = self._parse()
+        body = self._read_body()
+        if not self._authorize(body):
+            return
+        if "delete" not in query:
+            self._send(400)
+            return
+        root = ElementTree.fromstring(body)
+        with self.server.lock:
+            objects = self.server.buckets.get(bucket, {})
+            for item in root.iter():
+                if item.tag.rsplit("}", 1)[-1] == "Key":
+                    objects.pop(item.text, None)
+        self._send(200, b"<DeleteResult></DeleteResult>", {"Content-Type": "application/xml"})
+
+    @staticmethod
+    def _list(objects, query):
+        """生成ListObjectsV2响应"""
+        prefix = query.get("prefix", "")
+        start_after = query.get("continuation-token", "")
+        keys = sorted(key for key in objects if key.startswith(prefix) and key > start_after)
+        page = keys[:MAX_KEYS]
+        truncated = len(keys) > MAX_KEYS
+        items = "".join(f"<Contents><Key>{escape(key)}</Key><Size>{len(objects[key])}</Size></Contents>"
+                        for key in page)
+        token = f"<NextContinuationToken>{escape(page[-1])}</NextContinuationToken>" if truncated else ""
+        return (f"<ListBucketResult><Prefix>{escape(prefix)}</Prefix><KeyCount>{len(page)}</KeyCount>"
+                f"<IsTruncated>{'true' if truncated else 'false'}</IsTruncated>{token}{items}"
+                f"</ListBucketResult>").encode("utf-8")
+
+
+class StandInS3Server(ThreadingHTTPServer):
+    """进程内的S3替身服务"""
+
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=0, access_key=None, secret_key=None):
+        """初始化服务
+
+        Args:
+            host: 监听地址
+            port: 监听端口，0表示自动选择
+            access_key: 可选，访问密钥，与 secret_key 一同提供时校验请求签名
+            secret_key: 可选，私有密钥
+        """
+        super().__init__((host, port), _StandInHandler)
+        self.lock = threading.Lock()
+        self.buckets = {}
+        self.access_key = access_key
+        self.secret_key = secret_key
+        # 签名无效而被拒绝的请求数
+        self.rejected = 0
+        # 请求类型 -> 次数，请求类型如 'PUT'、'HEAD'、'LIST'、'DELETE_MANY'
+        self.request_counts = {}
+        self._thread = None
+
+    def count(self, method, key, query):
+        """记录一次请求"""
+        if method == "GET" and not key:
+            kind = "LIST"
+        elif method == "POST" and "delete" in query:
+            kind = "DELETE_MANY"
+        else:
+            kind = method
+        with self.lock:
+            self.request_counts[kind] = self.request_counts.get(kind, 0) + 1
+
+    @property
+    def endpoint(self):
+        """服务地址"""
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """在后台线程中启动服务
+
+        Returns:
+            str: 服务地址
+        """
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self.endpoint
+
+    def stop(self):
+        """停止服务"""
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+仓库校验模块 - 在后台定期校验仓库文件，提前发现损坏而不是等到恢复时才发现
+
+校验以低优先级的多线程进行，可设置时间预算；每个文件的最后校验时间记录在
+备份根目录的 scrub_state.json 中，中断后再次运行会跳过近期已校验的文件。
+"""
+
+import os
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from utils.file_utils import atomic_write_json
+from backup.manifest import ManifestError
+
+# 校验状态文件名
+SCRUB_STATE_FILE = "scrub_state.json"
+
+# 校验结果通过的文件在此时间内不再重复校验（秒）
+DEFAULT_REVERIFY_AFTER = 7 * 24 * 3600
+
+# 每校验多少个文件保存一次状态
+STATE_SAVE_INTERVAL = 100
+
+
+class RepositoryScrubber:
+    """仓库校验器"""
+
+    def __init__(self, backup_manager):
+        """初始化校验器
+
+        Args:
+            backup_manager: 备份管理器实例
+        """
+        self.backup_manager = backup_manager
+        self.object_store = backup_manager.object_store
+        self.state_file = os.path.join(backup_manager.backup_root, SCRUB_STATE_FILE)
+
+    def load_state(self):
+        """加载校验状态
+
+        Returns:
+            dict: md5 -> {"verified_at": 时间戳, "status": 'ok'/'missing'/'corrupted'}
+        """
+        try:
+            with open(self.state_file, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            return state.get("objects", {})
+        except (OSError, ValueError):
+            return {}
+
+    def save_state(self, objects):
+        """保存校验状态，先写临时文件再替换，避免中断时损坏状态文件
+
+        Args:
+            objects: 各文件的校验状态
+        """
+        atomic_write_json(self.state_file, {"objects": objects}, durable=self.backup_manager.durable)
+
+    def _collect_objects(self, backups):
+        """收集备份引用的所有仓库文件及其期望大小
+
+        Returns:
+            tuple: (md5 -> 大小, 无法读取元数据的备份问题列表)
+        """
+        expected = {}
+        problems = []
+        visited = set()
+        for backup in backups:
+            if backup.get("type") != "md5":
+                continue
+            try:
+                expected.update(self.backup_manager.backup_objects(backup, visited))
+            except ManifestError as e:
+                problems.append({"name": backup["name"], "path": backup["path"], "error": str(e), "objects": []})
+        return expected, problems
+
+    def _check_object(self, file_md5, size, throttle=None):
+        """校验单个仓库文件
+
+        Returns:
+            tuple: (md5, 状态)
+        """
+        return file_md5, self.object_store.check(file_md5, size, throttle)
+
+    def _affected_backups(self, backups, bad_objects):
+        """找出引用了损坏或缺失文件的备份"""
+        affected = []
+        for backup in backups:
+            if backup.get("type") != "md5":
+                continue
+            try:
+                objects = sorted(bad_objects.keys() & self.backup_manager.backup_objects(backup).keys())
+            except ManifestError:
+                continue
+            if objects:
+                affected.append({"name": backup["name"], "path": backup["path"], "error": None, "objects": objects})
+        return affected
+
+    def run(self, time_budget=None, max_workers=None, reverify_after=DEFAULT_REVERIFY_AFTER, low_priority=True):
+        """执行一次校验
+
+        Args:
+            time_budget: 本次最多运行的秒数，None表示不限制
+            max_workers: 并行校验的线程数，默认按CPU数量决定
+            reverify_after: 校验通过的文件在多少秒内不再重复校验
+            low_priority: 是否降低校验线程的优先级
+
+        Returns:
+            dict: 校验报告
+        """
+        started = time.time()
+        deadline = None if time_budget is None else time.monotonic() + time_budget
+        # 仓库由所有配置共用，校验范围为全部配置的备份
+        backups = self.backup_manager.repository_backups()
+        expected, problems = self._collect_objects(backups)
+        state = self.load_state()
+
+        # 跳过近期校验通过的文件，先前发现问题的文件每次都重新校验
+        pending = sorted(file_md5 for file_md5 in expected
+                         if not (state.get(file_md5, {}).get("status") == "ok"
+                                 and started - state[file_md5].get("verified_at", 0) < reverify_after))
+        skipped = len(expected) - len(pending)
+
+        if max_workers is None:
+            max_workers = min(4, os.cpu_count() or 1)
+        checked = 0
+        unsaved = 0
+        remaining = iter(pending)
+        with self.backup_manager.io_governor.job("scrub") as io_job, \
+                ThreadPoolExecutor(max_workers=max_workers,
+                                   initializer=io_job.worker_initializer(low_priority)) as executor:
+            running = set()
+            while True:
+                # 时间预算用完后不再提交新任务，只等待正在进行的校验完成
+                while len(running) < max_workers * 2 and (deadline is None or time.monotonic() < deadline):
+                    file_md5 = next(remaining, None)
+                    if file_md5 is None:
+                        break
+                    running.add(executor.submit(self._check_object, file_md5, expected[file_md5], io_job.throttle))
+                if not running:
+                    break
+                done, running = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    file_md5, status = future.result()
+                    state[file_md5] = {"verified_at": time.time(), "status": status}
+                    checked += 1
+                    unsaved += 1
+                if unsaved >= STATE_SAVE_INTERVAL:
+                    self.save_state(state)
+                    unsaved = 0
+
+        # 清理已不再被引用的文件的状态
+        state = {file_md5: info for file_md5, info in state.items() if file_md5 in expected}
+        self.save_state(state)
+
+        bad_objects = {file_md5: info["status"] for file_md5, info in state.items() if info["status"] != "ok"}
+        return {
+            "checked": checked,
+            "skipped": skipped,
+            "remaining": len(pending) - checked,
+            "complete": checked == len(pending),
+            "bad_objects": bad_objects,
+            "affected_backups": problems + (self._affected_backups(backups, bad_objects) if bad_objects else []),
+            "io": io_job.report(),
+            "elapsed": time.time() - started
+        }
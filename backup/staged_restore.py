@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+分阶段恢复模块 - 先在存档目录旁的暂存目录中完整构建要恢复的存档，再通过重命名替换存档目录
+
+存档目录在整个恢复过程中只有两次重命名之间的瞬间不存在，模拟器不会看到空的或只恢复了一半的
+存档目录；构建暂存目录失败时存档目录不受影响。被替换下来的存档目录保留为上一份存档，可以立即撤销恢复。
+
+存档目录 <父目录>/<名称> 旁的文件和目录:
+    .<名称>.saveguard-staging        暂存目录，可以提前准备好
+    .<名称>.saveguard-staging.json   暂存目录对应的备份和构建时发现的问题，构建完成后才写入
+    .<名称>.saveguard-previous       上一份存档，撤销恢复时换回
+    .<名称>.saveguard-swap           撤销恢复时短暂使用的临时名称
+
+重命名在同一个父目录中进行，不会跨文件系统复制。目录中的文件被其他程序占用而无法重命名时
+（Windows），退回为逐个替换文件。
+"""
+
+import os
+import json
+import shutil
+
+from utils.file_utils import atomic_write_json
+
+STAGING_SUFFIX = ".saveguard-staging"
+PREVIOUS_SUFFIX = ".saveguard-previous"
+SWAP_SUFFIX = ".saveguard-swap"
+MARKER_SUFFIX = ".json"
+
+
+def staging_paths(source_path):
+    """获取存档目录对应的暂存目录、上一份存档目录、临时目录和暂存标记文件
+
+    Returns:
+        tuple: (暂存目录, 上一份存档目录, 临时目录, 暂存标记文件)
+    """
+    source_path = os.path.abspath(source_path)
+    parent, name = os.path.split(source_path.rstrip(os.sep))
+    staging = os.path.join(parent, f".{name}{STAGING_SUFFIX}")
+    return (staging, os.path.join(parent, f".{name}{PREVIOUS_SUFFIX}"),
+            os.path.join(parent, f".{name}{SWAP_SUFFIX}"), staging + MARKER_SUFFIX)
+
+
+def read_marker(source_path):
+    """读取已准备好的暂存目录的信息
+
+    Returns:
+        dict: {"backup": 备份路径, "problems": {...}}，暂存目录不存在或未完成时返回None
+    """
+    staging, _, _, marker = staging_paths(source_path)
+    if not os.path.isdir(staging):
+        return None
+    try:
+        with open(marker, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_marker(source_path, backup_path, problems, durable=True):
+    """标记暂存目录已构建完成"""
+    atomic_write_json(staging_paths(source_path)[3], {"backup": backup_path, "problems": problems},
+                      durable=durable, ensure_ascii=False)
+
+
+def discard_staging(source_path):
+    """删除暂存目录和标记"""
+    staging, _, _, marker = staging_paths(source_path)
+    try:
+        os.remove(marker)
+    except FileNotFoundError:
+        pass
+    if os.path.lexists(staging):
+        shutil.rmtree(staging)
+
+
+def new_staging(source_path):
+    """删除旧的暂存目录并创建新的空暂存目录
+
+    Returns:
+        str: 暂存目录
+    """
+    discard_staging(source_path)
+    staging = staging_paths(source_path)[0]
+    os.makedirs(staging)
+    return staging
+
+
+def _replace_in_place(staging, source_path, previous):
+    """目录无法重命名时逐个替换文件：先复制一份上一份存档，再把暂存目录中的文件移入存档目录"""
+    shutil.copytree(source_path, previous)
+    staged = set()
+    for root, _, files in os.walk(staging):
+        rel_root = os.path.relpath(root, staging)
+        os.makedirs(os.path.join(source_path, rel_root), exist_ok=True)
+        for file in files:
+            rel_path = os.path.normpath(os.path.join(rel_root, file))
+            staged.add(rel_path)
+            os.replace(os.path.join(staging, rel_path), os.path.join(source_path, rel_path))
+    for root, _, files in os.walk(source_path):
+        for file in files:
+            path = os.path.join(root, file)
+            if os.path.relpath(path, source_path) not in staged:
+                os.remove(path)
+    shutil.rmtree(staging)
+
+
+def swap_in(source_path):
+    """用暂存目录替换存档目录，原存档目录保留为上一份存档
+
+    Returns:
+        bool: 是否通过重命名完成，False 表示退回为逐个替换文件
+    """
+    staging, previous, _, marker = staging_paths(source_path)
+    if os.path.lexists(previous):
+        shutil.rmtree(previous)
+    try:
+        os.remove(marker)
+    except FileNotFoundError:
+        pass
+    if not os.path.lexists(source_path):
+        os.rename(staging, source_path)
+        return True
+    try:
+        os.rename(source_path, previous)
+    except PermissionError:
+        _replace_in_place(staging, source_path, previous)
+        return False
+    try:
+        os.rename(staging, source_path)
+    except OSError:
+        os.rename(previous, source_path)
+        raise
+    return True
+
+
+def swap_previous(source_path):
+    """交换存档目录和上一份存档，用于撤销恢复，再次调用即重做
+
+    Returns:
+        bool: 是否有上一份存档
+    """
+    _, previous, swap, _ = staging_paths(source_path)
+    if not os.path.isdir(previous):
+        return False
+    if os.path.lexists(swap):
+        shutil.rmtree(swap)
+    if os.path.lexists(source_path):
+        os.rename(source_path, swap)
+    try:
+        os.rename(previous, source_path)
+    except OSError:
+        if os.path.lexists(swap):
+            os.rename(swap, source_path)
+        raise
+    if os.path.lexists(swap):
+        os.rename(swap, previous)
+    return True
+
+
+def recover_swap(source_path):
+    """在两次重命名之间崩溃时把存档目录换回来，并删除未完成的暂存目录"""
+    staging, previous, swap, marker = staging_paths(source_path)
+    if not os.path.lexists(source_path):
+        for candidate in (swap, previous):
+            if os.path.isdir(candidate):
+                os.rename(candidate, source_path)
+                break
+    elif os.path.isdir(swap) and not os.path.lexists(previous):
+        os.rename(swap, previous)
+    if os.path.lexists(staging) and not os.path.exists(marker):
+        shutil.rmtree(staging, ignore_errors=True)
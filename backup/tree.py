@@ -0,0 +1,396 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+树清单模块 - 以目录为单位的内容寻址清单（Merkle树）
+
+每个目录编码为一个树对象，以其内容的MD5为键存入仓库，与普通文件共用仓库和去重：
+子目录项记录子树的MD5、总大小和文件数，文件项记录文件的MD5、大小和修改时间。
+备份目录中只保存指向根树的 metadata/tree.json，因此：
+
+    复制备份只需复制这一个小文件；
+    只改动了一个子目录的快照，其余子树与上一次备份完全相同，不会重复写入；
+    比较两个备份时，MD5相同的子树直接跳过。
+
+树对象格式（小端）：
+    文件头  magic "SGTR"、版本、条目数
+    条目    类型(1字节)、名称字节数(2字节)、MD5(16字节)、大小(8字节)、
+            文件为修改时间(8字节浮点数，NaN表示未记录)/目录为文件数(8字节整数)、名称(UTF-8)
+    条目按名称排序，相同的目录内容总是得到相同的编码和MD5
+"""
+
+import io
+import os
+import json
+import math
+import struct
+import hashlib
+import threading
+from collections import OrderedDict
+
+from backup.manifest import Manifest, ManifestEntry, ManifestError
+
+# 备份目录中指向根树的文件
+TREE_POINTER_FILE = "tree.json"
+TREE_POINTER_VERSION = 1
+
+TREE_MAGIC = b"SGTR"
+TREE_VERSION = 1
+
+ENTRY_FILE = 0
+ENTRY_DIR = 1
+
+_HEADER = struct.Struct("<4sHI")
+_ENTRY = struct.Struct("<BH16sQ8s")
+_FLOAT = struct.Struct("<d")
+_COUNT = struct.Struct("<Q")
+
+# 已解析树对象的缓存大小，树对象内容不会改变，可以安全地跨备份共用
+TREE_CACHE_SIZE = 4096
+
+_tree_cache = OrderedDict()
+_tree_cache_lock = threading.Lock()
+
+
+def encode_tree(entries):
+    """编码树对象
+
+    Args:
+        entries: 条目字典列表。文件: {"name", "type": "file", "md5", "size", "mtime"(可选)}；
+                 目录: {"name", "type": "dir", "md5", "size", "files"}
+
+    Returns:
+        bytes: 树对象内容
+    """
+    parts = [_HEADER.pack(TREE_MAGIC, TREE_VERSION, len(entries))]
+    for entry in sorted(entries, key=lambda e: e["name"]):
+        name = entry["name"].encode("utf-8")
+        if entry["type"] == "dir":
+            kind, extra = ENTRY_DIR, _COUNT.pack(entry["files"])
+        else:
+            kind, extra = ENTRY_FILE, _FLOAT.pack(entry.get("mtime", math.nan))
+        parts.append(_ENTRY.pack(kind, len(name), bytes.fromhex(entry["md5"]), entry["size"], extra))
+        parts.append(name)
+    return b"".join(parts)
+
+
+def decode_tree(data):
+    """解码树对象
+
+    Returns:
+        list: 条目字典列表，格式同 encode_tree
+
+    Raises:
+        ManifestError: 格式错误
+    """
+    try:
+        magic, version, count = _HEADER.unpack_from(data)
+        if magic != TREE_MAGIC or version > TREE_VERSION:
+            raise ManifestError("不支持的树对象格式")
+        entries = []
+        offset = _HEADER.size
+        for _ in range(count):
+            kind, name_size, digest, size, extra = _ENTRY.unpack_from(data, offset)
+            offset += _ENTRY.size
+            name = data[offset:offset + name_size].decode("utf-8")
+            offset += name_size
+            entry = {"name": name, "md5": digest.hex(), "size": size}
+            if kind == ENTRY_DIR:
+                entry["type"] = "dir"
+                entry["files"] = _COUNT.unpack(extra)[0]
+            else:
+                entry["type"] = "file"
+                mtime = _FLOAT.unpack(extra)[0]
+                if not math.isnan(mtime):
+                    entry["mtime"] = mtime
+            entries.append(entry)
+    except (struct.error, UnicodeDecodeError):
+        raise ManifestError("树对象已损坏")
+    if offset != len(data):
+        raise ManifestError("树对象已损坏")
+    return entries
+
+
+def build_trees(file_metadata):
+    """由扁平的文件元数据构建树对象
+
+    Args:
+        file_metadata: 文件元数据字典列表，path 为以 os.sep 分隔的相对路径
+
+    Returns:
+        tuple: (根树MD5, {树MD5: 树对象内容}, 文件数, 总大小)
+    """
+    # 目录为字典，文件为元数据字典外包一层元组，避免与名为 md5、path 的子项混淆
+    root = {}
+    for file_info in file_metadata:
+        *dirs, name = file_info["path"].split(os.sep)
+        node = root
+        for part in dirs:
+            node = node.setdefault(part, {})
+        node[name] = (file_info,)
+
+    trees = {}
+
+    def encode(node):
+        entries = []
+        files = 0
+        size = 0
+        for name, child in node.items():
+            if isinstance(child, tuple):
+                file_info = child[0]
+                entry = {"name": name, "type": "file", "md5": file_info["md5"], "size": file_info["size"]}
+                if "mtime" in file_info:
+                    entry["mtime"] = file_info["mtime"]
+                files += 1
+            else:
+                tree_md5, child_files, child_size = encode(child)
+                entry = {"name": name, "type": "dir", "md5": tree_md5, "size": child_size, "files": child_files}
+                files += child_files
+            size += entry["size"]
+            entries.append(entry)
+        data = encode_tree(entries)
+        tree_md5 = hashlib.md5(data).hexdigest()
+        trees[tree_md5] = data
+        return tree_md5, files, size
+
+    root_md5, files, size = encode(root)
+    return root_md5, trees, files, size
+
+
+def write_trees(writer, trees, existing):
+    """将仓库中还没有的树对象交给仓库写入器
+
+    Args:
+        writer: 仓库写入器
+        trees: {树MD5: 树对象内容}
+        existing: 仓库中已有的对象MD5集合
+
+    Returns:
+        int: 新写入的树对象数
+    """
+    written = 0
+    for tree_md5, data in trees.items():
+        if tree_md5 in existing or writer.is_pending(tree_md5):
+            continue
+        writer.put_stream(tree_md5, io.BytesIO(data), len(data))
+        written += 1
+    return written
+
+
+def read_tree(store, tree_md5):
+    """读取并解码树对象，结果会被缓存
+
+    Raises:
+        ManifestError: 树对象缺失或损坏
+    """
+    return _read_tree(store, tree_md5)[0]
+
+
+def _read_tree(store, tree_md5):
+    """读取并解码树对象
+
+    Returns:
+        tuple: (条目列表, 树对象字节数)
+    """
+    cache_key = (store.location, tree_md5)
+    with _tree_cache_lock:
+        cached = _tree_cache.get(cache_key)
+        if cached is not None:
+            _tree_cache.move_to_end(cache_key)
+            return cached
+
+    try:
+        with store.open(tree_md5) as f:
+            data = f.read()
+    except FileNotFoundError:
+        raise ManifestError(f"仓库中缺少树对象：{tree_md5}")
+    if hashlib.md5(data).hexdigest() != tree_md5:
+        raise ManifestError(f"树对象已损坏：{tree_md5}")
+    cached = (decode_tree(data), len(data))
+
+    with _tree_cache_lock:
+        _tree_cache[cache_key] = cached
+        if len(_tree_cache) > TREE_CACHE_SIZE:
+            _tree_cache.popitem(last=False)
+    return cached
+
+
+def walk_tree(store, root_md5, prefix=""):
+    """依次返回树中的所有文件
+
+    Yields:
+        dict: 文件元数据 {path, md5, size, mtime}
+    """
+    for entry in read_tree(store, root_md5):
+        path = os.path.join(prefix, entry["name"]) if prefix else entry["name"]
+        if entry["type"] == "dir":
+            yield from walk_tree(store, entry["md5"], path)
+        else:
+            file_info = {"path": path, "md5": entry["md5"], "size": entry["size"]}
+            if "mtime" in entry:
+                file_info["mtime"] = entry["mtime"]
+            yield file_info
+
+
+def _iter_tree_entries(store, root_md5, prefix=""):
+    """依次返回树中的所有文件，条目为 ManifestEntry"""
+    for entry in read_tree(store, root_md5):
+        path = os.path.join(prefix, entry["name"]) if prefix else entry["name"]
+        if entry["type"] == "dir":
+            yield from _iter_tree_entries(store, entry["md5"], path)
+        else:
+            yield ManifestEntry(path, entry["md5"], entry["size"], entry.get("mtime"))
+
+
+def stream_tree(store, root_md5):
+    """以流的方式读取树清单，内存占用只与目录深度和树对象缓存大小有关
+
+    调用时先遍历一遍所有树对象，确认它们都存在且完好后才返回迭代器。
+
+    Args:
+        store: 仓库存储
+        root_md5: 根树MD5
+
+    Returns:
+        iterator: ManifestEntry 迭代器
+
+    Raises:
+        ManifestError: 树对象缺失或损坏
+    """
+    for _ in walk_unique_trees(store, [root_md5]):
+        pass
+    return _iter_tree_entries(store, root_md5)
+
+
+def find_tree_entry(store, root_md5, path):
+    """按路径逐层查找条目，只读取路径经过的树对象
+
+    Args:
+        store: 仓库存储
+        root_md5: 根树MD5
+        path: 以 os.sep 分隔的相对路径
+
+    Returns:
+        dict: 条目字典（格式同 encode_tree），不存在时返回None
+    """
+    tree_md5 = root_md5
+    parts = path.split(os.sep)
+    for depth, name in enumerate(parts):
+        entry = next((e for e in read_tree(store, tree_md5) if e["name"] == name), None)
+        if entry is None:
+            return None
+        if depth == len(parts) - 1:
+            return entry
+        if entry["type"] != "dir":
+            return None
+        tree_md5 = entry["md5"]
+    return None
+
+
+def walk_unique_trees(store, roots, visited=None):
+    """遍历多个根树可达的所有树对象，共用的子树只访问一次
+
+    Args:
+        store: 仓库存储
+        roots: 根树MD5的可迭代对象
+        visited: 可选，已访问过的树MD5集合，多次调用时传入同一个集合可跳过已遍历的子树
+
+    Yields:
+        tuple: (树MD5, 条目列表, 树对象字节数)
+    """
+    if visited is None:
+        visited = set()
+    pending = list(roots)
+    while pending:
+        tree_md5 = pending.pop()
+        if tree_md5 in visited:
+            continue
+        visited.add(tree_md5)
+        entries, size = _read_tree(store, tree_md5)
+        pending.extend(entry["md5"] for entry in entries if entry["type"] == "dir")
+        yield tree_md5, entries, size
+
+
+def load_tree_pointer(backup_path):
+    """读取备份的根树指针
+
+    Returns:
+        dict: {"version", "root", "files", "size"}，备份不是树清单时返回None
+
+    Raises:
+        ManifestError: 指针文件损坏
+    """
+    pointer_file = os.path.join(backup_path, "metadata", TREE_POINTER_FILE)
+    try:
+        with open(pointer_file, "r", encoding="utf-8") as f:
+            pointer = json.load(f)
+    except FileNotFoundError:
+        return None
+    except ValueError:
+        raise ManifestError("备份元数据文件已损坏，无法解析JSON格式")
+    if not isinstance(pointer, dict) or "root" not in pointer:
+        raise ManifestError("备份元数据格式错误，缺少根树")
+    return pointer
+
+
+def make_tree_pointer(root_md5, files, size):
+    """生成根树指针的内容"""
+    return {"version": TREE_POINTER_VERSION, "root": root_md5, "files": files, "size": size}
+
+
+def load_tree_manifest(store, root_md5):
+    """将树清单展开为扁平的 Manifest"""
+    return Manifest.from_entries(walk_tree(store, root_md5))
+
+
+def diff_trees(store, old_root, new_root):
+    """比较两棵树，MD5相同的子树直接跳过
+
+    Returns:
+        dict: 格式同 manifest_diff.diff_manifests
+    """
+    diff = {"added": [], "removed": [], "modified": [], "unchanged": 0, "size_delta": 0}
+
+    def add_all(tree_md5, prefix, key):
+        for file_info in walk_tree(store, tree_md5, prefix):
+            diff[key].append({"path": file_info["path"], "size": file_info["size"]})
+
+    def compare(old_md5, new_md5, prefix):
+        old_entries = {entry["name"]: entry for entry in read_tree(store, old_md5)}
+        new_entries = {entry["name"]: entry for entry in read_tree(store, new_md5)}
+        for name in sorted(old_entries.keys() | new_entries.keys()):
+            path = os.path.join(prefix, name) if prefix else name
+            old_entry = old_entries.get(name)
+            new_entry = new_entries.get(name)
+            if old_entry is not None and new_entry is not None and old_entry["type"] == new_entry["type"]:
+                if old_entry["type"] == "dir":
+                    if old_entry["md5"] == new_entry["md5"]:
+                        diff["unchanged"] += old_entry["files"]
+                    else:
+                        compare(old_entry["md5"], new_entry["md5"], path)
+                elif old_entry["md5"] == new_entry["md5"]:
+                    diff["unchanged"] += 1
+                else:
+                    diff["modified"].append({"path": path, "old_size": old_entry["size"],
+                                             "new_size": new_entry["size"],
+                                             "size_delta": new_entry["size"] - old_entry["size"]})
+                continue
+            # 一侧不存在，或同名的文件与目录互换
+            for entry, key in ((old_entry, "removed"), (new_entry, "added")):
+                if entry is None:
+                    continue
+                if entry["type"] == "dir":
+                    add_all(entry["md5"], path, key)
+                else:
+                    diff[key].append({"path": path, "size": entry["size"]})
+
+    if old_root != new_root:
+        compare(old_root, new_root, "")
+    else:
+        diff["unchanged"] = sum(entry["files"] if entry["type"] == "dir" else 1
+                                for entry in read_tree(store, old_root))
+    for key in ("added", "removed", "modified"):
+        diff[key].sort(key=lambda item: item["path"])
+    diff["size_delta"] = (sum(item["size"] for item in diff["added"]) - sum(item["size"] for item in diff["removed"])
+                          + sum(item["size_delta"] for item in diff["modified"]))
+    return diff
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+自动化延迟测试 - 使用替身平台后端测量开启自动保存/自动载入时快速备份和快速恢复（F7/F8）的耗时
+
+替身游戏模拟菜单动画（过快的按键会被吞掉），收到退出按键后分几次写入存档，等待会在存档和模拟器写入量
+稳定后立即结束；报告列出每个等待的实际耗时，并与原来的固定延时对比。指定 --calibrate 时先校准按键间隔。
+
+用法:
+    python -m benchmarks.automation [--rounds 3] [--save-chunks 3] [--chunk-interval 0.05] [--calibrate]
+"""
+
+import os
+import json
+import time
+import shutil
+import argparse
+import tempfile
+
+from config.config_manager import ConfigManager
+from backup.backup_manager import BackupManager
+from utils.file_utils import ensure_dir
+from utils.macros import BUILTIN_MACROS, DEFAULT_GAME
+from utils.standin_backends import StandInGame, STANDIN_PROCESS_NAME, install, uninstall, macro_sequences
+
+# 原实现中退出和载入的固定延时（秒）：聚焦后等待0.1秒，每次按键前后各0.05秒加PyDirectInput的0.1秒停顿，
+# 载入前固定等待3.5秒；不含Windows窗口后端内部的0.2秒
+LEGACY_EXIT_DELAY = 0.1 + 7 * 0.2
+LEGACY_LOAD_DELAY = 3.5 + 0.1 + 2 * 0.2
+
+# 替身游戏菜单中按键之后需要的最短间隔（秒），确认键打开菜单的动画较长
+STANDIN_KEY_GAP = 0.03
+STANDIN_KEY_GAPS = {"enter": 0.12}
+
+
+def _run(backup_manager, action, rounds):
+    """执行多次操作
+
+    Returns:
+        tuple: (平均耗时毫秒, 最后一次的等待记录)
+    """
+    elapsed = 0.0
+    for _ in range(rounds):
+        started = time.perf_counter()
+        success, message = getattr(backup_manager, action)()
+        elapsed += time.perf_counter() - started
+        if not success:
+            raise RuntimeError(message)
+        if backup_manager.warnings:
+            raise RuntimeError("; ".join(backup_manager.warnings))
+    return elapsed * 1000 / rounds, backup_manager.automation_timings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="测量自动保存/自动载入的等待耗时")
+    parser.add_argument("--rounds", type=int, default=3, help="每种操作的次数")
+    parser.add_argument("--save-chunks", type=int, default=3, help="替身游戏每次存档分几次写入")
+    parser.add_argument("--chunk-interval", type=float, default=0.05, help="替身游戏两次写入的间隔（秒）")
+    parser.add_argument("--calibrate", action="store_true", help="测量前先校准按键间隔")
+    args = parser.parse_args(argv)
+
+    work_dir = tempfile.mkdtemp(prefix="saveguard_automation_")
+    try:
+        source_dir = os.path.join(work_dir, "source")
+        ensure_dir(source_dir)
+        config_file = os.path.join(work_dir, "config.json")
+        with open(config_file, "w", encoding="utf-8") as f:
+            json.dump({
+                "hotkeys": {"quick_backup": "f7", "quick_restore": "f8"},
+                "paths": {"source_path": source_dir, "backup_root": os.path.join(work_dir, "backups")},
+                "features": {"md5_deduplication": True, "auto_load_after_restore": True,
+                             "auto_save_before_backup": True, "durable_writes": False},
+                "emulator": {"process_names": [STANDIN_PROCESS_NAME]},
+                "language": "zh_CN"
+            }, f)
+
+        with open(os.path.join(source_dir, "userdata0000"), "wb") as f:
+            f.write(os.urandom(4096))
+        game = StandInGame(source_dir, save_chunks=args.save_chunks, chunk_interval=args.chunk_interval,
+                           sequences=macro_sequences(BUILTIN_MACROS[DEFAULT_GAME]),
+                           key_gap=STANDIN_KEY_GAP, key_gaps=STANDIN_KEY_GAPS)
+        install(game)
+        backup_manager = BackupManager(ConfigManager(config_file), print)
+        if args.calibrate:
+            success, message, _ = backup_manager.calibrate_automation(trials=1, iterations=3, progress=print)
+            print(message)
+            if not success:
+                return
+
+        legacy_ms = (LEGACY_EXIT_DELAY + LEGACY_LOAD_DELAY) * 1000
+        for action in ("quick_backup", "quick_restore"):
+            ms, timings = _run(backup_manager, action, args.rounds)
+            print(f"{action}: {ms:.1f} ms（原固定延时 {legacy_ms:.0f} ms）")
+            for line in timings.format_report().splitlines():
+                print(f"  {line}")
+        print(f"替身游戏存档次数: {game.saves}，载入次数: {game.loads}，按键次数: {len(game.key_log)}，"
+              f"被吞掉的按键: {game.dropped}")
+    finally:
+        uninstall()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+持久化写入性能测试 - 比较开启和关闭 durable_writes 时的备份耗时与落盘同步次数
+
+用法:
+    python -m benchmarks.durability [--files 200] [--size 65536] [--rounds 5]
+"""
+
+import os
+import json
+import time
+import shutil
+import argparse
+import tempfile
+
+from config.config_manager import ConfigManager
+from backup.backup_manager import BackupManager
+from utils.file_utils import ensure_dir, sync_call_count
+
+
+def _make_source(source_dir, file_count, file_size):
+    """生成测试用的源目录"""
+    ensure_dir(source_dir)
+    for i in range(file_count):
+        with open(os.path.join(source_dir, f"file_{i:05d}.bin"), "wb") as f:
+            f.write(os.urandom(file_size))
+
+
+def _touch_source(source_dir, fraction=0.1):
+    """修改部分源文件，模拟两次备份之间存档的变化"""
+    names = sorted(os.listdir(source_dir))
+    for name in names[:max(1, int(len(names) * fraction))]:
+        path = os.path.join(source_dir, name)
+        size = os.path.getsize(path)
+        with open(path, "wb") as f:
+            f.write(os.urandom(size))
+
+
+def run_mode(work_dir, durable, rounds):
+    """在指定模式下执行多次备份
+
+    Returns:
+        dict: 每次备份的平均耗时（毫秒）和平均同步调用次数
+    """
+    source_dir = os.path.join(work_dir, "source")
+    backup_root = os.path.join(work_dir, "backups_durable" if durable else "backups_fast")
+    config_file = os.path.join(work_dir, "durable.json" if durable else "fast.json")
+    with open(config_file, "w", encoding="utf-8") as f:
+        json.dump({
+            "hotkeys": {"quick_backup": "f7", "quick_restore": "f8"},
+            "paths": {"source_path": source_dir, "backup_root": backup_root},
+            "features": {"md5_deduplication": True, "auto_load_after_restore": False,
+                         "auto_save_before_backup": False, "durable_writes": durable},
+            "language": "zh_CN"
+        }, f)
+
+    backup_manager = BackupManager(ConfigManager(config_file), print, enable_automation=False)
+    elapsed = 0.0
+    syncs = 0
+    for i in range(rounds):
+        _touch_source(source_dir)
+        sync_before = sync_call_count()
+        started = time.perf_counter()
+        success, message = backup_manager.create_backup(f"bench_{i}", is_manual=True)
+        elapsed += time.perf_counter() - started
+        syncs += sync_call_count() - sync_before
+        if not success:
+            raise RuntimeError(message)
+    return {"ms_per_backup": elapsed * 1000 / rounds, "syncs_per_backup": syncs / rounds}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="比较 durable_writes 开关对备份耗时的影响")
+    parser.add_argument("--files", type=int, default=200, help="源目录文件数")
+    parser.add_argument("--size", type=int, default=64 * 1024, help="每个文件的字节数")
+    parser.add_argument("--rounds", type=int, default=5, help="每种模式的备份次数")
+    parser.add_argument("--dir", help="测试目录，默认使用临时目录（应与实际备份目录在同类磁盘上）")
+    args = parser.parse_args(argv)
+
+    work_dir = tempfile.mkdtemp(prefix="saveguard_bench_", dir=args.dir)
+    try:
+        _make_source(os.path.join(work_dir, "source"), args.files, args.size)
+        for durable in (False, True):
+            result = run_mode(work_dir, durable, args.rounds)
+            label = "durable_writes=on " if durable else "durable_writes=off"
+            print(f"{label}  {result['ms_per_backup']:8.1f} ms/备份  {result['syncs_per_backup']:6.1f} 次同步/备份")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
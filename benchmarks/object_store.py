@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+对象存储性能测试 - 在进程内的S3替身服务上执行备份、恢复和清理，统计请求数与连接复用
+
+用法:
+    python -m benchmarks.object_store [--files 200] [--size 65536] [--rounds 5]
+"""
+
+import os
+import json
+import time
+import shutil
+import argparse
+import tempfile
+
+from config.config_manager import ConfigManager
+from backup.backup_manager import BackupManager
+from backup.s3_standin import StandInS3Server
+from benchmarks.durability import _make_source, _touch_source
+
+
+def _timed(server, action):
+    """执行一次操作
+
+    Returns:
+        tuple: (耗时毫秒, 服务端收到的各类请求数)
+    """
+    before = dict(server.request_counts)
+    started = time.perf_counter()
+    success, message = action()[:2]
+    elapsed = (time.perf_counter() - started) * 1000
+    if not success:
+        raise RuntimeError(message)
+    counts = {kind: count - before.get(kind, 0) for kind, count in server.request_counts.items()
+              if count != before.get(kind, 0)}
+    return elapsed, counts
+
+
+def _format_counts(counts):
+    return " ".join(f"{kind}={count}" for kind, count in sorted(counts.items())) or "-"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="测量S3兼容后端的请求数和耗时")
+    parser.add_argument("--files", type=int, default=200, help="源目录文件数")
+    parser.add_argument("--size", type=int, default=64 * 1024, help="每个文件的字节数")
+    parser.add_argument("--rounds", type=int, default=5, help="增量备份次数")
+    parser.add_argument("--connections", type=int, default=8, help="连接池大小")
+    args = parser.parse_args(argv)
+
+    work_dir = tempfile.mkdtemp(prefix="saveguard_bench_")
+    # 替身服务校验签名，测量的是带签名的真实请求路径
+    server = StandInS3Server(access_key="bench", secret_key="bench-secret")
+    endpoint = server.start()
+    try:
+        source_dir = os.path.join(work_dir, "source")
+        _make_source(source_dir, args.files, args.size)
+        config_file = os.path.join(work_dir, "s3.json")
+        with open(config_file, "w", encoding="utf-8") as f:
+            json.dump({
+                "hotkeys": {"quick_backup": "f7", "quick_restore": "f8"},
+                "paths": {"source_path": source_dir, "backup_root": os.path.join(work_dir, "backups")},
+                "features": {"md5_deduplication": True, "auto_load_after_restore": False,
+                             "auto_save_before_backup": False, "background_scrub": False},
+                "repository": {"backend": "s3", "endpoint": endpoint, "bucket": "bench",
+                               "prefix": "repository/", "access_key": "bench", "secret_key": "bench-secret",
+                               "max_connections": args.connections},
+                "language": "zh_CN"
+            }, f)
+
+        backup_manager = BackupManager(ConfigManager(config_file), print, enable_automation=False)
+        store = backup_manager.object_store
+
+        elapsed, counts = _timed(server, lambda: backup_manager.create_backup("full", is_manual=True))
+        print(f"首次备份      {elapsed:8.1f} ms  {_format_counts(counts)}")
+        for i in range(args.rounds):
+            _touch_source(source_dir)
+            elapsed, counts = _timed(server, lambda: backup_manager.create_backup(f"bench_{i}", is_manual=True))
+            print(f"增量备份 {i + 1:<4} {elapsed:8.1f} ms  {_format_counts(counts)}")
+
+        first = backup_manager.backups[0]
+        elapsed, counts = _timed(server, lambda: backup_manager.restore_backup(first["path"], first["name"]))
+        print(f"恢复          {elapsed:8.1f} ms  {_format_counts(counts)}")
+
+        for backup in list(backup_manager.backups[1:]):
+            backup_manager.delete_backup(backup["path"], backup["name"])
+        elapsed, counts = _timed(server, backup_manager.gc_repository)
+        print(f"清理仓库      {elapsed:8.1f} ms  {_format_counts(counts)}")
+
+        print(f"请求总数 {store.request_count}，新建连接 {store.pool.connections_created}"
+              f"（连接池大小 {args.connections}），签名被拒绝 {server.rejected}")
+        store.close()
+    finally:
+        server.stop()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
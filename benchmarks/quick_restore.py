@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+快速恢复性能测试 - 比较开启和关闭内存缓存时反复快速恢复最新备份（F8）的耗时与缓存命中率
+
+用法:
+    python -m benchmarks.quick_restore [--files 20] [--size 1048576] [--rounds 5]
+"""
+
+import os
+import json
+import time
+import shutil
+import argparse
+import tempfile
+
+from config.config_manager import ConfigManager
+from backup.backup_manager import BackupManager
+from utils.file_utils import ensure_dir
+
+
+def _make_source(source_dir, file_count, file_size):
+    """生成测试用的源目录"""
+    ensure_dir(source_dir)
+    for i in range(file_count):
+        with open(os.path.join(source_dir, f"userdata{i:04d}"), "wb") as f:
+            f.write(os.urandom(file_size))
+
+
+def run_mode(work_dir, cache_mb, rounds):
+    """备份一次后多次快速恢复
+
+    Returns:
+        dict: 每次恢复的平均耗时（毫秒）和缓存统计
+    """
+    source_dir = os.path.join(work_dir, "source")
+    backup_root = os.path.join(work_dir, f"backups_{cache_mb}")
+    config_file = os.path.join(work_dir, f"cache_{cache_mb}.json")
+    with open(config_file, "w", encoding="utf-8") as f:
+        json.dump({
+            "hotkeys": {"quick_backup": "f7", "quick_restore": "f8"},
+            "paths": {"source_path": source_dir, "backup_root": backup_root},
+            "features": {"md5_deduplication": True, "auto_load_after_restore": False,
+                         "auto_save_before_backup": False, "durable_writes": False},
+            "object_cache": {"max_mb": cache_mb},
+            "language": "zh_CN"
+        }, f)
+
+    backup_manager = BackupManager(ConfigManager(config_file), print, enable_automation=False)
+    success, message = backup_manager.quick_backup()
+    if not success:
+        raise RuntimeError(message)
+    elapsed = 0.0
+    for _ in range(rounds):
+        started = time.perf_counter()
+        success, message = backup_manager.quick_restore()
+        elapsed += time.perf_counter() - started
+        if not success:
+            raise RuntimeError(message)
+    cache = backup_manager.object_cache
+    return {"ms_per_restore": elapsed * 1000 / rounds, "cache": cache.stats() if cache is not None else None}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="比较内存缓存对快速恢复耗时的影响")
+    parser.add_argument("--files", type=int, default=20, help="存档文件数")
+    parser.add_argument("--size", type=int, default=1024 * 1024, help="每个文件的字节数")
+    parser.add_argument("--rounds", type=int, default=5, help="快速恢复的次数")
+    parser.add_argument("--cache-mb", type=int, default=128, help="开启缓存时的缓存大小（MB）")
+    parser.add_argument("--dir", help="测试目录，默认使用临时目录（应与实际备份目录在同类磁盘上）")
+    args = parser.parse_args(argv)
+
+    work_dir = tempfile.mkdtemp(prefix="saveguard_bench_", dir=args.dir)
+    try:
+        _make_source(os.path.join(work_dir, "source"), args.files, args.size)
+        for cache_mb in (0, args.cache_mb):
+            result = run_mode(work_dir, cache_mb, args.rounds)
+            cache = result["cache"]
+            label = f"object_cache={cache_mb}MB" if cache_mb else "object_cache=off  "
+            line = f"{label}  {result['ms_per_restore']:8.1f} ms/恢复"
+            if cache:
+                line += f"  命中率 {cache['hit_rate'] * 100:5.1f}%（命中 {cache['hits']}，未命中 {cache['misses']}）"
+            print(line)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,592 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+SaveGuard - 存档守护者
+命令行入口，不加载tkinter、win32或键盘钩子，适合脚本化和服务器上的定时备份
+
+用法示例:
+    python cli.py backup                 # 快速备份
+    python cli.py backup --name 打Boss前  # 命名备份
+    python cli.py restore                # 恢复最新备份
+    python cli.py undo-restore           # 换回上一次恢复前的存档
+    python cli.py list --json
+    python cli.py gc --dry-run
+    python cli.py rebuild-index          # 仓库被其他程序修改后重建文件索引
+    python cli.py tier                   # 旧备份的文件移入冷存储
+    python cli.py --profile 二周目 backup  # 备份指定配置
+    python cli.py backup --all-profiles  # 同时备份所有配置
+    python cli.py export -o saves.tar    # 导出全部备份
+    python cli.py import saves.tar
+    python cli.py diff 打Boss前            # 比较备份与当前存档
+    python cli.py calibrate              # 校准自动退出/载入的按键间隔（游戏需正在运行）
+
+退出码: 0 成功，1 操作失败，2 参数错误
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+from config.config_manager import ConfigManager
+from backup.backup_manager import BackupManager
+from utils.file_utils import format_size
+
+
+EXIT_OK = 0
+EXIT_FAILURE = 1
+EXIT_USAGE = 2
+
+
+def _print_error(message):
+    """向标准错误输出打印消息"""
+    print(message, file=sys.stderr)
+
+
+def _print_warning(message):
+    """向标准错误输出打印警告"""
+    print(f"警告: {message}", file=sys.stderr)
+
+
+def resolve_backup(backup_manager, identifier):
+    """根据路径、目录名或备份名称查找备份记录
+
+    Args:
+        backup_manager: 备份管理器实例
+        identifier: 备份路径、目录名或名称
+
+    Returns:
+        tuple: (备份记录, 错误消息)，成功时错误消息为None
+    """
+    backup = backup_manager.find_backup(identifier)
+    if backup:
+        return backup, None
+
+    matches = [b for b in backup_manager.backups
+               if os.path.basename(b["path"]) == identifier or b["name"] == identifier]
+    if not matches:
+        return None, f"找不到备份：{identifier}"
+    if len(matches) > 1:
+        return None, f"有{len(matches)}个备份名为 {identifier}，请改用备份路径"
+    return matches[0], None
+
+
+def _resolve_backups(backup_manager, identifiers):
+    """解析多个备份标识
+
+    Returns:
+        tuple: (备份记录列表, 错误消息)，未指定时备份记录列表为None
+    """
+    if not identifiers:
+        return None, None
+    backups = []
+    for identifier in identifiers:
+        backup, error = resolve_backup(backup_manager, identifier)
+        if error:
+            return None, error
+        backups.append(backup)
+    return backups, None
+
+
+def cmd_backup(backup_manager, args):
+    """执行备份"""
+    if args.all_profiles:
+        return _backup_all_profiles(backup_manager, args)
+    if args.name:
+        success, message = backup_manager.create_backup(args.name, is_manual=True)
+    else:
+        success, message = backup_manager.quick_backup()
+    (print if success else _print_error)(message)
+    return EXIT_OK if success else EXIT_FAILURE
+
+
+def _backup_all_profiles(backup_manager, args):
+    """并行备份所有配置，各配置共用同一个仓库"""
+    config_manager = backup_manager.config_manager
+    managers = [backup_manager if name == backup_manager.profile else
+                BackupManager(config_manager, _print_warning, enable_automation=False, profile=name)
+                for name in config_manager.profile_names()]
+
+    def run(manager):
+        if args.name:
+            return manager.create_backup(args.name, is_manual=True)
+        return manager.quick_backup()
+
+    exit_code = EXIT_OK
+    with ThreadPoolExecutor(max_workers=len(managers)) as executor:
+        for manager, (success, message) in zip(managers, executor.map(run, managers)):
+            (print if success else _print_error)(f"[{manager.profile}] {message}")
+            if not success:
+                exit_code = EXIT_FAILURE
+    return exit_code
+
+
+def _format_throttled(report):
+    """格式化任务因I/O限速等待的时间，没有等待时返回空字符串"""
+    io = (report or {}).get("io")
+    if not io or not io["throttled_seconds"]:
+        return ""
+    return f"（I/O限速等待 {io['throttled_seconds']:.1f} 秒）"
+
+
+def cmd_mirror(backup_manager, args):
+    """将备份目录增量镜像到另一个目录，--watch 时定期重复执行"""
+    target = args.target or backup_manager.config['paths'].get('mirror_root')
+    if not target:
+        _print_error("未指定镜像目录，请在命令行或配置文件的 paths.mirror_root 中指定")
+        return EXIT_USAGE
+
+    while True:
+        success, message, report = backup_manager.mirror_repository(target, args.workers, args.prune)
+        if success and report["skipped_backups"]:
+            _print_warning(f"{len(report['skipped_backups'])}个备份不在备份目录下或已不存在，未镜像")
+        (print if success else _print_error)(message + _format_throttled(report))
+        if not args.watch:
+            return EXIT_OK if success else EXIT_FAILURE
+        try:
+            time.sleep(args.watch)
+        except KeyboardInterrupt:
+            return EXIT_OK if success else EXIT_FAILURE
+
+
+def cmd_profiles(backup_manager, args):
+    """列出所有配置"""
+    config_manager = backup_manager.config_manager
+    for name in config_manager.profile_names():
+        profile = config_manager.get_profile(name)
+        marker = "*" if name == config_manager.active_profile else " "
+        print(f"{marker} {name}\t{profile['source_path']}")
+    return EXIT_OK
+
+
+def cmd_restore(backup_manager, args):
+    """恢复备份，未指定时恢复最新备份"""
+    if args.backup:
+        backup, error = resolve_backup(backup_manager, args.backup)
+        if error:
+            _print_error(error)
+            return EXIT_FAILURE
+        success, message = backup_manager.restore_backup(backup["path"], backup["name"], True)
+    else:
+        success, message = backup_manager.quick_restore()
+    (print if success else _print_error)(message)
+    return EXIT_OK if success else EXIT_FAILURE
+
+
+def cmd_prepare_restore(backup_manager, args):
+    """提前准备恢复备份的暂存目录"""
+    backup_path = None
+    if args.backup:
+        backup, error = resolve_backup(backup_manager, args.backup)
+        if error:
+            _print_error(error)
+            return EXIT_FAILURE
+        backup_path = backup["path"]
+    success, message = backup_manager.prepare_restore(backup_path)
+    (print if success else _print_error)(message)
+    return EXIT_OK if success else EXIT_FAILURE
+
+
+def cmd_undo_restore(backup_manager, args):
+    """换回上一次恢复前的存档"""
+    success, message = backup_manager.undo_restore()
+    (print if success else _print_error)(message)
+    return EXIT_OK if success else EXIT_FAILURE
+
+
+def cmd_restore_paths(backup_manager, args):
+    """只恢复备份中的部分文件"""
+    backup, error = resolve_backup(backup_manager, args.backup)
+    if error:
+        _print_error(error)
+        return EXIT_FAILURE
+    if args.list:
+        success, message, files = backup_manager.list_backup_files(backup["path"])
+        for file_info in files:
+            print(f"{format_size(file_info['size'])}\t{file_info['path']}")
+        (print if success else _print_error)(message)
+        return EXIT_OK if success else EXIT_FAILURE
+    if not args.paths:
+        _print_error("请指定要恢复的文件、目录或通配符，或使用 --list 查看备份中的文件")
+        return EXIT_USAGE
+    success, message, _ = backup_manager.restore_paths(backup["path"], args.paths)
+    (print if success else _print_error)(message)
+    return EXIT_OK if success else EXIT_FAILURE
+
+
+def cmd_list(backup_manager, args):
+    """列出所有备份，按时间从新到旧排列"""
+    backups = sorted(backup_manager.backups, key=lambda x: x["date"], reverse=True)
+    if args.json:
+        print(json.dumps(backups, ensure_ascii=False, indent=2))
+        return EXIT_OK
+    for backup in backups:
+        print(f"{backup['date'][:19]}\t{backup.get('type', 'legacy')}\t{backup['name']}\t{backup['path']}")
+    return EXIT_OK
+
+
+def cmd_stats(backup_manager, args):
+    """显示存储统计信息"""
+    stats = backup_manager.calculate_storage_stats()
+    if not stats:
+        _print_error("当前没有备份数据")
+        return EXIT_FAILURE
+    if args.json:
+        print(json.dumps(stats, ensure_ascii=False, indent=2))
+        return EXIT_OK
+    print(f"备份总数: {stats['backup_count']} (MD5去重: {stats['md5_backup_count']})")
+    print(f"文件仓库大小: {format_size(stats['repo_size'])}")
+    print(f"备份文件总数: {stats['total_files']}")
+    print(f"理论占用空间: {format_size(stats['theoretical_size'])}")
+    print(f"节省空间: {format_size(stats['saved_space'])} ({stats['saved_percentage']:.1f}%)")
+    cache = stats.get("object_cache")
+    if cache:
+        print(f"内存缓存: {format_size(cache['bytes'])} / {format_size(cache['max_bytes'])}，"
+              f"命中率 {cache['hit_rate'] * 100:.1f}%（命中 {cache['hits']}，未命中 {cache['misses']}）")
+    index = stats.get("object_index")
+    if index:
+        print(f"文件索引: {index['objects']}个文件，布隆过滤器 {format_size(index['bloom_bytes'])}，"
+              f"已检查 {index['lookups']}次（直接判定为新文件 {index['bloom_negatives']}，误判 {index['false_positives']}）")
+    tiers = stats.get("tiers")
+    if tiers:
+        print(f"热层: {format_size(tiers['hot_bytes'])}，冷层: {format_size(tiers['cold_bytes'])}"
+              f"（压缩后 {format_size(tiers['cold_stored_bytes'])}，{tiers['packs']}个文件包）")
+        print("预计恢复耗时:")
+        for cost in stats.get("restore_costs") or []:
+            if cost["error"]:
+                print(f"  {cost['name']}\t元数据无法读取：{cost['error']}")
+                continue
+            print(f"  {cost['name']}\t{cost['seconds']:.2f} 秒（热层 {format_size(cost['hot_bytes'])}，"
+                  f"冷层 {format_size(cost['cold_bytes'])}，{cost['packs']}个文件包）")
+    governor = stats.get("io_governor")
+    if governor and governor["enabled"]:
+        running = {True: "运行中", False: "未运行"}.get(governor["emulator_running"], "无法检测，按运行中限速")
+        limits = [f"{mb_s:g} MB/s" if mb_s else "不限速" for mb_s in (governor["max_mb_s"], governor["idle_mb_s"])]
+        print(f"I/O限速: 模拟器运行时 {limits[0]}，未运行时 {limits[1]}（当前{running}）")
+        for name, job in sorted(governor["jobs"].items()):
+            print(f"  {name}\t{job['runs']}次，读写 {format_size(job['bytes'])}，"
+                  f"限速等待 {job['throttled_seconds']:.1f} / {job['elapsed']:.1f} 秒")
+    return EXIT_OK
+
+
+def cmd_gc(backup_manager, args):
+    """清理仓库中未被引用的文件"""
+    success, message, stats = backup_manager.gc_repository(dry_run=args.dry_run)
+    if not success:
+        _print_error(message)
+        return EXIT_FAILURE
+    prefix = "[试运行] " if args.dry_run else ""
+    print(f"{prefix}{message}，释放 {format_size(stats['freed_bytes'])}{_format_throttled(stats)}")
+    return EXIT_OK
+
+
+def cmd_tier(backup_manager, args):
+    """按备份的新旧在仓库目录和冷存储之间移动文件"""
+    success, message, report = backup_manager.tier_repository(dry_run=args.dry_run)
+    if not success:
+        _print_error(message)
+        return EXIT_FAILURE
+    prefix = "[试运行] " if args.dry_run else ""
+    print(f"{prefix}{message}，移入 {format_size(report['frozen_bytes'])}，移回 {format_size(report['thawed_bytes'])}"
+          f"{_format_throttled(report)}")
+    for file_md5 in report["corrupted"]:
+        _print_warning(f"文件校验失败：{file_md5}")
+    return EXIT_OK
+
+
+def cmd_rebuild_index(backup_manager, args):
+    """从仓库目录重建文件索引"""
+    success, message, _ = backup_manager.rebuild_object_index()
+    if not success:
+        _print_error(message)
+        return EXIT_FAILURE
+    print(message)
+    return EXIT_OK
+
+
+def cmd_verify(backup_manager, args):
+    """校验备份完整性"""
+    backups, error = _resolve_backups(backup_manager, args.backups)
+    if error:
+        _print_error(error)
+        return EXIT_FAILURE
+
+    success, message, problems = backup_manager.verify_backups(backups)
+    for problem in problems:
+        if problem["error"]:
+            _print_error(f"{problem['name']}: {problem['error']}")
+            continue
+        for path in problem["missing"]:
+            _print_error(f"{problem['name']}: 缺失 {path}")
+        for path in problem["corrupted"]:
+            _print_error(f"{problem['name']}: 损坏 {path}")
+    (print if success else _print_error)(message)
+    return EXIT_OK if success else EXIT_FAILURE
+
+
+def cmd_scrub(backup_manager, args):
+    """以低优先级校验仓库文件，可在时间预算内分多次完成"""
+    success, message, report = backup_manager.scrub_repository(
+        time_budget=args.time_budget, max_workers=args.workers)
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        for problem in report["affected_backups"]:
+            if problem["error"]:
+                _print_error(f"{problem['name']}: {problem['error']}")
+            else:
+                _print_error(f"{problem['name']}: {len(problem['objects'])}个文件损坏或缺失")
+    (print if success else _print_error)(message + ("" if args.json else _format_throttled(report)))
+    return EXIT_OK if success else EXIT_FAILURE
+
+
+def _format_delta(size_delta):
+    """格式化大小变化"""
+    return ("+" if size_delta >= 0 else "-") + format_size(abs(size_delta))
+
+
+def cmd_diff(backup_manager, args):
+    """比较两个备份，只指定一个备份时与当前存档比较"""
+    old_backup, error = resolve_backup(backup_manager, args.old)
+    if not error and args.new:
+        new_backup, error = resolve_backup(backup_manager, args.new)
+    if error:
+        _print_error(error)
+        return EXIT_FAILURE
+
+    if args.new:
+        success, message, diff = backup_manager.diff_backups(old_backup["path"], new_backup["path"])
+    else:
+        success, message, diff = backup_manager.diff_with_source(old_backup["path"])
+    if not success:
+        _print_error(message)
+        return EXIT_FAILURE
+    if args.json:
+        print(json.dumps(diff, ensure_ascii=False, indent=2))
+        return EXIT_OK
+    for item in diff["added"]:
+        print(f"A\t{format_size(item['size'])}\t{item['path']}")
+    for item in diff["removed"]:
+        print(f"D\t{format_size(item['size'])}\t{item['path']}")
+    for item in diff["modified"]:
+        print(f"M\t{_format_delta(item['size_delta'])}\t{item['path']}")
+    print(f"{message}，大小变化 {_format_delta(diff['size_delta'])}")
+    return EXIT_OK
+
+
+def cmd_migrate(backup_manager, args):
+    """将传统备份转换为MD5去重备份"""
+    success, message, report = backup_manager.migrate_legacy_backups(max_workers=args.workers)
+    if report is None:
+        _print_error(message)
+        return EXIT_FAILURE
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    for failure in report["failed"]:
+        _print_error(f"{failure['name']}: {failure['error']}")
+    message += (f"，共{report['files']}个文件，新增仓库文件 {format_size(report['bytes_written'])}，"
+                f"释放 {format_size(report['reclaimed'])}")
+    (print if success else _print_error)(message)
+    return EXIT_OK if success else EXIT_FAILURE
+
+
+def cmd_convert_manifests(backup_manager, args):
+    """将旧版JSON格式的备份元数据转换为紧凑格式"""
+    success, message, stats = backup_manager.convert_manifests()
+    for failure in stats["failed"]:
+        _print_error(f"{failure['name']}: {failure['error']}")
+    if stats["converted"]:
+        message += f"，{format_size(stats['bytes_before'])} → {format_size(stats['bytes_after'])}"
+    (print if success else _print_error)(message)
+    return EXIT_OK if success else EXIT_FAILURE
+
+
+def cmd_export(backup_manager, args):
+    """将备份导出为备份包，输出为 - 时写到标准输出"""
+    backups, error = _resolve_backups(backup_manager, args.backups)
+    since = None
+    if not error and args.since:
+        since, error = resolve_backup(backup_manager, args.since)
+    if error:
+        _print_error(error)
+        return EXIT_FAILURE
+
+    compress = args.gzip or args.output.endswith((".tar.gz", ".tgz"))
+    if args.output == "-":
+        success, message, _ = backup_manager.export_backups(sys.stdout.buffer, backups, since, compress)
+        sys.stdout.buffer.flush()
+        # 标准输出用于数据，消息写到标准错误
+        _print_error(message)
+    else:
+        with open(args.output, "wb") as f:
+            success, message, _ = backup_manager.export_backups(f, backups, since, compress)
+        if not success:
+            os.remove(args.output)
+        (print if success else _print_error)(message)
+    return EXIT_OK if success else EXIT_FAILURE
+
+
+def cmd_import(backup_manager, args):
+    """从备份包导入备份，输入为 - 时从标准输入读取"""
+    if args.bundle == "-":
+        success, message, _ = backup_manager.import_backups(sys.stdin.buffer)
+    else:
+        if not os.path.exists(args.bundle):
+            _print_error(f"文件不存在：{args.bundle}")
+            return EXIT_FAILURE
+        with open(args.bundle, "rb") as f:
+            success, message, _ = backup_manager.import_backups(f)
+    (print if success else _print_error)(message)
+    return EXIT_OK if success else EXIT_FAILURE
+
+
+def cmd_calibrate(backup_manager, args):
+    """校准当前配置的游戏按键宏的按键间隔"""
+    success, message, _ = backup_manager.calibrate_automation(args.trials, args.iterations, progress=print)
+    (print if success else _print_error)(message)
+    return EXIT_OK if success else EXIT_FAILURE
+
+
+def build_parser():
+    """构建命令行参数解析器
+
+    Returns:
+        argparse.ArgumentParser: 参数解析器
+    """
+    parser = argparse.ArgumentParser(prog="saveguard", description="SaveGuard 存档备份命令行工具")
+    parser.add_argument("--config", default="config.json", help="配置文件路径（默认: config.json）")
+    parser.add_argument("--profile", help="要操作的配置名称（默认: default）")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    backup_parser = subparsers.add_parser("backup", help="备份当前存档")
+    backup_parser.add_argument("--name", help="备份名称，不指定时创建快速备份")
+    backup_parser.add_argument("--all-profiles", action="store_true", help="同时备份所有配置")
+    backup_parser.set_defaults(func=cmd_backup)
+
+    restore_parser = subparsers.add_parser("restore", help="恢复备份")
+    restore_parser.add_argument("backup", nargs="?", help="备份路径、目录名或名称，默认恢复最新备份")
+    restore_parser.set_defaults(func=cmd_restore)
+
+    prepare_parser = subparsers.add_parser("prepare-restore", help="提前在存档目录旁构建备份的存档，之后恢复时只需重命名")
+    prepare_parser.add_argument("backup", nargs="?", help="备份路径、目录名或名称，默认为最新备份")
+    prepare_parser.set_defaults(func=cmd_prepare_restore)
+
+    undo_restore_parser = subparsers.add_parser("undo-restore", help="换回上一次恢复前的存档，再次执行即重做")
+    undo_restore_parser.set_defaults(func=cmd_undo_restore)
+
+    restore_paths_parser = subparsers.add_parser("restore-paths", help="只恢复备份中的部分文件，存档中的其他文件不变")
+    restore_paths_parser.add_argument("backup", help="备份路径、目录名或名称")
+    restore_paths_parser.add_argument("paths", nargs="*", help="文件、目录或通配符，如 slot1/*.sav")
+    restore_paths_parser.add_argument("--list", action="store_true", help="列出备份中的文件")
+    restore_paths_parser.set_defaults(func=cmd_restore_paths)
+
+    list_parser = subparsers.add_parser("list", help="列出所有备份")
+    list_parser.add_argument("--json", action="store_true", help="以JSON格式输出")
+    list_parser.set_defaults(func=cmd_list)
+
+    stats_parser = subparsers.add_parser("stats", help="显示存储统计信息")
+    stats_parser.add_argument("--json", action="store_true", help="以JSON格式输出")
+    stats_parser.set_defaults(func=cmd_stats)
+
+    gc_parser = subparsers.add_parser("gc", help="清理仓库中未被引用的文件")
+    gc_parser.add_argument("--dry-run", action="store_true", help="只统计，不删除")
+    gc_parser.set_defaults(func=cmd_gc)
+
+    tier_parser = subparsers.add_parser("tier", help="将只被旧备份引用的文件压缩打包移入冷存储")
+    tier_parser.add_argument("--dry-run", action="store_true", help="只统计，不移动文件")
+    tier_parser.set_defaults(func=cmd_tier)
+
+    rebuild_index_parser = subparsers.add_parser("rebuild-index",
+                                                 help="从仓库目录重建文件索引，仓库被其他程序修改后使用")
+    rebuild_index_parser.set_defaults(func=cmd_rebuild_index)
+
+    verify_parser = subparsers.add_parser("verify", help="校验备份完整性")
+    verify_parser.add_argument("backups", nargs="*", help="要校验的备份，默认校验全部")
+    verify_parser.set_defaults(func=cmd_verify)
+
+    scrub_parser = subparsers.add_parser("scrub", help="低优先级校验仓库文件，支持断点续校")
+    scrub_parser.add_argument("--time-budget", type=float, help="最多运行的秒数")
+    scrub_parser.add_argument("--workers", type=int, help="并行校验的线程数")
+    scrub_parser.add_argument("--json", action="store_true", help="以JSON格式输出报告")
+    scrub_parser.set_defaults(func=cmd_scrub)
+
+    diff_parser = subparsers.add_parser("diff", help="比较两个备份的文件变化，只指定一个备份时与当前存档比较")
+    diff_parser.add_argument("old", help="较早的备份")
+    diff_parser.add_argument("new", nargs="?", help="较新的备份，默认为当前存档")
+    diff_parser.add_argument("--json", action="store_true", help="以JSON格式输出")
+    diff_parser.set_defaults(func=cmd_diff)
+
+    migrate_parser = subparsers.add_parser("migrate", help="将传统备份转换为MD5去重备份，校验后删除完整副本，中断后可继续")
+    migrate_parser.add_argument("--workers", type=int, help="并行计算MD5的线程数")
+    migrate_parser.add_argument("--json", action="store_true", help="以JSON格式输出报告")
+    migrate_parser.set_defaults(func=cmd_migrate)
+
+    convert_parser = subparsers.add_parser("convert-manifests",
+                                           help="将旧版 files.json 备份元数据转换为紧凑的 manifest.bin")
+    convert_parser.set_defaults(func=cmd_convert_manifests)
+
+    export_parser = subparsers.add_parser("export", help="将备份导出为备份包，只包含所选备份引用的文件")
+    export_parser.add_argument("backups", nargs="*", help="要导出的备份，默认导出全部（指定--since时为其后的所有备份）")
+    export_parser.add_argument("-o", "--output", required=True, help="输出文件，- 表示标准输出")
+    export_parser.add_argument("--since", help="基础备份，只导出之后新产生的文件，导入方需已导入基础备份")
+    export_parser.add_argument("--gzip", action="store_true", help="使用gzip压缩（输出文件名以.tar.gz结尾时自动启用）")
+    export_parser.set_defaults(func=cmd_export)
+
+    import_parser = subparsers.add_parser("import", help="从备份包导入备份，跳过仓库中已有的文件")
+    import_parser.add_argument("bundle", help="备份包文件，- 表示标准输入")
+    import_parser.set_defaults(func=cmd_import)
+
+    mirror_parser = subparsers.add_parser("mirror", help="将备份目录增量镜像到另一个目录，中断后可继续")
+    mirror_parser.add_argument("target", nargs="?", help="镜像目录，默认使用配置中的 paths.mirror_root")
+    mirror_parser.add_argument("--workers", type=int, help="并行复制的线程数")
+    mirror_parser.add_argument("--prune", action="store_true", help="删除镜像中源目录已不存在的备份和文件")
+    mirror_parser.add_argument("--watch", type=float, metavar="SECONDS", help="持续运行，每隔指定秒数镜像一次")
+    mirror_parser.set_defaults(func=cmd_mirror)
+
+    profiles_parser = subparsers.add_parser("profiles", help="列出所有配置，*号标记界面中的当前配置")
+    profiles_parser.set_defaults(func=cmd_profiles)
+
+    calibrate_parser = subparsers.add_parser("calibrate",
+                                             help="反复自动退出和载入游戏，测量每次按键后的最短可靠间隔并保存")
+    calibrate_parser.add_argument("--trials", type=int, default=3, help="每个候选间隔需要连续成功的次数")
+    calibrate_parser.add_argument("--iterations", type=int, default=4, help="每个按键二分查找的次数")
+    calibrate_parser.set_defaults(func=cmd_calibrate)
+
+    return parser
+
+
+def main(argv=None):
+    """命令行入口函数
+
+    Args:
+        argv: 参数列表，默认使用sys.argv
+
+    Returns:
+        int: 退出码
+    """
+    args = build_parser().parse_args(argv)
+
+    if not os.path.exists(args.config):
+        _print_error(f"配置文件不存在：{args.config}")
+        return EXIT_FAILURE
+
+    config_errors = []
+    config_manager = ConfigManager(args.config, error_handler=config_errors.append)
+    if config_errors:
+        for message in config_errors:
+            _print_error(message)
+        return EXIT_FAILURE
+
+    if args.profile and config_manager.get_profile(args.profile) is None:
+        _print_error(f"配置不存在：{args.profile}")
+        return EXIT_USAGE
+
+    backup_manager = BackupManager(config_manager, _print_warning, enable_automation=False, profile=args.profile)
+    return args.func(backup_manager, args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -7,25 +7,39 @@
 
 import os
 import json
-from tkinter import messagebox
 from i18n import t, get_i18n_manager
+from utils.macros import DEFAULT_GAME
+
+
+# 默认的模拟器进程名称，包括Windows和Linux版本
+DEFAULT_PROCESS_NAMES = ['shadPS4.exe', 'shadps4', 'Shadps4-qt.AppImage']
+
+# 默认配置的名称，对应配置文件顶层的 paths.source_path 和 hotkeys
+DEFAULT_PROFILE = 'default'
+
+
+def _show_error_dialog(message):
+    """使用tkinter弹窗显示错误信息，仅在GUI中需要时才导入tkinter"""
+    from tkinter import messagebox
+    messagebox.showerror(t("error"), message)
 
 
 class ConfigManager:
     """配置管理类，负责加载和保存配置"""
     
-    def __init__(self, config_file="config.json"):
+    def __init__(self, config_file="config.json", error_handler=None):
         """初始化配置管理器
         
         Args:
             config_file: 配置文件路径
+            error_handler: 可选，接收错误消息的回调函数，默认弹窗显示
         """
         self.config_file = config_file
+        self.error_handler = error_handler or _show_error_dialog
         self.config = self.load_config()
         
         # 初始化路径
-        self.source_path = self.config['paths']['source_path']
-        self.backup_root = os.path.join(os.getcwd(), self.config['paths']['backup_root'])
+        self._load_paths()
         
         # 设置i18n语言
         if 'language' in self.config:
@@ -52,14 +66,17 @@ class ConfigManager:
                     'features': {
                         'md5_deduplication': True,
                         'auto_load_after_restore': False,
-                        'auto_save_before_backup': False
+                        'auto_save_before_backup': False,
+                        'background_scrub': True,
+                        'durable_writes': True
                     },
+                    'emulator': {'process_names': list(DEFAULT_PROCESS_NAMES)},
                     'language': 'zh_CN'
                 }
                 self.save_config(default_config)
                 return default_config
         except Exception as e:
-            messagebox.showerror(t("error"), f"{t('save_config_error')}: {str(e)}")
+            self.error_handler(f"{t('save_config_error')}: {str(e)}")
             # 返回默认配置
             return {
                 'hotkeys': {'quick_backup': 'f7', 'quick_restore': 'f8'},
@@ -71,6 +88,7 @@ class ConfigManager:
                     'md5_deduplication': True,
                     'auto_load_after_restore': False
                 },
+                'emulator': {'process_names': list(DEFAULT_PROCESS_NAMES)},
                 'language': 'zh_CN'
             }
     
@@ -87,7 +105,7 @@ class ConfigManager:
             with open(self.config_file, 'w', encoding='utf-8') as f:
                 json.dump(config, f, ensure_ascii=False, indent=4)
         except Exception as e:
-            messagebox.showerror(t("error"), f"{t('save_config_error')}: {str(e)}")
+            self.error_handler(f"{t('save_config_error')}: {str(e)}")
     
     def update_config(self, new_config):
         """更新配置
@@ -96,9 +114,82 @@ class ConfigManager:
             new_config: 新的配置字典
         """
         self.config = new_config
+        self._load_paths()
+        self.save_config()
+    
+    def _load_paths(self):
+        """从配置中读取路径、进程名和当前配置名"""
         self.source_path = self.config['paths']['source_path']
         self.backup_root = os.path.join(os.getcwd(), self.config['paths']['backup_root'])
-        self.save_config()
+        self.process_names = self.config.get('emulator', {}).get('process_names', DEFAULT_PROCESS_NAMES)
+        self.active_profile = self.config.get('active_profile', DEFAULT_PROFILE)
+        if self.active_profile not in self.profile_names():
+            self.active_profile = DEFAULT_PROFILE
+    
+    def profile_names(self):
+        """获取所有配置名称
+        
+        每个配置对应一个存档目录，拥有自己的热键和备份列表，所有配置共用同一个文件仓库。
+        
+        Returns:
+            list: 配置名称列表，默认配置排在最前
+        """
+        return [DEFAULT_PROFILE] + sorted(name for name in self.config.get('profiles', {}) if name != DEFAULT_PROFILE)
+    
+    def get_profile(self, name=None):
+        """获取配置的存档目录、热键和游戏
+        
+        Args:
+            name: 配置名称，默认为当前配置
+            
+        Returns:
+            dict: {"name": 名称, "source_path": 存档目录, "hotkeys": 热键字典, "game": 按键宏的游戏名称}，
+                  配置不存在时返回None；热键字典即配置中保存的字典，修改后调用 save_config 即可保存
+        """
+        name = name or self.active_profile
+        default_game = self.config.get('game', DEFAULT_GAME)
+        if name == DEFAULT_PROFILE:
+            return {"name": name, "source_path": self.config['paths']['source_path'],
+                    "hotkeys": self.config.setdefault('hotkeys', {}), "game": default_game}
+        profile = self.config.get('profiles', {}).get(name)
+        if profile is None:
+            return None
+        # 其他配置未设置热键时不注册热键，避免与默认配置冲突；未设置游戏时与默认配置相同
+        return {"name": name, "source_path": profile['source_path'], "hotkeys": profile.setdefault('hotkeys', {}),
+                "game": profile.get('game', default_game)}
+    
+    def set_profile(self, name, source_path, hotkeys=None, game=None):
+        """新增或修改配置，修改后需调用 save_config 保存
+        
+        Args:
+            name: 配置名称
+            source_path: 存档目录
+            hotkeys: 可选，热键字典
+            game: 可选，按键宏的游戏名称
+        """
+        if name == DEFAULT_PROFILE:
+            self.config['paths']['source_path'] = source_path
+            if hotkeys is not None:
+                self.config['hotkeys'] = hotkeys
+            if game is not None:
+                self.config['game'] = game
+        else:
+            profile = self.config.setdefault('profiles', {}).setdefault(name, {})
+            profile['source_path'] = source_path
+            if hotkeys is not None:
+                profile['hotkeys'] = hotkeys
+            if game is not None:
+                profile['game'] = game
+        self._load_paths()
+    
+    def set_active_profile(self, name):
+        """切换当前配置，修改后需调用 save_config 保存
+        
+        Args:
+            name: 配置名称
+        """
+        self.config['active_profile'] = name
+        self._load_paths()
     
     def get_config(self):
         """获取当前配置
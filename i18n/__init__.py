@@ -6,10 +6,13 @@ i18n模块 - 国际化支持
 提供多语言翻译和语言切换功能
 """
 
-from pathlib import Path
+import os
 import json
 import locale
 
+# 语言文件目录
+LOCALES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'locales')
+
 class I18nManager:
     _instance = None
     _current_lang = None
@@ -25,29 +28,41 @@ class I18nManager:
             self._init_translations()
     
     def _init_translations(self):
-        """初始化翻译资源"""
+        """初始化翻译资源，语言文件在首次使用时才加载"""
         # 使用系统默认语言作为初始语言
-        system_lang = locale.getdefaultlocale()[0]
+        system_lang = locale.getdefaultlocale()[0] or ''
         self._current_lang = 'zh_CN' if system_lang.startswith('zh') else 'en_US'
+    
+    def _locale_file(self, lang_code):
+        """获取语言文件路径"""
+        return os.path.join(LOCALES_DIR, f'{lang_code}.json')
+    
+    def _load_language(self, lang_code):
+        """按需加载指定语言的翻译文件
         
-        # 加载翻译文件
-        i18n_dir = Path(__file__).parent / 'locales'
-        for lang_file in i18n_dir.glob('*.json'):
-            lang_code = lang_file.stem
+        Returns:
+            dict: 翻译字典，语言文件不存在时返回None
+        """
+        translations = self._translations.get(lang_code)
+        if translations is None:
+            lang_file = self._locale_file(lang_code)
+            if not os.path.isfile(lang_file):
+                return None
             with open(lang_file, 'r', encoding='utf-8') as f:
-                self._translations[lang_code] = json.load(f)
+                translations = json.load(f)
+            self._translations[lang_code] = translations
+        return translations
     
     def get_text(self, key, lang=None):
         """获取指定键的翻译文本"""
-        lang = lang or self._current_lang
-        try:
-            return self._translations[lang][key]
-        except KeyError:
+        translations = self._load_language(lang or self._current_lang)
+        if translations is None:
             return key
+        return translations.get(key, key)
     
     def set_language(self, lang_code):
         """设置当前语言"""
-        if lang_code in self._translations:
+        if lang_code in self._translations or os.path.isfile(self._locale_file(lang_code)):
             self._current_lang = lang_code
             return True
         return False
@@ -58,7 +73,7 @@ class I18nManager:
     
     def get_available_languages(self):
         """获取所有可用的语言代码"""
-        return list(self._translations.keys())
+        return [os.path.splitext(name)[0] for name in os.listdir(LOCALES_DIR) if name.endswith('.json')]
 
 # 创建全局访问点
 def get_i18n_manager():
@@ -6,18 +6,32 @@
 """
 
 import tkinter as tk
-from tkinter import ttk, messagebox, filedialog
+from tkinter import ttk, messagebox, filedialog, simpledialog
 import os
-import keyboard
-from datetime import datetime
+import re
+import bisect
+import threading
 
 from config.config_manager import ConfigManager
 from backup.backup_manager import BackupManager
-from utils.system_utils import is_process_running, register_hotkey, unregister_all_hotkeys
+from backup.backup_index import BackupIndex
+from utils.system_utils import ProcessTracker, register_hotkey, unregister_all_hotkeys, listen_key_press
 from utils.file_utils import format_size
+from utils.macros import macro_names
+from utils import startup_probe
 from i18n import get_i18n_manager, t
 
 
+# 备份列表每次加载的行数，滚动到底部时再加载下一页
+BACKUP_LIST_PAGE_SIZE = 200
+
+# 启动后后台校验仓库的时间预算（秒），未完成的部分下次启动时继续
+BACKGROUND_SCRUB_TIME_BUDGET = 60
+
+# 筛选栏中日期的格式，可只填年或年月
+DATE_FILTER_PATTERN = re.compile(r"^\d{4}(-\d{2}(-\d{2})?)?$")
+
+
 class BackupManagerUI:
     """备份管理器UI类，负责界面展示和用户交互"""
     
@@ -35,17 +49,20 @@ class BackupManagerUI:
         self.config_manager = ConfigManager()
         
         # 初始化备份管理器
-        self.backup_manager = BackupManager(self.config_manager)
+        self.init_backup_manager()
         
         # 创建界面
         self.create_widgets()
         self.update_backup_list()
         
-        # 初始化热键
-        self.setup_hotkeys()
+        # 热键在窗口显示后再注册，避免加载键盘钩子拖慢窗口出现
+        master.after(0, self.finish_startup)
         
         # 自动保存机制
         master.protocol("WM_DELETE_WINDOW", self.on_close)
+        
+        # 窗口重新获得焦点时载入其他进程（如命令行）对备份记录的修改
+        master.bind("<FocusIn>", self.on_focus_in)
     
     def create_widgets(self):
         """创建界面组件"""
@@ -53,9 +70,20 @@ class BackupManagerUI:
         main_frame = ttk.Frame(self.master, padding=10)
         main_frame.pack(fill=tk.BOTH, expand=True)
 
+        # 配置选择
+        profile_frame = ttk.Frame(main_frame)
+        profile_frame.grid(row=0, column=0, sticky="ew")
+        ttk.Label(profile_frame, text=t("profile") + ":").pack(side=tk.LEFT)
+        self.profile_var = tk.StringVar(value=self.backup_manager.profile)
+        self.profile_combo = ttk.Combobox(profile_frame, textvariable=self.profile_var, state='readonly', width=20)
+        self.profile_combo['values'] = self.config_manager.profile_names()
+        self.profile_combo.pack(side=tk.LEFT, padx=5)
+        self.profile_combo.bind("<<ComboboxSelected>>", lambda e: self.switch_profile(self.profile_var.get()))
+        ttk.Button(profile_frame, text=t("new_profile"), command=self.add_profile).pack(side=tk.LEFT)
+
         # 备份操作区
         backup_frame = ttk.LabelFrame(main_frame, text=t("backup"), padding=10)
-        backup_frame.grid(row=0, column=0, sticky="ew", pady=5)
+        backup_frame.grid(row=1, column=0, sticky="ew", pady=5)
         
         # 添加设置按钮和统计按钮
         buttons_frame = ttk.Frame(backup_frame)
@@ -71,7 +99,9 @@ class BackupManagerUI:
 
         # 备份列表
         list_frame = ttk.LabelFrame(main_frame, text=t("backup_list"), padding=10)
-        list_frame.grid(row=1, column=0, sticky="nsew", pady=5)
+        list_frame.grid(row=2, column=0, sticky="nsew", pady=5)
+        
+        self.create_search_bar(list_frame)
         
         self.tree = ttk.Treeview(list_frame, columns=("name", "date", "path"), show="headings", height=8)
         self.tree.heading("name", text=t("backup_name"), anchor=tk.W)
@@ -83,9 +113,13 @@ class BackupManagerUI:
 
         # 创建右键菜单
         self.context_menu = tk.Menu(self.master, tearoff=0)
+        self.context_menu.add_command(label=t("restore_files"), command=self.show_partial_restore)
         self.context_menu.add_command(label=t("rename"), command=self.rename_backup)
         self.context_menu.add_command(label=t("duplicate"), command=self.duplicate_backup)
         self.context_menu.add_separator()
+        self.context_menu.add_command(label=t("compare_with_current"), command=self.compare_with_current)
+        self.context_menu.add_command(label=t("compare_selected"), command=self.compare_selected_backups)
+        self.context_menu.add_separator()
         self.context_menu.add_command(label=t("delete"), command=self.delete_backup)
 
         # 绑定右键菜单
@@ -93,40 +127,261 @@ class BackupManagerUI:
 
         # 滚动条
         scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=self.tree.yview)
-        self.tree.configure(yscroll=scrollbar.set)
+        self.tree.configure(yscroll=lambda first, last: self.on_tree_scroll(scrollbar, first, last))
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
 
         # 恢复操作区
         restore_frame = ttk.Frame(main_frame)
-        restore_frame.grid(row=2, column=0, sticky="e", pady=5)
+        restore_frame.grid(row=3, column=0, sticky="e", pady=5)
         ttk.Button(restore_frame, text=t("restore_selected"), command=self.restore_backup).pack(side=tk.RIGHT)
+        ttk.Button(restore_frame, text=t("undo_restore"), command=self.undo_restore).pack(side=tk.RIGHT, padx=5)
 
         # 状态栏
         self.status_bar = ttk.Label(main_frame, text=t("ready"), relief=tk.SUNKEN)
-        self.status_bar.grid(row=3, column=0, sticky="ew")
+        self.status_bar.grid(row=4, column=0, sticky="ew")
 
         # 配置网格布局权重
         main_frame.columnconfigure(0, weight=1)
-        main_frame.rowconfigure(1, weight=1)
+        main_frame.rowconfigure(2, weight=1)
+    
+    def create_search_bar(self, parent):
+        """创建备份列表上方的搜索筛选栏
+        
+        Args:
+            parent: 父容器
+        """
+        search_frame = ttk.Frame(parent)
+        search_frame.pack(side=tk.TOP, fill=tk.X, pady=(0, 5))
+        
+        self.search_var = tk.StringVar()
+        self.type_filter_var = tk.StringVar(value=t("all_types"))
+        self.date_from_var = tk.StringVar()
+        self.date_to_var = tk.StringVar()
+        self.min_size_var = tk.StringVar()
+        self.max_size_var = tk.StringVar()
+        
+        ttk.Label(search_frame, text=t("search") + ":").pack(side=tk.LEFT)
+        ttk.Entry(search_frame, textvariable=self.search_var, width=16).pack(side=tk.LEFT, padx=(2, 5))
+        type_combo = ttk.Combobox(search_frame, textvariable=self.type_filter_var, state='readonly', width=7)
+        type_combo['values'] = [t("all_types"), "md5", "legacy"]
+        type_combo.pack(side=tk.LEFT, padx=5)
+        ttk.Label(search_frame, text=t("date_range") + ":").pack(side=tk.LEFT)
+        ttk.Entry(search_frame, textvariable=self.date_from_var, width=10).pack(side=tk.LEFT, padx=2)
+        ttk.Label(search_frame, text="~").pack(side=tk.LEFT)
+        ttk.Entry(search_frame, textvariable=self.date_to_var, width=10).pack(side=tk.LEFT, padx=(2, 5))
+        ttk.Label(search_frame, text=t("size_range_mb") + ":").pack(side=tk.LEFT)
+        ttk.Entry(search_frame, textvariable=self.min_size_var, width=6).pack(side=tk.LEFT, padx=2)
+        ttk.Label(search_frame, text="~").pack(side=tk.LEFT)
+        ttk.Entry(search_frame, textvariable=self.max_size_var, width=6).pack(side=tk.LEFT, padx=(2, 5))
+        ttk.Button(search_frame, text=t("clear"), command=self.clear_search).pack(side=tk.LEFT)
+        
+        for var in (self.search_var, self.type_filter_var, self.date_from_var,
+                    self.date_to_var, self.min_size_var, self.max_size_var):
+            var.trace_add("write", lambda *args: self.apply_search())
+    
+    def get_search_criteria(self):
+        """从筛选栏读取筛选条件，格式不正确的条件会被忽略
+        
+        Returns:
+            dict: BackupIndex.search 的参数
+        """
+        criteria = {}
+        text = self.search_var.get().strip()
+        if text:
+            criteria["text"] = text
+        if self.type_filter_var.get() in ("md5", "legacy"):
+            criteria["backup_type"] = self.type_filter_var.get()
+        
+        # 日期按前缀比较，"2024-05" 表示整个五月
+        date_from = self.date_from_var.get().strip()
+        if DATE_FILTER_PATTERN.match(date_from):
+            criteria["date_from"] = date_from
+        date_to = self.date_to_var.get().strip()
+        if DATE_FILTER_PATTERN.match(date_to):
+            criteria["date_to"] = date_to + "\uffff"
+        
+        for var, key in ((self.min_size_var, "min_size"), (self.max_size_var, "max_size")):
+            try:
+                criteria[key] = int(float(var.get()) * 1024 * 1024)
+            except ValueError:
+                pass
+        return criteria
+    
+    def apply_search(self):
+        """按筛选栏的条件刷新备份列表"""
+        self.search_criteria = self.get_search_criteria()
+        if self.search_criteria:
+            if ("min_size" in self.search_criteria or "max_size" in self.search_criteria) and not self.sizes_backfilled:
+                # 旧备份记录没有大小信息，首次按大小筛选时在后台补充一次
+                self.sizes_backfilled = True
+                self.backfill_sizes()
+            if self.backup_index is None:
+                self.backup_index = BackupIndex(self.backup_manager.backups)
+        self.update_backup_list()
+    
+    def backfill_sizes(self):
+        """在后台线程中为旧备份记录补充大小，完成后按当前的筛选条件重新刷新列表"""
+        backup_manager = self.backup_manager
+        
+        def finish(count):
+            # 补充的大小已通过监听函数更新到搜索索引中，切换了配置时无需刷新
+            if count and backup_manager is self.backup_manager:
+                self.update_backup_list()
+        
+        def run():
+            count = backup_manager.backfill_backup_sizes()
+            self.master.after(0, finish, count)
+        
+        threading.Thread(target=run, daemon=True).start()
+    
+    def clear_search(self):
+        """清空筛选条件"""
+        for var in (self.search_var, self.date_from_var, self.date_to_var,
+                    self.min_size_var, self.max_size_var):
+            var.set("")
+        self.type_filter_var.set(t("all_types"))
+    
+    def init_backup_manager(self):
+        """为每个配置创建备份管理器，所有配置共用同一个文件仓库，替换下来的备份管理器在后台关闭"""
+        for backup_manager in getattr(self, "backup_managers", {}).values():
+            # 等待其正在进行的操作完成，不阻塞界面线程
+            threading.Thread(target=backup_manager.close, daemon=True).start()
+        self.backup_managers = {}
+        for name in self.config_manager.profile_names():
+            backup_manager = BackupManager(
+                self.config_manager,
+                # 热键触发的操作在后台线程中执行，警告和记录变化都交回界面线程处理
+                lambda message: self.master.after(0, self.show_backup_warning, message),
+                profile=name
+            )
+            backup_manager.add_listener(
+                lambda event, backup, name=name: self.master.after(0, self.on_profile_backup_changed, name, event, backup))
+            self.backup_managers[name] = backup_manager
+        self.backup_manager = self.backup_managers[self.config_manager.active_profile]
+        self.reset_backup_index()
+        self.search_criteria = getattr(self, "search_criteria", {})
+    
+    def reset_backup_index(self):
+        """丢弃当前配置的搜索索引，在第一次搜索时重新建立"""
+        self.backup_index = None
+        self.sizes_backfilled = False
+    
+    def switch_profile(self, name):
+        """切换列表中显示的配置
+        
+        Args:
+            name: 配置名称
+        """
+        if name == self.backup_manager.profile or name not in self.backup_managers:
+            return
+        self.config_manager.set_active_profile(name)
+        self.config_manager.save_config()
+        self.backup_manager = self.backup_managers[name]
+        self.reset_backup_index()
+        self.update_backup_list()
+    
+    def add_profile(self):
+        """新建配置：输入名称并选择存档目录"""
+        name = simpledialog.askstring(t("new_profile"), t("profile_name"), parent=self.master)
+        name = (name or "").strip()
+        if not name:
+            return
+        if name in self.backup_managers:
+            messagebox.showwarning(t("warning"), t("profile_exists"))
+            return
+        source_path = filedialog.askdirectory(title=t("save_directory"))
+        if not source_path:
+            return
+        
+        self.config_manager.set_profile(name, source_path)
+        self.config_manager.save_config()
+        self.init_backup_manager()
+        self.profile_combo['values'] = self.config_manager.profile_names()
+        self.profile_var.set(name)
+        self.switch_profile(name)
+    
+    def on_profile_backup_changed(self, name, event, backup):
+        """任一配置的备份记录变化时调用，只有当前显示的配置需要更新列表"""
+        if name == self.backup_manager.profile:
+            self.on_backup_changed(event, backup)
+    
+    def on_focus_in(self, event):
+        """主窗口获得焦点时检查备份记录文件是否被其他进程修改，变化通过监听函数更新列表
+        
+        正在进行操作的配置跳过检查，不阻塞界面线程。
+        """
+        if event.widget is not self.master:
+            return
+        for backup_manager in self.backup_managers.values():
+            backup_manager.refresh_backups(blocking=False)
+    
+    def finish_startup(self):
+        """完成启动的后续工作：注册全局热键，启动后台校验"""
+        self.setup_hotkeys()
+        startup_probe.mark("hotkeys")
+        if self.config_manager.config['features'].get('background_scrub', True):
+            self.start_background_scrub()
+    
+    def start_background_scrub(self):
+        """在后台线程中以低优先级校验仓库，发现问题时提示用户"""
+        backup_manager = self.backup_manager
+        
+        def run():
+            success, message, _ = backup_manager.scrub_repository(time_budget=BACKGROUND_SCRUB_TIME_BUDGET)
+            if not success:
+                self.master.after(0, lambda: self.show_backup_warning(message))
+        
+        threading.Thread(target=run, daemon=True).start()
     
     def setup_hotkeys(self):
-        """注册全局热键"""
-        def check_shadps4_running():
-            return is_process_running('shadPS4.exe')
+        """注册所有配置的全局热键，同一按键只注册给第一个使用它的配置"""
+        self.clear_hotkeys()
+        
+        # 缓存模拟器PID，热键触发时只需O(1)的检查
+        self.process_tracker = ProcessTracker(self.config_manager.process_names)
         
         # 注册热键
-        self.hotkey_handlers = [
-            register_hotkey(
-                self.config_manager.config['hotkeys']['quick_backup'],
-                lambda: self.master.after(0, self.quick_backup),
-                check_shadps4_running
-            ),
-            register_hotkey(
-                self.config_manager.config['hotkeys']['quick_restore'],
-                lambda: self.master.after(0, self.quick_restore),
-                check_shadps4_running
-            )
-        ]
+        registered = set()
+        for name in self.config_manager.profile_names():
+            hotkeys = self.config_manager.get_profile(name)['hotkeys']
+            for action in ('quick_backup', 'quick_restore'):
+                key = hotkeys.get(action)
+                if not key or key in registered:
+                    continue
+                registered.add(key)
+                self.hotkey_handlers.append(register_hotkey(
+                    key,
+                    lambda name=name, action=action: self.run_profile_action(name, action),
+                    self.process_tracker.is_running
+                ))
+    
+    def clear_hotkeys(self):
+        """注销已注册的全局热键"""
+        for unregister in getattr(self, "hotkey_handlers", []):
+            unregister()
+        self.hotkey_handlers = []
+    
+    def run_profile_action(self, name, action):
+        """在后台线程中执行配置的快速备份或快速恢复，不同配置的操作可以同时进行
+        
+        Args:
+            name: 配置名称
+            action: 'quick_backup' 或 'quick_restore'
+        """
+        backup_manager = self.backup_managers.get(name)
+        if backup_manager is None:
+            return
+        
+        def run():
+            success, message = getattr(backup_manager, action)()
+            if len(self.backup_managers) > 1:
+                message = f"[{name}] {message}"
+            if success:
+                self.master.after(0, lambda: self.show_status(message))
+            else:
+                self.master.after(0, lambda: messagebox.showerror(t("error"), message))
+        
+        threading.Thread(target=run, daemon=True).start()
     
     def create_backup(self):
         """创建新备份"""
@@ -134,62 +389,236 @@ class BackupManagerUI:
         success, message = self.backup_manager.create_backup(backup_name,is_manual=True)
         
         if success:
-            self.update_backup_list()
             self.show_status(message)
             self.backup_name.delete(0, tk.END)
         else:
             messagebox.showerror(t("error"), message)
     
     def quick_backup(self):
-        """快速备份功能"""
-        success, message = self.backup_manager.quick_backup()
-        
-        if success:
-            self.update_backup_list()
-            self.show_status(message)
-        else:
-            self.master.after(0, lambda: messagebox.showerror(t("error"), message))
+        """快速备份当前配置"""
+        self.run_profile_action(self.backup_manager.profile, 'quick_backup')
     
     def restore_backup(self):
         """恢复选中备份"""
-        selected = self.tree.selection()
-        if not selected:
+        backup = self.get_selected_backup()
+        if not backup:
             messagebox.showwarning(t("error"), t("select_backup_first"))
             return
-            
-        item = self.tree.item(selected[0])
-        backup_path = item["values"][2]
-        backup_name = item["values"][0]
         
-        success, message = self.backup_manager.restore_backup(backup_path, backup_name,True)
+        success, message = self.backup_manager.restore_backup(backup["path"], backup["name"],True)
         
         if success:
             self.show_status(message)
         else:
             messagebox.showerror(t("error"), message)
     
-    def quick_restore(self):
-        """快速恢复最新备份"""
-        success, message = self.backup_manager.quick_restore()
-        
+    def undo_restore(self):
+        """换回上一次恢复前的存档"""
+        success, message = self.backup_manager.undo_restore()
         if success:
             self.show_status(message)
         else:
-            self.master.after(0, lambda: messagebox.showerror(t("error"), message))
+            messagebox.showerror(t("error"), message)
+    
+    def show_partial_restore(self):
+        """选择备份中的文件或目录进行部分恢复"""
+        backup = self.get_selected_backup()
+        if not backup:
+            messagebox.showwarning(t("error"), t("select_backup_first"))
+            return
+        success, message, files = self.backup_manager.list_backup_files(backup["path"])
+        if not success:
+            messagebox.showerror(t("error"), message)
+            return
+
+        dialog = tk.Toplevel(self.master)
+        dialog.title(t("partial_restore_title").format(backup_name=backup["name"]))
+        dialog.geometry("520x420")
+        dialog.transient(self.master)
+
+        frame = ttk.Frame(dialog)
+        frame.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        tree = ttk.Treeview(frame, columns=("size",), selectmode="extended")
+        tree.heading("#0", text=t("diff_path"), anchor=tk.W)
+        tree.heading("size", text=t("size"), anchor=tk.W)
+        tree.column("size", width=100, stretch=False)
+        scrollbar = ttk.Scrollbar(frame, orient=tk.VERTICAL, command=tree.yview)
+        tree.configure(yscroll=scrollbar.set)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        tree.pack(fill=tk.BOTH, expand=True)
+
+        # 以路径为节点ID构建目录树，选中目录即恢复目录下的所有文件
+        for file_info in sorted(files, key=lambda f: f["path"]):
+            parts = file_info["path"].split(os.sep)
+            for depth in range(1, len(parts)):
+                node = os.sep.join(parts[:depth])
+                if not tree.exists(node):
+                    tree.insert(os.sep.join(parts[:depth - 1]), tk.END, iid=node, text=parts[depth - 1])
+            tree.insert(os.sep.join(parts[:-1]), tk.END, iid=file_info["path"], text=parts[-1],
+                        values=(format_size(file_info["size"]),))
+
+        pattern_frame = ttk.Frame(dialog)
+        pattern_frame.pack(fill=tk.X, padx=5)
+        ttk.Label(pattern_frame, text=t("restore_pattern") + "：").pack(side=tk.LEFT)
+        pattern_entry = ttk.Entry(pattern_frame)
+        pattern_entry.pack(side=tk.LEFT, fill=tk.X, expand=True)
+
+        def do_restore():
+            patterns = list(tree.selection())
+            if pattern_entry.get().strip():
+                patterns.append(pattern_entry.get().strip())
+            if not patterns:
+                messagebox.showwarning(t("error"), t("select_files_first"), parent=dialog)
+                return
+            if not messagebox.askyesno(t("confirm"), t("confirm_partial_restore"), parent=dialog):
+                return
+            success, message, _ = self.backup_manager.restore_paths(backup["path"], patterns)
+            if success:
+                self.show_status(message)
+                dialog.destroy()
+            else:
+                messagebox.showerror(t("error"), message, parent=dialog)
+
+        buttons = ttk.Frame(dialog)
+        buttons.pack(fill=tk.X, padx=5, pady=5)
+        ttk.Button(buttons, text=t("close"), command=dialog.destroy).pack(side=tk.RIGHT)
+        ttk.Button(buttons, text=t("restore_selected_files"), command=do_restore).pack(side=tk.RIGHT, padx=5)
+
+    def quick_restore(self):
+        """快速恢复当前配置的最新备份"""
+        self.run_profile_action(self.backup_manager.profile, 'quick_restore')
     
     def update_backup_list(self):
-        """更新备份列表显示"""
-        for item in self.tree.get_children():
-            self.tree.delete(item)
+        """重新加载备份列表显示，只插入第一页"""
+        self.backups_by_path = {b["path"]: b for b in self.backup_manager.backups}
+        if self.search_criteria:
+            if self.backup_index is None:
+                self.backup_index = BackupIndex(self.backup_manager.backups)
+            self.sorted_backup_keys = self.backup_index.search_sorted(**self.search_criteria)
+        else:
+            # 按日期升序排列的 (日期, 路径)，ISO格式的日期字符串可以直接比较
+            self.sorted_backup_keys = sorted((b["date"], b["path"]) for b in self.backup_manager.backups)
+        self.tree.delete(*self.tree.get_children())
+        self.fill_backup_rows(BACKUP_LIST_PAGE_SIZE)
+    
+    def fill_backup_rows(self, count):
+        """在列表末尾追加备份行，直到加载了指定行数或全部备份
+        
+        Args:
+            count: 期望加载的行数
+        """
+        total = len(self.sorted_backup_keys)
+        for index in range(len(self.tree.get_children()), min(count, total)):
+            # 列表按日期倒序显示
+            path = self.sorted_backup_keys[total - 1 - index][1]
+            self.tree.insert("", tk.END, iid=path, values=self.backup_row(self.backups_by_path[path]))
+    
+    def backup_row(self, backup):
+        """生成备份在列表中的显示内容
+        
+        Args:
+            backup: 备份记录
             
-        for backup in sorted(self.backup_manager.backups, 
-                           key=lambda x: x["date"], 
-                           reverse=True):
-            self.tree.insert("", tk.END, values=(
-                backup["name"],
-                datetime.fromisoformat(backup["date"]).strftime("%Y-%m-%d %H:%M:%S"),
-                backup["path"]
-            ))
+        Returns:
+            tuple: (名称, 日期, 路径)
+        """
+        # isoformat日期的前19个字符即为 YYYY-MM-DDTHH:MM:SS，无需再解析
+        return backup["name"], backup["date"][:19].replace("T", " "), backup["path"]
+    
+    def on_tree_scroll(self, scrollbar, first, last):
+        """列表滚动时更新滚动条，滚动到底部时加载下一页"""
+        scrollbar.set(first, last)
+        shown = len(self.tree.get_children())
+        if float(last) >= 1.0 and shown < len(self.sorted_backup_keys):
+            self.master.after_idle(lambda: self.fill_backup_rows(shown + BACKUP_LIST_PAGE_SIZE))
+    
+    def on_backup_changed(self, event, backup):
+        """备份记录变化时增量更新搜索索引，并只更新受影响的行
+        
+        Args:
+            event: 'added'、'removed' 或 'updated'
+            backup: 发生变化的备份记录
+        """
+        key = (backup["date"], backup["path"])
+        path = backup["path"]
+        
+        if event == "removed":
+            self.backups_by_path.pop(path, None)
+            if self.backup_index is not None:
+                self.backup_index.remove(backup)
+            self.remove_backup_row(key)
+            return
+        
+        self.backups_by_path[path] = backup
+        if self.backup_index is not None:
+            if event == "added":
+                self.backup_index.add(backup)
+            else:
+                self.backup_index.update(backup)
+        
+        visible = BackupIndex.matches(backup, **self.search_criteria)
+        position = bisect.bisect_left(self.sorted_backup_keys, key)
+        listed = position < len(self.sorted_backup_keys) and self.sorted_backup_keys[position] == key
+        if visible and listed:
+            if self.tree.exists(path):
+                self.tree.item(path, values=self.backup_row(backup))
+        elif visible:
+            self.insert_backup_row(key, backup)
+        elif listed:
+            self.remove_backup_row(key)
+    
+    def insert_backup_row(self, key, backup):
+        """将备份加入列表，只有落在已加载范围内时才插入行
+        
+        Args:
+            key: (日期, 路径)
+            backup: 备份记录
+        """
+        shown = len(self.tree.get_children())
+        fully_loaded = shown >= len(self.sorted_backup_keys)
+        position = bisect.bisect_left(self.sorted_backup_keys, key)
+        self.sorted_backup_keys.insert(position, key)
+        # 列表按日期倒序显示
+        index = len(self.sorted_backup_keys) - 1 - position
+        limit = max(shown, BACKUP_LIST_PAGE_SIZE)
+        if index < limit or fully_loaded:
+            self.tree.insert("", index, iid=key[1], values=self.backup_row(backup))
+            # 列表未全部加载时保持已加载的行数不变
+            if not fully_loaded and shown + 1 > limit:
+                self.tree.delete(self.tree.get_children()[-1])
+    
+    def remove_backup_row(self, key):
+        """将备份从列表中移除，并用下一条备份补齐已加载的行数
+        
+        Args:
+            key: (日期, 路径)
+        """
+        shown = len(self.tree.get_children())
+        position = bisect.bisect_left(self.sorted_backup_keys, key)
+        if position < len(self.sorted_backup_keys) and self.sorted_backup_keys[position] == key:
+            del self.sorted_backup_keys[position]
+        if self.tree.exists(key[1]):
+            self.tree.delete(key[1])
+            self.fill_backup_rows(shown)
+    
+    def get_selected_backup(self):
+        """获取列表中选中的备份记录
+        
+        Returns:
+            dict: 备份记录，未选中时返回None
+        """
+        selected = self.tree.selection()
+        if not selected:
+            return None
+        return self.backups_by_path.get(selected[0])
+    
+    def show_backup_warning(self, message):
+        """显示备份引擎产生的警告
+        
+        Args:
+            message: 警告消息
+        """
+        messagebox.showwarning(t("warning"), message)
     
     def show_status(self, message):
         """更新状态栏
@@ -204,7 +633,7 @@ class BackupManagerUI:
         """显示设置窗口"""
         settings_window = tk.Toplevel(self.master)
         settings_window.title(t('settings'))
-        settings_window.geometry("500x550")
+        settings_window.geometry("500x680")
         settings_window.resizable(False, False)
         settings_window.transient(self.master)
         
@@ -218,12 +647,13 @@ class BackupManagerUI:
         hotkeys_frame.pack(fill=tk.X, pady=5)
         
         ttk.Label(hotkeys_frame, text=t('quick_backup') + '：').grid(row=0, column=0, sticky=tk.W)
-        self.backup_key_label = ttk.Label(hotkeys_frame, text=self.config_manager.config['hotkeys']['quick_backup'], width=10, relief="sunken")
+        hotkeys = self.config_manager.get_profile()['hotkeys']
+        self.backup_key_label = ttk.Label(hotkeys_frame, text=hotkeys.get('quick_backup', ''), width=10, relief="sunken")
         self.backup_key_label.grid(row=0, column=1, padx=5)
         ttk.Button(hotkeys_frame, text=t('set'), command=lambda: self.start_key_listening('quick_backup')).grid(row=0, column=2)
         
         ttk.Label(hotkeys_frame, text=t('quick_restore') + '：').grid(row=1, column=0, sticky=tk.W)
-        self.restore_key_label = ttk.Label(hotkeys_frame, text=self.config_manager.config['hotkeys']['quick_restore'], width=10, relief="sunken")
+        self.restore_key_label = ttk.Label(hotkeys_frame, text=hotkeys.get('quick_restore', ''), width=10, relief="sunken")
         self.restore_key_label.grid(row=1, column=1, padx=5)
         ttk.Button(hotkeys_frame, text=t('set'), command=lambda: self.start_key_listening('quick_restore')).grid(row=1, column=2)
         
@@ -233,7 +663,7 @@ class BackupManagerUI:
         
         ttk.Label(paths_frame, text=t('save_directory') + '：').grid(row=0, column=0, sticky=tk.W)
         self.source_path_entry = ttk.Entry(paths_frame, width=30)
-        self.source_path_entry.insert(0, self.config_manager.config['paths']['source_path'])
+        self.source_path_entry.insert(0, self.config_manager.get_profile()['source_path'])
         self.source_path_entry.grid(row=0, column=1, padx=5)
         ttk.Button(paths_frame, text=t('browse'), command=lambda: self.browse_directory(self.source_path_entry)).grid(row=0, column=2)
         
@@ -243,6 +673,11 @@ class BackupManagerUI:
         self.backup_path_entry.grid(row=1, column=1, padx=5)
         ttk.Button(paths_frame, text=t('browse'), command=lambda: self.browse_directory(self.backup_path_entry)).grid(row=1, column=2)
         
+        ttk.Label(paths_frame, text=t('emulator_process_names') + '：').grid(row=2, column=0, sticky=tk.W)
+        self.process_names_entry = ttk.Entry(paths_frame, width=30)
+        self.process_names_entry.insert(0, ', '.join(self.config_manager.process_names))
+        self.process_names_entry.grid(row=2, column=1, padx=5)
+        
         # 语言设置
         language_frame = ttk.LabelFrame(settings_frame, text=t('language_settings'), padding=10)
         language_frame.pack(fill=tk.X, pady=5)
@@ -272,6 +707,21 @@ class BackupManagerUI:
         ttk.Checkbutton(features_frame, text=t('auto_save_before_backup'), 
                        variable=self.auto_save_var).pack(anchor=tk.W)
         
+        # 自动退出/载入使用的游戏按键宏和校准
+        macro_frame = ttk.Frame(features_frame)
+        macro_frame.pack(anchor=tk.W, fill=tk.X)
+        ttk.Label(macro_frame, text=t('game_macro') + '：').pack(side=tk.LEFT)
+        self.game_var = tk.StringVar(value=self.config_manager.get_profile()['game'])
+        game_combo = ttk.Combobox(macro_frame, textvariable=self.game_var, state='readonly', width=15)
+        game_combo['values'] = macro_names(self.config_manager.config)
+        game_combo.pack(side=tk.LEFT, padx=5)
+        ttk.Button(macro_frame, text=t('calibrate_automation'), command=self.calibrate_automation).pack(side=tk.LEFT)
+        
+        # 后台校验选项
+        self.background_scrub_var = tk.BooleanVar(value=self.config_manager.config['features'].get('background_scrub', True))
+        ttk.Checkbutton(features_frame, text=t('background_scrub'), 
+                       variable=self.background_scrub_var).pack(anchor=tk.W)
+        
         # 添加保存按钮
         ttk.Button(settings_frame, text=t('save'), command=lambda: self.save_settings(settings_window, 
                                                                 self.source_path_entry.get(),
@@ -283,33 +733,39 @@ class BackupManagerUI:
         Args:
             key_type: 热键类型，'quick_backup' 或 'quick_restore'
         """
-        # 先解除当前快捷键的绑定
-        keyboard.remove_hotkey(self.config_manager.config['hotkeys'][key_type])
+        # 设置的是当前配置的热键
+        hotkeys = self.config_manager.get_profile()['hotkeys']
+        
+        # 先解除快捷键的绑定，避免设置时触发
+        self.clear_hotkeys()
         
         def on_key_event(e):
             # 获取按键名称
             key_name = e.name
             if key_name not in ['shift', 'ctrl', 'alt']:
-                # 检查按键是否已被使用
+                # 检查按键是否已被本配置的另一个热键或其他配置使用
                 other_key = 'quick_restore' if key_type == 'quick_backup' else 'quick_backup'
-                if key_name == self.config_manager.config['hotkeys'][other_key]:
+                used = [hotkeys.get(other_key)] + [
+                    key for name in self.config_manager.profile_names() if name != self.config_manager.active_profile
+                    for key in self.config_manager.get_profile(name)['hotkeys'].values()]
+                if key_name in used:
                     messagebox.showwarning(t("warning"), t("hotkey_already_used"))
                     return
                 
                 # 更新配置
-                self.config_manager.config['hotkeys'][key_type] = key_name
+                hotkeys[key_type] = key_name
                 # 更新显示
                 if key_type == 'quick_backup':
                     self.backup_key_label.config(text=key_name)
                 else:
                     self.restore_key_label.config(text=key_name)
                 # 移除监听器
-                keyboard.unhook(hook)
+                stop_listening()
                 # 更新热键设置
                 self.setup_hotkeys()
                 
         # 添加按键监听
-        hook = keyboard.on_press(on_key_event)
+        stop_listening = listen_key_press(on_key_event)
         
         # 更新状态提示
         if key_type == 'quick_backup':
@@ -325,14 +781,18 @@ class BackupManagerUI:
             source_path: 源路径
             backup_path: 备份路径
         """
-        # 更新路径设置
-        self.config_manager.config['paths']['source_path'] = source_path
+        # 更新路径设置，存档目录属于当前配置
+        self.config_manager.set_profile(self.config_manager.active_profile, source_path, game=self.game_var.get())
         self.config_manager.config['paths']['backup_root'] = backup_path
+        process_names = [name.strip() for name in self.process_names_entry.get().split(',') if name.strip()]
+        if process_names:
+            self.config_manager.config.setdefault('emulator', {})['process_names'] = process_names
         
         # 更新功能设置
         self.config_manager.config['features']['md5_deduplication'] = self.md5_var.get()
         self.config_manager.config['features']['auto_load_after_restore'] = self.auto_load_var.get()
         self.config_manager.config['features']['auto_save_before_backup'] = self.auto_save_var.get()
+        self.config_manager.config['features']['background_scrub'] = self.background_scrub_var.get()
         
         # 更新语言设置
         new_language = self.language_var.get()
@@ -344,7 +804,7 @@ class BackupManagerUI:
         self.config_manager.update_config(self.config_manager.config)
         
         # 更新备份管理器的配置
-        self.backup_manager = BackupManager(self.config_manager)
+        self.init_backup_manager()
         self.update_backup_list()
         
         # 重新设置热键
@@ -358,6 +818,23 @@ class BackupManagerUI:
         settings_window.destroy()
         messagebox.showinfo(t("settings_saved_title"), t("settings_saved_message"))
 
+    def calibrate_automation(self):
+        """在后台线程中校准当前配置的游戏按键宏，进度显示在状态栏"""
+        if not messagebox.askyesno(t("calibrate_automation"), t("confirm_calibrate")):
+            return
+        backup_manager = self.backup_manager
+        self.show_status(t("calibration_running"))
+        
+        def run():
+            success, message, _ = backup_manager.calibrate_automation(
+                progress=lambda text: self.master.after(0, self.show_status, text))
+            if success:
+                self.master.after(0, lambda: messagebox.showinfo(t("calibrate_automation"), message))
+            else:
+                self.master.after(0, lambda: messagebox.showerror(t("error"), message))
+        
+        threading.Thread(target=run, daemon=True).start()
+
     def browse_directory(self, entry_widget):
         """浏览文件夹
         
@@ -382,6 +859,34 @@ class BackupManagerUI:
         stats_message += "\n" + t("total_files").format(count=stats['total_files'])
         stats_message += "\n" + t("theoretical_size").format(size=format_size(stats['theoretical_size']))
         stats_message += "\n\n" + t("saved_space").format(size=format_size(stats['saved_space']), percentage=stats['saved_percentage'])
+        cache = stats.get('object_cache')
+        if cache:
+            stats_message += "\n\n" + t("object_cache_stats").format(
+                size=format_size(cache['bytes']), max_size=format_size(cache['max_bytes']),
+                rate=cache['hit_rate'] * 100, hits=cache['hits'], misses=cache['misses'])
+        index = stats.get('object_index')
+        if index:
+            stats_message += "\n" + t("object_index_stats").format(
+                objects=index['objects'], bloom_size=format_size(index['bloom_bytes']), lookups=index['lookups'],
+                negatives=index['bloom_negatives'], false_positives=index['false_positives'])
+        tiers = stats.get('tiers')
+        if tiers:
+            stats_message += "\n\n" + t("tier_stats").format(
+                hot=format_size(tiers['hot_bytes']), cold=format_size(tiers['cold_bytes']),
+                stored=format_size(tiers['cold_stored_bytes']), packs=tiers['packs'])
+            costs = [cost for cost in stats.get('restore_costs') or [] if not cost['error']]
+            if costs:
+                stats_message += "\n" + t("restore_cost_oldest").format(
+                    seconds=costs[-1]['seconds'], cold=format_size(costs[-1]['cold_bytes']))
+        governor = stats.get('io_governor')
+        if governor and governor['enabled']:
+            max_rate, idle_rate = (f"{mb_s:g} MB/s" if mb_s else t("io_unlimited")
+                                   for mb_s in (governor['max_mb_s'], governor['idle_mb_s']))
+            state = {True: "io_emulator_running", False: "io_emulator_stopped"}.get(
+                governor['emulator_running'], "io_emulator_unknown")
+            stats_message += "\n\n" + t("io_governor_stats").format(
+                max_rate=max_rate, idle_rate=idle_rate, state=t(state),
+                throttled=sum(job['throttled_seconds'] for job in governor['jobs'].values()))
         
         messagebox.showinfo(t("storage_stats"), stats_message)
     
@@ -399,20 +904,22 @@ class BackupManagerUI:
         # 获取鼠标点击的项
         item = self.tree.identify_row(event.y)
         if item:
-            # 选中被点击的项
-            self.tree.selection_set(item)
+            # 选中被点击的项，点击已选中的项时保留多选，以便比较两个备份
+            if item not in self.tree.selection():
+                self.tree.selection_set(item)
+            state = tk.NORMAL if len(self.tree.selection()) == 2 else tk.DISABLED
+            self.context_menu.entryconfigure(t("compare_selected"), state=state)
             # 显示右键菜单
             self.context_menu.post(event.x_root, event.y_root)
 
     def rename_backup(self):
         """重命名备份"""
-        selected = self.tree.selection()
-        if not selected:
+        backup = self.get_selected_backup()
+        if not backup:
             return
 
-        item = self.tree.item(selected[0])
-        old_name = item['values'][0]
-        old_path = item['values'][2]
+        old_name = backup['name']
+        old_path = backup['path']
 
         # 弹出重命名对话框
         dialog = tk.Toplevel(self.master)
@@ -432,7 +939,6 @@ class BackupManagerUI:
             if new_name and new_name != old_name:
                 success, message, _ = self.backup_manager.rename_backup(old_path, new_name)
                 if success:
-                    self.update_backup_list()
                     self.show_status(message)
                 else:
                     messagebox.showerror(t("error"), message)
@@ -444,35 +950,98 @@ class BackupManagerUI:
 
     def delete_backup(self):
         """删除备份"""
-        selected = self.tree.selection()
-        if not selected:
+        backup = self.get_selected_backup()
+        if not backup:
             return
 
-        item = self.tree.item(selected[0])
-        backup_name = item['values'][0]
-        backup_path = item['values'][2]
+        backup_name = backup['name']
+        backup_path = backup['path']
 
         if messagebox.askyesno(t("confirm_delete"), t("confirm_delete_backup").format(backup_name=backup_name)):
             success, message = self.backup_manager.delete_backup(backup_path, backup_name)
             if success:
-                self.update_backup_list()
                 self.show_status(message)
             else:
                 messagebox.showerror(t("error"), message)
 
+    def compare_with_current(self):
+        """比较选中的备份与当前存档"""
+        backup = self.get_selected_backup()
+        if not backup:
+            return
+        success, message, diff = self.backup_manager.diff_with_source(backup['path'])
+        if not success:
+            messagebox.showerror(t("error"), message)
+            return
+        self.show_diff(t("diff_with_current_title").format(backup_name=backup['name']), diff)
+
+    def compare_selected_backups(self):
+        """比较选中的两个备份，较早的备份作为基准"""
+        backups = [self.backups_by_path.get(item) for item in self.tree.selection()]
+        if len(backups) != 2 or None in backups:
+            messagebox.showinfo(t("compare_selected"), t("select_two_backups"))
+            return
+        old_backup, new_backup = sorted(backups, key=lambda b: b['date'])
+        success, message, diff = self.backup_manager.diff_backups(old_backup['path'], new_backup['path'])
+        if not success:
+            messagebox.showerror(t("error"), message)
+            return
+        self.show_diff(t("diff_backups_title").format(old_name=old_backup['name'], new_name=new_backup['name']), diff)
+
+    def show_diff(self, title, diff):
+        """显示比较结果窗口
+
+        Args:
+            title: 窗口标题
+            diff: 比较结果字典
+        """
+        window = tk.Toplevel(self.master)
+        window.title(title)
+        window.geometry("600x400")
+        window.transient(self.master)
+
+        summary = t("diff_summary").format(added=len(diff['added']), removed=len(diff['removed']),
+                                           modified=len(diff['modified']), unchanged=diff['unchanged'])
+        sign = "+" if diff['size_delta'] >= 0 else "-"
+        summary += "  " + t("diff_size_delta").format(size=sign + format_size(abs(diff['size_delta'])))
+        ttk.Label(window, text=summary, padding=5).pack(fill=tk.X)
+
+        frame = ttk.Frame(window)
+        frame.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        tree = ttk.Treeview(frame, columns=("status", "path", "size"), show="headings")
+        tree.heading("status", text=t("diff_status"), anchor=tk.W)
+        tree.heading("path", text=t("diff_path"), anchor=tk.W)
+        tree.heading("size", text=t("diff_size"), anchor=tk.W)
+        tree.column("status", width=80, stretch=False)
+        tree.column("path", width=380)
+        tree.column("size", width=120, stretch=False)
+        scrollbar = ttk.Scrollbar(frame, orient=tk.VERTICAL, command=tree.yview)
+        tree.configure(yscroll=scrollbar.set)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        tree.pack(fill=tk.BOTH, expand=True)
+
+        for item in diff['added']:
+            tree.insert("", tk.END, values=(t("diff_added"), item['path'], "+" + format_size(item['size'])))
+        for item in diff['removed']:
+            tree.insert("", tk.END, values=(t("diff_removed"), item['path'], "-" + format_size(item['size'])))
+        for item in diff['modified']:
+            sign = "+" if item['size_delta'] >= 0 else "-"
+            tree.insert("", tk.END, values=(t("diff_modified"), item['path'],
+                                            sign + format_size(abs(item['size_delta']))))
+
+        ttk.Button(window, text=t("close"), command=window.destroy).pack(pady=5)
+
     def duplicate_backup(self):
         """复制备份"""
-        selected = self.tree.selection()
-        if not selected:
+        backup = self.get_selected_backup()
+        if not backup:
             return
 
-        item = self.tree.item(selected[0])
-        src_name = item['values'][0]
-        src_path = item['values'][2]
+        src_name = backup['name']
+        src_path = backup['path']
 
         success, message = self.backup_manager.duplicate_backup(src_path, src_name)
         if success:
-            self.update_backup_list()
             self.show_status(message)
         else:
             messagebox.showerror(t("error"), message)
\ No newline at end of file
@@ -6,23 +6,34 @@
 """
 
 import os
+import sys
+import json
 import hashlib
 import shutil
 
+# 复制文件时每次读写的块大小
+COPY_BUFFER_SIZE = 1024 * 1024
 
-def calculate_file_md5(file_path):
+
+def calculate_file_md5(file_path, throttle=None):
     """计算文件的MD5哈希值
     
     Args:
         file_path: 文件路径
+        throttle: 可选，I/O限速函数，每读取一块数据后以其字节数调用
         
     Returns:
         str: MD5哈希值的十六进制字符串
     """
     hash_md5 = hashlib.md5()
     with open(file_path, "rb") as f:
-        for chunk in iter(lambda: f.read(4096), b""):
-            hash_md5.update(chunk)
+        if throttle is None:
+            for chunk in iter(lambda: f.read(4096), b""):
+                hash_md5.update(chunk)
+        else:
+            for chunk in iter(lambda: f.read(COPY_BUFFER_SIZE), b""):
+                throttle(len(chunk))
+                hash_md5.update(chunk)
     return hash_md5.hexdigest()
 
 
@@ -59,4 +70,255 @@ def safe_filename(filename):
     Returns:
         str: 安全的文件名
     """
-    return "".join([c for c in filename if c not in r'\/:*?"<>|'])
\ No newline at end of file
+    return "".join([c for c in filename if c not in r'\/:*?"<>|'])
+
+# 已执行的落盘同步调用次数，用于统计持久化开销
+_sync_calls = 0
+
+# Linux下的syncfs函数，首次使用时加载
+_syncfs = None
+
+
+def sync_call_count():
+    """获取累计的落盘同步调用次数
+
+    Returns:
+        int: fsync/syncfs 调用次数
+    """
+    return _sync_calls
+
+
+def _get_syncfs():
+    """获取Linux的syncfs函数，不支持时返回None"""
+    global _syncfs
+    if _syncfs is None:
+        _syncfs = False
+        if sys.platform.startswith("linux"):
+            try:
+                import ctypes
+                _syncfs = ctypes.CDLL(None, use_errno=True).syncfs
+            except (OSError, AttributeError):
+                pass
+    return _syncfs or None
+
+
+def _fsync_path(path, directory=False):
+    """对单个文件或目录执行fsync"""
+    global _sync_calls
+    if directory:
+        # Windows无法打开目录做fsync，NTFS的元数据由文件系统日志保证
+        if sys.platform == "win32":
+            return
+        fd = os.open(path, os.O_RDONLY)
+    else:
+        fd = os.open(path, os.O_RDWR | getattr(os, "O_BINARY", 0))
+    try:
+        os.fsync(fd)
+        _sync_calls += 1
+    finally:
+        os.close(fd)
+
+
+def sync_paths(paths, directories=False):
+    """让一组文件或目录落盘
+
+    Linux下对每个涉及的文件系统调用一次syncfs，其他平台逐个fsync。
+
+    Args:
+        paths: 文件或目录路径
+        directories: paths是否为目录
+    """
+    global _sync_calls
+    paths = list(paths)
+    if not paths:
+        return
+
+    syncfs = _get_syncfs()
+    if not syncfs:
+        for path in paths:
+            _fsync_path(path, directories)
+        return
+
+    synced_devices = {}  # 设备号 -> syncfs是否成功
+    for path in paths:
+        directory = path if directories else os.path.dirname(os.path.abspath(path))
+        device = os.stat(directory).st_dev
+        if device not in synced_devices:
+            fd = os.open(directory, os.O_RDONLY)
+            try:
+                synced_devices[device] = syncfs(fd) == 0
+            finally:
+                os.close(fd)
+            if synced_devices[device]:
+                _sync_calls += 1
+        if not synced_devices[device]:
+            _fsync_path(path, directories)
+
+
+class WriteBatch:
+    """批量原子写入
+
+    文件先写入同目录下的临时文件，commit时统一落盘后再重命名为目标文件，
+    崩溃时目标文件要么是旧内容要么是完整的新内容，不会出现写了一半的文件。
+    落盘同步按批进行，一批文件只需要少量几次同步调用。
+    """
+
+    def __init__(self, durable=True, tag=None, throttle=None):
+        """初始化写入批次
+
+        Args:
+            durable: 是否在提交时同步落盘
+            tag: 临时文件名标记，崩溃恢复时据此清理临时文件
+            throttle: 可选，I/O限速函数，复制和流式写入时每读取一块数据后以其字节数调用
+        """
+        self.durable = durable
+        self.tag = tag or f"{os.getpid()}-{id(self)}"
+        self.throttle = throttle
+        self._pending = {}   # 目标路径 -> 临时文件路径
+        self._written = []   # 已直接写入、只需要落盘的文件
+        self._on_commit = []  # 提交完成后调用的函数
+
+    def temp_path(self, target):
+        """获取目标文件对应的临时文件路径"""
+        return f"{target}.{self.tag}.tmp"
+
+    def is_pending(self, target):
+        """检查目标文件是否已在本批次中等待提交"""
+        return target in self._pending
+
+    def write_bytes(self, target, data):
+        """写入二进制数据
+
+        Args:
+            target: 目标文件路径
+            data: 文件内容
+        """
+        temp = self.temp_path(target)
+        with open(temp, "wb") as f:
+            f.write(data)
+        self._pending[target] = temp
+
+    def write_json(self, target, obj, **dump_kwargs):
+        """写入JSON文件
+
+        Args:
+            target: 目标文件路径
+            obj: 要写入的对象
+            dump_kwargs: 传给json.dump的参数
+        """
+        temp = self.temp_path(target)
+        with open(temp, "w", encoding="utf-8") as f:
+            json.dump(obj, f, **dump_kwargs)
+        self._pending[target] = temp
+
+    def copy_file(self, src, target):
+        """复制文件
+
+        Args:
+            src: 源文件路径
+            target: 目标文件路径
+        """
+        temp = self.temp_path(target)
+        with open(src, "rb") as src_file:
+            if self.throttle is None:
+                with open(temp, "wb") as dest_file:
+                    shutil.copyfileobj(src_file, dest_file, COPY_BUFFER_SIZE)
+            else:
+                self._copy_stream(src_file, temp)
+        self._pending[target] = temp
+
+    def write_stream(self, target, src_file, digest=None):
+        """从文件对象流式写入，适合从归档等不可随机访问的数据源写入大文件
+
+        Args:
+            target: 目标文件路径
+            src_file: 可读取二进制数据的文件对象
+            digest: 可选，hashlib哈希对象，写入的数据会同时更新到其中
+        """
+        temp = self.temp_path(target)
+        self._pending[target] = temp
+        self._copy_stream(src_file, temp, digest)
+
+    def _copy_stream(self, src_file, temp, digest=None):
+        """按块复制数据到临时文件，设置了限速函数时每读取一块数据后调用限速函数"""
+        with open(temp, "wb") as dest_file:
+            for chunk in iter(lambda: src_file.read(COPY_BUFFER_SIZE), b""):
+                if self.throttle is not None:
+                    self.throttle(len(chunk))
+                if digest is not None:
+                    digest.update(chunk)
+                dest_file.write(chunk)
+
+    def add_written(self, path):
+        """登记一个已直接写入的文件，提交时一并落盘
+
+        Args:
+            path: 文件路径
+        """
+        self._written.append(path)
+
+    def discard(self, target):
+        """从本批次中去掉一个等待提交的文件并删除其临时文件
+
+        Args:
+            target: 目标文件路径
+        """
+        temp = self._pending.pop(target, None)
+        if temp is not None:
+            try:
+                os.remove(temp)
+            except OSError:
+                pass
+
+    def on_commit(self, callback):
+        """登记提交完成后调用的函数，放弃本批次时不会调用
+
+        Args:
+            callback: 无参数函数
+        """
+        self._on_commit.append(callback)
+
+    def commit(self):
+        """提交本批次：落盘临时文件，重命名为目标文件，再落盘目录项"""
+        files = list(self._pending.values()) + self._written
+        if self.durable:
+            sync_paths(files)
+        for target, temp in self._pending.items():
+            os.replace(temp, target)
+        if self.durable and files:
+            sync_paths({os.path.dirname(os.path.abspath(path))
+                        for path in list(self._pending) + self._written}, directories=True)
+        self._pending = {}
+        self._written = []
+        callbacks, self._on_commit = self._on_commit, []
+        for callback in callbacks:
+            callback()
+
+    def abort(self):
+        """放弃本批次，删除所有临时文件"""
+        for temp in self._pending.values():
+            try:
+                os.remove(temp)
+            except OSError:
+                pass
+        self._pending = {}
+        self._written = []
+        self._on_commit = []
+
+
+def atomic_write_json(path, obj, durable=True, **dump_kwargs):
+    """原子地写入单个JSON文件
+
+    Args:
+        path: 文件路径
+        obj: 要写入的对象
+        durable: 是否同步落盘
+        dump_kwargs: 传给json.dump的参数
+    """
+    batch = WriteBatch(durable)
+    try:
+        batch.write_json(path, obj, **dump_kwargs)
+        batch.commit()
+    except Exception:
+        batch.abort()
+        raise
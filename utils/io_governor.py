@@ -0,0 +1,266 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+I/O限速模块 - 限制备份、清理、校验、镜像等任务读写磁盘的速度，避免模拟器读取游戏数据时卡顿
+
+所有任务共用一个令牌桶：每读写一块数据先取得相应字节数的令牌，令牌不足时等待。模拟器运行时按
+max_mb_s 限速，并可将任务线程的I/O优先级降为 io_class（Linux 为 ionice 的 idle/best-effort 类，
+Windows 为后台处理模式）；模拟器未运行时按 idle_mb_s 限速（0 为不限速），每隔 check_interval 秒
+重新检查一次模拟器状态，任务进行中模拟器退出或启动时限速随之调整。
+
+配置示例（config.json，max_mb_s 为 0 或 enabled 为 false 时不限速）:
+    "io_governor": {"enabled": true, "max_mb_s": 64, "burst_mb": 4, "idle_mb_s": 0,
+                    "io_class": "idle", "check_interval": 1.0}
+"""
+
+import time
+import threading
+from contextlib import contextmanager
+
+from utils.system_utils import lower_current_thread_priority, set_current_thread_io_class, restore_current_thread_io_class
+
+# 默认的限速设置
+DEFAULT_MAX_MB_S = 64
+DEFAULT_BURST_MB = 4
+DEFAULT_IDLE_MB_S = 0
+DEFAULT_IO_CLASS = "idle"
+DEFAULT_CHECK_INTERVAL = 1.0
+
+# 可选的I/O优先级类别
+IO_CLASSES = ("idle", "best-effort", "none")
+
+# 删除文件等元数据操作按此字节数计入限速
+METADATA_OP_BYTES = 4096
+
+_governor = None
+_governor_guard = threading.Lock()
+
+
+class TokenBucket:
+    """令牌桶，多个线程共用，令牌不足时按欠下的字节数等待"""
+
+    def __init__(self, burst):
+        """初始化令牌桶
+
+        Args:
+            burst: 桶的容量（字节），允许的最大突发量
+        """
+        self.burst = burst
+        self._tokens = burst
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, nbytes, rate):
+        """取出令牌，不足时等待
+
+        Args:
+            nbytes: 字节数
+            rate: 当前的速度限制（字节/秒），为0时不限速
+
+        Returns:
+            float: 等待的秒数
+        """
+        with self._lock:
+            now = time.monotonic()
+            if not rate:
+                self._tokens = self.burst
+                self._last = now
+                return 0.0
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * rate)
+            self._last = now
+            self._tokens -= nbytes
+            delay = -self._tokens / rate if self._tokens < 0 else 0.0
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+
+class IOJob:
+    """一次受限速的任务，记录其读写量和等待时间"""
+
+    def __init__(self, governor, name, constrained):
+        self.governor = governor
+        self.name = name
+        # 任务开始时模拟器是否在运行
+        self.constrained = constrained
+        self.bytes = 0
+        self.throttled_seconds = 0.0
+        self.waits = 0
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+
+    def throttle(self, nbytes):
+        """读写 nbytes 字节之前调用，需要时等待"""
+        delay = self.governor.consume(nbytes)
+        with self._lock:
+            self.bytes += nbytes
+            if delay > 0:
+                self.throttled_seconds += delay
+                self.waits += 1
+
+    def worker_initializer(self, low_priority=True):
+        """获取工作线程的初始化函数：降低CPU优先级，模拟器运行时再降低I/O优先级
+
+        Args:
+            low_priority: 是否降低CPU优先级
+
+        Returns:
+            function: 无参数函数，没有需要做的设置时返回None
+        """
+        io_class = self.governor.io_class if self.constrained else "none"
+        if not low_priority and io_class == "none":
+            return None
+
+        def initialize():
+            if low_priority:
+                lower_current_thread_priority()
+            if io_class != "none":
+                set_current_thread_io_class(io_class)
+        return initialize
+
+    def report(self):
+        """获取任务的限速统计
+
+        Returns:
+            dict: {"bytes", "throttled_seconds", "waits", "elapsed", "constrained"}，多个线程同时等待时
+                  throttled_seconds 为各线程等待时间之和
+        """
+        with self._lock:
+            return {"bytes": self.bytes, "throttled_seconds": self.throttled_seconds, "waits": self.waits,
+                    "elapsed": time.monotonic() - self.started, "constrained": self.constrained}
+
+
+class IOGovernor:
+    """按模拟器是否运行调整限速的I/O限速器"""
+
+    def __init__(self, settings, is_emulator_running=None):
+        """初始化限速器
+
+        Args:
+            settings: 配置中的 io_governor 字典
+            is_emulator_running: 可选，无参数函数，返回模拟器是否在运行，未提供时状态未知，按在运行限速
+        """
+        self.enabled = settings.get("enabled", True)
+        self.max_rate = settings.get("max_mb_s", DEFAULT_MAX_MB_S) * 1024 * 1024
+        self.idle_rate = settings.get("idle_mb_s", DEFAULT_IDLE_MB_S) * 1024 * 1024
+        self.io_class = settings.get("io_class", DEFAULT_IO_CLASS)
+        if self.io_class not in IO_CLASSES:
+            raise ValueError(f"无效的 io_class：{self.io_class}")
+        self.check_interval = settings.get("check_interval", DEFAULT_CHECK_INTERVAL)
+        self.bucket = TokenBucket(int(settings.get("burst_mb", DEFAULT_BURST_MB) * 1024 * 1024))
+        self.is_emulator_running = is_emulator_running
+        # 最近一次检测的结果，无法检测时为None
+        self._emulator_state = None
+        self._checked_at = None
+        self._lock = threading.Lock()
+        self._totals = {}
+
+    def emulator_state(self):
+        """检测模拟器是否在运行，每隔 check_interval 秒才重新检查
+
+        Returns:
+            bool: 是否在运行，未提供检测函数或检测失败（如缺少 psutil）时返回None
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self._checked_at is None or now - self._checked_at >= self.check_interval:
+                self._checked_at = now
+                self._emulator_state = None
+                if self.is_emulator_running is not None:
+                    try:
+                        self._emulator_state = bool(self.is_emulator_running())
+                    except Exception:
+                        pass
+            return self._emulator_state
+
+    def emulator_running(self):
+        """按模拟器在运行处理限速，无法检测时保守地视为在运行"""
+        return self.emulator_state() is not False
+
+    def current_rate(self):
+        """获取当前的速度限制（字节/秒），0表示不限速"""
+        if not self.enabled:
+            return 0
+        return self.max_rate if self.emulator_running() else self.idle_rate
+
+    def consume(self, nbytes):
+        """按当前限速取出令牌
+
+        Returns:
+            float: 等待的秒数
+        """
+        rate = self.current_rate()
+        if not rate:
+            return 0.0
+        return self.bucket.consume(nbytes, rate)
+
+    @contextmanager
+    def job(self, name):
+        """在 with 语句中执行一次受限速的任务，模拟器运行时当前线程的I/O优先级降为 io_class
+
+        Args:
+            name: 任务名称，如 backup、gc、scrub、mirror
+
+        Yields:
+            IOJob: 任务，读写数据前调用其 throttle 方法
+        """
+        constrained = self.enabled and self.emulator_running()
+        job = IOJob(self, name, constrained)
+        previous = None
+        if constrained and self.io_class != "none":
+            previous = set_current_thread_io_class(self.io_class)
+        try:
+            yield job
+        finally:
+            if previous is not None:
+                restore_current_thread_io_class(previous)
+            self._record(job)
+
+    def _record(self, job):
+        """累计任务的限速统计"""
+        report = job.report()
+        with self._lock:
+            totals = self._totals.setdefault(job.name, {"runs": 0, "bytes": 0, "throttled_seconds": 0.0,
+                                                         "elapsed": 0.0, "last": None})
+            totals["runs"] += 1
+            totals["bytes"] += report["bytes"]
+            totals["throttled_seconds"] += report["throttled_seconds"]
+            totals["elapsed"] += report["elapsed"]
+            totals["last"] = report
+
+    def stats(self):
+        """获取限速统计
+
+        Returns:
+            dict: {"enabled", "max_mb_s", "idle_mb_s", "io_class", "emulator_running",
+                   "jobs": 任务名称 -> {"runs", "bytes", "throttled_seconds", "elapsed", "last"}}，
+                  无法检测模拟器时 emulator_running 为None（按运行中限速）
+        """
+        with self._lock:
+            jobs = {name: dict(totals) for name, totals in self._totals.items()}
+        return {
+            "enabled": self.enabled,
+            "max_mb_s": self.max_rate / (1024 * 1024),
+            "idle_mb_s": self.idle_rate / (1024 * 1024),
+            "io_class": self.io_class,
+            "emulator_running": self.emulator_state(),
+            "jobs": jobs,
+        }
+
+
+def get_io_governor(config, is_emulator_running=None):
+    """获取进程共用的I/O限速器，所有任务共用同一个令牌桶
+
+    Args:
+        config: 配置字典，限速设置以第一次获取时的为准
+        is_emulator_running: 可选，检测模拟器是否运行的函数，以第一次获取时提供的为准
+
+    Returns:
+        IOGovernor: 限速器
+    """
+    global _governor
+    with _governor_guard:
+        if _governor is None:
+            _governor = IOGovernor(config.get("io_governor", {}), is_emulator_running)
+        return _governor
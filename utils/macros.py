@@ -0,0 +1,286 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+按键宏模块 - 按游戏定义自动退出/载入游戏的窗口标题和按键步骤，并校准每一步的最短可靠间隔
+
+宏定义（内置或配置文件 macros 中的同名定义）:
+
+    {
+        "window_titles": ["Bloodborne", ...],   # 游戏窗口可能的标题
+        "exit": [步骤, ...],                    # 退出到标题画面并保存
+        "load": [步骤, ...],                    # 在标题画面载入存档
+        "reset": [步骤, ...]                    # 可选，校准中按键被吞掉后回到游戏中的步骤
+    }
+
+每个步骤是按键或等待条件:
+
+    {"key": "enter", "delay": 0.2}             # 按键，之后间隔 delay 秒，未指定时使用 key_interval
+    {"wait": "save_quiescent", "timeout": 5}   # 等待条件成立，未指定 timeout 时使用对应的默认超时
+
+等待条件由调用方提供，BackupManager 提供 window_focus（窗口未找到时中止宏）、save_quiescent 和
+emulator_io_settled。校准结果按游戏和宏名称保存，只在按键序列与当前宏相同时使用。
+"""
+
+import time
+
+# 未指定游戏时使用的宏
+DEFAULT_GAME = "bloodborne"
+
+# 内置的宏定义
+BUILTIN_MACROS = {
+    "bloodborne": {
+        "window_titles": ["Bloodborne", "BLOODBORNE", "血源诅咒", "血源"],
+        "exit": [
+            {"wait": "window_focus"},
+            {"key": "enter"}, {"key": "left"}, {"key": "b"}, {"key": "up"},
+            {"key": "b"}, {"key": "left"}, {"key": "b"},
+            {"wait": "save_quiescent"},
+        ],
+        "load": [
+            {"wait": "emulator_io_settled"},
+            {"wait": "window_focus"},
+            {"key": "b"}, {"key": "b"},
+        ],
+    },
+}
+
+# 可以执行和校准的宏名称
+MACRO_ACTIONS = ("exit", "load")
+
+# 失败时中止宏的等待条件，其他条件超时后继续执行
+REQUIRED_WAITS = ("window_focus",)
+
+# 校准时每一步的最短间隔（秒）
+MIN_STEP_DELAY = 0.0
+
+
+class MacroError(Exception):
+    """宏定义无效"""
+
+
+def macro_names(config):
+    """获取所有可用的游戏宏名称
+
+    Args:
+        config: 配置字典
+
+    Returns:
+        list: 内置宏和配置文件中定义的宏名称
+    """
+    return sorted(set(BUILTIN_MACROS) | set(config.get("macros", {})))
+
+
+def load_macro(config, game):
+    """获取游戏的宏定义，配置文件中的同名定义覆盖内置定义
+
+    Args:
+        config: 配置字典
+        game: 游戏名称
+
+    Returns:
+        dict: 宏定义
+
+    Raises:
+        MacroError: 游戏没有宏定义或定义无效
+    """
+    macro = config.get("macros", {}).get(game, BUILTIN_MACROS.get(game))
+    if macro is None:
+        raise MacroError(f"没有游戏 {game} 的按键宏")
+    validate_macro(macro)
+    return macro
+
+
+def validate_macro(macro):
+    """检查宏定义的格式
+
+    Raises:
+        MacroError: 定义无效
+    """
+    if not isinstance(macro.get("window_titles"), list) or not macro["window_titles"]:
+        raise MacroError("宏定义缺少 window_titles")
+    for action in MACRO_ACTIONS + ("reset",):
+        steps = macro.get(action, [])
+        if not isinstance(steps, list):
+            raise MacroError(f"宏 {action} 应为步骤列表")
+        for step in steps:
+            if not isinstance(step, dict) or ("key" in step) == ("wait" in step):
+                raise MacroError(f"宏 {action} 的步骤无效：{step}")
+    for action in MACRO_ACTIONS:
+        if action not in macro:
+            raise MacroError(f"宏定义缺少 {action}")
+
+
+def key_sequence(steps):
+    """获取步骤中的按键序列，用于判断校准结果是否适用于当前宏"""
+    return [step["key"] for step in steps if "key" in step]
+
+
+def step_delays(steps, default_delay, calibration=None):
+    """计算每个按键步骤之后的间隔
+
+    Args:
+        steps: 步骤列表
+        default_delay: 未指定 delay 的按键使用的间隔
+        calibration: 可选，校准结果 {"keys": [...], "delays": [...]}，按键序列不同时忽略
+
+    Returns:
+        list: 每个按键步骤的间隔（秒）
+    """
+    keys = key_sequence(steps)
+    if calibration and calibration.get("keys") == keys and len(calibration.get("delays", [])) == len(keys):
+        return list(calibration["delays"])
+    return [step.get("delay", default_delay) for step in steps if "key" in step]
+
+
+class MacroRunner:
+    """执行宏的步骤"""
+
+    def __init__(self, input_backend, conditions, timings=None):
+        """初始化宏执行器
+
+        Args:
+            input_backend: 按键输入后端，提供 press(key) 方法
+            conditions: 等待条件名称 -> 函数(timeout)，返回条件是否在超时前成立
+            timings: 可选，WaitTimings 实例，记录按键和等待的耗时
+        """
+        self.input_backend = input_backend
+        self.conditions = conditions
+        self.timings = timings
+
+    def run(self, steps, delays, timeouts):
+        """依次执行步骤
+
+        Args:
+            steps: 步骤列表
+            delays: step_delays 返回的按键间隔
+            timeouts: 等待条件名称 -> 默认超时（秒）
+
+        Returns:
+            tuple: (是否完成, 中止时失败的等待条件名称)
+
+        Raises:
+            MacroError: 步骤使用了未知的等待条件
+        """
+        delays = iter(delays)
+        keys_started = None
+        for step in steps:
+            if "key" in step:
+                if keys_started is None:
+                    keys_started = time.monotonic()
+                self.input_backend.press(step["key"])
+                delay = next(delays)
+                if delay > 0:
+                    time.sleep(delay)
+                continue
+
+            self._record_keys(keys_started)
+            keys_started = None
+            name = step["wait"]
+            condition = self.conditions.get(name)
+            if condition is None:
+                raise MacroError(f"未知的等待条件：{name}")
+            satisfied = condition(step.get("timeout", timeouts.get(name)))
+            if not satisfied and name in REQUIRED_WAITS:
+                return False, name
+        self._record_keys(keys_started)
+        return True, None
+
+    def _record_keys(self, started):
+        """记录一段连续按键的耗时"""
+        if started is not None and self.timings is not None:
+            self.timings.record("key_sequence", time.monotonic() - started, True)
+
+
+class MacroCalibrator:
+    """测量宏中每个按键之后的最短可靠间隔
+
+    每个按键的间隔在 [MIN_STEP_DELAY, 当前间隔] 之间二分查找：候选间隔连续 trials 次都能完成退出
+    （存档被写入）或载入（模拟器读取存档）时视为可靠。每次试验完整执行一次退出和载入，使游戏回到
+    试验前的状态；按键被吞掉时执行宏的 reset 步骤并用当前间隔补完未完成的部分。
+    """
+
+    def __init__(self, run_action, verify_action, reset, trials=3, iterations=4, margin=0.25, progress=None):
+        """初始化校准器
+
+        Args:
+            run_action: 函数(action, delays)，执行宏并返回 (是否完成, 失败的等待条件名称)
+            verify_action: 函数(action)，返回一个无参数函数，执行宏之后调用它判断宏是否生效
+            reset: 无参数函数，按键被吞掉后让游戏回到可以退出的状态
+            trials: 每个候选间隔需要连续成功的次数
+            iterations: 每个按键二分查找的次数
+            margin: 在测得的最短间隔上增加的余量比例
+            progress: 可选，接收进度消息的回调函数
+        """
+        self.run_action = run_action
+        self.verify_action = verify_action
+        self.reset = reset
+        self.trials = trials
+        self.iterations = iterations
+        self.margin = margin
+        self.progress = progress or (lambda message: None)
+
+    def _attempt(self, action, delays):
+        """执行一次宏并判断是否生效
+
+        Raises:
+            MacroError: 找不到游戏窗口
+        """
+        check = self.verify_action(action)
+        completed, failed_wait = self.run_action(action, delays)
+        if not completed:
+            raise MacroError(f"等待条件 {failed_wait} 未满足，请确认游戏正在运行")
+        return check()
+
+    def _trial(self, best, action, candidate):
+        """用候选间隔执行一次退出和载入
+
+        Returns:
+            bool: 被校准的宏是否生效
+        """
+        exit_delays = candidate if action == "exit" else best["exit"]
+        if not self._attempt("exit", exit_delays):
+            self.reset()
+            if not self._attempt("exit", best["exit"]):
+                raise MacroError("退出宏在当前间隔下也未生效，请确认游戏处于可以退出的状态")
+            if not self._attempt("load", best["load"]):
+                raise MacroError("载入宏在当前间隔下未生效")
+            return False
+        load_delays = candidate if action == "load" else best["load"]
+        if self._attempt("load", load_delays):
+            return True
+        if action != "load" or not self._attempt("load", best["load"]):
+            raise MacroError("载入宏在当前间隔下未生效")
+        return False
+
+    def calibrate(self, delays):
+        """校准所有按键的间隔
+
+        Args:
+            delays: {"exit": [...], "load": [...]}，当前使用的间隔，作为二分查找的上限
+
+        Returns:
+            dict: {"exit": [...], "load": [...]}，校准后的间隔
+
+        Raises:
+            MacroError: 当前间隔下宏也无法生效
+        """
+        best = {action: list(delays[action]) for action in MACRO_ACTIONS}
+        for action in MACRO_ACTIONS:
+            measured = list(best[action])
+            for index, upper in enumerate(delays[action]):
+                low, high = MIN_STEP_DELAY, upper
+                for _ in range(self.iterations):
+                    middle = (low + high) / 2
+                    candidate = list(best[action])
+                    candidate[index] = middle
+                    if all(self._trial(best, action, candidate) for _ in range(self.trials)):
+                        high = middle
+                    else:
+                        low = middle
+                    best[action][index] = high
+                measured[index] = high
+                best[action][index] = round(min(upper, high * (1 + self.margin)), 3)
+                self.progress(f"{action} #{index + 1}: {measured[index] * 1000:.0f} ms -> "
+                              f"{best[action][index] * 1000:.0f} ms")
+        return best
@@ -0,0 +1,296 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+平台后端模块 - 封装进程检测、热键、按键模拟和窗口聚焦等平台相关功能
+
+psutil、keyboard、win32gui、pydirectinput 等库只在对应后端首次使用时才导入，
+避免拖慢程序启动；测试或其他平台可以通过 set_backend 替换为自定义实现。
+"""
+
+import sys
+
+
+class ProcessBackend:
+    """进程检测后端，基于psutil"""
+
+    def __init__(self):
+        import psutil
+        self._psutil = psutil
+
+    def is_running(self, process_name):
+        """检查指定名称的进程是否在运行
+
+        Args:
+            process_name: 进程名称，如 'shadPS4.exe'
+
+        Returns:
+            bool: 进程是否在运行
+        """
+        try:
+            return any(p.info['name'] == process_name
+                       for p in self._psutil.process_iter(['name']))
+        except (self._psutil.NoSuchProcess, self._psutil.AccessDenied):
+            return False
+
+    def find_process(self, process_names):
+        """遍历进程，查找第一个名称匹配的进程
+
+        Args:
+            process_names: 可接受的进程名称集合
+
+        Returns:
+            int: 进程PID，未找到时返回None
+        """
+        try:
+            for p in self._psutil.process_iter(['name']):
+                if p.info['name'] in process_names:
+                    return p.pid
+        except (self._psutil.NoSuchProcess, self._psutil.AccessDenied):
+            pass
+        return None
+
+    def pid_exists(self, pid):
+        """检查PID是否存在"""
+        return self._psutil.pid_exists(pid)
+
+    def process_name(self, pid):
+        """获取PID对应的进程名称
+
+        Returns:
+            str: 进程名称，进程已退出或无权访问时返回None
+        """
+        try:
+            return self._psutil.Process(pid).name()
+        except (self._psutil.NoSuchProcess, self._psutil.AccessDenied):
+            return None
+
+    def io_write_bytes(self, pid):
+        """获取进程累计写入的字节数，用于判断模拟器是否已写完存档
+
+        Returns:
+            int: 写入字节数，进程已退出、无权访问或平台不支持时返回None
+        """
+        try:
+            return self._psutil.Process(pid).io_counters().write_bytes
+        except (self._psutil.NoSuchProcess, self._psutil.AccessDenied, AttributeError, NotImplementedError):
+            return None
+
+    def io_read_bytes(self, pid):
+        """获取进程累计读取的字节数，用于判断模拟器是否已开始载入存档
+
+        Returns:
+            int: 读取字节数，进程已退出、无权访问或平台不支持时返回None
+        """
+        try:
+            return self._psutil.Process(pid).io_counters().read_bytes
+        except (self._psutil.NoSuchProcess, self._psutil.AccessDenied, AttributeError, NotImplementedError):
+            return None
+
+
+class HotkeyBackend:
+    """全局热键后端，基于keyboard库"""
+
+    def __init__(self):
+        import keyboard
+        self._keyboard = keyboard
+
+    def add_hotkey(self, key, callback):
+        """注册热键"""
+        self._keyboard.add_hotkey(key, callback)
+
+    def remove_hotkey(self, key):
+        """注销热键"""
+        self._keyboard.remove_hotkey(key)
+
+    def unhook_all_hotkeys(self):
+        """注销所有热键"""
+        self._keyboard.unhook_all_hotkeys()
+
+    def on_press(self, callback):
+        """监听任意按键按下
+
+        Returns:
+            object: 监听句柄，用于 unhook
+        """
+        return self._keyboard.on_press(callback)
+
+    def unhook(self, hook):
+        """移除按键监听"""
+        self._keyboard.unhook(hook)
+
+
+class InputBackend:
+    """按键模拟后端，优先使用PyDirectInput，缺失时退回keyboard库"""
+
+    def __init__(self):
+        import keyboard
+        self._keyboard = keyboard
+        # 导入PyDirectInput库用于更可靠的游戏按键模拟
+        try:
+            import pydirectinput
+            # 按键间隔由 simulate_key_press 的调用方统一控制，不再叠加PyDirectInput自带的停顿
+            pydirectinput.PAUSE = 0
+            self._pydirectinput = pydirectinput
+        except ImportError:
+            self._pydirectinput = None
+            print("警告: PyDirectInput库未安装，将使用keyboard库作为备选方案")
+            print("建议安装PyDirectInput以获得更好的游戏兼容性: pip install pydirectinput")
+
+    def press(self, key):
+        """按下并释放一个按键
+
+        Args:
+            key: 按键名称
+        """
+        # 优先使用PyDirectInput库，它更适合游戏输入
+        if self._pydirectinput:
+            try:
+                self._pydirectinput.press(key)
+                return
+            except Exception as e:
+                print(f"PyDirectInput按键失败: {str(e)}，尝试使用keyboard库")
+        # 备选方案：使用keyboard库
+        self._keyboard.press_and_release(key)
+
+
+class Win32WindowBackend:
+    """Windows窗口聚焦后端，基于win32gui"""
+
+    def __init__(self):
+        import win32gui
+        import win32con
+        self._win32gui = win32gui
+        self._win32con = win32con
+
+    def focus(self, window_title, fuzzy=False):
+        """查找并激活指定标题的窗口
+
+        Args:
+            window_title: 窗口标题
+            fuzzy: 是否按不区分大小写的子串模糊匹配
+
+        Returns:
+            bool: 是否成功激活窗口
+        """
+        win32gui = self._win32gui
+        if not fuzzy:
+            hwnd = win32gui.FindWindow(None, window_title)
+            if hwnd:
+                win32gui.SetForegroundWindow(hwnd)
+                return True
+            return False
+
+        def enum_windows_callback(hwnd, results):
+            if win32gui.IsWindowVisible(hwnd):
+                title = win32gui.GetWindowText(hwnd)
+                if window_title.lower() in title.lower():  # 模糊匹配
+                    results.append(hwnd)
+
+        results = []
+        win32gui.EnumWindows(enum_windows_callback, results)
+        if not results:
+            return False
+
+        hwnd = results[0]
+        # 尝试多种方法激活窗口，是否已成为前台窗口由调用方通过 is_foreground 等待
+        try:
+            # 确保窗口不是最小化的
+            win32gui.ShowWindow(hwnd, self._win32con.SW_RESTORE)
+            # 将窗口置于前台
+            win32gui.SetForegroundWindow(hwnd)
+            # 额外尝试置顶窗口
+            win32gui.BringWindowToTop(hwnd)
+            if win32gui.GetForegroundWindow() != hwnd:
+                # 尝试再次激活窗口
+                win32gui.SetForegroundWindow(hwnd)
+            return True
+        except Exception as e:
+            print(f"激活窗口失败: {str(e)}")
+            return False
+
+    def is_foreground(self, window_title, fuzzy=False):
+        """检查前台窗口是否为指定标题的窗口
+
+        Args:
+            window_title: 窗口标题
+            fuzzy: 是否按不区分大小写的子串模糊匹配
+
+        Returns:
+            bool: 前台窗口是否匹配
+        """
+        title = self._win32gui.GetWindowText(self._win32gui.GetForegroundWindow())
+        if fuzzy:
+            return window_title.lower() in title.lower()
+        return title == window_title
+
+
+class NullWindowBackend:
+    """不支持窗口聚焦的平台使用的空后端"""
+
+    def focus(self, window_title, fuzzy=False):
+        """始终返回False，表示未找到窗口"""
+        return False
+
+    def is_foreground(self, window_title, fuzzy=False):
+        """始终返回False"""
+        return False
+
+
+def _load_window_backend():
+    """根据平台选择窗口后端"""
+    if sys.platform == "win32":
+        return Win32WindowBackend()
+    return NullWindowBackend()
+
+
+# 后端名称 -> 加载函数
+_BACKEND_LOADERS = {
+    "process": ProcessBackend,
+    "hotkey": HotkeyBackend,
+    "input": InputBackend,
+    "window": _load_window_backend,
+}
+
+# 已加载的后端实例
+_backends = {}
+
+
+def get_backend(kind):
+    """获取平台后端，首次使用时才加载
+
+    Args:
+        kind: 后端类型，'process'、'hotkey'、'input' 或 'window'
+
+    Returns:
+        object: 后端实例
+    """
+    backend = _backends.get(kind)
+    if backend is None:
+        backend = _BACKEND_LOADERS[kind]()
+        _backends[kind] = backend
+    return backend
+
+
+def set_backend(kind, backend):
+    """替换平台后端，传入None时恢复为默认的延迟加载
+
+    Args:
+        kind: 后端类型
+        backend: 后端实例
+    """
+    if kind not in _BACKEND_LOADERS:
+        raise KeyError(kind)
+    if backend is None:
+        _backends.pop(kind, None)
+    else:
+        _backends[kind] = backend
+
+
+def loaded_backends():
+    """获取已加载的后端类型列表
+
+    Returns:
+        list: 后端类型名称
+    """
+    return sorted(_backends)
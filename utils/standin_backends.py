@@ -0,0 +1,257 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+平台替身后端模块 - 模拟游戏窗口、按键输入和模拟器进程，使自动退出/载入游戏可以在Linux上测试和测量
+
+StandInGame 模拟一个运行中的游戏：窗口在激活后经过 focus_latency 秒才成为前台窗口；
+最后一次按键后经过 save_delay 秒开始写存档，分 save_chunks 次写入，每次间隔 chunk_interval 秒，
+同时增加模拟器进程的累计写入字节数。所有按键按时间记录在 key_log 中。
+
+指定 sequences 时模拟游戏菜单：距上一个按键不足 key_gap（或 key_gaps 中上一个按键对应的间隔）
+的按键会被吞掉，只有收到的按键组成 sequences 中的退出序列时才写存档，组成载入序列时增加模拟器的
+累计读取字节数，可用于测试按键宏的校准。
+
+用法:
+    game = StandInGame(save_dir)
+    install(game)                    # 替换 process、window、input 三个平台后端
+    ...
+    uninstall()
+"""
+
+import os
+import time
+import threading
+
+from utils.platform_backends import set_backend
+
+# 模拟器进程的PID和名称
+STANDIN_PID = 424242
+STANDIN_PROCESS_NAME = "shadPS4.exe"
+
+
+class StandInGame:
+    """模拟的游戏和模拟器"""
+
+    def __init__(self, save_dir, window_title="Bloodborne", focus_latency=0.03, save_delay=0.05,
+                 save_chunks=3, chunk_interval=0.05, chunk_size=4096, sequences=None, key_gap=0.0,
+                 key_gaps=None, load_size=65536, idle_reset=0.25):
+        """初始化模拟游戏
+
+        Args:
+            save_dir: 游戏写入存档的目录
+            window_title: 游戏窗口标题
+            focus_latency: 激活窗口到成为前台窗口的延迟（秒）
+            save_delay: 最后一次按键到开始写存档的延迟（秒）
+            save_chunks: 每次存档分几次写入
+            chunk_interval: 两次写入之间的间隔（秒）
+            chunk_size: 每次写入的字节数
+            sequences: 可选，{按键元组: 'save' 或 'load'}，未指定时每组按键都会写存档
+            key_gap: 两次按键之间的最短间隔，更快的按键被吞掉
+            key_gaps: 可选，{按键: 该按键之后的最短间隔}，覆盖 key_gap
+            load_size: 每次载入存档增加的读取字节数
+            idle_reset: 停止按键多久后未完成的序列作废
+        """
+        self.save_dir = save_dir
+        self.window_title = window_title
+        self.focus_latency = focus_latency
+        self.save_delay = save_delay
+        self.save_chunks = save_chunks
+        self.chunk_interval = chunk_interval
+        self.chunk_size = chunk_size
+        self.sequences = sequences
+        self.key_gap = key_gap
+        self.key_gaps = key_gaps or {}
+        self.load_size = load_size
+        self.idle_reset = idle_reset
+        self.running = True
+        self.write_bytes = 0
+        self.read_bytes = 0
+        self.key_log = []
+        self.saves = 0
+        self.loads = 0
+        self.dropped = 0
+        self._accepted = []
+        self._last_key = None
+        self._last_accepted_at = None
+        self._foreground_at = None
+        self._lock = threading.Lock()
+        self._save_timer = None
+
+    def focus(self):
+        """激活窗口，focus_latency 秒后成为前台窗口"""
+        with self._lock:
+            if self._foreground_at is None:
+                self._foreground_at = time.monotonic() + self.focus_latency
+
+    def is_foreground(self):
+        """窗口是否已在前台"""
+        with self._lock:
+            return self._foreground_at is not None and time.monotonic() >= self._foreground_at
+
+    def press(self, key):
+        """收到按键
+
+        未指定 sequences 时重新开始计时，最后一次按键 save_delay 秒后写存档；否则收到完整的退出或
+        载入序列 save_delay 秒后执行，不是任何序列开头的按键使菜单回到初始状态，停止按键
+        idle_reset 秒后未完成的序列作废。
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.key_log.append((now, key))
+            if self._last_key is not None and now - self._last_accepted_at < self.key_gaps.get(self._last_key,
+                                                                                                  self.key_gap):
+                self.dropped += 1
+            else:
+                self._accepted.append(key)
+                self._last_key = key
+                self._last_accepted_at = now
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+            if self.sequences is None:
+                self._start_timer(self.save_delay, self._write_save)
+                return
+            keys = tuple(self._accepted)
+            outcome = self.sequences.get(keys)
+            if outcome is not None:
+                self._accepted = []
+                threading.Timer(self.save_delay, self._finish_sequence, (outcome,)).start()
+            elif not any(sequence[:len(keys)] == keys for sequence in self.sequences):
+                self._accepted = []
+            self._start_timer(self.idle_reset, self._reset_menu)
+
+    def _start_timer(self, delay, function):
+        """启动按键停止后的计时"""
+        self._save_timer = threading.Timer(delay, function)
+        self._save_timer.daemon = True
+        self._save_timer.start()
+
+    def _reset_menu(self):
+        """停止按键后菜单回到初始状态"""
+        with self._lock:
+            self._accepted = []
+            self._last_key = None
+
+    def _finish_sequence(self, outcome):
+        """执行收到的退出或载入序列"""
+        if outcome == "save":
+            self._write_save()
+        else:
+            with self._lock:
+                self.read_bytes += self.load_size
+                self.loads += 1
+
+    def _write_save(self):
+        """分几次写入存档文件"""
+        path = os.path.join(self.save_dir, "userdata0000")
+        os.makedirs(self.save_dir, exist_ok=True)
+        with open(path, "ab") as f:
+            for chunk in range(self.save_chunks):
+                if chunk:
+                    time.sleep(self.chunk_interval)
+                f.write(os.urandom(self.chunk_size))
+                f.flush()
+                with self._lock:
+                    self.write_bytes += self.chunk_size
+        with self._lock:
+            self.saves += 1
+
+    def blur(self):
+        """窗口失去焦点"""
+        with self._lock:
+            self._foreground_at = None
+
+
+class StandInProcessBackend:
+    """模拟器进程后端"""
+
+    def __init__(self, game):
+        self.game = game
+
+    def is_running(self, process_name):
+        return self.game.running and process_name == STANDIN_PROCESS_NAME
+
+    def find_process(self, process_names):
+        if self.game.running and STANDIN_PROCESS_NAME in process_names:
+            return STANDIN_PID
+        return None
+
+    def pid_exists(self, pid):
+        return self.game.running and pid == STANDIN_PID
+
+    def process_name(self, pid):
+        return STANDIN_PROCESS_NAME if self.pid_exists(pid) else None
+
+    def io_write_bytes(self, pid):
+        return self.game.write_bytes if self.pid_exists(pid) else None
+
+    def io_read_bytes(self, pid):
+        return self.game.read_bytes if self.pid_exists(pid) else None
+
+
+class StandInWindowBackend:
+    """游戏窗口后端"""
+
+    def __init__(self, game):
+        self.game = game
+
+    def _matches(self, window_title, fuzzy):
+        if fuzzy:
+            return window_title.lower() in self.game.window_title.lower()
+        return window_title == self.game.window_title
+
+    def focus(self, window_title, fuzzy=False):
+        if not self.game.running or not self._matches(window_title, fuzzy):
+            return False
+        self.game.focus()
+        return True
+
+    def is_foreground(self, window_title, fuzzy=False):
+        return self.game.running and self._matches(window_title, fuzzy) and self.game.is_foreground()
+
+
+class StandInInputBackend:
+    """按键输入后端"""
+
+    def __init__(self, game):
+        self.game = game
+
+    def press(self, key):
+        self.game.press(key)
+
+
+class RecordingInputBackend:
+    """记录按键的输入后端，可同时转发给另一个输入后端"""
+
+    def __init__(self, forward=None):
+        """初始化
+
+        Args:
+            forward: 可选，实际执行按键的输入后端
+        """
+        self.forward = forward
+        self.keys = []
+
+    def press(self, key):
+        self.keys.append((time.monotonic(), key))
+        if self.forward is not None:
+            self.forward.press(key)
+
+
+def macro_sequences(macro):
+    """根据宏定义生成模拟游戏的 sequences 参数：退出序列写存档，载入序列载入存档"""
+    from utils.macros import key_sequence
+    return {tuple(key_sequence(macro["exit"])): "save", tuple(key_sequence(macro["load"])): "load"}
+
+
+def install(game):
+    """用模拟游戏替换 process、window、input 三个平台后端"""
+    set_backend("process", StandInProcessBackend(game))
+    set_backend("window", StandInWindowBackend(game))
+    set_backend("input", StandInInputBackend(game))
+
+
+def uninstall():
+    """恢复默认的平台后端"""
+    for kind in ("process", "window", "input"):
+        set_backend(kind, None)
@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+启动耗时探针 - 记录程序启动各阶段相对于进程启动的耗时
+
+应在程序入口最先导入本模块，使计时起点尽量接近进程启动时间。
+"""
+
+import time
+
+# 计时起点，模块首次导入时记录
+_start = time.perf_counter()
+
+# 已记录的阶段 [(名称, 距起点的秒数)]
+_marks = []
+
+
+def mark(name):
+    """记录一个启动阶段完成的时间点
+
+    Args:
+        name: 阶段名称，如 'window'、'hotkeys'
+    """
+    _marks.append((name, time.perf_counter() - _start))
+
+
+def get_mark(name):
+    """获取阶段耗时
+
+    Args:
+        name: 阶段名称
+
+    Returns:
+        float: 距起点的秒数，未记录时返回None
+    """
+    for mark_name, elapsed in _marks:
+        if mark_name == name:
+            return elapsed
+    return None
+
+
+def format_report():
+    """生成启动耗时报告
+
+    Returns:
+        str: 每个阶段一行的报告文本
+    """
+    from utils.platform_backends import loaded_backends
+
+    lines = [f"{name}: {elapsed * 1000:.1f} ms" for name, elapsed in _marks]
+    lines.append(f"已加载的平台后端: {', '.join(loaded_backends()) or '无'}")
+    return "\n".join(lines)
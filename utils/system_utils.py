@@ -3,103 +3,300 @@
 
 """
 系统工具模块 - 提供进程检测、热键管理等系统相关功能
+
+具体实现由 utils.platform_backends 中的后端提供，相关库在首次调用时才加载。
 """
 
-import psutil
-import keyboard
-import win32gui
-import win32con
+import os
+import sys
 import time
+import threading
 
-# 导入PyDirectInput库用于更可靠的游戏按键模拟
-try:
-    import pydirectinput
-    pydirectinput.PAUSE = 0.1  # 设置按键间隔，避免按键过快
-    HAS_PYDIRECTINPUT = True
-except ImportError:
-    HAS_PYDIRECTINPUT = False
-    print("警告: PyDirectInput库未安装，将使用keyboard库作为备选方案")
-    print("建议安装PyDirectInput以获得更好的游戏兼容性: pip install pydirectinput")
+from utils.platform_backends import get_backend
+from utils.waits import wait_until
 
 
 def is_process_running(process_name):
     """检查指定进程是否在运行
-    
+
     Args:
         process_name: 进程名称，如 'shadPS4.exe'
-        
+
     Returns:
         bool: 进程是否在运行
     """
-    try:
-        return any(p.info['name'] == process_name 
-                  for p in psutil.process_iter(['name']))
-    except (psutil.NoSuchProcess, psutil.AccessDenied):
-        return False
+    return get_backend("process").is_running(process_name)
+
+
+class ProcessTracker:
+    """模拟器进程跟踪器
+
+    找到进程后记住其PID，之后只需检查PID是否存在且名称仍然匹配，
+    PID失效时才重新遍历系统进程，使每次热键检测的开销与进程总数无关。
+    """
+
+    def __init__(self, process_names):
+        """初始化进程跟踪器
+
+        Args:
+            process_names: 可接受的进程名称列表，如 ['shadPS4.exe', 'shadps4']
+        """
+        self.process_names = frozenset(process_names)
+        self.pid = None
+
+    def is_running(self):
+        """检查模拟器进程是否在运行
+
+        Returns:
+            bool: 进程是否在运行
+        """
+        backend = get_backend("process")
+        if self.pid is not None:
+            # PID可能被系统复用，因此还要确认进程名称
+            if backend.pid_exists(self.pid) and backend.process_name(self.pid) in self.process_names:
+                return True
+            self.pid = None
+
+        self.pid = backend.find_process(self.process_names)
+        return self.pid is not None
+
+    def reset(self):
+        """清除缓存的PID，下次检测时重新扫描"""
+        self.pid = None
+
+    def io_write_bytes(self):
+        """获取模拟器进程累计写入的字节数
+
+        Returns:
+            int: 写入字节数，模拟器未运行或平台不支持时返回None
+        """
+        if not self.is_running():
+            return None
+        return get_backend("process").io_write_bytes(self.pid)
+
+    def io_read_bytes(self):
+        """获取模拟器进程累计读取的字节数
+
+        Returns:
+            int: 读取字节数，模拟器未运行或平台不支持时返回None
+        """
+        if not self.is_running():
+            return None
+        return get_backend("process").io_read_bytes(self.pid)
 
 
 def register_hotkey(key, callback, check_process=None):
     """注册热键
-    
+
     Args:
         key: 热键字符串，如 'f7'
         callback: 热键触发时的回调函数
         check_process: 可选，检查进程是否在运行的函数
-        
+
     Returns:
         function: 热键注销函数
     """
+    backend = get_backend("hotkey")
     if check_process:
         def wrapper():
             if check_process():
                 callback()
-        keyboard.add_hotkey(key, wrapper)
+        backend.add_hotkey(key, wrapper)
     else:
-        keyboard.add_hotkey(key, callback)
-    
+        backend.add_hotkey(key, callback)
+
     # 返回注销函数
-    return lambda: keyboard.remove_hotkey(key)
+    return lambda: backend.remove_hotkey(key)
+
+
+def unregister_hotkey(key):
+    """注销单个热键
+
+    Args:
+        key: 热键字符串
+    """
+    get_backend("hotkey").remove_hotkey(key)
 
 
 def unregister_all_hotkeys():
     """注销所有热键"""
-    keyboard.unhook_all_hotkeys()
+    get_backend("hotkey").unhook_all_hotkeys()
 
 
-def focus_window(window_title):
+def listen_key_press(callback):
+    """监听下一次按键，用于设置热键
+
+    Args:
+        callback: 按键事件回调函数
+
+    Returns:
+        function: 移除监听的函数
+    """
+    backend = get_backend("hotkey")
+    hook = backend.on_press(callback)
+    return lambda: backend.unhook(hook)
+
+
+def focus_window(window_title, fuzzy=False):
     """查找并激活指定标题的窗口
-    
+
     Args:
         window_title: 窗口标题
-        
+        fuzzy: 是否按不区分大小写的子串模糊匹配
+
     Returns:
         bool: 是否成功激活窗口
     """
-    hwnd = win32gui.FindWindow(None, window_title)
-    if hwnd:
-        win32gui.SetForegroundWindow(hwnd)
-        return True
-    return False
+    return get_backend("window").focus(window_title, fuzzy)
+
+
+def is_window_foreground(window_title, fuzzy=False):
+    """检查前台窗口是否为指定标题的窗口
+
+    Args:
+        window_title: 窗口标题
+        fuzzy: 是否按不区分大小写的子串模糊匹配
+
+    Returns:
+        bool: 前台窗口是否匹配
+    """
+    return get_backend("window").is_foreground(window_title, fuzzy)
+
+
+def focus_game_window(window_titles, timeout, timings=None):
+    """聚焦游戏窗口并等待其成为前台窗口
+
+    依次尝试各个标题，找到窗口并激活后等待它成为前台窗口；窗口尚未出现时继续查找直到超时。
+
+    Args:
+        window_titles: 可能的窗口标题列表，按不区分大小写的子串匹配
+        timeout: 最长等待秒数
+        timings: 可选，WaitTimings 实例，记录为 'window_focus'
+
+    Returns:
+        bool: 游戏窗口是否已在前台
+    """
+    window = get_backend("window")
+    focused_title = None
+
+    def focused():
+        nonlocal focused_title
+        if focused_title is not None:
+            return window.is_foreground(focused_title, True)
+        for title in window_titles:
+            if window.focus(title, True):
+                focused_title = title
+                return window.is_foreground(title, True)
+        return False
+
+    return wait_until(focused, timeout, "window_focus", timings)
 
 
 def simulate_key_press(key, delay=0.05):
     """模拟按键
-    
+
     Args:
         key: 按键名称
-        delay: 按键前后的延迟时间（秒）
+        delay: 按键后等待的时间（秒），让游戏处理完这次输入后再按下一个键
     """
-    time.sleep(delay)
-    
-    # 优先使用PyDirectInput库，它更适合游戏输入
-    if HAS_PYDIRECTINPUT:
-        try:
-            pydirectinput.press(key)
-        except Exception as e:
-            print(f"PyDirectInput按键失败: {str(e)}，尝试使用keyboard库")
-            keyboard.press_and_release(key)
-    else:
-        # 备选方案：使用keyboard库
-        keyboard.press_and_release(key)
-        
-    time.sleep(delay)
\ No newline at end of file
+    get_backend("input").press(key)
+    if delay:
+        time.sleep(delay)
+
+
+def lower_current_thread_priority():
+    """降低当前线程的CPU和I/O优先级，用于后台校验等不紧急的任务
+
+    Windows下进入后台处理模式，Linux下调高当前线程的nice值，其他平台不做处理。
+
+    Returns:
+        bool: 是否成功降低优先级
+    """
+    try:
+        if sys.platform == "win32":
+            import ctypes
+            THREAD_MODE_BACKGROUND_BEGIN = 0x00010000
+            kernel32 = ctypes.windll.kernel32
+            return bool(kernel32.SetThreadPriority(kernel32.GetCurrentThread(), THREAD_MODE_BACKGROUND_BEGIN))
+        if sys.platform.startswith("linux"):
+            # Linux的nice值是按线程生效的
+            thread_id = threading.get_native_id()
+            os.setpriority(os.PRIO_PROCESS, thread_id, max(os.getpriority(os.PRIO_PROCESS, thread_id), 10))
+            return True
+    except (OSError, AttributeError):
+        pass
+    return False
+
+
+# Linux ioprio_set/ioprio_get 的系统调用号
+_IOPRIO_SYSCALLS = {
+    "x86_64": (251, 252),
+    "i386": (289, 290),
+    "i686": (289, 290),
+    "aarch64": (30, 31),
+    "riscv64": (30, 31),
+    "armv7l": (314, 315),
+    "ppc64le": (273, 274),
+}
+
+# Linux的I/O优先级类别（ionice -c），best-effort 使用其中最低的级别7
+_IOPRIO_CLASSES = {"best-effort": (2, 7), "idle": (3, 0)}
+_IOPRIO_CLASS_SHIFT = 13
+_IOPRIO_WHO_PROCESS = 1
+
+
+def _ioprio_syscall(index, *args):
+    """调用 ioprio_set（index=0）或 ioprio_get（index=1），当前线程由线程ID指定"""
+    import ctypes
+    import platform
+    numbers = _IOPRIO_SYSCALLS.get(platform.machine())
+    if numbers is None:
+        raise OSError("不支持的CPU架构")
+    libc = ctypes.CDLL(None, use_errno=True)
+    result = libc.syscall(numbers[index], _IOPRIO_WHO_PROCESS, threading.get_native_id(), *args)
+    if result < 0:
+        raise OSError(ctypes.get_errno(), "ioprio系统调用失败")
+    return result
+
+
+def set_current_thread_io_class(io_class):
+    """降低当前线程的I/O优先级
+
+    Linux下设置ionice类别（idle 只在磁盘空闲时读写，best-effort 为最低级别），Windows下进入后台处理模式，
+    其他平台不做处理。
+
+    Args:
+        io_class: 'idle' 或 'best-effort'
+
+    Returns:
+        object: 原来的优先级，传给 restore_current_thread_io_class 恢复，未修改时返回None
+    """
+    try:
+        if sys.platform == "win32":
+            import ctypes
+            THREAD_MODE_BACKGROUND_BEGIN = 0x00010000
+            kernel32 = ctypes.windll.kernel32
+            return "background" if kernel32.SetThreadPriority(kernel32.GetCurrentThread(),
+                                                              THREAD_MODE_BACKGROUND_BEGIN) else None
+        if sys.platform.startswith("linux"):
+            ioprio_class, level = _IOPRIO_CLASSES[io_class]
+            previous = _ioprio_syscall(1)
+            _ioprio_syscall(0, (ioprio_class << _IOPRIO_CLASS_SHIFT) | level)
+            return previous
+    except (OSError, AttributeError, KeyError):
+        pass
+    return None
+
+
+def restore_current_thread_io_class(previous):
+    """恢复 set_current_thread_io_class 修改前的I/O优先级"""
+    try:
+        if sys.platform == "win32":
+            import ctypes
+            THREAD_MODE_BACKGROUND_END = 0x00020000
+            kernel32 = ctypes.windll.kernel32
+            kernel32.SetThreadPriority(kernel32.GetCurrentThread(), THREAD_MODE_BACKGROUND_END)
+        elif sys.platform.startswith("linux"):
+            _ioprio_syscall(0, previous)
+    except (OSError, AttributeError):
+        pass
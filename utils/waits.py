@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+等待模块 - 以可观察的条件代替自动退出/载入游戏中的固定延时
+
+每种等待都在条件满足时立即返回，超时后放弃等待继续执行，不会比原来的固定延时更慢：
+
+    存档文件静止      存档目录中所有文件的大小和修改时间在一段时间内不再变化
+    窗口已聚焦        前台窗口标题与游戏窗口匹配
+    模拟器I/O稳定    模拟器进程累计写入的字节数在一段时间内不再变化
+
+每次等待实际花费的时间记录在 WaitTimings 中，可用于调整超时或排查延迟。
+"""
+
+import os
+import time
+
+# 轮询条件的间隔（秒）
+POLL_INTERVAL = 0.02
+
+
+class WaitTimings:
+    """一次自动化操作中各个等待的耗时记录"""
+
+    def __init__(self):
+        self.records = []
+
+    def record(self, name, elapsed, satisfied):
+        """记录一次等待
+
+        Args:
+            name: 等待名称，如 'window_focus'、'save_quiescent'
+            elapsed: 实际等待的秒数
+            satisfied: 条件是否在超时前满足
+        """
+        self.records.append({"wait": name, "elapsed": elapsed, "satisfied": satisfied})
+
+    def total(self):
+        """所有等待的总耗时"""
+        return sum(record["elapsed"] for record in self.records)
+
+    def format_report(self):
+        """生成每个等待一行的报告文本"""
+        return "\n".join(f"{record['wait']}: {record['elapsed'] * 1000:.1f} ms"
+                         + ("" if record["satisfied"] else "（超时）") for record in self.records)
+
+
+def wait_until(condition, timeout, name=None, timings=None, poll_interval=POLL_INTERVAL):
+    """等待条件成立
+
+    Args:
+        condition: 无参数函数，返回True表示条件成立
+        timeout: 最长等待秒数
+        name: 可选，记录到 timings 中的等待名称
+        timings: 可选，WaitTimings 实例
+        poll_interval: 轮询间隔
+
+    Returns:
+        bool: 条件是否在超时前成立
+    """
+    started = time.monotonic()
+    deadline = started + timeout
+    while True:
+        satisfied = bool(condition())
+        if satisfied or time.monotonic() >= deadline:
+            break
+        time.sleep(poll_interval)
+    if timings is not None:
+        timings.record(name, time.monotonic() - started, satisfied)
+    return satisfied
+
+
+def wait_stable(probe, quiet_period, timeout, name=None, timings=None, poll_interval=POLL_INTERVAL):
+    """等待观测值在 quiet_period 秒内保持不变
+
+    Args:
+        probe: 无参数函数，返回可比较的观测值，如目录状态或写入字节数
+        quiet_period: 观测值需要保持不变的秒数
+        timeout: 最长等待秒数
+        name: 可选，记录到 timings 中的等待名称
+        timings: 可选，WaitTimings 实例
+        poll_interval: 轮询间隔
+
+    Returns:
+        bool: 观测值是否在超时前稳定
+    """
+    last = probe()
+    changed_at = time.monotonic()
+
+    def stable():
+        nonlocal last, changed_at
+        current = probe()
+        now = time.monotonic()
+        if current != last:
+            last = current
+            changed_at = now
+        return now - changed_at >= quiet_period
+
+    return wait_until(stable, timeout, name, timings, poll_interval)
+
+
+def directory_state(path):
+    """获取目录中所有文件的大小和修改时间，作为判断存档是否静止的观测值
+
+    Returns:
+        frozenset: {(相对路径, 大小, 修改时间纳秒)}，目录不存在时为空集合
+    """
+    state = []
+    for root, _, files in os.walk(path):
+        for file in files:
+            file_path = os.path.join(root, file)
+            try:
+                stat = os.stat(file_path)
+            except FileNotFoundError:
+                # 游戏正在替换文件
+                continue
+            state.append((os.path.relpath(file_path, path), stat.st_size, stat.st_mtime_ns))
+    return frozenset(state)